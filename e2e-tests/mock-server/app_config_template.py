@@ -0,0 +1,202 @@
+"""
+Default app_config document and its precompiled byte template
+Only company_id and device_unique_id vary between default configs, so the document is
+serialized once with placeholders and rendered by splicing in the JSON-escaped IDs.
+"""
+
+import json
+import re
+
+
+def build_default_app_config(company_id, device_unique_id):
+    """
+    Build the default app_config document served when no app_config.json fixture exists
+
+    Args:
+        company_id: Company ID for the config
+        device_unique_id: Device unique ID for the config (also used as the device name)
+
+    Returns:
+        dict: app_config document
+    """
+    return {
+        "id": "642b74cc7ac462445dba7457",
+        "name": device_unique_id,
+        "unique_id": device_unique_id,
+        "auto_relay_reports": False,
+        "aws_greengrass_core_thing_arn": "",
+        "bluemix_auth_token": "",
+        "heartbeat_period": 5,
+        "heartbeat_values": None,
+        "max_persisted_reports": 1000,
+        "relay_frequency_limit_seconds": 0,
+        "metadata": {},
+        "company": {
+            "id": company_id,
+            "company_id": company_id,
+            "name": "edge testing company",
+            "user_id": "5bb3e6d773c6b700018695fa",
+            "created_at": "2023-04-04T00:52:27.154015Z",
+            "updated_at": "2023-04-04T00:52:27.154015Z",
+            "origin": "cloud",
+            "aliases": {
+                "device": "device",
+                "gateway": "gateway"
+            },
+            "branding": {
+                "gradient_sidbar": False,
+                "icon_url": "",
+                "logo_background_color": "",
+                "logo_url": "",
+                "portal_title": "",
+                "primary_color": "",
+                "secondary_color": "",
+                "sidebar_text_color": ""
+            }
+        },
+        "device_type": {
+            "id": "642b74cc7ac462445dba7455",
+            "name": "Remote Terminal Test Device Type",
+            "type": "gateway",
+            "role": "gateway",
+            "manufacturer": "ManFac",
+            "model": "3 Million",
+            "company_id": company_id,
+            "user_id": "642b74cb7ac462445dba7453",
+            "origin": "cloud",
+            "created_at": "2023-04-04T00:52:28.001016Z",
+            "updated_at": "2023-04-04T00:52:28.001016Z",
+            "capabilities": {
+                "actions": {
+                    "heartbeat": True,
+                    "log": True,
+                    "log_config": True,
+                    "log_level": True,
+                    "log_upload": True,
+                    "mqtt": True,
+                    "send_config": True,
+                    "setting": True,
+                    "start_remote_terminal": True,
+                    "status": True,
+                    "stop_remote_terminal": True
+                }
+            },
+            "rules": [],
+            "command_ids": [],
+            "ingestor_ids": [],
+            "software_update_ids": [],
+            "pollable_attributes": []
+        },
+        "user": {
+            "id": "642b74cb7ac462445dba7453",
+            "company_id": company_id,
+            "user_id": "5bb3e6d773c6b700018695fa",
+            "email": "edge-testing@edgeiq.io",
+            "first_name": "EdgeIQ",
+            "last_name": "Tester",
+            "phone_number": "",
+            "encrypted_authentication_token": "wFkiS.$2a$10$...",
+            "encrypted_password": "$2a$10$...",
+            "logo_url": "",
+            "origin": "cloud",
+            "created_at": "2023-04-04T00:52:27.640092Z",
+            "updated_at": "2023-04-04T00:52:27.640092Z"
+        },
+        "log_config": {
+            "local_level": "info",
+            "forward_level": "error",
+            "forward_frequency_limit": 60
+        },
+        "device_types": [],
+        "devices": [],
+        "connections": [],
+        "ingestors": [],
+        "translators": [],
+        "commands": [],
+        "integrations": [],
+        "integration_ids": [],
+        "rules": [],
+        "device_ha_group": None
+    }
+
+
+def render_app_config_reference(company_id, device_unique_id):
+    """
+    Render the default app_config the slow way (pretty-printed json.dumps per request)
+
+    Kept as the reference the template output must be byte-identical to.
+    """
+    return json.dumps(build_default_app_config(company_id, device_unique_id), indent=2).encode('utf-8')
+
+
+class AppConfigTemplate:
+    """
+    Byte template of a JSON document whose only varying parts are whole string values
+
+    The document is built once with sentinel strings in place of the variable fields and
+    serialized with the same json.dumps options as the reference renderer. The output is
+    split on the serialized sentinels into constant byte segments. Rendering encodes each
+    value with json.dumps (identical escaping to the full serializer) and joins the
+    segments in a single allocation sized from the precomputed segment lengths.
+    """
+
+    def __init__(self, builder, fields, **dumps_kwargs):
+        """
+        Args:
+            builder: Callable taking the fields as keyword arguments and returning the document
+            fields: Names of the string fields that vary between renders
+            dumps_kwargs: Options passed to json.dumps (must match the reference renderer)
+        """
+        self.fields = tuple(fields)
+        self.dumps_kwargs = dumps_kwargs
+
+        sentinels = {field: f"\x00{field}\x00" for field in self.fields}
+        document = json.dumps(builder(**sentinels), **dumps_kwargs).encode('utf-8')
+        tokens = {json.dumps(sentinel).encode('utf-8'): field for field, sentinel in sentinels.items()}
+        pattern = re.compile(b'|'.join(re.escape(token) for token in tokens))
+
+        # Alternating constant segments and field slots: segments[i] precedes slots[i]
+        self.segments = []
+        self.slots = []
+        position = 0
+        for match in pattern.finditer(document):
+            self.segments.append(document[position:match.start()])
+            self.slots.append(tokens[match.group(0)])
+            position = match.end()
+        self.segments.append(document[position:])
+
+        missing = set(self.fields) - set(self.slots)
+        if missing:
+            raise ValueError(f"Template fields not present in document: {sorted(missing)}")
+
+    def render(self, **values):
+        """
+        Render the document for the given field values
+
+        Returns:
+            bytes: Serialized document, byte-identical to json.dumps(builder(**values), **dumps_kwargs)
+        """
+        ensure_ascii = self.dumps_kwargs.get('ensure_ascii', True)
+        encoded = {
+            field: json.dumps(values[field], ensure_ascii=ensure_ascii).encode('utf-8')
+            for field in self.fields
+        }
+        parts = [None] * (len(self.segments) + len(self.slots))
+        parts[0::2] = self.segments
+        parts[1::2] = [encoded[field] for field in self.slots]
+        return b''.join(parts)
+
+
+DEFAULT_APP_CONFIG_TEMPLATE = AppConfigTemplate(
+    build_default_app_config, ('company_id', 'device_unique_id'), indent=2
+)
+
+
+def render_default_app_config(company_id, device_unique_id):
+    """
+    Render the default app_config document from the precompiled template
+
+    Returns:
+        bytes: Pretty-printed JSON identical to render_app_config_reference()
+    """
+    return DEFAULT_APP_CONFIG_TEMPLATE.render(company_id=company_id, device_unique_id=device_unique_id)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Archive compression benchmark for app_config.zip
+Reports wire size against server CPU time (compress) and gateway CPU time (decompress)
+for every archive method/level and optional gzip Content-Encoding, over fixture configs
+of various sizes.
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+from app_config_template import build_default_app_config
+from server import build_zip_archive
+
+ARCHIVE_VARIANTS = [('stored', None)] + [('deflate', level) for level in range(1, 10)]
+CONTENT_ENCODINGS = [None, 6]
+
+# Number of synthetic device entries appended to the default config for each fixture size
+FIXTURE_SIZES = {
+    'default': 0,
+    'small': 25,
+    'medium': 250,
+    'large': 2500,
+}
+
+
+def build_fixture(device_count, seed=1):
+    """
+    Build a pretty-printed app_config with device_count synthetic devices
+
+    Device entries carry the kind of mostly-repetitive metadata real fleets have, so the
+    compression ratio is representative rather than best-case.
+    """
+    rng = random.Random(seed)
+    app_config = build_default_app_config('bench-company', 'bench-gateway')
+    for index in range(device_count):
+        app_config['devices'].append({
+            'id': f"{rng.getrandbits(96):024x}",
+            'name': f"sensor-{index:05d}",
+            'unique_id': f"bench-sensor-{index:05d}",
+            'device_type_id': f"{rng.getrandbits(96):024x}",
+            'company_id': 'bench-company',
+            'active': True,
+            'log_config': {'local_level': 'info', 'forward_level': 'error', 'forward_frequency_limit': 60},
+            'location': {'lat': round(rng.uniform(-90, 90), 6), 'lon': round(rng.uniform(-180, 180), 6)},
+            'metadata': {'serial': f"SN{rng.randrange(10**9):09d}", 'firmware': f"1.{rng.randrange(20)}.{rng.randrange(50)}"},
+            'ingestor_ids': [f"{rng.getrandbits(96):024x}" for _ in range(rng.randrange(1, 4))],
+            'created_at': '2023-04-04T00:52:28.001016Z',
+            'updated_at': '2023-04-04T00:52:28.001016Z',
+        })
+    return json.dumps(app_config, indent=2).encode('utf-8')
+
+
+def cpu_time(func, repeat):
+    """Average process CPU time of func() over `repeat` runs, returning (seconds, last_result)"""
+    result = None
+    started = time.process_time()
+    for _ in range(repeat):
+        result = func()
+    return (time.process_time() - started) / repeat, result
+
+
+def unzip(zip_data):
+    """Extract app_config.json like the gateway does"""
+    with zipfile.ZipFile(BytesIO(zip_data)) as archive:
+        return archive.read('app_config.json')
+
+
+def run_matrix(fixtures, repeat):
+    """
+    Benchmark every archive/content-encoding combination for each fixture
+
+    Returns:
+        list of result dicts
+    """
+    results = []
+    for fixture_name, content in fixtures.items():
+        for compression, level in ARCHIVE_VARIANTS:
+            compress_s, zip_data = cpu_time(lambda: build_zip_archive(content, compression, level), repeat)
+            unzip_s, _ = cpu_time(lambda: unzip(zip_data), repeat)
+            for gzip_level in CONTENT_ENCODINGS:
+                wire = zip_data
+                gzip_s = gunzip_s = 0.0
+                if gzip_level is not None:
+                    gzip_s, wire = cpu_time(lambda: gzip.compress(zip_data, compresslevel=gzip_level), repeat)
+                    gunzip_s, _ = cpu_time(lambda: gzip.decompress(wire), repeat)
+                results.append({
+                    'fixture': fixture_name,
+                    'json_bytes': len(content),
+                    'compression': compression,
+                    'level': level,
+                    'content_encoding': f"gzip-{gzip_level}" if gzip_level is not None else 'identity',
+                    'wire_bytes': len(wire),
+                    'ratio': round(len(wire) / len(content), 4),
+                    'server_cpu_ms': round((compress_s + gzip_s) * 1000.0, 4),
+                    'client_cpu_ms': round((unzip_s + gunzip_s) * 1000.0, 4),
+                })
+    return results
+
+
+def print_table(results, out):
+    """Print a human readable size/CPU table"""
+    header = f"{'fixture':<8} {'json':>9} {'archive':<10} {'encoding':<9} {'wire':>9} {'ratio':>7} {'server ms':>10} {'client ms':>10}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for r in results:
+        archive = r['compression'] if r['level'] is None else f"{r['compression']}-{r['level']}"
+        print(f"{r['fixture']:<8} {r['json_bytes']:>9} {archive:<10} {r['content_encoding']:<9} "
+              f"{r['wire_bytes']:>9} {r['ratio']:>7.3f} {r['server_cpu_ms']:>10.3f} {r['client_cpu_ms']:>10.3f}",
+              file=out)
+
+
+def main(argv=None):
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description='app_config.zip compression size/CPU benchmark')
+    parser.add_argument('--fixture', action='append', default=[],
+                        help='extra app_config.json file to include (repeatable)')
+    parser.add_argument('--sizes', default=','.join(FIXTURE_SIZES),
+                        help=f"synthetic fixture sizes to include (default: {','.join(FIXTURE_SIZES)})")
+    parser.add_argument('--repeat', type=int, default=20, help='runs averaged per measurement')
+    parser.add_argument('--json', dest='json_output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    fixtures = {}
+    for size in filter(None, args.sizes.split(',')):
+        fixtures[size] = build_fixture(FIXTURE_SIZES[size])
+    for path in args.fixture:
+        fixtures[Path(path).stem] = Path(path).read_bytes()
+
+    results = run_matrix(fixtures, args.repeat)
+    print_table(results, sys.stdout)
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Full archive vs JSON Patch delta benchmark for config updates
+For realistic edits to fixture configs of various sizes, reports bytes on the wire for the
+full app_config.zip and for the delta (plain and gzip), the server CPU time to build the
+delta, and the gateway CPU time to apply each (unzip + MD5 vs patch + serialize + MD5).
+"""
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import random
+import sys
+
+from bench_compression import FIXTURE_SIZES, build_fixture, cpu_time, unzip
+from config_history import ConfigHistory, DeltaUnavailable, serialize
+from json_patch import apply_patch
+from server import build_zip_archive
+
+
+def new_device(config, rng, index):
+    """A device entry shaped like the others in the fixture"""
+    device = copy.deepcopy(config['devices'][-1]) if config['devices'] else {}
+    device.update({
+        'id': f"{rng.getrandbits(96):024x}",
+        'name': f"sensor-new-{index:05d}",
+        'unique_id': f"bench-sensor-new-{index:05d}",
+    })
+    return device
+
+
+def edit_log_level(config, rng):
+    device = rng.choice(config['devices'])
+    device['log_config']['local_level'] = 'debug'
+
+
+def edit_heartbeat(config, rng):
+    config['heartbeat_period'] = 30
+
+
+def edit_one_firmware(config, rng):
+    rng.choice(config['devices'])['metadata']['firmware'] = '2.0.0'
+
+
+def edit_add_device(config, rng):
+    config['devices'].append(new_device(config, rng, 0))
+
+
+def edit_insert_device(config, rng):
+    config['devices'].insert(len(config['devices']) // 2, new_device(config, rng, 1))
+
+
+def edit_remove_device(config, rng):
+    del config['devices'][len(config['devices']) // 2]
+
+
+def edit_fleet_firmware(config, rng):
+    for device in rng.sample(config['devices'], max(1, len(config['devices']) // 10)):
+        device['metadata']['firmware'] = '2.0.0'
+        device['updated_at'] = '2024-01-01T00:00:00.000000Z'
+
+
+def edit_reorder(config, rng):
+    rng.shuffle(config['devices'])
+
+
+# name -> edit function (mutates the parsed config in place)
+EDITS = {
+    'heartbeat': edit_heartbeat,
+    'log_level': edit_log_level,
+    'one_firmware': edit_one_firmware,
+    'add_device': edit_add_device,
+    'insert_device': edit_insert_device,
+    'remove_device': edit_remove_device,
+    'fleet_firmware_10pct': edit_fleet_firmware,
+    'reorder': edit_reorder,
+}
+
+
+def apply_full(zip_data):
+    """Gateway side of a full download: unzip and verify the MD5"""
+    content = unzip(zip_data)
+    return hashlib.md5(content).hexdigest()
+
+
+def apply_delta(base, delta):
+    """Gateway side of a delta: parse the current config, patch, serialize and verify the MD5"""
+    document = apply_patch(json.loads(base), json.loads(delta), in_place=True)
+    return hashlib.md5(serialize(document)).hexdigest()
+
+
+def run_matrix(fixtures, edits, repeat, seed=1):
+    """
+    Benchmark full vs delta delivery for each fixture and edit
+
+    Returns:
+        list of result dicts
+    """
+    results = []
+    for fixture_name, base in fixtures.items():
+        # Devices are needed for the device edits
+        if not json.loads(base)['devices']:
+            continue
+        for edit_name in edits:
+            config = json.loads(base)
+            EDITS[edit_name](config, random.Random(seed))
+            target = serialize(config)
+            target_md5 = hashlib.md5(target).hexdigest()
+
+            zip_data = build_zip_archive(target)
+            full_apply_s, _ = cpu_time(lambda: apply_full(zip_data), repeat)
+            result = {
+                'fixture': fixture_name,
+                'edit': edit_name,
+                'json_bytes': len(target),
+                'full_bytes': len(zip_data),
+                'full_apply_ms': round(full_apply_s * 1000.0, 4),
+            }
+            try:
+                build_s, delta = cpu_time(lambda: ConfigHistory.build_delta(base, target), repeat)
+            except DeltaUnavailable as e:
+                result.update({'delivery': f"full ({e})"})
+                results.append(result)
+                continue
+            delta_apply_s, delta_md5 = cpu_time(lambda: apply_delta(base, delta), repeat)
+            if delta_md5 != target_md5:
+                raise AssertionError(f"{fixture_name}/{edit_name}: patched config MD5 mismatch")
+            delta_gzip = gzip.compress(delta, compresslevel=6)
+            result.update({
+                'delivery': 'delta' if len(delta) < len(zip_data) else 'full (not_smaller)',
+                'delta_bytes': len(delta),
+                'delta_gzip_bytes': len(delta_gzip),
+                'saved_ratio': round(1 - min(len(delta), len(zip_data)) / len(zip_data), 4),
+                'delta_build_ms': round(build_s * 1000.0, 4),
+                'delta_apply_ms': round(delta_apply_s * 1000.0, 4),
+            })
+            results.append(result)
+    return results
+
+
+def print_table(results, out):
+    """Print a human readable bytes/CPU table"""
+    header = (f"{'fixture':<8} {'edit':<21} {'full':>8} {'delta':>8} {'delta.gz':>9} {'saved':>7} "
+              f"{'build ms':>9} {'full apply':>11} {'delta apply':>12}  delivery")
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for r in results:
+        if 'delta_bytes' not in r:
+            print(f"{r['fixture']:<8} {r['edit']:<21} {r['full_bytes']:>8} {'-':>8} {'-':>9} {'-':>7} {'-':>9} "
+                  f"{r['full_apply_ms']:>11.3f} {'-':>12}  {r['delivery']}", file=out)
+            continue
+        print(f"{r['fixture']:<8} {r['edit']:<21} {r['full_bytes']:>8} {r['delta_bytes']:>8} "
+              f"{r['delta_gzip_bytes']:>9} {r['saved_ratio']:>7.1%} {r['delta_build_ms']:>9.3f} "
+              f"{r['full_apply_ms']:>11.3f} {r['delta_apply_ms']:>12.3f}  {r['delivery']}", file=out)
+
+
+def main(argv=None):
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description='app_config full archive vs JSON Patch delta benchmark')
+    parser.add_argument('--sizes', default='small,medium,large',
+                        help=f"synthetic fixture sizes to include (from: {','.join(FIXTURE_SIZES)})")
+    parser.add_argument('--edits', default=','.join(EDITS), help=f"edit patterns (default: {','.join(EDITS)})")
+    parser.add_argument('--repeat', type=int, default=10, help='runs averaged per measurement')
+    parser.add_argument('--json', dest='json_output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    fixtures = {size: build_fixture(FIXTURE_SIZES[size]) for size in filter(None, args.sizes.split(','))}
+    edits = [edit for edit in args.edits.split(',') if edit]
+    unknown = set(edits) - set(EDITS)
+    if unknown:
+        parser.error(f"unknown edit(s): {', '.join(sorted(unknown))}")
+
+    results = run_matrix(fixtures, edits, args.repeat)
+    print_table(results, sys.stdout)
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
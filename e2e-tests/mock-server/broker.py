@@ -0,0 +1,826 @@
+"""
+Minimal in-process MQTT broker for local tests and benchmarks
+Speaks MQTT 3.1.1 and 5.0 over plain TCP on the mock server's asyncio event loop: QoS 0 and 1
+(QoS 2 publishes are accepted and delivered at QoS 1), + and # wildcards, retained messages,
+will messages and $share/<group>/<filter> shared subscriptions.
+
+It stands in for mosquitto where installing system packages is not an option. Sessions are
+not persisted (every connection starts clean), and there is no authentication or TLS.
+Broker-side routing and delivery latency are exported as metrics.
+
+Runs inside the mock server with EMBEDDED_BROKER=1, or standalone:
+    python3 broker.py --port 1883
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import logging
+import os
+import signal
+import sys
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+MQTT_V31, MQTT_V311, MQTT_V5 = 3, 4, 5
+PROTOCOL_NAMES = {MQTT_V31: b'MQIsdp', MQTT_V311: b'MQTT', MQTT_V5: b'MQTT'}
+
+# MQTT 5 property identifiers and their wire types
+PROPERTY_TYPES = {
+    0x01: 'byte', 0x02: 'u32', 0x03: 'str', 0x08: 'str', 0x09: 'bin', 0x0B: 'varint',
+    0x11: 'u32', 0x12: 'str', 0x13: 'u16', 0x15: 'str', 0x16: 'bin', 0x17: 'byte',
+    0x18: 'u32', 0x19: 'byte', 0x1A: 'str', 0x1C: 'str', 0x1F: 'str', 0x21: 'u16',
+    0x22: 'u16', 0x23: 'u16', 0x24: 'byte', 0x25: 'byte', 0x26: 'pair', 0x27: 'u32',
+    0x28: 'byte', 0x29: 'byte', 0x2A: 'byte',
+}
+PROP_SUBSCRIPTION_ID = 0x0B
+PROP_ASSIGNED_CLIENT_ID = 0x12
+PROP_TOPIC_ALIAS_MAXIMUM = 0x22
+PROP_TOPIC_ALIAS = 0x23
+PROP_WILDCARD_AVAILABLE = 0x28
+PROP_SUBSCRIPTION_ID_AVAILABLE = 0x29
+PROP_SHARED_AVAILABLE = 0x2A
+# Properties of a PUBLISH that are specific to one hop and never forwarded
+HOP_PROPERTIES = (PROP_TOPIC_ALIAS, PROP_SUBSCRIPTION_ID)
+
+TOPIC_ALIAS_MAXIMUM = 64
+
+# Delivery latency is usually well below a millisecond on a local broker
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class ProtocolError(Exception):
+    """Malformed or unsupported packet; the connection is closed"""
+
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value % 128
+        value //= 128
+        out.append(byte | 0x80 if value else byte)
+        if not value:
+            return bytes(out)
+
+
+def encode_string(value):
+    data = value.encode('utf-8') if isinstance(value, str) else value
+    return len(data).to_bytes(2, 'big') + data
+
+
+def encode_properties(properties):
+    """Encode [(identifier, value)] MQTT 5 properties, including the length prefix"""
+    out = bytearray()
+    for identifier, value in properties:
+        kind = PROPERTY_TYPES[identifier]
+        out.append(identifier)
+        if kind == 'byte':
+            out.append(value)
+        elif kind == 'u16':
+            out += value.to_bytes(2, 'big')
+        elif kind == 'u32':
+            out += value.to_bytes(4, 'big')
+        elif kind == 'varint':
+            out += encode_varint(value)
+        elif kind == 'pair':
+            out += encode_string(value[0]) + encode_string(value[1])
+        else:
+            out += encode_string(value)
+    return encode_varint(len(out)) + bytes(out)
+
+
+def encode_packet(packet_type, flags, body):
+    return bytes([packet_type << 4 | flags]) + encode_varint(len(body)) + body
+
+
+class PacketReader:
+    """Cursor over the variable header and payload of one packet"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, count):
+        if self.pos + count > len(self.data):
+            raise ProtocolError('packet too short')
+        chunk = self.data[self.pos:self.pos + count]
+        self.pos += count
+        return chunk
+
+    def u8(self):
+        return self.take(1)[0]
+
+    def u16(self):
+        return int.from_bytes(self.take(2), 'big')
+
+    def u32(self):
+        return int.from_bytes(self.take(4), 'big')
+
+    def varint(self):
+        value = 0
+        for shift in range(0, 28, 7):
+            byte = self.u8()
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+        raise ProtocolError('malformed variable byte integer')
+
+    def binary(self):
+        return self.take(self.u16())
+
+    def string(self):
+        try:
+            return self.binary().decode('utf-8')
+        except UnicodeDecodeError:
+            raise ProtocolError('invalid UTF-8 string')
+
+    def properties(self):
+        """Decode MQTT 5 properties into [(identifier, value)]"""
+        end = self.varint() + self.pos
+        properties = []
+        while self.pos < end:
+            identifier = self.u8()
+            kind = PROPERTY_TYPES.get(identifier)
+            if kind is None:
+                raise ProtocolError(f"unknown property 0x{identifier:02x}")
+            if kind == 'pair':
+                value = (self.string(), self.string())
+            elif kind == 'str':
+                value = self.string()
+            else:
+                value = {'byte': self.u8, 'u16': self.u16, 'u32': self.u32, 'varint': self.varint,
+                         'bin': self.binary}[kind]()
+            properties.append((identifier, value))
+        return properties
+
+    def rest(self):
+        chunk = self.data[self.pos:]
+        self.pos = len(self.data)
+        return chunk
+
+
+def valid_topic(topic):
+    return bool(topic) and '+' not in topic and '#' not in topic and '\0' not in topic
+
+
+def valid_filter(topic_filter):
+    """Check a (non-shared) topic filter: # only as the last level, wildcards alone in their level"""
+    if not topic_filter or '\0' in topic_filter:
+        return False
+    levels = topic_filter.split('/')
+    for index, level in enumerate(levels):
+        if '#' in level and (level != '#' or index != len(levels) - 1):
+            return False
+        if '+' in level and level != '+':
+            return False
+    return True
+
+
+def parse_subscription(topic_filter):
+    """Split '$share/<group>/<filter>' into (group, filter); plain filters give (None, filter)"""
+    if topic_filter.startswith('$share/'):
+        parts = topic_filter.split('/', 2)
+        if len(parts) < 3 or not parts[1] or '+' in parts[1] or '#' in parts[1] or not parts[2]:
+            raise ProtocolError(f"invalid shared subscription {topic_filter!r}")
+        return parts[1], parts[2]
+    return None, topic_filter
+
+
+class TrieNode:
+    __slots__ = ('children', 'subscribers', 'groups')
+
+    def __init__(self):
+        self.children = {}
+        # connection -> (qos, options)
+        self.subscribers = {}
+        # group -> SharedGroup
+        self.groups = {}
+
+
+class SharedGroup:
+    """Members of one shared subscription; each message goes to the next member in turn"""
+
+    __slots__ = ('members', 'turn')
+
+    def __init__(self):
+        self.members = {}
+        self.turn = itertools.count()
+
+    def pick(self):
+        members = list(self.members.items())
+        return members[next(self.turn) % len(members)]
+
+
+class SubscriptionTrie:
+    """
+    Topic filters indexed level by level, so matching a topic costs the number of levels
+    times the branching on wildcards instead of a scan over every subscription
+    """
+
+    def __init__(self):
+        self.root = TrieNode()
+        self.count = 0
+
+    def _node(self, topic_filter, create):
+        node = self.root
+        path = []
+        for level in topic_filter.split('/'):
+            child = node.children.get(level)
+            if child is None:
+                if not create:
+                    return None, path
+                child = node.children[level] = TrieNode()
+            path.append((node, level))
+            node = child
+        return node, path
+
+    def add(self, topic_filter, connection, qos, options=0, group=None):
+        """Add or replace a subscription; returns True when it already existed"""
+        node, _ = self._node(topic_filter, create=True)
+        if group is None:
+            existed = connection in node.subscribers
+            node.subscribers[connection] = (qos, options)
+        else:
+            shared = node.groups.get(group)
+            if shared is None:
+                shared = node.groups[group] = SharedGroup()
+            existed = connection in shared.members
+            shared.members[connection] = (qos, options)
+        if not existed:
+            self.count += 1
+        return existed
+
+    def remove(self, topic_filter, connection, group=None):
+        """Remove a subscription; returns False if it did not exist"""
+        node, path = self._node(topic_filter, create=False)
+        if node is None:
+            return False
+        if group is None:
+            if node.subscribers.pop(connection, None) is None:
+                return False
+        else:
+            shared = node.groups.get(group)
+            if shared is None or shared.members.pop(connection, None) is None:
+                return False
+            if not shared.members:
+                del node.groups[group]
+        self.count -= 1
+        # Prune empty branches
+        for parent, level in reversed(path):
+            child = parent.children[level]
+            if child.children or child.subscribers or child.groups:
+                break
+            del parent.children[level]
+        return True
+
+    def match(self, topic):
+        """
+        Subscriptions matching a topic
+
+        Returns:
+            list of (connection, qos, options) for plain subscribers (one entry per matching
+            filter) and one chosen member per matching shared group
+        """
+        levels = topic.split('/')
+        matched = []
+        self._match(self.root, levels, 0, matched, topic.startswith('$'))
+        return matched
+
+    def _match(self, node, levels, index, matched, system_topic):
+        # Wildcards at the first level never match topics starting with '$'
+        wildcards = not (index == 0 and system_topic)
+        if wildcards:
+            multi = node.children.get('#')
+            if multi is not None:
+                self._collect(multi, matched)
+        if index == len(levels):
+            self._collect(node, matched)
+            return
+        child = node.children.get(levels[index])
+        if child is not None:
+            self._match(child, levels, index + 1, matched, system_topic)
+        if wildcards:
+            single = node.children.get('+')
+            if single is not None:
+                self._match(single, levels, index + 1, matched, system_topic)
+
+    @staticmethod
+    def _collect(node, matched):
+        for connection, (qos, options) in node.subscribers.items():
+            matched.append((connection, qos, options))
+        for shared in node.groups.values():
+            connection, (qos, options) = shared.pick()
+            matched.append((connection, qos, options))
+
+
+def topic_matches(topic_filter, topic):
+    """Whether a (non-shared) filter matches a topic, for retained message delivery"""
+    filter_levels = topic_filter.split('/')
+    levels = topic.split('/')
+    if topic.startswith('$') and filter_levels[0] in ('+', '#'):
+        return False
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(levels) or (level != '+' and level != levels[index]):
+            return False
+    return len(filter_levels) == len(levels)
+
+
+class Message:
+    """A routed publish, encoded lazily once per (protocol, qos, retain) variant"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'properties', 'received', 'encoded')
+
+    def __init__(self, topic, payload, qos, retain, properties, received):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.properties = properties
+        self.received = received
+        self.encoded = {}
+
+    def parts(self, version, qos, retain):
+        """(header + topic, properties + payload) around the packet identifier"""
+        key = (version == MQTT_V5, qos, retain)
+        parts = self.encoded.get(key)
+        if parts is None:
+            tail = (encode_properties(self.properties) if version == MQTT_V5 else b'') + self.payload
+            topic = encode_string(self.topic)
+            length = len(topic) + (2 if qos else 0) + len(tail)
+            head = bytes([PUBLISH << 4 | qos << 1 | int(retain)]) + encode_varint(length) + topic
+            parts = self.encoded[key] = (head, tail)
+        return parts
+
+
+class Connection:
+    """One client connection: packet loop, subscriptions, in-flight and queued QoS 1 deliveries"""
+
+    def __init__(self, broker, reader, writer):
+        self.broker = broker
+        self.reader = reader
+        self.writer = writer
+        peer = writer.get_extra_info('peername')
+        self.peer = f"{peer[0]}:{peer[1]}" if peer else 'unknown'
+        self.client_id = None
+        self.version = MQTT_V311
+        self.keepalive = 0
+        self.will = None
+        self.subscriptions = {}
+        self.inflight = {}
+        # QoS 1 deliveries waiting for a free in-flight slot: (message, retain, sent)
+        self.queued = collections.deque()
+        self.awaiting_release = set()
+        self.topic_aliases = {}
+        self.packet_ids = itertools.cycle(range(1, 65536))
+        self.closed = False
+
+    def __repr__(self):
+        return f"<Connection {self.client_id or '?'} {self.peer}>"
+
+    async def read_packet(self):
+        first = await self.reader.readexactly(1)
+        length = 0
+        for shift in range(0, 28, 7):
+            byte = (await self.reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+        else:
+            raise ProtocolError('malformed remaining length')
+        if length > self.broker.max_packet_size:
+            raise ProtocolError(f"packet of {length} bytes exceeds the maximum")
+        body = await self.reader.readexactly(length) if length else b''
+        return first[0] >> 4, first[0] & 0x0F, body
+
+    def send(self, data):
+        if not self.closed:
+            self.writer.write(data)
+
+    async def run(self):
+        """Serve the connection until the client disconnects or breaks the protocol"""
+        graceful = False
+        try:
+            packet_type, flags, body = await asyncio.wait_for(self.read_packet(), self.broker.connect_timeout)
+            if packet_type != CONNECT:
+                raise ProtocolError('first packet must be CONNECT')
+            if not self.handle_connect(PacketReader(body)):
+                return
+            timeout = self.keepalive * 1.5 if self.keepalive else None
+            while not self.closed:
+                packet_type, flags, body = await asyncio.wait_for(self.read_packet(), timeout)
+                if packet_type == DISCONNECT:
+                    reason = body[0] if body else 0
+                    # MQTT 5 reason 0x04: disconnect with will message
+                    graceful = reason != 0x04
+                    break
+                self.dispatch(packet_type, flags, PacketReader(body))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.TimeoutError:
+            logger.debug(f"{self}: keepalive expired")
+        except ProtocolError as e:
+            logger.warning(f"{self}: protocol error, closing: {e}")
+        finally:
+            self.broker.disconnected(self, graceful)
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+            if self.queued:
+                self.broker.queued.dec(len(self.queued))
+                self.broker.dropped.inc(len(self.queued), reason='disconnected')
+                self.queued.clear()
+
+    def dispatch(self, packet_type, flags, packet):
+        if packet_type == PUBLISH:
+            self.handle_publish(flags, packet)
+        elif packet_type == PUBACK:
+            self.handle_puback(packet.u16())
+        elif packet_type == PUBREL:
+            packet_id = packet.u16()
+            self.awaiting_release.discard(packet_id)
+            self.send(encode_packet(PUBCOMP, 0, packet_id.to_bytes(2, 'big')))
+        elif packet_type in (PUBREC, PUBCOMP):
+            # Deliveries never exceed QoS 1, so these only answer a misbehaving client
+            pass
+        elif packet_type == SUBSCRIBE:
+            self.handle_subscribe(packet)
+        elif packet_type == UNSUBSCRIBE:
+            self.handle_unsubscribe(packet)
+        elif packet_type == PINGREQ:
+            self.send(encode_packet(PINGRESP, 0, b''))
+        else:
+            raise ProtocolError(f"unexpected packet type {packet_type}")
+
+    def handle_connect(self, packet):
+        """Process CONNECT and send CONNACK; returns False when the connection is refused"""
+        name = packet.binary()
+        self.version = packet.u8()
+        if PROTOCOL_NAMES.get(self.version) != name:
+            # 0x01: unacceptable protocol version (3.1.1 return code, understood by all clients)
+            self.send(encode_packet(CONNACK, 0, b'\x00\x01'))
+            return False
+        connect_flags = packet.u8()
+        self.keepalive = packet.u16()
+        if self.version == MQTT_V5:
+            packet.properties()
+        client_id = packet.string()
+        if connect_flags & 0x04:
+            will_properties = packet.properties() if self.version == MQTT_V5 else []
+            will_topic = packet.string()
+            will_payload = packet.binary()
+            self.will = (will_topic, will_payload, (connect_flags >> 3) & 0x03, bool(connect_flags & 0x20),
+                         [p for p in will_properties if p[0] not in HOP_PROPERTIES and p[0] != 0x18])
+        # Username and password are read past but not checked
+        if connect_flags & 0x80:
+            packet.string()
+        if connect_flags & 0x40:
+            packet.binary()
+
+        properties = []
+        if not client_id:
+            if self.version != MQTT_V5 and not connect_flags & 0x02:
+                # 0x02: identifier rejected (an empty ID requires a clean session before MQTT 5)
+                self.send(encode_packet(CONNACK, 0, b'\x00\x02'))
+                return False
+            client_id = self.broker.assign_client_id()
+            properties.append((PROP_ASSIGNED_CLIENT_ID, client_id))
+        self.client_id = client_id
+        self.broker.connected(self)
+
+        if self.version == MQTT_V5:
+            properties += [(PROP_TOPIC_ALIAS_MAXIMUM, TOPIC_ALIAS_MAXIMUM), (PROP_WILDCARD_AVAILABLE, 1),
+                           (PROP_SUBSCRIPTION_ID_AVAILABLE, 0), (PROP_SHARED_AVAILABLE, 1)]
+            self.send(encode_packet(CONNACK, 0, b'\x00\x00' + encode_properties(properties)))
+        else:
+            self.send(encode_packet(CONNACK, 0, b'\x00\x00'))
+        return True
+
+    def handle_publish(self, flags, packet):
+        received = time.perf_counter()
+        qos = (flags >> 1) & 0x03
+        retain = bool(flags & 0x01)
+        if qos == 3:
+            raise ProtocolError('invalid QoS 3')
+        topic = packet.string()
+        packet_id = packet.u16() if qos else None
+        properties = []
+        if self.version == MQTT_V5:
+            properties = packet.properties()
+            alias = next((value for identifier, value in properties if identifier == PROP_TOPIC_ALIAS), None)
+            if alias is not None:
+                if not 0 < alias <= TOPIC_ALIAS_MAXIMUM:
+                    raise ProtocolError(f"topic alias {alias} out of range")
+                if topic:
+                    self.topic_aliases[alias] = topic
+                else:
+                    topic = self.topic_aliases.get(alias)
+                    if topic is None:
+                        raise ProtocolError(f"unknown topic alias {alias}")
+            properties = [p for p in properties if p[0] not in HOP_PROPERTIES]
+        if not valid_topic(topic):
+            raise ProtocolError(f"invalid topic name {topic!r}")
+        payload = packet.rest()
+
+        if qos == 2:
+            duplicate = packet_id in self.awaiting_release
+            self.awaiting_release.add(packet_id)
+            self.send(encode_packet(PUBREC, 0, packet_id.to_bytes(2, 'big')))
+            if duplicate:
+                return
+        elif qos == 1:
+            self.send(encode_packet(PUBACK, 0, packet_id.to_bytes(2, 'big')))
+        self.broker.publish(Message(topic, bytes(payload), min(qos, 1), retain, properties, received), self)
+
+    def deliver(self, message, qos, retain, sent=None):
+        """
+        Send a message to this client
+
+        QoS 1 messages past the client's in-flight window are queued and sent as PUBACKs free up
+        slots; only QoS 0 messages to a client that is not reading its socket are dropped.
+
+        Args:
+            message: Message to send
+            qos: Delivery QoS (0 or 1)
+            retain: Retain flag to set on the PUBLISH
+            sent: Start of the delivery latency (default: when the message was received)
+
+        Returns:
+            bool: False when it was dropped because the client is gone or not keeping up
+        """
+        if self.closed:
+            return False
+        broker = self.broker
+        if qos:
+            if self.queued or len(self.inflight) >= broker.max_inflight:
+                self.queued.append((message, retain, sent))
+                broker.queued.inc()
+            else:
+                self.send_qos1(message, retain, sent)
+            return True
+        transport = self.writer.transport
+        if transport.get_write_buffer_size() > broker.max_buffer:
+            broker.dropped.inc(reason='slow_consumer')
+            return False
+        transport.writelines(message.parts(self.version, 0, retain))
+        return True
+
+    def send_qos1(self, message, retain, sent):
+        head, tail = message.parts(self.version, 1, retain)
+        packet_id = next(self.packet_ids)
+        while packet_id in self.inflight:
+            packet_id = next(self.packet_ids)
+        self.inflight[packet_id] = sent or message.received
+        self.writer.transport.writelines((head, packet_id.to_bytes(2, 'big'), tail))
+
+    def handle_puback(self, packet_id):
+        received = self.inflight.pop(packet_id, None)
+        if received is not None:
+            self.broker.ack_latency.observe(time.perf_counter() - received)
+        while self.queued and len(self.inflight) < self.broker.max_inflight and not self.closed:
+            self.broker.queued.dec()
+            self.send_qos1(*self.queued.popleft())
+
+    def handle_subscribe(self, packet):
+        packet_id = packet.u16()
+        if self.version == MQTT_V5:
+            packet.properties()
+        codes = []
+        retained = []
+        while packet.pos < len(packet.data):
+            topic_filter = packet.string()
+            options = packet.u8()
+            requested_qos = options & 0x03
+            try:
+                group, plain_filter = parse_subscription(topic_filter)
+            except ProtocolError:
+                group = plain_filter = None
+            if plain_filter is None or not valid_filter(plain_filter) or requested_qos == 3:
+                # 0x80 failure (3.1.1) / 0x8F topic filter invalid (5)
+                codes.append(0x8F if self.version == MQTT_V5 else 0x80)
+                continue
+            qos = min(requested_qos, 1)
+            existed = self.broker.subscriptions.add(plain_filter, self, qos, options, group)
+            self.subscriptions[topic_filter] = (group, plain_filter)
+            codes.append(qos)
+            retain_handling = (options >> 4) & 0x03
+            if group is None and (retain_handling == 0 or (retain_handling == 1 and not existed)):
+                retained.append((plain_filter, qos))
+        if self.version == MQTT_V5:
+            body = packet_id.to_bytes(2, 'big') + encode_properties([]) + bytes(codes)
+        else:
+            body = packet_id.to_bytes(2, 'big') + bytes(codes)
+        self.send(encode_packet(SUBACK, 0, body))
+        self.broker.subscription_count.set(self.broker.subscriptions.count)
+        for plain_filter, qos in retained:
+            self.broker.send_retained(self, plain_filter, qos)
+
+    def handle_unsubscribe(self, packet):
+        packet_id = packet.u16()
+        if self.version == MQTT_V5:
+            packet.properties()
+        codes = []
+        while packet.pos < len(packet.data):
+            topic_filter = packet.string()
+            entry = self.subscriptions.pop(topic_filter, None)
+            removed = entry is not None and self.broker.subscriptions.remove(entry[1], self, entry[0])
+            # 0x11: no subscription existed
+            codes.append(0x00 if removed else 0x11)
+        if self.version == MQTT_V5:
+            body = packet_id.to_bytes(2, 'big') + encode_properties([]) + bytes(codes)
+        else:
+            body = packet_id.to_bytes(2, 'big')
+        self.send(encode_packet(UNSUBACK, 0, body))
+        self.broker.subscription_count.set(self.broker.subscriptions.count)
+
+
+class Broker:
+    """
+    asyncio MQTT broker
+
+    Args:
+        host: Listen address
+        port: Listen port (0 picks a free port, see .port after start())
+        registry: metrics.Registry to export broker metrics in (default: a private one)
+        max_inflight: Unacknowledged QoS 1 deliveries per client; later ones are queued until PUBACKs free slots
+        max_buffer: Bytes buffered for a client before QoS 0 messages to it are dropped
+        max_packet_size: Largest accepted packet
+        connect_timeout: Seconds a new connection has to send CONNECT
+        backlog: Listen backlog; deep enough for a fleet reconnecting at once (asyncio's default is 100)
+    """
+
+    def __init__(self, host='127.0.0.1', port=1883, registry=None, max_inflight=1000, max_buffer=8 * 1024 * 1024,
+                 max_packet_size=16 * 1024 * 1024, connect_timeout=10.0, backlog=1024):
+        self.host = host
+        self.port = port
+        self.max_inflight = max_inflight
+        self.max_buffer = max_buffer
+        self.max_packet_size = max_packet_size
+        self.connect_timeout = connect_timeout
+        self.backlog = backlog
+        self.server = None
+        self.clients = {}
+        self.connections = set()
+        self.tasks = set()
+        self.subscriptions = SubscriptionTrie()
+        self.retained = {}
+        self.client_ids = itertools.count(1)
+
+        self.registry = registry or metrics.Registry()
+        self.connection_count = self.registry.gauge(
+            'mock_broker_connections', 'Clients connected to the embedded broker')
+        self.subscription_count = self.registry.gauge(
+            'mock_broker_subscriptions', 'Subscriptions held by the embedded broker')
+        self.received = self.registry.counter(
+            'mock_broker_messages_received_total', 'PUBLISH packets received by the embedded broker, by QoS', ('qos',))
+        self.delivered = self.registry.counter(
+            'mock_broker_messages_delivered_total', 'Messages delivered to subscribers, by QoS', ('qos',))
+        self.dropped = self.registry.counter(
+            'mock_broker_messages_dropped_total', 'Messages not delivered to a subscriber, by reason', ('reason',))
+        self.queued = self.registry.gauge(
+            'mock_broker_queued_messages', 'QoS 1 deliveries waiting for a free in-flight slot')
+        self.route_latency = self.registry.histogram(
+            'mock_broker_route_seconds', 'Time to match and write one publish to every subscriber',
+            buckets=LATENCY_BUCKETS)
+        self.ack_latency = self.registry.histogram(
+            'mock_broker_delivery_ack_seconds', 'Publish received to subscriber PUBACK for QoS 1 deliveries',
+            buckets=LATENCY_BUCKETS)
+
+    async def start(self):
+        """Start listening; returns self"""
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, backlog=self.backlog)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"✓ Embedded MQTT broker listening on {self.host}:{self.port}")
+        return self
+
+    async def stop(self):
+        """Stop listening and close every client connection"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        for connection in list(self.connections):
+            connection.close()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        logger.info("Embedded MQTT broker stopped")
+
+    async def handle_client(self, reader, writer):
+        connection = Connection(self, reader, writer)
+        self.connections.add(connection)
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            await connection.run()
+        finally:
+            self.connections.discard(connection)
+            self.tasks.discard(task)
+
+    def assign_client_id(self):
+        return f"embedded-{next(self.client_ids)}"
+
+    def connected(self, connection):
+        """Register a client, taking over the connection of an earlier client with the same ID"""
+        previous = self.clients.get(connection.client_id)
+        if previous is not None:
+            logger.info(f"Client {connection.client_id} reconnected, closing its previous connection")
+            if previous.version == MQTT_V5:
+                # 0x8E: session taken over
+                previous.send(encode_packet(DISCONNECT, 0, b'\x8e' + encode_properties([])))
+            self.drop_subscriptions(previous)
+            previous.will = None
+            previous.close()
+        self.clients[connection.client_id] = connection
+        self.connection_count.set(len(self.clients))
+        logger.debug(f"Client {connection.client_id} connected from {connection.peer} (protocol {connection.version})")
+
+    def disconnected(self, connection, graceful):
+        """Forget a closed connection and publish its will unless it disconnected cleanly"""
+        self.drop_subscriptions(connection)
+        if self.clients.get(connection.client_id) is connection:
+            del self.clients[connection.client_id]
+        self.connection_count.set(len(self.clients))
+        if connection.will is not None and not graceful:
+            topic, payload, qos, retain, properties = connection.will
+            self.publish(Message(topic, payload, min(qos, 1), retain, properties, time.perf_counter()))
+        connection.will = None
+
+    def drop_subscriptions(self, connection):
+        for group, plain_filter in connection.subscriptions.values():
+            self.subscriptions.remove(plain_filter, connection, group)
+        connection.subscriptions.clear()
+        self.subscription_count.set(self.subscriptions.count)
+
+    def publish(self, message, sender=None):
+        """Store (if retained) and route a message to every matching subscription"""
+        self.received.inc(qos=message.qos)
+        if message.retain:
+            if message.payload:
+                self.retained[message.topic] = message
+            else:
+                self.retained.pop(message.topic, None)
+
+        # A client with several matching subscriptions gets one copy at the highest QoS
+        targets = {}
+        for connection, qos, options in self.subscriptions.match(message.topic):
+            if options & 0x04 and connection is sender and connection.version == MQTT_V5:
+                # No Local
+                continue
+            current = targets.get(connection)
+            qos = min(qos, message.qos)
+            retain = message.retain and bool(options & 0x08)
+            if current is None or qos > current[0]:
+                targets[connection] = (qos, retain)
+        for connection, (qos, retain) in targets.items():
+            if connection.deliver(message, qos, retain):
+                self.delivered.inc(qos=qos)
+        self.route_latency.observe(time.perf_counter() - message.received)
+
+    def send_retained(self, connection, topic_filter, qos):
+        """Deliver retained messages matching a new subscription (with the retain flag set)"""
+        for topic, message in list(self.retained.items()):
+            if topic_matches(topic_filter, topic):
+                delivery_qos = min(qos, message.qos)
+                if connection.deliver(message, delivery_qos, True, time.perf_counter()):
+                    self.delivered.inc(qos=delivery_qos)
+
+
+async def serve(host, port):
+    """Run a standalone broker until SIGTERM/SIGINT"""
+    broker = await Broker(host, port).start()
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_event.set)
+    await stop_event.wait()
+    await broker.stop()
+
+
+def main(argv=None):
+    """Run the broker from the command line"""
+    parser = argparse.ArgumentParser(description='Minimal asyncio MQTT 3.1.1/5 broker')
+    parser.add_argument('--host', default=os.getenv('EMBEDDED_BROKER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('MQTT_PORT', '1883')))
+    args = parser.parse_args(argv)
+    log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    logging.basicConfig(
+        level=getattr(logging, log_level, logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(serve(args.host, args.port))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Recording of uplink MQTT traffic to a gzip-compressed JSONL capture
+One JSON object per message: {"t": unix time, "topic", "qos", "retain", "payload"}; payloads
+that are not valid UTF-8 are stored base64 encoded with "encoding": "base64".
+
+Recording never blocks the MQTT callback: messages go through a bounded queue to a writer
+thread, and are counted as dropped when the queue is full.
+"""
+
+import base64
+import gzip
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def encode_record(timestamp, topic, payload, qos=0, retain=False):
+    """Capture record dict for one message"""
+    record = {'t': timestamp, 'topic': topic, 'qos': qos, 'retain': bool(retain)}
+    try:
+        record['payload'] = payload.decode('utf-8')
+    except UnicodeDecodeError:
+        record['payload'] = base64.b64encode(payload).decode('ascii')
+        record['encoding'] = 'base64'
+    return record
+
+
+def decode_payload(record):
+    """Original payload bytes of a capture record"""
+    if record.get('encoding') == 'base64':
+        return base64.b64decode(record['payload'])
+    return record['payload'].encode('utf-8')
+
+
+def read_capture(path):
+    """
+    Iterate over the records of a capture file (gzip or plain JSONL)
+
+    Yields:
+        dict records in file order
+    """
+    with open(path, 'rb') as raw:
+        gzipped = raw.read(2) == b'\x1f\x8b'
+    opener = gzip.open if gzipped else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CaptureWriter:
+    """
+    Appends messages to a capture file from a background thread
+
+    Args:
+        path: Capture file; written gzip compressed unless it ends in .jsonl
+        max_queue: Messages held in memory while the writer catches up
+        flush_interval: Idle seconds after which buffered records are flushed to disk
+    """
+
+    def __init__(self, path, max_queue=10000, flush_interval=1.0):
+        self.path = path
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.dropped = 0
+        self.written = 0
+        self.thread = None
+
+    def start(self):
+        """Open the file and start the writer thread"""
+        self.thread = threading.Thread(target=self.run, name='capture-writer', daemon=True)
+        self.thread.start()
+        logger.info(f"Recording uplink MQTT traffic to {self.path}")
+        return self
+
+    def record(self, timestamp, topic, payload, qos=0, retain=False):
+        """
+        Queue one message for writing
+
+        Returns:
+            bool: False when the queue was full and the message was dropped
+        """
+        try:
+            self.queue.put_nowait((timestamp, topic, payload, qos, retain))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.recorded += 1
+        return True
+
+    def open(self):
+        if str(self.path).endswith('.jsonl'):
+            return open(self.path, 'a', encoding='utf-8')
+        return gzip.open(self.path, 'at', encoding='utf-8', compresslevel=6)
+
+    def run(self):
+        """Writer thread: drain the queue into the capture file"""
+        with self.open() as f:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    f.flush()
+                    continue
+                if item is _STOP:
+                    break
+                f.write(json.dumps(encode_record(*item), separators=(',', ':')) + '\n')
+                self.written += 1
+        logger.info(f"Capture closed: {self.written} messages written, {self.dropped} dropped")
+
+    def close(self, timeout=10):
+        """Write out everything queued so far and stop the writer thread"""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+        self.thread = None
@@ -0,0 +1,166 @@
+"""
+Versioned app_config history and delta delivery for the mock server
+Every config served to a device is recorded as a version. A download that carries the
+device's current MD5 (?md5=...) can then be answered with a JSON Patch from that version to
+the current one instead of the full archive.
+
+A delta is only offered when applying it reproduces the target file byte for byte: the
+device parses its current app_config.json, applies the patch and writes the result with
+json.dumps(indent=2), so the MD5 it checks matches the one from send_config_v3.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from json_patch import apply_patch, make_patch
+
+logger = logging.getLogger(__name__)
+
+DELTA_CONTENT_TYPE = 'application/json-patch+json'
+# How the device must serialize the patched document (sent as X-Config-Serialization)
+DELTA_SERIALIZATION = 'json; indent=2'
+
+
+def serialize(document):
+    """Serialize a patched app_config the way the device is told to (DELTA_SERIALIZATION)"""
+    return json.dumps(document, indent=2).encode('utf-8')
+
+
+def encode_patch(patch):
+    return json.dumps(patch, separators=(',', ':')).encode('utf-8')
+
+
+class DeltaUnavailable(Exception):
+    """No delta can be served for a base/target pair; the message is the metrics reason"""
+
+
+class ConfigHistory:
+    """
+    Config versions served per device, their content by MD5, and cached deltas
+
+    Args:
+        max_versions: Versions remembered per device
+        max_devices: Devices remembered (least recently served are forgotten first)
+        max_contents: Config contents kept in memory, keyed by JSON MD5
+        max_deltas: Computed deltas (or failures) kept in memory
+        directory: Optional content-addressed store (<md5>.json) shared by forked HTTP
+                   workers, so a base served by one worker can be diffed by another
+    """
+
+    def __init__(self, max_versions=8, max_devices=10000, max_contents=256, max_deltas=256, directory=None):
+        self.max_versions = max_versions
+        self.max_devices = max_devices
+        self.max_contents = max_contents
+        self.max_deltas = max_deltas
+        self.devices = OrderedDict()
+        self.contents = OrderedDict()
+        self.deltas = OrderedDict()
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def record(self, company_id, device_unique_id, json_md5_hash, content):
+        """Remember that a device was served a config version"""
+        key = (company_id, device_unique_id)
+        versions = self.devices.get(key)
+        if versions is None:
+            versions = self.devices[key] = deque(maxlen=self.max_versions)
+            while len(self.devices) > self.max_devices:
+                self.devices.popitem(last=False)
+        else:
+            self.devices.move_to_end(key)
+        if not versions or versions[-1][0] != json_md5_hash:
+            versions.append((json_md5_hash, time.time()))
+        self.store_content(json_md5_hash, content)
+
+    def versions(self, company_id, device_unique_id):
+        """[(json_md5, first_served_at)] for a device, oldest first"""
+        return list(self.devices.get((company_id, device_unique_id), ()))
+
+    def store_content(self, json_md5_hash, content):
+        if json_md5_hash in self.contents:
+            self.contents.move_to_end(json_md5_hash)
+            return
+        self.contents[json_md5_hash] = content
+        while len(self.contents) > self.max_contents:
+            self.contents.popitem(last=False)
+        if self.directory is not None:
+            path = self.directory / f"{json_md5_hash}.json"
+            if not path.exists():
+                tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                try:
+                    tmp_path.write_bytes(content)
+                    os.replace(tmp_path, path)
+                except OSError as e:
+                    logger.warning(f"Failed to write config history file {path}: {e}")
+                    tmp_path.unlink(missing_ok=True)
+
+    def content(self, json_md5_hash):
+        """Config content for an MD5, or None if it was never served (or has been forgotten)"""
+        content = self.contents.get(json_md5_hash)
+        if content is None and self.directory is not None and len(json_md5_hash) == 32:
+            try:
+                content = (self.directory / f"{json_md5_hash}.json").read_bytes()
+            except (FileNotFoundError, ValueError):
+                return None
+            # Never trust a file whose name does not match its content
+            if hashlib.md5(content).hexdigest() != json_md5_hash:
+                return None
+        return content
+
+    def delta(self, base_md5, target_md5):
+        """
+        Encoded JSON Patch turning the base version into the target version
+
+        Args:
+            base_md5: JSON MD5 the device currently has
+            target_md5: JSON MD5 of the config being served
+
+        Returns:
+            bytes: JSON Patch document
+
+        Raises:
+            DeltaUnavailable: unknown_base, unknown_target, not_json or not_reproducible
+        """
+        key = (base_md5, target_md5)
+        cached = self.deltas.get(key)
+        if cached is not None:
+            self.deltas.move_to_end(key)
+            if isinstance(cached, DeltaUnavailable):
+                raise cached
+            return cached
+        base, target = self.content(base_md5), self.content(target_md5)
+        if base is None:
+            # Not cached: the base may still be served (and recorded) later
+            raise DeltaUnavailable('unknown_base')
+        if target is None:
+            raise DeltaUnavailable('unknown_target')
+        try:
+            result = self.build_delta(base, target)
+        except DeltaUnavailable as e:
+            result = e
+        self.deltas[key] = result
+        while len(self.deltas) > self.max_deltas:
+            self.deltas.popitem(last=False)
+        if isinstance(result, DeltaUnavailable):
+            raise result
+        return result
+
+    @staticmethod
+    def build_delta(base, target):
+        """Diff two config contents, checking the patch reproduces the target bytes exactly"""
+        try:
+            base_document = json.loads(base)
+            target_document = json.loads(target)
+        except ValueError:
+            raise DeltaUnavailable('not_json')
+        patch = make_patch(base_document, target_document)
+        if serialize(apply_patch(base_document, patch)) != target:
+            # e.g. a fixture not written with json.dumps(indent=2)
+            raise DeltaUnavailable('not_reproducible')
+        return encode_patch(patch)
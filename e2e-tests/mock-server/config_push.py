@@ -0,0 +1,317 @@
+"""
+Config push soak for the EdgeIQ mock server
+Production gateways receive config pushes all day. A soak publishes send_config_v3 to one device
+at a fixed rate, for hours if needed. Each push is a different synthetic app_config: the sizes
+cycle through a list and the seed is the push number, so size and MD5 change with every push.
+The soak measures how long the agent takes to download each pushed config. Combined with
+process sampling on the target, a rising latency trend points to creep in config application
+and a rising RSS points to a leak.
+
+A plan is a JSON object (PUT /admin/soak):
+    {"company_id": "test-company-001", "device_unique_id": "test-device-001", "interval": 60,
+     "duration": 7200, "sizes": [{"devices": 10}, {"devices": 1000, "rules": 100}], "timeout": 30}
+
+interval: seconds between pushes; duration: seconds to push for (0 = until stopped);
+count: pushes to send (0 = unlimited); timeout: seconds after which an undownloaded push counts
+as missed (default: interval); seed: seed of the first push; sizes: synthetic config section counts
+(see synthetic_config.py), cycled.
+
+A soak keeps bounded state however long it runs: the undownloaded pushes (until they time out), the
+most recent pushes for the report and the latencies of the last `max_samples` downloads. Counts,
+mean, min, max and the latency trend are running aggregates over the whole soak.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from loadgen import summarize_latencies
+from synthetic_config import SyntheticSpec
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = ({'devices': 10}, {'devices': 200, 'rules': 20}, {'devices': 2000, 'rules': 200})
+FIELDS = {
+    'interval': 60.0,
+    'duration': 0.0,
+    'count': 0,
+    'timeout': None,
+    'seed': 1,
+}
+# Pushes listed individually in a report (the most recent ones)
+RECENT_PUSHES = 20
+
+
+class PushPlan:
+    """
+    What a soak pushes, to which device and how often
+
+    Args:
+        company_id: Company of the device
+        device_unique_id: Device receiving the pushes
+        sizes: Synthetic config section counts, cycled (default: DEFAULT_SIZES)
+        **settings: See FIELDS and the module docstring
+    """
+
+    def __init__(self, company_id, device_unique_id, sizes=None, **settings):
+        unknown = set(settings) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown soak setting(s): {', '.join(sorted(unknown))}")
+        for name, value in (('company_id', company_id), ('device_unique_id', device_unique_id)):
+            if not isinstance(value, str) or not value or '/' in value:
+                raise ValueError(f"{name} must be a non-empty string without '/', got {value!r}")
+        self.company_id = company_id
+        self.device_unique_id = device_unique_id
+        for name, default in FIELDS.items():
+            value = settings.get(name, default)
+            if value is None and name == 'timeout':
+                value = settings.get('interval', FIELDS['interval'])
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            if value < 0:
+                raise ValueError(f"{name} must not be negative, got {value}")
+            setattr(self, name, value)
+        if not self.interval:
+            raise ValueError("interval must be positive")
+        if not isinstance(self.seed, int) or not isinstance(self.count, int):
+            raise ValueError("seed and count must be integers")
+        self.sizes = [dict(size) for size in (DEFAULT_SIZES if sizes is None else sizes)]
+        if not self.sizes:
+            raise ValueError("sizes must list at least one synthetic config size")
+        for size in self.sizes:
+            if not isinstance(size, dict) or 'seed' in size:
+                raise ValueError(f"Each size must be an object of section counts without seed, got {size!r}")
+            SyntheticSpec(**size)
+
+    @classmethod
+    def from_json(cls, text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid soak plan JSON: {e}") from e
+        if not isinstance(value, dict):
+            raise ValueError(f"Soak plan must be an object, got {value!r}")
+        if 'company_id' not in value or 'device_unique_id' not in value:
+            raise ValueError("Soak plan needs company_id and device_unique_id")
+        return cls(**value)
+
+    def spec(self, index):
+        """Synthetic config of push number index"""
+        return SyntheticSpec(seed=self.seed + index, **self.sizes[index % len(self.sizes)])
+
+    def to_dict(self):
+        return {'company_id': self.company_id, 'device_unique_id': self.device_unique_id, 'sizes': self.sizes,
+                **{name: getattr(self, name) for name in FIELDS}}
+
+
+class LatencyStats:
+    """
+    Download latencies of a soak (or of one config size)
+
+    Count, mean, min and max are exact; percentiles cover the most recent max_samples downloads.
+    """
+
+    def __init__(self, max_samples):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, latency_s):
+        self.samples.append(latency_s)
+        self.count += 1
+        self.total += latency_s
+        self.min = latency_s if self.min is None else min(self.min, latency_s)
+        self.max = latency_s if self.max is None else max(self.max, latency_s)
+
+    def summary(self):
+        """summarize_latencies() of the samples, with the exact figures of every download"""
+        summary = summarize_latencies(self.samples)
+        if self.count:
+            summary.update(count=self.count, min=round(self.min * 1000, 3), max=round(self.max * 1000, 3),
+                           mean=round(self.total / self.count * 1000, 3))
+        return summary
+
+
+class Trend:
+    """Running least squares fit of (x, y) points"""
+
+    def __init__(self):
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = 0.0
+
+    def add(self, x, y):
+        self.n += 1
+        self.sx += x
+        self.sy += y
+        self.sxx += x * x
+        self.sxy += x * y
+
+    def slope(self, per=1.0):
+        """Slope in y per `per` units of x (None below 3 points)"""
+        if self.n < 3:
+            return None
+        variance = self.n * self.sxx - self.sx * self.sx
+        if variance <= 1e-9 * self.n * self.sxx:
+            return None
+        return round((self.n * self.sxy - self.sx * self.sy) / variance * per, 3)
+
+
+class PushSoak:
+    """
+    Runs a PushPlan and matches downloads to pushes by MD5
+
+    A push not downloaded within the plan's timeout is counted as missed and forgotten, so a later
+    download of it does not count.
+
+    Args:
+        plan: PushPlan
+        publish: Coroutine function(plan, spec) publishing send_config_v3 for the plan's device
+                 with the spec's config; returns (json_md5_hash, archive_size)
+        clock: Wall clock, replaceable in tests
+        max_samples: Latencies kept for percentiles (the first quarter of them also for the start
+                     of the soak)
+    """
+
+    def __init__(self, plan, publish, clock=time.time, max_samples=10000):
+        self.plan = plan
+        self.publish = publish
+        self.clock = clock
+        self.pushes = 0
+        self.missed = 0
+        self.pending = {}
+        self.recent = deque(maxlen=RECENT_PUSHES)
+        self.latency = LatencyStats(max_samples)
+        # Latencies of the first downloads, compared with the last ones for latency creep
+        self.early = []
+        self.early_size = max(max_samples // 4, 1)
+        self.trend = Trend()
+        self.by_size = [{'bytes': None, 'pushes': 0, 'latency': LatencyStats(max_samples)} for _ in plan.sizes]
+        self.current = None
+        self.running = False
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def start(self):
+        """Start pushing on the running event loop"""
+        self.running = True
+        self.started_at = self.clock()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+        return self
+
+    async def run(self):
+        """Push at a fixed rate (no drift from publish time) until duration or count is reached"""
+        plan = self.plan
+        index = 0
+        try:
+            while True:
+                await self.push(index)
+                index += 1
+                if plan.count and index >= plan.count:
+                    break
+                next_at = self.started_at + index * plan.interval
+                if plan.duration and next_at - self.started_at >= plan.duration:
+                    break
+                await asyncio.sleep(max(0.0, next_at - self.clock()))
+            # Give the last push its chance to be downloaded
+            deadline = self.clock() + plan.timeout
+            while self.pending and self.clock() < deadline:
+                await asyncio.sleep(min(1.0, plan.timeout))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.running = False
+            self.finished_at = self.clock()
+            logger.info(f"Config push soak finished: {self.pushes} pushes")
+
+    async def push(self, index):
+        spec = self.plan.spec(index)
+        self.current = spec
+        md5, size = await self.publish(self.plan, spec)
+        self.expire()
+        entry = {'index': index, 'size': index % len(self.plan.sizes), 'entries': spec.total, 'bytes': size,
+                 'md5': md5, 'published_at': self.clock(), 'latency_s': None}
+        self.pushes += 1
+        figures = self.by_size[entry['size']]
+        figures['pushes'] += 1
+        figures['bytes'] = max(figures['bytes'] or 0, size)
+        self.recent.append(entry)
+        self.pending[md5] = entry
+        logger.info(f"Config push {index}: {spec.to_dict()} ({size} bytes, md5 {md5})")
+
+    def expire(self):
+        """Count pushes past their timeout as missed and stop waiting for them"""
+        now = self.clock()
+        for md5, entry in list(self.pending.items()):
+            if now - entry['published_at'] > self.plan.timeout:
+                del self.pending[md5]
+                self.missed += 1
+
+    def stop(self):
+        """Stop pushing (downloads are still matched)"""
+        if self.task is not None:
+            self.task.cancel()
+        self.running = False
+
+    def spec_for(self, company_id, device_unique_id):
+        """The config currently pushed to a device (None if the soak does not target it or is over)"""
+        if self.running and (company_id, device_unique_id) == (self.plan.company_id, self.plan.device_unique_id):
+            return self.current
+        return None
+
+    def downloaded(self, company_id, device_unique_id, md5):
+        """
+        Match a served config to its push
+
+        Returns:
+            bool: Whether the download completed a push
+        """
+        if (company_id, device_unique_id) != (self.plan.company_id, self.plan.device_unique_id):
+            return False
+        self.expire()
+        entry = self.pending.pop(md5, None)
+        if entry is None:
+            return False
+        latency_s = entry['latency_s'] = self.clock() - entry['published_at']
+        self.latency.add(latency_s)
+        self.by_size[entry['size']]['latency'].add(latency_s)
+        self.trend.add(entry['published_at'] - self.started_at, latency_s * 1000)
+        if len(self.early) < self.early_size:
+            self.early.append(latency_s)
+        return True
+
+    def report(self):
+        """
+        Soak statistics: push counts, download latency distribution (ms), latency trend and
+        the figures per config size
+        """
+        self.expire()
+        now = self.clock()
+        downloaded = self.latency.count
+        # Quarters of the soak while every latency is kept, the first and last samples beyond that
+        window = min(max(downloaded // 4, 1), len(self.early))
+        last = list(self.latency.samples)[-window:] if window else []
+        return {
+            'plan': self.plan.to_dict(),
+            'running': self.running,
+            'elapsed_s': round(((self.finished_at if not self.running and self.finished_at else now)
+                                - self.started_at) if self.started_at else 0.0, 3),
+            'pushes': self.pushes,
+            'downloaded': downloaded,
+            'missed': self.missed,
+            'pending': len(self.pending),
+            'latency_ms': self.latency.summary(),
+            'latency_slope_ms_per_h': self.trend.slope(per=3600),
+            'first_quarter_latency_ms': summarize_latencies(self.early[:window]),
+            'last_quarter_latency_ms': summarize_latencies(last),
+            'by_size': [{'size': size, 'bytes': figures['bytes'], 'pushes': figures['pushes'],
+                         'latency_ms': figures['latency'].summary()}
+                        for size, figures in zip(self.plan.sizes, self.by_size)],
+            'recent': [{'index': p['index'], 'bytes': p['bytes'], 'md5': p['md5'],
+                        'latency_ms': round(p['latency_s'] * 1000, 3) if p['latency_s'] is not None else None}
+                       for p in self.recent],
+        }
@@ -0,0 +1,341 @@
+"""
+Indexed per-device fixtures for the mock server
+Holds RESPONSES_DIR/app_config.json plus per-company and per-device overrides in memory with
+precomputed MD5 hashes, kept current through inotify instead of per-request stat calls.
+impairment.json files (network impairment profiles) and synthetic.json files (generated
+large-fleet configs) are indexed the same way.
+
+Layout (most specific wins):
+    <root>/<name>                        all devices
+    <root>/<company_id>/<name>           every device of a company
+    <root>/<company_id>/<device_id>/<name>  one device
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+FIXTURE_NAME = 'app_config.json'
+IMPAIRMENT_NAME = 'impairment.json'
+SYNTHETIC_NAME = 'synthetic.json'
+FIXTURE_NAMES = (FIXTURE_NAME, IMPAIRMENT_NAME, SYNTHETIC_NAME)
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# Files are picked up when closed after writing or renamed into place; IN_CREATE is only
+# used to start watching new company/device directories.
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+Fixture = namedtuple('Fixture', ['content', 'md5', 'scope'])
+
+
+class Inotify:
+    """Thin ctypes wrapper around the Linux inotify API"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        """Watch a directory, returning the watch descriptor"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read_events(self):
+        """
+        Read all pending events without blocking
+
+        Returns:
+            list of (wd, mask, name) tuples
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(errors='surrogateescape')
+                offset += length
+                events.append((wd, mask, name))
+
+    def rm_watch(self, wd):
+        """Stop watching (errors are ignored: the kernel may already have dropped it)"""
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FixtureStore:
+    """
+    In-memory index of fixture files keyed by (company_id, device_id, name)
+
+    Global fixtures are stored under (None, None, name) and company fixtures under
+    (company_id, None, name). lookup() is a dict access; the index only changes when inotify
+    reports a change under the root, or on a periodic rescan when inotify is unavailable.
+    """
+
+    def __init__(self, root, poll_interval=2.0):
+        self.root = Path(root)
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self.inotify = None
+        self.watches = {}
+        self.loop = None
+        self.poll_task = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key_for(self, path):
+        """Index key for a fixture path, or None if the path is not a fixture location"""
+        try:
+            parts = Path(path).relative_to(self.root).parts
+        except ValueError:
+            return None
+        if not parts or parts[-1] not in FIXTURE_NAMES or len(parts) > 3:
+            return None
+        scope = parts[:-1]
+        return (scope[0] if len(scope) > 0 else None, scope[1] if len(scope) > 1 else None, parts[-1])
+
+    def path_for(self, key):
+        """Fixture path for an index key"""
+        return self.root.joinpath(*[part for part in key if part is not None])
+
+    @staticmethod
+    def scope_of(key):
+        """'global', 'company' or 'device'"""
+        return 'device' if key[1] is not None else 'company' if key[0] is not None else 'global'
+
+    def read(self, key):
+        """Read one fixture from disk, returning None when it does not exist"""
+        try:
+            content = self.path_for(key).read_bytes()
+        except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+            return None
+        return Fixture(content, hashlib.md5(content).hexdigest(), self.scope_of(key))
+
+    def update(self, key):
+        """Re-read one fixture into the index (removing it when the file is gone)"""
+        path = self.path_for(key)
+        entry = self.read(key)
+        if entry is None:
+            if self.entries.pop(key, None) is not None:
+                logger.info(f"Fixture removed: {path}")
+            return
+        previous = self.entries.get(key)
+        self.entries[key] = entry
+        if previous is None or previous.md5 != entry.md5:
+            logger.info(f"Fixture loaded: {path} ({len(entry.content)} bytes, md5 {entry.md5})")
+
+    def directories(self):
+        """Root, company and device directories that may hold fixtures"""
+        directories = [self.root]
+        for company_dir in self.scan_dirs(self.root):
+            directories.append(company_dir)
+            directories.extend(self.scan_dirs(company_dir))
+        return directories
+
+    @staticmethod
+    def scan_dirs(path):
+        """Visible subdirectories of path (empty when path is missing)"""
+        try:
+            return [entry for entry in path.iterdir() if entry.is_dir() and not entry.name.startswith('.')]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+    def load(self):
+        """(Re)build the whole index from disk"""
+        entries = {}
+        for directory in self.directories():
+            for name in FIXTURE_NAMES:
+                key = self.key_for(directory / name)
+                entry = self.read(key)
+                if entry is not None:
+                    entries[key] = entry
+        self.entries = entries
+        logger.debug(f"Fixture index loaded from {self.root}: {len(entries)} fixture(s)")
+        return self
+
+    def lookup(self, company_id, device_unique_id, name=FIXTURE_NAME):
+        """
+        Most specific fixture file for a device
+
+        Returns:
+            Fixture(content, md5, scope) or None when there is no such fixture
+            (for app_config.json: the default config should be generated)
+        """
+        entries = self.entries
+        return (entries.get((company_id, device_unique_id, name))
+                or entries.get((company_id, None, name))
+                or entries.get((None, None, name)))
+
+    def lookup_first(self, company_id, device_unique_id, names):
+        """
+        Most specific fixture among several file names; within one scope, earlier names win
+
+        Returns:
+            (name, Fixture) or (None, None) when none of the files exist
+        """
+        entries = self.entries
+        for scope in ((company_id, device_unique_id), (company_id, None), (None, None)):
+            for name in names:
+                fixture = entries.get(scope + (name,))
+                if fixture is not None:
+                    return name, fixture
+        return None, None
+
+    # Change tracking
+
+    def watch(self, loop=None):
+        """
+        Start tracking changes on the running event loop
+
+        Uses inotify when the platform supports it and falls back to periodic rescans.
+
+        Returns:
+            'inotify' or 'poll'
+        """
+        self.loop = loop or asyncio.get_running_loop()
+        try:
+            self.inotify = Inotify()
+            for directory in self.directories():
+                self.add_watch(directory)
+        except OSError as e:
+            logger.warning(f"inotify unavailable ({e}), rescanning fixtures every {self.poll_interval}s")
+            if self.inotify is not None:
+                self.inotify.close()
+                self.inotify = None
+            self.watches = {}
+            self.poll_task = self.loop.create_task(self.poll())
+            return 'poll'
+        self.loop.add_reader(self.inotify.fd, self.on_inotify_readable)
+        logger.debug(f"Watching {len(self.watches)} fixture directories with inotify")
+        return 'inotify'
+
+    def add_watch(self, directory):
+        try:
+            wd = self.inotify.add_watch(directory)
+        except FileNotFoundError:
+            return
+        self.watches[wd] = Path(directory)
+
+    def on_inotify_readable(self):
+        """Apply pending inotify events to the index"""
+        for wd, mask, name in self.inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, reloading all fixtures")
+                self.rewatch()
+                return
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                self.drop_tree(directory)
+                continue
+            path = directory / name
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.depth(path) <= 2:
+                    self.add_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.drop_tree(path)
+                continue
+            key = self.key_for(path)
+            if key is not None and not mask & IN_CREATE:
+                self.update(key)
+
+    def depth(self, directory):
+        return len(directory.relative_to(self.root).parts)
+
+    def add_tree(self, directory):
+        """Watch a new company/device directory and index what it already holds"""
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            self.add_watch(current)
+            for name in FIXTURE_NAMES:
+                key = self.key_for(current / name)
+                if key is not None:
+                    self.update(key)
+            if self.depth(current) < 2:
+                pending.extend(self.scan_dirs(current))
+
+    def drop_tree(self, directory):
+        """Forget watches and fixtures at or below a directory that went away"""
+        for wd, path in list(self.watches.items()):
+            if path == directory or directory in path.parents:
+                self.inotify.rm_watch(wd)
+                del self.watches[wd]
+        for key in list(self.entries):
+            if directory in self.path_for(key).parents:
+                self.update(key)
+
+    def rewatch(self):
+        """Recreate all watches and reload the index (after a queue overflow)"""
+        self.close()
+        self.load()
+        self.watch(self.loop)
+
+    async def poll(self):
+        """Fallback change tracking: rebuild the index periodically"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                self.load()
+            except OSError as e:
+                logger.warning(f"Fixture rescan failed: {e}")
+
+    def close(self):
+        """Stop tracking changes"""
+        if self.inotify is not None:
+            if self.loop is not None:
+                self.loop.remove_reader(self.inotify.fd)
+            self.inotify.close()
+            self.inotify = None
+        self.watches = {}
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+            self.poll_task = None
@@ -0,0 +1,265 @@
+"""
+Network impairment profiles for the mock server
+Lets a run mix good and bad links: HTTP latency/jitter, bandwidth caps with paced chunked
+responses, random connection resets, and delayed or dropped send_config_v3 publishes.
+
+A profile is a JSON object, optionally based on a preset:
+    {"preset": "3g", "reset_probability": 0.05}
+
+Profiles are resolved per device, most specific first, from admin overrides
+(/admin/impairment/...) and impairment.json fixture files, then IMPAIRMENT_PROFILE.
+"""
+
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import random
+from pathlib import Path
+
+from fixture_store import IMPAIRMENT_NAME
+
+logger = logging.getLogger(__name__)
+
+FIELDS = {
+    'latency_ms': 0.0,
+    'jitter_ms': 0.0,
+    'bandwidth_kbps': 0.0,
+    'chunk_size': 4096,
+    'reset_probability': 0.0,
+    'mqtt_delay_ms': 0.0,
+    'mqtt_jitter_ms': 0.0,
+    'mqtt_drop_probability': 0.0,
+}
+
+PROBABILITY_FIELDS = ('reset_probability', 'mqtt_drop_probability')
+
+PRESETS = {
+    'lan': {},
+    'dsl': {'latency_ms': 30, 'jitter_ms': 5, 'bandwidth_kbps': 8000, 'mqtt_delay_ms': 30},
+    '3g': {'latency_ms': 150, 'jitter_ms': 50, 'bandwidth_kbps': 750, 'mqtt_delay_ms': 150, 'mqtt_jitter_ms': 50},
+    'satellite': {'latency_ms': 600, 'jitter_ms': 100, 'bandwidth_kbps': 1000, 'mqtt_delay_ms': 600,
+                  'mqtt_jitter_ms': 100},
+    'lossy': {'latency_ms': 200, 'jitter_ms': 150, 'bandwidth_kbps': 256, 'reset_probability': 0.1,
+              'mqtt_delay_ms': 200, 'mqtt_jitter_ms': 200, 'mqtt_drop_probability': 0.1},
+}
+
+
+class ImpairmentProfile:
+    """
+    One set of impairment settings
+
+    Args:
+        latency_ms: Delay before the HTTP response starts
+        jitter_ms: Uniform +/- variation of latency_ms
+        bandwidth_kbps: Response body rate cap in kbit/s (0 = unlimited)
+        chunk_size: Bytes written per paced chunk when bandwidth is capped
+        reset_probability: Chance of resetting the connection part-way through the body
+        mqtt_delay_ms: Delay before publishing send_config_v3
+        mqtt_jitter_ms: Uniform +/- variation of mqtt_delay_ms
+        mqtt_drop_probability: Chance of never publishing send_config_v3
+    """
+
+    def __init__(self, **settings):
+        unknown = set(settings) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown impairment setting(s): {', '.join(sorted(unknown))}")
+        for name, default in FIELDS.items():
+            value = settings.get(name, default)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            if value < 0:
+                raise ValueError(f"{name} must not be negative, got {value}")
+            if name in PROBABILITY_FIELDS and value > 1:
+                raise ValueError(f"{name} must be between 0 and 1, got {value}")
+            setattr(self, name, value)
+        if self.chunk_size < 1:
+            raise ValueError(f"chunk_size must be at least 1, got {self.chunk_size}")
+        self.chunk_size = int(self.chunk_size)
+
+    @classmethod
+    def from_value(cls, value):
+        """
+        Build a profile from a preset name or a dict (optionally with a "preset" base)
+
+        Raises:
+            ValueError: Unknown preset or invalid settings
+        """
+        if isinstance(value, str):
+            value = {'preset': value}
+        if not isinstance(value, dict):
+            raise ValueError(f"Impairment profile must be a preset name or an object, got {value!r}")
+        settings = dict(value)
+        preset = settings.pop('preset', None)
+        if preset is not None:
+            if preset not in PRESETS:
+                raise ValueError(f"Unknown impairment preset {preset!r} (choose from {', '.join(PRESETS)})")
+            settings = {**PRESETS[preset], **settings}
+        return cls(**settings)
+
+    @classmethod
+    def from_json(cls, text):
+        """Build a profile from JSON text or a bare preset name"""
+        text = text.strip()
+        if text in PRESETS:
+            return cls.from_value(text)
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid impairment profile JSON: {e}") from e
+        return cls.from_value(value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    @property
+    def is_clean(self):
+        """True when the profile does not impair anything"""
+        return all(getattr(self, name) == default for name, default in FIELDS.items() if name != 'chunk_size')
+
+    @staticmethod
+    def jittered(base_ms, jitter_ms, rng):
+        """Delay in seconds: base +/- uniform jitter, never negative"""
+        if jitter_ms:
+            base_ms += rng.uniform(-jitter_ms, jitter_ms)
+        return max(base_ms, 0.0) / 1000.0
+
+    def http_delay(self, rng):
+        return self.jittered(self.latency_ms, self.jitter_ms, rng)
+
+    def mqtt_delay(self, rng):
+        return self.jittered(self.mqtt_delay_ms, self.mqtt_jitter_ms, rng)
+
+    @property
+    def bytes_per_second(self):
+        return self.bandwidth_kbps * 1000.0 / 8.0
+
+    def reset_offset(self, body_length, rng):
+        """Byte offset at which to reset the connection, or None to deliver the whole body"""
+        if self.reset_probability and rng.random() < self.reset_probability:
+            return rng.randrange(body_length) if body_length else 0
+        return None
+
+    def drop_publish(self, rng):
+        return bool(self.mqtt_drop_probability) and rng.random() < self.mqtt_drop_probability
+
+
+CLEAN_PROFILE = ImpairmentProfile()
+
+
+class Impairments:
+    """
+    Resolves the impairment profile for each device
+
+    Admin overrides live in memory, or in overrides.json of a directory shared by forked HTTP
+    workers so an override reaches every worker; impairment.json fixtures come from the
+    fixture store. For each scope (device, company, global) an admin override beats a
+    fixture file; the default profile applies when neither exists.
+    """
+
+    def __init__(self, default=None, seed=None, directory=None):
+        self.default = default or CLEAN_PROFILE
+        self.overrides = {}
+        self.parsed = {}
+        self.rng = random.Random(seed)
+        self.path = Path(directory) / 'overrides.json' if directory else None
+        # (inode, mtime, size) of the overrides file when it was last read
+        self.loaded = None
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def refresh(self):
+        """Re-read the shared overrides if another worker changed them"""
+        if self.path is None:
+            return
+        try:
+            stat = self.path.stat()
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            version = None
+        if version == self.loaded:
+            return
+        overrides = {}
+        if version is not None:
+            try:
+                for entry in json.loads(self.path.read_text()):
+                    profile = ImpairmentProfile.from_value(entry['profile'])
+                    overrides[(entry['company_id'], entry['device_unique_id'])] = profile
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable impairment overrides {self.path}: {e}")
+                return
+        self.overrides = overrides
+        self.loaded = version
+
+    @contextlib.contextmanager
+    def shared(self):
+        """Change the overrides, writing them back for the other workers"""
+        if self.path is None:
+            yield
+            return
+        with open(self.path.with_suffix('.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.refresh()
+            yield
+            entries = [{'company_id': company_id, 'device_unique_id': device_unique_id, 'profile': profile.to_dict()}
+                       for (company_id, device_unique_id), profile in self.overrides.items()]
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(entries))
+            os.replace(tmp_path, self.path)
+            self.loaded = None
+            self.refresh()
+
+    def set(self, profile, company_id=None, device_unique_id=None):
+        """Install an admin override for a device, a company, or every device"""
+        with self.shared():
+            self.overrides[(company_id, device_unique_id)] = profile
+
+    def clear(self, company_id=None, device_unique_id=None):
+        """Remove an admin override, returning whether one existed"""
+        with self.shared():
+            return self.overrides.pop((company_id, device_unique_id), None) is not None
+
+    def reset(self):
+        """Remove every admin override"""
+        with self.shared():
+            self.overrides.clear()
+
+    def from_fixture(self, fixture):
+        """
+        Parsed profile for an impairment.json fixture (parsed once per content hash)
+
+        An invalid file is logged once and treated as the default profile.
+        """
+        profile = self.parsed.get(fixture.md5)
+        if profile is None:
+            try:
+                profile = ImpairmentProfile.from_json(fixture.content.decode('utf-8', errors='replace'))
+            except ValueError as e:
+                logger.warning(f"Ignoring invalid {fixture.scope} impairment.json: {e}")
+                profile = self.default
+            self.parsed[fixture.md5] = profile
+        return profile
+
+    def resolve(self, company_id, device_unique_id, store=None):
+        """
+        Profile for a device
+
+        Args:
+            company_id: Company ID of the device
+            device_unique_id: Device unique ID
+            store: FixtureStore holding impairment.json files (optional)
+
+        Returns:
+            ImpairmentProfile
+        """
+        self.refresh()
+        for key in ((company_id, device_unique_id), (company_id, None), (None, None)):
+            profile = self.overrides.get(key)
+            if profile is not None:
+                return profile
+            if store is not None:
+                fixture = store.entries.get(key + (IMPAIRMENT_NAME,))
+                if fixture is not None:
+                    return self.from_fixture(fixture)
+        return self.default
@@ -0,0 +1,182 @@
+"""
+Minimal JSON Patch (RFC 6902) diff and apply for app_config deltas
+make_patch() emits add/remove/replace operations, diffing arrays element-wise so that an
+inserted or removed rule does not rewrite the rest of the list. Object member order is
+preserved, so a patched document serializes to the same bytes as the target.
+"""
+
+import copy
+import difflib
+import json
+
+
+def escape_token(token):
+    """Escape an object key for use in a JSON Pointer"""
+    return str(token).replace('~', '~0').replace('/', '~1')
+
+
+def unescape_token(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def same_type(a, b):
+    """Type check that keeps bool apart from int, and int apart from float"""
+    return type(a) is type(b)
+
+
+def same_value(a, b):
+    """
+    Deep equality as the serialized document sees it: unlike ==, 1, 1.0 and true differ, and so do
+    objects with the same members in a different order
+    """
+    if not same_type(a, b):
+        return False
+    if isinstance(a, dict):
+        return list(a) == list(b) and all(same_value(value, b[key]) for key, value in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(same_value(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def fingerprint(value):
+    """String used to match array elements (member order and number types are kept)"""
+    return json.dumps(value, separators=(',', ':'))
+
+
+def make_patch(old, new, path=''):
+    """
+    Build a JSON Patch that turns `old` into `new`
+
+    Args:
+        old: Source document (parsed JSON)
+        new: Target document (parsed JSON)
+        path: JSON Pointer of the documents (used for recursion)
+
+    Returns:
+        list of operation dicts
+    """
+    if not same_type(old, new):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    if isinstance(old, dict):
+        return _diff_objects(old, new, path)
+    if same_value(old, new):
+        return []
+    if isinstance(old, list):
+        return _diff_arrays(old, new, path)
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def _diff_objects(old, new, path):
+    # "add" appends a member, so replace the object when new members are not at the end
+    # (or members moved); otherwise the patched document serializes in a different order
+    kept = [key for key in old if key in new]
+    if list(new) != kept + [key for key in new if key not in old]:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    if same_value(old, new):
+        return []
+    ops = []
+    for key in old:
+        if key not in new:
+            ops.append({'op': 'remove', 'path': f"{path}/{escape_token(key)}"})
+    for key, value in new.items():
+        child = f"{path}/{escape_token(key)}"
+        if key not in old:
+            ops.append({'op': 'add', 'path': child, 'value': value})
+        else:
+            ops.extend(make_patch(old[key], value, child))
+    return ops
+
+
+def _diff_arrays(old, new, path):
+    # Only fingerprint and match the part between the common prefix and suffix
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and same_value(old[start], new[start]):
+        start += 1
+    end = 0
+    while end < limit - start and same_value(old[-1 - end], new[-1 - end]):
+        end += 1
+    old_middle, new_middle = old[start:len(old) - end], new[start:len(new) - end]
+
+    ops = []
+    matcher = difflib.SequenceMatcher(None, [fingerprint(v) for v in old_middle],
+                                      [fingerprint(v) for v in new_middle], autojunk=False)
+    # Operations are applied in order, so the working array always starts with new[:j1]
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        i1, i2, j1, j2 = i1 + start, i2 + start, j1 + start, j2 + start
+        paired = min(i2 - i1, j2 - j1) if tag == 'replace' else 0
+        for k in range(paired):
+            ops.extend(make_patch(old[i1 + k], new[j1 + k], f"{path}/{j1 + k}"))
+        for _ in range(i2 - i1 - paired):
+            ops.append({'op': 'remove', 'path': f"{path}/{j1 + paired}"})
+        for j in range(j1 + paired, j2):
+            ops.append({'op': 'add', 'path': f"{path}/{j}", 'value': new[j]})
+    return ops
+
+
+def _resolve(doc, pointer):
+    """Return (parent, token) for a JSON Pointer; parent is None for the root"""
+    if pointer == '':
+        return None, None
+    if not pointer.startswith('/'):
+        raise ValueError(f"Invalid JSON Pointer {pointer!r}")
+    tokens = [unescape_token(t) for t in pointer[1:].split('/')]
+    parent = doc
+    for token in tokens[:-1]:
+        parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+    return parent, tokens[-1]
+
+
+def apply_patch(doc, patch, in_place=False):
+    """
+    Apply a JSON Patch (add, remove, replace and test operations)
+
+    Args:
+        doc: Parsed JSON document
+        patch: List of operation dicts
+        in_place: Modify doc instead of a deep copy
+
+    Returns:
+        The patched document
+
+    Raises:
+        ValueError: If an operation is unsupported or does not apply
+    """
+    if not in_place:
+        doc = copy.deepcopy(doc)
+    for op in patch:
+        kind = op.get('op')
+        try:
+            parent, token = _resolve(doc, op['path'])
+            if kind == 'test':
+                current = doc if parent is None else (parent[int(token)] if isinstance(parent, list) else parent[token])
+                if current != op['value']:
+                    raise ValueError(f"test failed at {op['path']}")
+            elif parent is None:
+                if kind == 'remove':
+                    raise ValueError('cannot remove the document root')
+                doc = op['value']
+            elif isinstance(parent, list):
+                index = len(parent) if token == '-' else int(token)
+                if kind == 'add':
+                    if index > len(parent):
+                        raise IndexError(index)
+                    parent.insert(index, op['value'])
+                elif kind == 'remove':
+                    del parent[index]
+                elif kind == 'replace':
+                    parent[index] = op['value']
+                else:
+                    raise ValueError(f"unsupported op {kind!r}")
+            else:
+                if kind == 'add' or (kind == 'replace' and token in parent):
+                    parent[token] = op['value']
+                elif kind == 'remove':
+                    del parent[token]
+                else:
+                    raise ValueError(f"unsupported op {kind!r} or missing member {token!r}")
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"JSON Patch operation {op} does not apply: {e!r}") from e
+    return doc
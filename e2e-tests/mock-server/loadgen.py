@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Fleet-scale MQTT load generator for the EdgeIQ mock server
+Simulates N devices over M MQTT connections performing the config round trip:
+publish to u/<company>/<device>/config, receive send_config_v3, download app_config.zip
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import sys
+import time
+import zipfile
+from io import BytesIO
+
+import aiohttp
+import paho.mqtt.client as mqtt
+
+# Configure logging
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(
+    level=getattr(logging, log_level, logging.INFO),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('loadgen')
+
+
+def percentile(sorted_values, pct):
+    """
+    Return the pct-th percentile of an already sorted list using linear interpolation
+
+    Args:
+        sorted_values: Ascending list of numbers
+        pct: Percentile in range [0, 100]
+
+    Returns:
+        float or None if the list is empty
+    """
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return float(sorted_values[0])
+    rank = (len(sorted_values) - 1) * (pct / 100.0)
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return float(sorted_values[lower])
+    weight = rank - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize_latencies(values):
+    """
+    Summarize latency samples (seconds) into a JSON friendly dict in milliseconds
+
+    Returns:
+        dict with count, min, mean, p50, p95, p99 and max
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0, 'min': None, 'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+    def ms(value):
+        return round(value * 1000.0, 3)
+
+    return {
+        'count': len(ordered),
+        'min': ms(ordered[0]),
+        'mean': ms(sum(ordered) / len(ordered)),
+        'p50': ms(percentile(ordered, 50)),
+        'p95': ms(percentile(ordered, 95)),
+        'p99': ms(percentile(ordered, 99)),
+        'max': ms(ordered[-1]),
+    }
+
+
+def requests_allowed(elapsed, rate, ramp):
+    """
+    Number of requests that may have been issued after `elapsed` seconds
+
+    The request rate grows linearly from 0 to `rate` over `ramp` seconds and then stays flat,
+    so the allowance is the integral of that rate curve.
+
+    Args:
+        elapsed: Seconds since the run started
+        rate: Target requests per second (0 or less means unlimited)
+        ramp: Ramp-up duration in seconds
+
+    Returns:
+        float: Cumulative request allowance
+    """
+    if rate <= 0:
+        return math.inf
+    if elapsed <= 0:
+        return 0.0
+    if ramp <= 0:
+        return rate * elapsed
+    if elapsed < ramp:
+        return rate * elapsed * elapsed / (2.0 * ramp)
+    return rate * ramp / 2.0 + rate * (elapsed - ramp)
+
+
+class SimulatedConnection:
+    """One MQTT connection carrying config traffic for a slice of the simulated devices"""
+
+    def __init__(self, index, devices, company_id, host, port, loop, on_command):
+        self.index = index
+        self.devices = devices
+        self.company_id = company_id
+        self.host = host
+        self.port = port
+        self.loop = loop
+        self.on_command = on_command
+        self.connected = loop.create_future()
+        self.subscribed = loop.create_future()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2,
+                                  client_id=f"edgeiq-loadgen-{os.getpid()}-{index}")
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = self.on_message
+        self.client.max_inflight_messages_set(0)
+        self.client.max_queued_messages_set(0)
+
+    def _resolve(self, future, value):
+        """Resolve a future from the paho network thread"""
+        def setter():
+            if not future.done():
+                future.set_result(value)
+        self.loop.call_soon_threadsafe(setter)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        """Subscribe to the downlink command topic of every device on this connection"""
+        logger.debug(f"Connection {self.index} connected: reason_code={reason_code}")
+        if reason_code != 0:
+            self._resolve(self.connected, False)
+            return
+        topics = [(f"d/{self.company_id}/{device}/gateway_commands/send_config_v3", 1) for device in self.devices]
+        client.subscribe(topics)
+        self._resolve(self.connected, True)
+
+    def on_subscribe(self, client, userdata, mid, reason_code_list, properties):
+        """Mark the connection ready once the broker acknowledged the subscription"""
+        logger.debug(f"Connection {self.index} subscribed to {len(reason_code_list)} topics")
+        self._resolve(self.subscribed, True)
+
+    def on_message(self, client, userdata, msg):
+        """Forward send_config_v3 commands to the event loop"""
+        received_at = time.monotonic()
+        device = msg.topic.split('/')[2]
+        self.loop.call_soon_threadsafe(self.on_command, device, msg.payload, received_at)
+
+    async def start(self, timeout):
+        """Connect, subscribe and wait for the broker acks"""
+        self.client.connect_async(self.host, self.port, 60)
+        self.client.loop_start()
+        if not await asyncio.wait_for(self.connected, timeout):
+            raise ConnectionError(f"Connection {self.index} rejected by broker at {self.host}:{self.port}")
+        await asyncio.wait_for(self.subscribed, timeout)
+
+    def request_config(self, device):
+        """Publish a config v3 request for one device"""
+        payload = json.dumps({'config_version': 3, 'requested': True})
+        return self.client.publish(f"u/{self.company_id}/{device}/config", payload, qos=1)
+
+    def stop(self):
+        """Disconnect and stop the network thread"""
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class LoadGenerator:
+    """Drives config round trips for a simulated fleet and collects latency statistics"""
+
+    def __init__(self, devices=100, connections=10, rate=0.0, ramp=0.0, requests_per_device=1,
+                 duration=None, company_id='loadtest-company', device_prefix='loadtest-device',
+                 mqtt_host='localhost', mqtt_port=1883, timeout=30.0, verify=False,
+                 http_concurrency=100):
+        self.num_devices = devices
+        self.num_connections = max(1, min(connections, devices))
+        self.rate = rate
+        self.ramp = ramp
+        self.requests_per_device = requests_per_device
+        self.duration = duration
+        self.company_id = company_id
+        self.device_ids = [f"{device_prefix}-{i:06d}" for i in range(devices)]
+        self.mqtt_host = mqtt_host
+        self.mqtt_port = mqtt_port
+        self.timeout = timeout
+        self.verify = verify
+        self.http_concurrency = http_concurrency
+
+        self.connections = []
+        self.device_connection = {}
+        self.pending = {}
+        self.mqtt_latencies = []
+        self.download_latencies = []
+        self.total_latencies = []
+        self.errors = {}
+        self.issued = 0
+        self.completed = 0
+        self.bytes_downloaded = 0
+
+    def record_error(self, kind):
+        """Count an error by kind"""
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def on_command(self, device, payload, received_at):
+        """Match an incoming send_config_v3 to the outstanding request of the device"""
+        future = self.pending.get(device)
+        if future is None or future.done():
+            self.record_error('unexpected_command')
+            return
+        future.set_result((payload, received_at))
+
+    async def connect(self):
+        """Open all MQTT connections, distributing devices round-robin"""
+        loop = asyncio.get_running_loop()
+        slices = [self.device_ids[i::self.num_connections] for i in range(self.num_connections)]
+        for index, devices in enumerate(slices):
+            connection = SimulatedConnection(index, devices, self.company_id, self.mqtt_host,
+                                             self.mqtt_port, loop, self.on_command)
+            self.connections.append(connection)
+            for device in devices:
+                self.device_connection[device] = connection
+
+        logger.info(f"Opening {len(self.connections)} MQTT connections for {self.num_devices} devices")
+        await asyncio.gather(*(connection.start(self.timeout) for connection in self.connections))
+        logger.info("✓ All connections established and subscribed")
+
+    async def round_trip(self, session, device):
+        """Run one config round trip for a device and record its latencies"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[device] = future
+        started = time.monotonic()
+        try:
+            info = self.device_connection[device].request_config(device)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self.record_error('publish_failed')
+                return
+
+            try:
+                payload, received_at = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                self.record_error('command_timeout')
+                return
+
+            try:
+                command = json.loads(payload)
+                url = command['payload']['url']
+                expected_md5 = command['payload']['md5']
+            except (ValueError, KeyError, TypeError):
+                self.record_error('invalid_command')
+                return
+
+            download_started = time.monotonic()
+            try:
+                async with session.get(url) as response:
+                    body = await response.read()
+                    if response.status != 200:
+                        self.record_error(f"http_{response.status}")
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.record_error('download_failed')
+                return
+            finished = time.monotonic()
+
+            if self.verify:
+                try:
+                    with zipfile.ZipFile(BytesIO(body)) as archive:
+                        content = archive.read('app_config.json')
+                except (zipfile.BadZipFile, KeyError):
+                    # Truncated or corrupt body, or no app_config.json in the archive
+                    self.record_error('invalid_archive')
+                    return
+                if hashlib.md5(content).hexdigest() != expected_md5:
+                    self.record_error('md5_mismatch')
+                    return
+
+            self.bytes_downloaded += len(body)
+            self.mqtt_latencies.append(received_at - started)
+            self.download_latencies.append(finished - download_started)
+            self.total_latencies.append(finished - started)
+            self.completed += 1
+        finally:
+            self.pending.pop(device, None)
+
+    async def run(self):
+        """Issue requests according to the rate/ramp schedule and return the JSON report"""
+        await self.connect()
+
+        total_requests = self.num_devices * self.requests_per_device
+        busy = set()
+        tasks = set()
+        device_cursor = 0
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.http_concurrency)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            started = time.monotonic()
+            while True:
+                elapsed = time.monotonic() - started
+                if self.duration is not None:
+                    if elapsed >= self.duration:
+                        break
+                elif self.issued >= total_requests:
+                    break
+
+                allowed = requests_allowed(elapsed, self.rate, self.ramp)
+                while self.issued < allowed and (self.duration is not None or self.issued < total_requests):
+                    device = self.device_ids[device_cursor % self.num_devices]
+                    if device in busy:
+                        # Every device is busy when the cursor wraps onto an outstanding request
+                        break
+                    device_cursor += 1
+                    busy.add(device)
+                    task = asyncio.create_task(self.round_trip(session, device))
+                    task.add_done_callback(lambda _, device=device: busy.discard(device))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    self.issued += 1
+
+                await asyncio.sleep(0.001)
+
+            if tasks:
+                await asyncio.gather(*tasks)
+            elapsed = time.monotonic() - started
+
+        for connection in self.connections:
+            connection.stop()
+
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        """Build the JSON report"""
+        error_count = sum(self.errors.values())
+        return {
+            'config': {
+                'devices': self.num_devices,
+                'connections': self.num_connections,
+                'rate': self.rate,
+                'ramp': self.ramp,
+                'requests_per_device': self.requests_per_device,
+                'duration': self.duration,
+                'mqtt': f"{self.mqtt_host}:{self.mqtt_port}",
+            },
+            'elapsed_s': round(elapsed, 3),
+            'requests': {
+                'issued': self.issued,
+                'completed': self.completed,
+                'errors': error_count,
+            },
+            'errors': dict(sorted(self.errors.items())),
+            'throughput_rps': round(self.completed / elapsed, 3) if elapsed > 0 else 0.0,
+            'bytes_downloaded': self.bytes_downloaded,
+            'latency_ms': {
+                'mqtt': summarize_latencies(self.mqtt_latencies),
+                'download': summarize_latencies(self.download_latencies),
+                'total': summarize_latencies(self.total_latencies),
+            },
+        }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Config round trip load generator for the EdgeIQ mock server')
+    parser.add_argument('--devices', type=int, default=100, help='number of simulated devices')
+    parser.add_argument('--connections', type=int, default=10, help='number of MQTT connections shared by the devices')
+    parser.add_argument('--rate', type=float, default=0.0, help='target config requests per second (0 = unlimited)')
+    parser.add_argument('--ramp', type=float, default=0.0, help='seconds to ramp linearly up to --rate')
+    parser.add_argument('--requests-per-device', type=int, default=1, help='requests per device when --duration is not set')
+    parser.add_argument('--duration', type=float, default=None, help='run for this many seconds instead of a fixed request count')
+    parser.add_argument('--company-id', default='loadtest-company')
+    parser.add_argument('--device-prefix', default='loadtest-device')
+    parser.add_argument('--mqtt-host', default=os.getenv('MQTT_HOST', 'localhost'))
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('MQTT_PORT', '1883')))
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--http-concurrency', type=int, default=100, help='max concurrent zip downloads')
+    parser.add_argument('--verify', action='store_true', help='check the downloaded app_config.json against the md5')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--max-error-rate', type=float, default=None,
+                        help='exit non-zero when errors/issued exceeds this fraction')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the load generator from the command line"""
+    args = parse_args(argv)
+    generator = LoadGenerator(
+        devices=args.devices,
+        connections=args.connections,
+        rate=args.rate,
+        ramp=args.ramp,
+        requests_per_device=args.requests_per_device,
+        duration=args.duration,
+        company_id=args.company_id,
+        device_prefix=args.device_prefix,
+        mqtt_host=args.mqtt_host,
+        mqtt_port=args.mqtt_port,
+        timeout=args.timeout,
+        verify=args.verify,
+        http_concurrency=args.http_concurrency,
+    )
+    report = asyncio.run(generator.run())
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_json)
+
+    if args.max_error_rate is not None and report['requests']['issued']:
+        error_rate = report['requests']['errors'] / report['requests']['issued']
+        if error_rate > args.max_error_rate:
+            logger.error(f"Error rate {error_rate:.4f} exceeds --max-error-rate {args.max_error_rate}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
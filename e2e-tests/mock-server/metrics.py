@@ -0,0 +1,299 @@
+"""
+Minimal Prometheus text-format metrics for the mock server
+Counters, gauges and histograms with labels, rendered by the /metrics endpoint.
+Kept dependency-free so the mock server only needs aiohttp and paho-mqtt.
+Registries can be snapshotted to JSON and merged, so multi-worker servers report one view.
+"""
+
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    """Format a sample value the way Prometheus expects"""
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labelnames, labelvalues, extra=None):
+    """Render a {name="value",...} label set (empty string when there are no labels)"""
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    """Base class for a labelled metric family"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), lock=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = lock or threading.Lock()
+        self.values = {}
+        self.registry = None
+
+    def key(self, labels):
+        """Label values tuple for the given keyword labels"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        """HELP and TYPE lines"""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self):
+        """List of (suffix, labelvalues, extra_label, value) samples"""
+        with self.lock:
+            return [('', key, None, value) for key, value in sorted(self.values.items())]
+
+    def snapshot_values(self):
+        """JSON serializable [labelvalues, value] pairs"""
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def merge_values(self, values):
+        """Add snapshot values from another process into this metric"""
+        with self.lock:
+            for key, value in values:
+                key = tuple(key)
+                self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        """Render the metric family in text exposition format"""
+        lines = self.header()
+        for suffix, labelvalues, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(self.labelnames, labelvalues, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing counter"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter for a label set"""
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        """Current value for a label set"""
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def total(self):
+        """Sum over all label sets"""
+        with self.lock:
+            return sum(self.values.values())
+
+
+class Gauge(Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), lock=None):
+        super().__init__(name, documentation, labelnames, lock)
+        self.function = None
+
+    def set(self, value, **labels):
+        """Set the gauge for a label set"""
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        """Increase the gauge for a label set"""
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Decrease the gauge for a label set"""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        """Current value for a label set"""
+        if self.function is not None:
+            return self.function(self.registry)
+        with self.lock:
+            return self.values.get(self.key(labels), 0)
+
+    def set_function(self, function):
+        """
+        Compute the (unlabelled) gauge value on every scrape
+
+        function(registry) receives the registry being rendered, so derived values such as
+        ratios are recomputed from merged counters rather than merged themselves.
+        """
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            return [('', (), None, self.function(self.registry))]
+        return super().samples()
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed bucket boundaries"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, lock=None):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """Record one observation for a label set"""
+        key = self.key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def get(self, **labels):
+        """Observation (count, sum) for a label set"""
+        with self.lock:
+            state = self.values.get(self.key(labels))
+            return (state['count'], state['sum']) if state else (0, 0.0)
+
+    def snapshot_values(self):
+        with self.lock:
+            return [[list(key), {'counts': list(state['counts']), 'sum': state['sum'], 'count': state['count']}]
+                    for key, state in self.values.items()]
+
+    def merge_values(self, values):
+        with self.lock:
+            for key, other in values:
+                key = tuple(key)
+                state = self.values.get(key)
+                if state is None:
+                    state = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                state['counts'] = [a + b for a, b in zip(state['counts'], other['counts'])]
+                state['sum'] += other['sum']
+                state['count'] += other['count']
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, state in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    samples.append(('_bucket', key, ('le', format_value(bound)), cumulative))
+                samples.append(('_sum', key, None, state['sum']))
+                samples.append(('_count', key, None, state['count']))
+        return samples
+
+
+class Registry:
+    """Collection of metric families rendered together"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def register(self, metric):
+        """Add a metric family; names must be unique"""
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        metric.registry = self
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames, self.lock))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames, self.lock))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets, self.lock))
+
+    def snapshot(self):
+        """
+        JSON serializable description and values of every metric family
+
+        Function gauges are left out: they are derived at render time.
+        """
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            if getattr(metric, 'function', None) is not None:
+                continue
+            family = {'type': metric.type_name, 'help': metric.documentation, 'labels': list(metric.labelnames),
+                      'values': metric.snapshot_values()}
+            if isinstance(metric, Histogram):
+                family['buckets'] = list(metric.buckets[:-1])
+            snapshot[name] = family
+        return snapshot
+
+    def merged(self, snapshots):
+        """
+        Build a registry with the same metric families holding the sum of the snapshots
+
+        Counters, histograms and gauges are summed across snapshots; function gauges are
+        re-evaluated against the merged registry. Families that only other processes register
+        (such as the embedded broker's, held by one worker) are added from their snapshot.
+
+        Args:
+            snapshots: Iterable of dicts produced by snapshot()
+
+        Returns:
+            Registry
+        """
+        merged = Registry()
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                merged.histogram(metric.name, metric.documentation, metric.labelnames, metric.buckets[:-1])
+            elif isinstance(metric, Gauge):
+                merged.gauge(metric.name, metric.documentation, metric.labelnames).function = metric.function
+            else:
+                merged.counter(metric.name, metric.documentation, metric.labelnames)
+        for snapshot in snapshots:
+            for name, family in snapshot.items():
+                if name not in merged.metrics:
+                    if family['type'] == 'histogram':
+                        merged.histogram(name, family['help'], family['labels'], family['buckets'])
+                    elif family['type'] == 'gauge':
+                        merged.gauge(name, family['help'], family['labels'])
+                    else:
+                        merged.counter(name, family['help'], family['labels'])
+                merged.metrics[name].merge_values(family['values'])
+        return merged
+
+    def render(self):
+        """Render all metric families in text exposition format"""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
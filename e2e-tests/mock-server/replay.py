@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Replay an MQTT capture against a broker
+Publishes the messages of a capture recorded by the mock server (MQTT_CAPTURE) with their
+original spacing at 1x, N times faster, or as fast as possible, and reports how closely the
+replay followed the schedule.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+from capture import decode_payload, read_capture
+from loadgen import summarize_latencies
+
+# Configure logging
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(
+    level=getattr(logging, log_level, logging.INFO),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('replay')
+
+# Below this much remaining wait, spin instead of sleeping (sleep overshoots by up to ~1ms)
+SPIN_THRESHOLD = 0.002
+
+
+def parse_speed(value):
+    """'max' (or 0) for unthrottled replay, otherwise a positive speed-up factor"""
+    if str(value).lower() in ('max', '0'):
+        return None
+    speed = float(str(value).rstrip('xX'))
+    if speed <= 0:
+        raise ValueError(f"speed must be positive or 'max', got {value}")
+    return speed
+
+
+def wait_until(deadline):
+    """Sleep, then spin, until time.monotonic() reaches deadline"""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_THRESHOLD:
+            time.sleep(remaining - SPIN_THRESHOLD / 2)
+
+
+class MQTTPublisher:
+    """paho client used by the replay, tracking acknowledgements of QoS 1/2 publishes"""
+
+    def __init__(self, host, port, client_id=None):
+        self.host = host
+        self.port = port
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id or f"replay-{os.getpid()}")
+        self.client.on_publish = self.on_publish
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.acked = threading.Condition(self.lock)
+
+    def on_publish(self, client, userdata, mid, reason_code, properties):
+        with self.lock:
+            self.pending -= 1
+            self.acked.notify_all()
+
+    def connect(self):
+        self.client.connect(self.host, self.port, 60)
+        self.client.loop_start()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self.lock:
+            self.pending += 1
+        self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def drain(self, timeout=30):
+        """Wait for every publish to be handed to the broker (and acknowledged for QoS > 0)"""
+        with self.lock:
+            return self.acked.wait_for(lambda: self.pending <= 0, timeout)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class Replayer:
+    """
+    Publishes capture records on their (scaled) original schedule
+
+    Args:
+        records: Iterable of capture records in time order (streamed, not held in memory)
+        publish: Callable (topic, payload, qos, retain)
+        speed: Speed-up factor, or None to publish as fast as possible
+        limit: Stop after this many messages
+    """
+
+    def __init__(self, records, publish, speed=1.0, limit=None):
+        self.records = records
+        self.publish = publish
+        self.speed = speed
+        self.limit = limit
+
+    def run(self):
+        """
+        Replay the records
+
+        Returns:
+            dict report with message counts, durations, effective speed and lateness percentiles
+        """
+        lateness = []
+        topics = set()
+        count = 0
+        first_t = last_t = None
+        started = time.monotonic()
+        for record in self.records:
+            if self.limit is not None and count >= self.limit:
+                break
+            if first_t is None:
+                first_t = record['t']
+            last_t = record['t']
+            if self.speed is not None:
+                target = started + (record['t'] - first_t) / self.speed
+                wait_until(target)
+                lateness.append(time.monotonic() - target)
+            self.publish(record['topic'], decode_payload(record), record.get('qos', 0), record.get('retain', False))
+            topics.add(record['topic'])
+            count += 1
+        elapsed = time.monotonic() - started
+
+        capture_duration = (last_t - first_t) if count else 0.0
+        return {
+            'speed': self.speed if self.speed is not None else 'max',
+            'messages': count,
+            'topics': len(topics),
+            'capture_duration_s': round(capture_duration, 3),
+            'replay_duration_s': round(elapsed, 3),
+            'effective_speed': round(capture_duration / elapsed, 3) if elapsed and capture_duration else None,
+            'throughput_mps': round(count / elapsed, 1) if elapsed else None,
+            'lateness_ms': summarize_latencies(lateness),
+        }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Replay an MQTT capture against a broker')
+    parser.add_argument('capture', help='capture file written by the mock server (MQTT_CAPTURE)')
+    parser.add_argument('--speed', type=parse_speed, default=1.0,
+                        help="speed-up factor (1 = real time, 10 = ten times faster) or 'max'")
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many messages')
+    parser.add_argument('--mqtt-host', default=os.getenv('MQTT_HOST', 'localhost'))
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('MQTT_PORT', '1883')))
+    parser.add_argument('--client-id', default=None)
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run a replay from the command line"""
+    args = parse_args(argv)
+    publisher = MQTTPublisher(args.mqtt_host, args.mqtt_port, args.client_id)
+    publisher.connect()
+    try:
+        logger.info(f"Replaying {args.capture} at {args.speed or 'max'}x to {args.mqtt_host}:{args.mqtt_port}")
+        report = Replayer(read_capture(args.capture), publisher.publish, args.speed, args.limit).run()
+        if not publisher.drain():
+            logger.warning(f"{publisher.pending} publishes still unacknowledged")
+        report['unacknowledged'] = max(publisher.pending, 0)
+    finally:
+        publisher.close()
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_json)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,22 +1,44 @@
 #!/usr/bin/env python3
 """
-Mock EdgeIQ API Server with embedded MQTT broker
-Provides HTTP endpoints for config downloads and MQTT broker for device communication
+Mock EdgeIQ API Server with optional embedded MQTT broker
+Provides HTTP endpoints for config downloads and answers device config requests over MQTT,
+through Mosquitto or the in-process broker in broker.py (EMBEDDED_BROKER=1)
 """
 
+import argparse
 import asyncio
+import gzip
 import hashlib
 import json
 import logging
 import os
 import re
+import signal
+import socket
+import struct
+import sys
+import time
 import zipfile
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
 
 import paho.mqtt.client as mqtt
 from aiohttp import web
 
+import metrics
+from app_config_template import render_default_app_config
+from broker import Broker
+from capture import CaptureWriter
+from config_push import PushPlan, PushSoak
+from config_history import DELTA_CONTENT_TYPE, DELTA_SERIALIZATION, ConfigHistory, DeltaUnavailable
+from fixture_store import FIXTURE_NAME, SYNTHETIC_NAME, FixtureStore
+from impairment import ImpairmentProfile, Impairments
+from sink import UplinkSink
+from synthetic_config import SyntheticSpec, build_archive as build_synthetic_archive
+from throttle import Throttle, ThrottlePolicy
+from timeline import DeviceTimeline, breakdown
+
 # Configure logging
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
 logging.basicConfig(
@@ -26,199 +48,773 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info(f"Logging level set to: {log_level}")
 
+# Prometheus metrics exposed on /metrics
+METRICS = metrics.Registry()
+HTTP_REQUESTS = METRICS.counter(
+    'mock_http_requests_total', 'HTTP requests handled, by route, method and status', ('route', 'method', 'status'))
+HTTP_LATENCY = METRICS.histogram(
+    'mock_http_request_duration_seconds', 'HTTP request latency by route', ('route',))
+HTTP_IN_FLIGHT = METRICS.gauge(
+    'mock_http_requests_in_flight', 'HTTP requests currently being handled')
+MQTT_RECEIVED = METRICS.counter(
+    'mock_mqtt_messages_received_total', 'MQTT messages received by topic pattern', ('topic',))
+MQTT_PUBLISHED = METRICS.counter(
+    'mock_mqtt_messages_published_total', 'MQTT messages published by topic pattern', ('topic',))
+MQTT_PUBLISH_QUEUE = METRICS.gauge(
+    'mock_mqtt_publish_queue_depth', 'QoS 1 publishes not yet acknowledged by the broker')
+CONFIG_GENERATION = METRICS.histogram(
+    'mock_config_generation_seconds', 'Time to produce app_config.zip and its MD5 hashes', ('source',))
+ARCHIVE_CACHE_LOOKUPS = METRICS.counter(
+    'mock_archive_cache_lookups_total', 'Archive cache lookups by result', ('result',))
+MQTT_CAPTURED = METRICS.counter(
+    'mock_mqtt_capture_messages_total', 'Uplink messages offered to the capture, by result', ('result',))
+CONFIG_DELTAS = METRICS.counter(
+    'mock_config_delta_requests_total', 'Config downloads carrying the current MD5, by outcome', ('result',))
+CONFIG_DELTA_BYTES_SAVED = METRICS.counter(
+    'mock_config_delta_bytes_saved_total', 'Archive bytes not sent because a delta was served')
+IMPAIRMENT_ACTIONS = METRICS.counter(
+    'mock_impairment_actions_total', 'Impairments applied, by action', ('action',))
+THROTTLE_ACTIONS = METRICS.counter(
+    'mock_throttle_actions_total', 'Throttled config downloads and replies, by action', ('action',))
+THROTTLE_QUEUE = METRICS.gauge(
+    'mock_throttle_reply_queue_depth', 'send_config_v3 replies held back by the throttle')
+CONFIG_PUSHES = METRICS.counter(
+    'mock_config_pushes_total', 'Config push soak pushes, by result', ('result',))
+ARCHIVE_CACHE_HIT_RATIO = METRICS.gauge(
+    'mock_archive_cache_hit_ratio', 'Archive cache hits / lookups since start')
+ARCHIVE_CACHE_HIT_RATIO.set_function(
+    lambda registry: sum(
+        registry.metrics['mock_archive_cache_lookups_total'].get(result=result) for result in ('hit', 'disk_hit')
+    ) / max(registry.metrics['mock_archive_cache_lookups_total'].total(), 1))
+
+
+def topic_pattern(topic):
+    """
+    Collapse company and device IDs of an EdgeIQ topic into wildcards for metric labels
+
+    u/<company_id>/<device_unique_id>/config -> u/+/+/config
+    """
+    parts = topic.split('/')
+    if len(parts) >= 3 and parts[0] in ('u', 'd'):
+        parts[1] = parts[2] = '+'
+    return '/'.join(parts)
+
+
+class ArchiveCache:
+    """
+    LRU cache of built zip archives keyed by JSON content MD5 and archive settings
+
+    The MQTT responder and the HTTP download both need the archive for the same config,
+    and higher deflate levels are CPU heavy, so identical content is only zipped once.
+    Both run on the same event loop thread, so the cache needs no locking.
+
+    With a directory configured the cache is also content-addressed on disk, which lets
+    forked HTTP workers reuse each other's archives. Files are written to a temporary
+    name and renamed into place, so concurrent workers never read a partial archive.
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def archive_path(self, key):
+        """On-disk location of an archive: <json_md5>-<compression>-<level>.zip"""
+        json_md5_hash, compression, compresslevel = key
+        return self.directory / f"{json_md5_hash}-{compression}-{compresslevel or 'default'}.zip"
+
+    def get_or_build(self, json_md5_hash, app_config_content, compression, compresslevel):
+        """
+        Return (zip_data, zip_md5_hash) for the content, building it on a miss
+        """
+        key = (json_md5_hash, compression, compresslevel)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            ARCHIVE_CACHE_LOOKUPS.inc(result='hit')
+            return entry
+
+        zip_data = None
+        if self.directory is not None:
+            try:
+                zip_data = self.archive_path(key).read_bytes()
+                ARCHIVE_CACHE_LOOKUPS.inc(result='disk_hit')
+            except FileNotFoundError:
+                pass
+
+        if zip_data is None:
+            ARCHIVE_CACHE_LOOKUPS.inc(result='miss')
+            zip_data = build_zip_archive(app_config_content, compression, compresslevel)
+            if self.directory is not None:
+                self.store(key, zip_data)
+
+        entry = (zip_data, hashlib.md5(zip_data).hexdigest())
+        if self.max_entries > 0:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def store(self, key, zip_data):
+        """Atomically write an archive into the on-disk cache"""
+        path = self.archive_path(key)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(zip_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write archive cache file {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Drop all cached archives held in memory"""
+        self.entries.clear()
+
+
+class WorkerMetrics:
+    """
+    Combines the metrics of forked HTTP workers into one report
+
+    Every worker periodically writes a JSON snapshot of its registry into a shared directory.
+    Whichever worker serves /metrics merges all snapshots (its own taken fresh) and renders them.
+    """
+
+    def __init__(self, directory, worker_id, interval=1.0):
+        self.directory = Path(directory)
+        self.worker_id = worker_id
+        self.interval = interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"worker-{worker_id}.json"
+
+    def publish(self):
+        """Write this worker's snapshot atomically"""
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(METRICS.snapshot()))
+        os.replace(tmp_path, self.path)
+
+    def collect(self):
+        """
+        Merge the snapshots of all workers
+
+        Returns:
+            metrics.Registry with the summed values
+        """
+        snapshots = [METRICS.snapshot()]
+        for path in sorted(self.directory.glob('worker-*.json')):
+            if path == self.path:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError) as e:
+                logger.debug(f"Skipping unreadable metrics snapshot {path}: {e}")
+        return METRICS.merged(snapshots)
+
+    async def run(self):
+        """Publish snapshots until cancelled"""
+        while True:
+            try:
+                self.publish()
+            except OSError as e:
+                logger.warning(f"Failed to publish metrics snapshot: {e}")
+            await asyncio.sleep(self.interval)
+
+
+class Readiness:
+    """
+    Composite readiness of the mock server's components
+
+    Components register named checks and flip them as their state changes; /ready reports
+    them and long-polls on change notifications instead of sleeping.
+    """
+
+    def __init__(self):
+        self.checks = {}
+        self.changed = asyncio.Event()
+        self.listeners = []
+
+    def require(self, name):
+        """Add a check that starts out not ready"""
+        self.checks.setdefault(name, False)
+
+    def set(self, name, value):
+        """Update a check and wake up long-polling waiters if it changed"""
+        if self.checks.get(name) == value:
+            return
+        self.checks[name] = value
+        logger.debug(f"Readiness check {name} -> {value}")
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+        for listener in self.listeners:
+            listener()
+
+    @property
+    def ready(self):
+        return all(self.checks.values())
+
+    async def wait(self, timeout):
+        """
+        Wait until every check passes
+
+        Returns:
+            bool: Whether the server became ready within timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while not self.ready:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.ready
+        return True
+
+
+class SharedReadiness:
+    """
+    Shares the MQTT readiness of worker 0 with the other forked HTTP workers
+
+    Without a share group only worker 0 runs the MQTT responder (and the embedded broker), so only
+    it knows their state. It writes those checks to a JSON file in the shared state directory
+    whenever one changes; the other workers poll the file and mirror the checks, so /ready gives
+    the same answer whichever worker SO_REUSEPORT hands the request to.
+    """
+
+    CHECKS = ('embedded_broker', 'mqtt_connected', 'mqtt_subscribed')
+
+    def __init__(self, directory, readiness=None, interval=0.2):
+        self.directory = Path(directory)
+        self.readiness = readiness
+        self.interval = interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / 'readiness.json'
+
+    def clear(self):
+        """Forget the state of a previous run (before the workers start)"""
+        self.path.unlink(missing_ok=True)
+
+    def publish(self):
+        """Write worker 0's shared checks atomically (registered as a Readiness listener)"""
+        checks = {name: value for name, value in self.readiness.checks.items() if name in self.CHECKS}
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(checks))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to publish readiness: {e}")
+
+    def read(self):
+        """Worker 0's shared checks ({} until it published them)"""
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    async def run(self):
+        """Mirror worker 0's checks until cancelled (the MQTT checks start out not ready)"""
+        self.readiness.require('mqtt_connected')
+        self.readiness.require('mqtt_subscribed')
+        while True:
+            for name, value in self.read().items():
+                self.readiness.set(name, value)
+            await asyncio.sleep(self.interval)
+
+
+def parse_wait(value, maximum=300.0):
+    """
+    Parse a long-poll duration such as '30', '30s' or '500ms' into seconds (capped at maximum)
+
+    Raises:
+        ValueError: If the value is not a non-negative duration
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(ms|s)?\s*', value or '')
+    if not match:
+        raise ValueError(f"Invalid wait duration {value!r} (use e.g. 30s or 500ms)")
+    seconds = float(match.group(1)) / (1000.0 if match.group(2) == 'ms' else 1.0)
+    return min(seconds, maximum)
+
+
+ARCHIVE_CACHE = ArchiveCache(int(os.getenv('ARCHIVE_CACHE_SIZE', '256')), os.getenv('ARCHIVE_CACHE_DIR'))
+
+# Config versions served per device, for delta downloads (?md5=<current json md5>)
+CONFIG_HISTORY = ConfigHistory(int(os.getenv('CONFIG_HISTORY_VERSIONS', '8')),
+                               directory=os.getenv('CONFIG_HISTORY_DIR'))
+
+# Per-device network impairment (admin overrides, impairment.json fixtures, IMPAIRMENT_PROFILE)
+IMPAIRMENTS = Impairments(directory=os.getenv('IMPAIRMENT_DIR'))
+
+# Backend overload model for reconnect storms (THROTTLE_PROFILE, /admin/throttle)
+THROTTLE = Throttle()
+
+# When each device's config was requested, published and downloaded (/admin/timeline)
+TIMELINE = DeviceTimeline(int(os.getenv('TIMELINE_MAX_DEVICES', '10000')), directory=os.getenv('TIMELINE_DIR'))
+
+# Config push soak in progress or last run (/admin/soak)
+PUSH_SOAK = None
 
-def generate_app_config_zip(company_id, device_unique_id):
+
+ARCHIVE_COMPRESSION_METHODS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+}
+
+
+def parse_archive_settings(compression=None, compresslevel=None):
+    """
+    Validate archive compression settings, falling back to the environment defaults
+
+    Args:
+        compression: 'stored' or 'deflate' (default: ARCHIVE_COMPRESSION env, 'deflate')
+        compresslevel: Deflate level 1-9 as int or str (default: ARCHIVE_COMPRESSLEVEL env,
+                       unset means zlib's default level)
+
+    Returns:
+        Tuple of (compression: str, compresslevel: int or None)
+
+    Raises:
+        ValueError: If the method or level is not supported
+    """
+    if compression is None:
+        compression = os.getenv('ARCHIVE_COMPRESSION', 'deflate')
+    if compresslevel is None:
+        compresslevel = os.getenv('ARCHIVE_COMPRESSLEVEL') or None
+
+    compression = compression.lower()
+    if compression not in ARCHIVE_COMPRESSION_METHODS:
+        raise ValueError(f"Unsupported archive compression '{compression}' "
+                         f"(expected one of: {', '.join(ARCHIVE_COMPRESSION_METHODS)})")
+
+    if compression == 'stored':
+        return compression, None
+
+    if compresslevel is not None:
+        try:
+            compresslevel = int(compresslevel)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid deflate level '{compresslevel}' (expected 1-9)")
+        if not 1 <= compresslevel <= 9:
+            raise ValueError(f"Invalid deflate level {compresslevel} (expected 1-9)")
+
+    return compression, compresslevel
+
+
+def build_zip_archive(app_config_content, compression='deflate', compresslevel=None):
+    """
+    Wrap app_config.json content into a zip archive
+
+    Args:
+        app_config_content: JSON document bytes stored as app_config.json at the archive root
+        compression: 'stored' or 'deflate'
+        compresslevel: Deflate level 1-9, None for zlib's default
+
+    Returns:
+        bytes: zip archive
+    """
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', ARCHIVE_COMPRESSION_METHODS[compression],
+                         compresslevel=compresslevel) as zip_file:
+        zip_file.writestr('app_config.json', app_config_content)
+    return zip_buffer.getvalue()
+
+
+FIXTURE_STORE = None
+
+
+def fixture_store():
+    """
+    Fixture index for RESPONSES_DIR
+
+    Built on first use and rebuilt if RESPONSES_DIR changes; main() starts change tracking.
+    """
+    global FIXTURE_STORE
+    responses_dir = Path(os.getenv('RESPONSES_DIR', '/home/ubuntu/fixtures/responses'))
+    if FIXTURE_STORE is None or FIXTURE_STORE.root != responses_dir:
+        if FIXTURE_STORE is not None:
+            FIXTURE_STORE.close()
+        FIXTURE_STORE = FixtureStore(responses_dir).load()
+    return FIXTURE_STORE
+
+
+SYNTHETIC_ARCHIVES = OrderedDict()
+# Synthetic archives being built in a worker thread, by SYNTHETIC_ARCHIVES key
+SYNTHETIC_BUILDS = {}
+SYNTHETIC_SPECS = {}
+
+
+def synthetic_spec(fixture):
+    """
+    Parsed synthetic.json fixture (cached by content MD5)
+
+    Returns:
+        SyntheticSpec, or None if the fixture is invalid
+    """
+    spec = SYNTHETIC_SPECS.get(fixture.md5)
+    if spec is None:
+        try:
+            spec = SyntheticSpec.from_json(fixture.content)
+        except ValueError as e:
+            logger.warning(f"✗ Ignoring invalid {fixture.scope} {SYNTHETIC_NAME} fixture: {e}")
+            return None
+        SYNTHETIC_SPECS[fixture.md5] = spec
+    return spec
+
+
+async def synthetic_archive(spec, company_id, device_unique_id, compression, compresslevel):
+    """
+    Stream a synthetic config into an archive, reusing the last SYNTHETIC_CACHE_SIZE results
+
+    Large synthetic configs take seconds to build, so the build runs in a worker thread while the
+    event loop keeps serving downloads, MQTT and /ready. Concurrent requests for the same archive
+    share one build.
+
+    Returns:
+        Tuple of (zip_data: bytes, json_md5_hash: str, zip_md5_hash: str)
+    """
+    key = (spec.key, company_id, device_unique_id, compression, compresslevel)
+    entry = SYNTHETIC_ARCHIVES.get(key)
+    if entry is not None:
+        SYNTHETIC_ARCHIVES.move_to_end(key)
+        ARCHIVE_CACHE_LOOKUPS.inc(result='hit')
+        return entry
+
+    build = SYNTHETIC_BUILDS.get(key)
+    if build is None:
+        ARCHIVE_CACHE_LOOKUPS.inc(result='miss')
+        build = SYNTHETIC_BUILDS[key] = asyncio.ensure_future(
+            build_synthetic_entry(key, spec, company_id, device_unique_id, compression, compresslevel))
+    else:
+        ARCHIVE_CACHE_LOOKUPS.inc(result='hit')
+    # A cancelled download does not cancel the build the other requests wait for
+    return await asyncio.shield(build)
+
+
+async def build_synthetic_entry(key, spec, company_id, device_unique_id, compression, compresslevel):
+    """Build a synthetic archive in a worker thread and add it to SYNTHETIC_ARCHIVES"""
+    try:
+        zip_data, json_md5_hash, json_size = await asyncio.to_thread(
+            build_synthetic_archive, spec, company_id, device_unique_id, ARCHIVE_COMPRESSION_METHODS[compression],
+            compresslevel)
+    finally:
+        SYNTHETIC_BUILDS.pop(key, None)
+    logger.info(f"Generated synthetic config {spec.to_dict()}: {json_size} bytes JSON, {len(zip_data)} bytes zip")
+    entry = (zip_data, json_md5_hash, hashlib.md5(zip_data).hexdigest())
+    max_entries = int(os.getenv('SYNTHETIC_CACHE_SIZE', '8'))
+    if max_entries > 0:
+        SYNTHETIC_ARCHIVES[key] = entry
+        while len(SYNTHETIC_ARCHIVES) > max_entries:
+            SYNTHETIC_ARCHIVES.popitem(last=False)
+    return entry
+
+
+async def generate_app_config_zip(company_id, device_unique_id, compression=None, compresslevel=None, synthetic=None):
     """
     Generate app_config.zip file content and return (zip_data, json_md5_hash, zip_md5_hash)
 
+    A synthetic config is served when requested explicitly, while a config push soak targets the
+    device, or when the most specific fixture for the device is a synthetic.json (an
+    app_config.json in the same scope takes precedence).
+
     Args:
         company_id: Company ID for the config
         device_unique_id: Device unique ID for the config
+        compression: Archive method, 'stored' or 'deflate' (default from ARCHIVE_COMPRESSION)
+        compresslevel: Deflate level 1-9 (default from ARCHIVE_COMPRESSLEVEL)
+        synthetic: SyntheticSpec overriding the fixtures (e.g. from download query parameters)
 
     Returns:
         Tuple of (zip_data: bytes, json_md5_hash: str, zip_md5_hash: str)
         - json_md5_hash: MD5 hash of the JSON file content (used in MQTT response)
         - zip_md5_hash: MD5 hash of the zip file content (for reference)
     """
+    compression, compresslevel = parse_archive_settings(compression, compresslevel)
     logger.debug(f"Generating app_config.zip for company_id={company_id}, device_unique_id={device_unique_id}")
-
-    # Load mock app_config response
-    responses_dir = Path(os.getenv('RESPONSES_DIR', '/home/ubuntu/fixtures/responses'))
-    app_config_file = responses_dir / 'app_config.json'
-
-    logger.debug(f"Looking for app_config.json at: {app_config_file}")
-
-    if not app_config_file.exists():
-        logger.debug("app_config.json not found, generating default config")
-        # Create default app_config if it doesn't exist
-        default_app_config = {
-            "id": "642b74cc7ac462445dba7457",
-            "name": device_unique_id,
-            "unique_id": device_unique_id,
-            "auto_relay_reports": False,
-            "aws_greengrass_core_thing_arn": "",
-            "bluemix_auth_token": "",
-            "heartbeat_period": 5,
-            "heartbeat_values": None,
-            "max_persisted_reports": 1000,
-            "relay_frequency_limit_seconds": 0,
-            "metadata": {},
-            "company": {
-                "id": company_id,
-                "company_id": company_id,
-                "name": "edge testing company",
-                "user_id": "5bb3e6d773c6b700018695fa",
-                "created_at": "2023-04-04T00:52:27.154015Z",
-                "updated_at": "2023-04-04T00:52:27.154015Z",
-                "origin": "cloud",
-                "aliases": {
-                    "device": "device",
-                    "gateway": "gateway"
-                },
-                "branding": {
-                    "gradient_sidbar": False,
-                    "icon_url": "",
-                    "logo_background_color": "",
-                    "logo_url": "",
-                    "portal_title": "",
-                    "primary_color": "",
-                    "secondary_color": "",
-                    "sidebar_text_color": ""
-                }
-            },
-            "device_type": {
-                "id": "642b74cc7ac462445dba7455",
-                "name": "Remote Terminal Test Device Type",
-                "type": "gateway",
-                "role": "gateway",
-                "manufacturer": "ManFac",
-                "model": "3 Million",
-                "company_id": company_id,
-                "user_id": "642b74cb7ac462445dba7453",
-                "origin": "cloud",
-                "created_at": "2023-04-04T00:52:28.001016Z",
-                "updated_at": "2023-04-04T00:52:28.001016Z",
-                "capabilities": {
-                    "actions": {
-                        "heartbeat": True,
-                        "log": True,
-                        "log_config": True,
-                        "log_level": True,
-                        "log_upload": True,
-                        "mqtt": True,
-                        "send_config": True,
-                        "setting": True,
-                        "start_remote_terminal": True,
-                        "status": True,
-                        "stop_remote_terminal": True
-                    }
-                },
-                "rules": [],
-                "command_ids": [],
-                "ingestor_ids": [],
-                "software_update_ids": [],
-                "pollable_attributes": []
-            },
-            "user": {
-                "id": "642b74cb7ac462445dba7453",
-                "company_id": company_id,
-                "user_id": "5bb3e6d773c6b700018695fa",
-                "email": "edge-testing@edgeiq.io",
-                "first_name": "EdgeIQ",
-                "last_name": "Tester",
-                "phone_number": "",
-                "encrypted_authentication_token": "wFkiS.$2a$10$...",
-                "encrypted_password": "$2a$10$...",
-                "logo_url": "",
-                "origin": "cloud",
-                "created_at": "2023-04-04T00:52:27.640092Z",
-                "updated_at": "2023-04-04T00:52:27.640092Z"
-            },
-            "log_config": {
-                "local_level": "info",
-                "forward_level": "error",
-                "forward_frequency_limit": 60
-            },
-            "device_types": [],
-            "devices": [],
-            "connections": [],
-            "ingestors": [],
-            "translators": [],
-            "commands": [],
-            "integrations": [],
-            "integration_ids": [],
-            "rules": [],
-            "device_ha_group": None
-        }
-        app_config_content = json.dumps(default_app_config, indent=2).encode('utf-8')
+    started = time.perf_counter()
+
+    if synthetic is None and PUSH_SOAK is not None:
+        synthetic = PUSH_SOAK.spec_for(company_id, device_unique_id)
+
+    # Look up the most specific fixture (device, company, then global) in the in-memory index
+    name, fixture = fixture_store().lookup_first(company_id, device_unique_id, (FIXTURE_NAME, SYNTHETIC_NAME))
+    if synthetic is None and name == SYNTHETIC_NAME:
+        synthetic = synthetic_spec(fixture)
+        fixture = None if synthetic is not None else fixture_store().lookup(company_id, device_unique_id)
+
+    if synthetic is not None:
+        # Streamed straight into the archive; too large (and too cheap to regenerate) for the history
+        zip_data, json_md5_hash, zip_md5_hash = await synthetic_archive(
+            synthetic, company_id, device_unique_id, compression, compresslevel)
+        CONFIG_GENERATION.observe(time.perf_counter() - started, source='synthetic')
+        return zip_data, json_md5_hash, zip_md5_hash
+
+    if fixture is None:
+        logger.debug("No app_config.json fixture for this device, generating default config")
+        source = 'default'
+        app_config_content = render_default_app_config(company_id, device_unique_id)
+        # Compute MD5 hash of JSON file content (this is what MQTT response should use)
+        json_md5_hash = hashlib.md5(app_config_content).hexdigest()
         logger.debug(f"Generated default config: {len(app_config_content)} bytes")
     else:
-        app_config_content = app_config_file.read_bytes()
-        logger.debug(f"Loaded app_config.json from file: {len(app_config_content)} bytes")
-
-    # Compute MD5 hash of JSON file content (this is what MQTT response should use)
-    json_md5_hash = hashlib.md5(app_config_content).hexdigest()
+        source = 'fixture'
+        app_config_content, json_md5_hash = fixture.content, fixture.md5
+        logger.debug(f"Using {fixture.scope} app_config.json fixture: {len(app_config_content)} bytes")
     logger.debug(f"JSON content MD5 hash: {json_md5_hash}")
+    CONFIG_HISTORY.record(company_id, device_unique_id, json_md5_hash, app_config_content)
 
-    # Create zip file in memory with app_config.json at root level
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.writestr('app_config.json', app_config_content)
+    # Create zip file in memory with app_config.json at root level (reused when the content is unchanged)
+    # The zip MD5 hash is kept for reference/debugging
+    zip_data, zip_md5_hash = ARCHIVE_CACHE.get_or_build(json_md5_hash, app_config_content, compression, compresslevel)
 
-    logger.debug("Created zip archive with app_config.json")
+    logger.debug(f"Created zip archive with app_config.json (compression={compression}, level={compresslevel})")
+    logger.debug(f"Generated zip: {len(zip_data)} bytes, zip MD5: {zip_md5_hash}, json MD5: {json_md5_hash}")
 
-    zip_buffer.seek(0)
-    zip_data = zip_buffer.read()
+    CONFIG_GENERATION.observe(time.perf_counter() - started, source=source)
+    return zip_data, json_md5_hash, zip_md5_hash
 
-    # Compute MD5 hash of zip file content (for reference/debugging)
-    zip_md5_hash = hashlib.md5(zip_data).hexdigest()
 
-    logger.debug(f"Generated zip: {len(zip_data)} bytes, zip MD5: {zip_md5_hash}, json MD5: {json_md5_hash}")
+def config_download_url(company_id, device_unique_id):
+    """URL sent in send_config_v3 (MOCK_SERVER_HOST and MOCK_SERVER_PORT, as devices reach the mock)"""
+    mock_server_host = os.getenv('MOCK_SERVER_HOST', 'localhost')
+    mock_server_port = os.getenv('MOCK_SERVER_PORT', '8080')
+    return (f"http://{mock_server_host}:{mock_server_port}/api/v1/platform/configs_v3/"
+            f"{company_id}/{device_unique_id}/app_config.zip")
 
-    return zip_data, json_md5_hash, zip_md5_hash
+
+def accepts_gzip(accept_encoding):
+    """
+    Check whether an Accept-Encoding header value allows a gzip response
+
+    Args:
+        accept_encoding: Raw Accept-Encoding header value (may be empty)
+
+    Returns:
+        bool: True if gzip (or *) is listed with a non-zero quality value
+    """
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if coding not in ('gzip', 'x-gzip', '*'):
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            return True
+    return False
+
+
+def default_client_id():
+    """Client ID unique per host and process, so responders never take over each other's session"""
+    return f"edgeiq-mock-server-{socket.gethostname()}-{os.getpid()}"
 
 
 class MockMQTTServer:
-    """MQTT client that connects to Mosquitto broker and responds to device config requests"""
+    """
+    MQTT client that connects to Mosquitto broker and responds to device config requests
 
-    def __init__(self, host='localhost', port=1883, max_retries=30, retry_delay=2):
+    The paho client is driven by the asyncio event loop shared with MockHTTPServer instead of
+    paho's background thread: socket readiness is registered with loop.add_reader/add_writer,
+    and CONNACK/SUBACK resolve futures, so all callbacks run on the loop thread.
+
+    Several responders can serve one broker: each connects with a unique client ID, and with a
+    share group they subscribe over MQTT v5 to $share/<group>/u/+/+/config so the broker hands
+    every config request to exactly one of them.
+    """
+
+    CONFIG_TOPIC = "u/+/+/config"
+    UPLINK_TOPIC = "u/#"
+
+    def __init__(self, host='localhost', port=1883, max_retries=30, retry_delay=2, ack_timeout=10,
+                 client_id=None, share_group=None, capture=None, sink=None, readiness=None):
+        """
+        Args:
+            host: Broker host
+            port: Broker port
+            max_retries: Connection attempts before giving up at startup
+            retry_delay: Seconds between connection attempts
+            ack_timeout: Seconds to wait for CONNACK/SUBACK
+            client_id: MQTT client ID (default: unique per host and process)
+            share_group: Shared subscription group name; None subscribes to the plain topic
+            capture: CaptureWriter recording every uplink message; widens the subscription to u/#
+            sink: UplinkSink accounting every uplink message; widens the subscription to u/#
+            readiness: Readiness updated with the broker connection and subscription state
+        """
         self.host = host
         self.port = port
         self.max_retries = max_retries
         self.retry_delay = retry_delay
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="edgeiq-mock-server")
+        self.ack_timeout = ack_timeout
+        self.client_id = client_id or default_client_id()
+        self.share_group = share_group
+        self.capture = capture
+        self.sink = sink
+        self.readiness = readiness
+        if readiness is not None:
+            readiness.require('mqtt_connected')
+            readiness.require('mqtt_subscribed')
+        topic_filter = self.UPLINK_TOPIC if capture is not None or sink is not None else self.CONFIG_TOPIC
+        if share_group:
+            self.subscription = f"$share/{share_group}/{topic_filter}"
+            protocol = mqtt.MQTTv5
+        else:
+            self.subscription = topic_filter
+            protocol = mqtt.MQTTv311
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=self.client_id, protocol=protocol)
         self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+        self.loop = None
+        self.misc_task = None
+        self.reconnect_task = None
+        self.running = False
+        self.stopping = False
         self.connected = False
+        self.subscribed = False
+        self.connect_future = None
+        self.subscribe_future = None
+        self.subscribe_mid = None
+        self.unacked_publishes = set()
+        self.reply_tasks = set()
+
+    def on_socket_open(self, client, userdata, sock):
+        """Register the new broker socket with the event loop"""
+        logger.debug("MQTT socket opened, registering reader with event loop")
+        self.loop.add_reader(sock, client.loop_read)
+        if self.misc_task is None or self.misc_task.done():
+            self.misc_task = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        """Unregister a closed broker socket"""
+        logger.debug("MQTT socket closed, removing reader from event loop")
+        self.loop.remove_reader(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        """Wait for the socket to become writable when paho has pending output"""
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        """Stop watching for writability once paho flushed its output"""
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        """Drive paho's keepalive and retry timers while the socket is open"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+        logger.debug("MQTT misc loop finished")
+
+    def _update_readiness(self):
+        if self.readiness is not None:
+            self.readiness.set('mqtt_connected', self.connected)
+            self.readiness.set('mqtt_subscribed', self.subscribed)
+
+    def _resolve(self, future, value):
+        """Resolve a startup future if someone is still waiting on it"""
+        if future is not None and not future.done():
+            future.set_result(value)
 
     def on_connect(self, client, userdata, flags, reason_code, properties):
         """Handle connection to Mosquitto broker"""
         logger.debug(f"on_connect called: reason_code={reason_code}, flags={flags}")
         if reason_code == 0:
-            logger.info(f"MQTT Client successfully connected to Mosquitto broker at {self.host}:{self.port}")
+            logger.info(f"MQTT Client {self.client_id} successfully connected to Mosquitto broker at {self.host}:{self.port}")
             self.connected = True
-            # Subscribe to uplink config topic pattern: u/+/+/config
-            result = client.subscribe("u/+/+/config")
-            logger.debug(f"Subscribe result: {result}")
-            logger.info("Subscribed to topic pattern: u/+/+/config")
+            # Subscribe to uplink config topic pattern: u/+/+/config (optionally as a shared subscription)
+            # When capturing, QoS 1 keeps the publisher's QoS (up to 1) visible in the recording
+            result, self.subscribe_mid = client.subscribe(self.subscription, qos=1 if self.capture is not None else 0)
+            logger.debug(f"Subscribe result: {result}, mid: {self.subscribe_mid}")
+            self._resolve(self.connect_future, True)
         else:
             logger.error(f"MQTT Client connection failed with result code: {reason_code}")
             self.connected = False
+            self._resolve(self.connect_future, False)
+        self._update_readiness()
+
+    def on_subscribe(self, client, userdata, mid, reason_code_list, properties):
+        """Handle the broker's subscription acknowledgement"""
+        logger.debug(f"on_subscribe called: mid={mid}, reason_codes={reason_code_list}")
+        if mid != self.subscribe_mid:
+            return
+        granted = all(not reason_code.is_failure for reason_code in reason_code_list)
+        if granted:
+            logger.info(f"Subscribed to topic pattern: {self.subscription}")
+        else:
+            logger.error(f"Broker rejected subscription to {self.subscription}: {reason_code_list}")
+        self.subscribed = granted
+        self._update_readiness()
+        self._resolve(self.subscribe_future, granted)
 
     def on_disconnect(self, client, userdata, flags, reason_code, properties):
         """Handle disconnection from broker"""
-        logger.warning(f"MQTT Client disconnected with result code: {reason_code}")
         self.connected = False
+        self.subscribed = False
+        self._update_readiness()
+        if self.stopping:
+            logger.info("MQTT Client disconnected")
+            return
+        logger.warning(f"MQTT Client disconnected with result code: {reason_code}")
+        self._resolve(self.connect_future, False)
+        if self.running and (self.reconnect_task is None or self.reconnect_task.done()):
+            self.reconnect_task = self.loop.create_task(self.reconnect())
+
+    async def reconnect(self):
+        """Reconnect after an unexpected disconnect (paho's thread used to do this for us)"""
+        while not self.stopping:
+            await asyncio.sleep(self.retry_delay)
+            logger.info(f"Reconnecting to Mosquitto broker at {self.host}:{self.port}...")
+            try:
+                if await self.connect_once():
+                    return
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"Reconnect failed: {e}")
+
+    def on_publish(self, client, userdata, mid, reason_code, properties):
+        """Track broker acknowledgements of QoS 1 publishes"""
+        if mid in self.unacked_publishes:
+            self.unacked_publishes.discard(mid)
+            MQTT_PUBLISH_QUEUE.dec()
+
+    def publish(self, topic, payload, qos=1):
+        """Publish a message and account for it in the metrics"""
+        publish_result = self.client.publish(topic, payload, qos=qos)
+        MQTT_PUBLISHED.inc(topic=topic_pattern(topic))
+        if qos > 0 and not publish_result.is_published():
+            self.unacked_publishes.add(publish_result.mid)
+            MQTT_PUBLISH_QUEUE.inc()
+        return publish_result
 
     def on_message(self, client, userdata, msg):
         """Handle incoming messages and respond with appropriate commands"""
         topic = msg.topic
-        payload = msg.payload.decode()
-        logger.info(f"MQTT Message received on topic '{topic}': {payload}")
+        MQTT_RECEIVED.inc(topic=topic_pattern(topic))
+        if self.capture is not None:
+            recorded = self.capture.record(time.time(), topic, msg.payload, msg.qos, msg.retain)
+            MQTT_CAPTURED.inc(result='recorded' if recorded else 'dropped')
+        is_config_request = mqtt.topic_matches_sub(self.CONFIG_TOPIC, topic)
+        if self.sink is not None:
+            self.sink.record(topic, msg.payload)
+            if not is_config_request:
+                # Sink traffic is only counted: no per-message logging or decoding
+                return
+        payload = msg.payload.decode(errors='replace')
+        if is_config_request:
+            logger.info(f"MQTT Message received on topic '{topic}': {payload}")
+        else:
+            logger.debug(f"MQTT Message received on topic '{topic}': {payload}")
 
         # Parse config request: u/<company_id>/<device_unique_id>/config
-        if topic.startswith('u/') and topic.endswith('/config'):
+        if is_config_request:
             logger.debug(f"Detected config request topic: {topic}")
             try:
                 payload_data = json.loads(payload)
@@ -234,38 +830,12 @@ class MockMQTTServer:
                         company_id = topic_parts[1]
                         device_unique_id = topic_parts[2]
                         logger.debug(f"Extracted IDs - company_id: {company_id}, device_unique_id: {device_unique_id}")
+                        TIMELINE.mark(company_id, device_unique_id, 'config_requested')
 
-                        # Build response topic: d/<company_id>/<device_unique_id>/gateway_commands/send_config_v3
-                        response_topic = f"d/{company_id}/{device_unique_id}/gateway_commands/send_config_v3"
-                        logger.debug(f"Response topic: {response_topic}")
-
-                        # Get mock server host from environment or use default
-                        mock_server_host = os.getenv('MOCK_SERVER_HOST', 'localhost')
-                        mock_server_port = os.getenv('MOCK_SERVER_PORT', '8080')
-                        logger.debug(f"Mock server endpoint: {mock_server_host}:{mock_server_port}")
-
-                        # Build config download URL
-                        config_url = f"http://{mock_server_host}:{mock_server_port}/api/v1/platform/configs_v3/{company_id}/{device_unique_id}/app_config.zip"
-                        logger.debug(f"Config URL: {config_url}")
-
-                        # Generate zip and get MD5 hash of JSON content (not zip)
-                        _, json_md5_hash, zip_md5_hash = generate_app_config_zip(company_id, device_unique_id)
-                        logger.debug(f"Using JSON MD5 hash for MQTT response: {json_md5_hash}")
-                        logger.debug(f"Zip MD5 hash (for reference): {zip_md5_hash}")
-
-                        # Build response payload with JSON MD5 hash
-                        response = {
-                            "command_type": "send_config_v3",
-                            "payload": {
-                                "url": config_url,
-                                "md5": json_md5_hash
-                            }
-                        }
-
-                        response_json = json.dumps(response)
-                        logger.info(f"Publishing config response to topic '{response_topic}': {response_json}")
-                        publish_result = client.publish(response_topic, response_json, qos=1)
-                        logger.debug(f"Publish result: {publish_result}")
+                        # The reply may wait for a synthetic archive build, which runs off the loop
+                        task = self.loop.create_task(self.reply_config(company_id, device_unique_id))
+                        self.reply_tasks.add(task)
+                        task.add_done_callback(self.reply_tasks.discard)
                     else:
                         logger.warning(f"Invalid topic format (expected at least 3 parts): {topic}")
                 else:
@@ -276,6 +846,97 @@ class MockMQTTServer:
         else:
             logger.debug(f"Ignoring non-config topic: {topic}")
 
+    async def reply_config(self, company_id, device_unique_id):
+        """Answer a config v3 request with send_config_v3, applying impairments and the throttle queue"""
+        # Build response topic: d/<company_id>/<device_unique_id>/gateway_commands/send_config_v3
+        response_topic = f"d/{company_id}/{device_unique_id}/gateway_commands/send_config_v3"
+        logger.debug(f"Response topic: {response_topic}")
+
+        # Build config download URL
+        config_url = config_download_url(company_id, device_unique_id)
+        logger.debug(f"Config URL: {config_url}")
+
+        # Generate zip and get MD5 hash of JSON content (not zip)
+        _, json_md5_hash, zip_md5_hash = await generate_app_config_zip(company_id, device_unique_id)
+        logger.debug(f"Using JSON MD5 hash for MQTT response: {json_md5_hash}")
+        logger.debug(f"Zip MD5 hash (for reference): {zip_md5_hash}")
+
+        # Build response payload with JSON MD5 hash
+        response = {
+            "command_type": "send_config_v3",
+            "payload": {
+                "url": config_url,
+                "md5": json_md5_hash
+            }
+        }
+
+        response_json = json.dumps(response)
+
+        # Apply the device's impairment profile (drop or delay the reply)
+        profile = IMPAIRMENTS.resolve(company_id, device_unique_id, fixture_store())
+        if profile.drop_publish(IMPAIRMENTS.rng):
+            IMPAIRMENT_ACTIONS.inc(action='mqtt_drop')
+            logger.info(f"Impairment: dropping config response to topic '{response_topic}'")
+            return
+        delay = profile.mqtt_delay(IMPAIRMENTS.rng)
+        if delay > 0:
+            IMPAIRMENT_ACTIONS.inc(action='mqtt_delay')
+            logger.info(f"Impairment: delaying config response to topic '{response_topic}' by {delay * 1000:.0f}ms")
+
+        # Pace replies through the throttle queue (storm tests), dropping them once it is too long
+        queued = THROTTLE.reserve_reply()
+        if queued is None:
+            THROTTLE_ACTIONS.inc(action='mqtt_drop')
+            logger.info(f"Throttle: dropping config response to topic '{response_topic}' (reply queue full)")
+            return
+        if queued > 0:
+            THROTTLE_ACTIONS.inc(action='mqtt_delay')
+            THROTTLE_QUEUE.inc()
+            logger.info(f"Throttle: queueing config response to topic '{response_topic}' for {queued * 1000:.0f}ms")
+            self.loop.call_later(delay + queued, self.publish_throttled, company_id, device_unique_id,
+                                 response_topic, response_json)
+            return
+        if delay > 0:
+            self.loop.call_later(delay, self.publish_reply, company_id, device_unique_id, response_topic, response_json)
+            return
+
+        logger.info(f"Publishing config response to topic '{response_topic}': {response_json}")
+        publish_result = self.publish_reply(company_id, device_unique_id, response_topic, response_json)
+        logger.debug(f"Publish result: {publish_result}")
+
+    def publish_reply(self, company_id, device_unique_id, topic, payload):
+        """Publish a send_config_v3 reply and record it on the device's timeline"""
+        TIMELINE.mark(company_id, device_unique_id, 'config_published')
+        return self.publish(topic, payload, qos=1)
+
+    def publish_throttled(self, company_id, device_unique_id, topic, payload):
+        """Publish a reply that waited in the throttle queue"""
+        THROTTLE.reply_sent()
+        THROTTLE_QUEUE.dec()
+        logger.info(f"Publishing throttled config response to topic '{topic}'")
+        self.publish_reply(company_id, device_unique_id, topic, payload)
+
+    async def connect_once(self):
+        """
+        Open the broker connection and wait for CONNACK and SUBACK
+
+        Returns:
+            bool: True once the config topic subscription was granted
+
+        Raises:
+            OSError: If the TCP connection cannot be established
+            asyncio.TimeoutError: If the broker does not acknowledge in time
+        """
+        self.connect_future = self.loop.create_future()
+        self.subscribe_future = self.loop.create_future()
+        logger.debug(f"Calling client.connect({self.host}, {self.port}, 60)")
+        self.client.connect(self.host, self.port, 60)
+
+        if not await asyncio.wait_for(self.connect_future, self.ack_timeout):
+            return False
+        logger.debug("CONNACK received, waiting for SUBACK")
+        return await asyncio.wait_for(self.subscribe_future, self.ack_timeout)
+
     async def wait_for_broker(self):
         """Wait for Mosquitto broker to be available"""
         logger.info(f"Waiting for Mosquitto broker at {self.host}:{self.port}...")
@@ -283,26 +944,14 @@ class MockMQTTServer:
 
         for attempt in range(1, self.max_retries + 1):
             try:
-                # Try to connect
                 logger.info(f"Connection attempt {attempt}/{self.max_retries}")
-                logger.debug(f"Calling client.connect({self.host}, {self.port}, 60)")
-                self.client.connect(self.host, self.port, 60)
-
-                # Start network loop in background
-                logger.debug("Starting MQTT network loop")
-                self.client.loop_start()
-
-                # Wait a bit for connection callback
-                logger.debug("Waiting 1 second for connection callback")
-                await asyncio.sleep(1)
-
-                if self.connected:
+                if await self.connect_once():
                     logger.info("Successfully connected to Mosquitto broker")
                     return True
                 else:
-                    logger.debug("Connection callback not received yet")
+                    logger.debug("Broker refused the connection or subscription")
 
-            except Exception as e:
+            except (OSError, asyncio.TimeoutError) as e:
                 logger.warning(f"Connection attempt {attempt} failed: {e}")
                 logger.debug(f"Exception type: {type(e).__name__}, details: {str(e)}")
 
@@ -315,39 +964,164 @@ class MockMQTTServer:
 
     async def start(self):
         """Start the MQTT client and connect to broker"""
+        self.loop = asyncio.get_running_loop()
+        self.stopping = False
         success = await self.wait_for_broker()
         if not success:
             raise ConnectionError(f"Could not connect to Mosquitto broker at {self.host}:{self.port}")
-        
+
+        self.running = True
         logger.info("MQTT client running and subscribed to config requests")
 
     def stop(self):
         """Stop the MQTT client"""
         logger.info("Stopping MQTT client...")
-        self.client.loop_stop()
+        self.stopping = True
+        self.running = False
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
         self.client.disconnect()
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+        for task in self.reply_tasks:
+            task.cancel()
+        if self.capture is not None:
+            self.capture.close()
 
 
 class MockHTTPServer:
     """HTTP server that mocks EdgeIQ API endpoints"""
 
-    def __init__(self, host='0.0.0.0', port=8080):
+    def __init__(self, host='0.0.0.0', port=8080, gzip_level=None, reuse_port=False, worker_metrics=None,
+                 sink=None, readiness=None, responder=None):
+        """
+        Args:
+            host: Listen address
+            port: Listen port
+            gzip_level: gzip level 1-9 used when the client sends Accept-Encoding: gzip,
+                        None disables Content-Encoding negotiation
+            reuse_port: Bind with SO_REUSEPORT so several worker processes share the port
+            worker_metrics: WorkerMetrics used to report all workers on /metrics
+            sink: UplinkSink reported on /sink
+            readiness: Readiness reported on /ready (default: ready once HTTP is up)
+            responder: MockMQTTServer publishing config push soaks (None without MQTT)
+        """
         self.host = host
         self.port = port
-        self.app = web.Application()
+        self.gzip_level = gzip_level
+        self.reuse_port = reuse_port
+        self.worker_metrics = worker_metrics
+        self.sink = sink
+        self.readiness = readiness or Readiness()
+        self.responder = responder
+        self.app = web.Application(middlewares=[self.metrics_middleware])
         self.app.router.add_get('/api/v1/platform/configs_v3/{company_id}/{device_unique_id}/app_config.zip', self.handle_config_download)
         self.app.router.add_get('/health', self.handle_health)
+        self.app.router.add_get('/ready', self.handle_ready)
+        self.app.router.add_get('/metrics', self.handle_metrics)
+        self.app.router.add_get('/sink', self.handle_sink)
+        self.app.router.add_delete('/sink', self.handle_sink_reset)
+        for path in ('/admin/impairment', '/admin/impairment/{company_id}',
+                     '/admin/impairment/{company_id}/{device_unique_id}'):
+            self.app.router.add_get(path, self.handle_impairment_get)
+            self.app.router.add_put(path, self.handle_impairment_put)
+            self.app.router.add_delete(path, self.handle_impairment_delete)
+        self.app.router.add_get('/admin/throttle', self.handle_throttle_get)
+        self.app.router.add_put('/admin/throttle', self.handle_throttle_put)
+        self.app.router.add_delete('/admin/throttle', self.handle_throttle_delete)
+        self.app.router.add_post('/admin/throttle/reset', self.handle_throttle_reset)
+        self.app.router.add_get('/admin/soak', self.handle_soak_get)
+        self.app.router.add_put('/admin/soak', self.handle_soak_put)
+        self.app.router.add_delete('/admin/soak', self.handle_soak_delete)
+        self.app.router.add_get('/admin/timeline', self.handle_timeline_get)
+        self.app.router.add_delete('/admin/timeline', self.handle_timeline_delete)
+        self.app.router.add_get('/admin/timeline/{company_id}/{device_unique_id}', self.handle_timeline_get)
+        self.app.router.add_delete('/admin/timeline/{company_id}/{device_unique_id}', self.handle_timeline_delete)
+
+    @web.middleware
+    async def metrics_middleware(self, request, handler):
+        """Record request count, latency and in-flight requests per route"""
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_LATENCY.observe(time.perf_counter() - started, route=route)
+            HTTP_REQUESTS.inc(route=route, method=request.method, status=status)
 
     async def handle_health(self, request):
         """Health check endpoint"""
         return web.json_response({'status': 'ok'})
 
+    async def handle_ready(self, request):
+        """
+        Readiness endpoint: 200 when the broker connection, config subscription and fixture
+        index are all up, 503 otherwise
+        GET /ready?wait=30s long-polls, answering as soon as everything is ready (or at the deadline)
+        """
+        try:
+            wait = parse_wait(request.query['wait']) if 'wait' in request.query else 0.0
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        ready = await self.readiness.wait(wait) if wait else self.readiness.ready
+        return web.json_response({'ready': ready, 'checks': dict(self.readiness.checks)},
+                                 status=200 if ready else 503)
+
+    async def handle_metrics(self, request):
+        """Prometheus text-format metrics endpoint"""
+        registry = self.worker_metrics.collect() if self.worker_metrics else METRICS
+        return web.Response(body=registry.render().encode('utf-8'),
+                            headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def handle_sink(self, request):
+        """
+        Uplink sink report
+        GET /sink?top=20&samples=1 - totals per topic class, heaviest devices, payload samples
+        GET /sink?device=<company_id>/<device_unique_id> - estimated counts for one device
+        """
+        if self.sink is None:
+            return web.json_response({'error': 'sink mode is disabled (set MQTT_SINK=1)'}, status=404)
+        device = request.query.get('device')
+        if device:
+            messages, size = self.sink.device_estimate(device)
+            return web.json_response({'device': device, 'messages_estimate': messages, 'bytes_estimate': size})
+        try:
+            top = int(request.query.get('top', '20'))
+        except ValueError:
+            return web.json_response({'error': 'top must be an integer'}, status=400)
+        samples = request.query.get('samples', '1') not in ('0', 'false', 'no')
+        return web.json_response(self.sink.report(top=top, samples=samples))
+
+    async def handle_sink_reset(self, request):
+        """Reset the uplink sink counters: DELETE /sink"""
+        if self.sink is None:
+            return web.json_response({'error': 'sink mode is disabled (set MQTT_SINK=1)'}, status=404)
+        self.sink.reset()
+        logger.info("Uplink sink counters reset")
+        return web.json_response({'status': 'reset'})
+
     async def handle_config_download(self, request):
         """
         Handle config download requests matching pattern:
         GET /api/v1/platform/configs_v3/{company_id}/{device_unique_id}/app_config.zip?token={auth_token}
 
-        Returns a zip file containing app_config.json at root level
+        Returns a zip file containing app_config.json at root level.
+        Optional query parameters override the archive settings for this request:
+        compression=stored|deflate and level=1-9. Section counts (devices=5000&rules=200, plus
+        an optional seed) serve a synthetic config of that size instead of the fixtures.
+
+        With md5=<JSON MD5 the device already has>, answers 304 when it is current, or a JSON
+        Patch from that version when one is known and smaller than the archive (see
+        delta_download); anything else falls back to the full archive.
         """
         company_id = request.match_info['company_id']
         device_unique_id = request.match_info['device_unique_id']
@@ -358,37 +1132,339 @@ class MockHTTPServer:
         logger.debug(f"Auth token (first 20 chars): {auth_token[:20] if auth_token else 'NONE'}...")
         logger.debug(f"Request headers: {dict(request.headers)}")
 
-        # Generate zip file and MD5 hashes
-        zip_data, json_md5_hash, zip_md5_hash = generate_app_config_zip(company_id, device_unique_id)
-
-        logger.info(f"Returning app_config.zip file: {len(zip_data)} bytes")
-        logger.debug(f"JSON MD5: {json_md5_hash}, Zip MD5: {zip_md5_hash}")
+        retry_after = THROTTLE.admit_download()
+        if retry_after is not None:
+            THROTTLE_ACTIONS.inc(action='http_429')
+            logger.info(f"Throttle: rejecting config download for {device_unique_id}, retry after {retry_after}s")
+            return web.json_response({'error': 'too many requests'}, status=429,
+                                     headers={'Retry-After': str(retry_after)})
 
+        # Generate zip file and MD5 hashes
+        try:
+            zip_data, json_md5_hash, zip_md5_hash = await generate_app_config_zip(
+                company_id, device_unique_id,
+                compression=request.query.get('compression'),
+                compresslevel=request.query.get('level'),
+                synthetic=SyntheticSpec.from_query(request.query)
+            )
+        except ValueError as e:
+            logger.warning(f"Rejecting config download with invalid archive or synthetic settings: {e}")
+            return web.json_response({'error': str(e)}, status=400)
+
+        content_type = 'application/zip'
         response_headers = {
             'Content-Disposition': 'attachment; filename="app_config.zip"',
-            'Content-Length': str(len(zip_data))
+            'X-Config-MD5': json_md5_hash
         }
+        body = zip_data
+        base_md5 = request.query.get('md5')
+        if base_md5 == json_md5_hash:
+            CONFIG_DELTAS.inc(result='not_modified')
+            logger.info(f"Device already has config {json_md5_hash}, returning 304")
+            return web.Response(status=304, headers={'X-Config-MD5': json_md5_hash})
+        delta = self.delta_download(base_md5, json_md5_hash, len(zip_data)) if base_md5 else None
+        if delta is not None:
+            content_type = DELTA_CONTENT_TYPE
+            body = delta
+            response_headers.update({
+                'Content-Disposition': 'attachment; filename="app_config.patch.json"',
+                'X-Config-Base-MD5': base_md5,
+                'X-Config-Delta': 'json-patch',
+                'X-Config-Serialization': DELTA_SERIALIZATION
+            })
+            logger.info(f"Returning app_config delta {base_md5} -> {json_md5_hash}: {len(delta)} bytes "
+                        f"instead of {len(zip_data)}")
+        else:
+            logger.info(f"Returning app_config.zip file: {len(zip_data)} bytes")
+        logger.debug(f"JSON MD5: {json_md5_hash}, Zip MD5: {zip_md5_hash}")
+
+        if self.gzip_level is not None:
+            response_headers['Vary'] = 'Accept-Encoding'
+            if accepts_gzip(request.headers.get('Accept-Encoding')):
+                encoded = gzip.compress(body, compresslevel=self.gzip_level)
+                response_headers['Content-Encoding'] = 'gzip'
+                logger.debug(f"gzip Content-Encoding applied: {len(body)} -> {len(encoded)} bytes")
+                body = encoded
+        response_headers['Content-Length'] = str(len(body))
         logger.debug(f"Response headers: {response_headers}")
 
+        profile = IMPAIRMENTS.resolve(company_id, device_unique_id, fixture_store())
+        if not profile.is_clean:
+            response = await self.send_impaired(request, profile, body, {**response_headers, 'Content-Type': content_type})
+            self.config_served(company_id, device_unique_id, json_md5_hash)
+            return response
+
+        self.config_served(company_id, device_unique_id, json_md5_hash)
         return web.Response(
-            body=zip_data,
-            content_type='application/zip',
+            body=body,
+            content_type=content_type,
             headers=response_headers
         )
 
+    @staticmethod
+    def config_served(company_id, device_unique_id, json_md5_hash):
+        """Record a served config on the device's timeline and match it to a soak push"""
+        TIMELINE.mark(company_id, device_unique_id, 'config_downloaded')
+        if PUSH_SOAK is not None and PUSH_SOAK.downloaded(company_id, device_unique_id, json_md5_hash):
+            CONFIG_PUSHES.inc(result='downloaded')
+
+    @staticmethod
+    def delta_download(base_md5, json_md5_hash, archive_size):
+        """
+        JSON Patch from the device's current config to the served one, if worth sending
+
+        Args:
+            base_md5: JSON MD5 the device reported having
+            json_md5_hash: JSON MD5 of the config being served
+            archive_size: Size of the full archive the delta competes with
+
+        Returns:
+            bytes or None: Patch body, or None to send the full archive
+        """
+        try:
+            delta = CONFIG_HISTORY.delta(base_md5, json_md5_hash)
+        except DeltaUnavailable as e:
+            CONFIG_DELTAS.inc(result=str(e))
+            logger.info(f"No delta from {base_md5} to {json_md5_hash} ({e}), sending full archive")
+            return None
+        if len(delta) >= archive_size:
+            CONFIG_DELTAS.inc(result='not_smaller')
+            logger.info(f"Delta from {base_md5} is {len(delta)} bytes, not smaller than the "
+                        f"{archive_size} byte archive, sending full archive")
+            return None
+        CONFIG_DELTAS.inc(result='delta')
+        CONFIG_DELTA_BYTES_SAVED.inc(archive_size - len(delta))
+        return delta
+
+    async def send_impaired(self, request, profile, body, headers):
+        """
+        Send a config download through an impairment profile
+
+        Waits latency +/- jitter before the response starts, paces the body in chunks at the
+        bandwidth cap, and may reset the connection part-way through the body.
+        """
+        rng = IMPAIRMENTS.rng
+        delay = profile.http_delay(rng)
+        if delay > 0:
+            IMPAIRMENT_ACTIONS.inc(action='http_delay')
+            logger.debug(f"Impairment: delaying response by {delay * 1000:.0f}ms")
+            await asyncio.sleep(delay)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/zip', **headers})
+        await response.prepare(request)
+
+        reset_at = profile.reset_offset(len(body), rng)
+        end = len(body) if reset_at is None else reset_at
+        rate = profile.bytes_per_second
+        if rate:
+            IMPAIRMENT_ACTIONS.inc(action='http_throttle')
+        started = time.monotonic()
+        offset = 0
+        while offset < end:
+            chunk = body[offset:min(offset + profile.chunk_size, end)]
+            await response.write(chunk)
+            offset += len(chunk)
+            if rate:
+                # Sleep until the wire time of everything sent so far has elapsed (no drift)
+                await asyncio.sleep(max(started + offset / rate - time.monotonic(), 0))
+
+        if reset_at is not None:
+            IMPAIRMENT_ACTIONS.inc(action='http_reset')
+            logger.info(f"Impairment: resetting connection after {reset_at}/{len(body)} bytes")
+            sock = request.transport.get_extra_info('socket') if request.transport else None
+            if sock is not None:
+                # Zero linger makes close() send RST instead of FIN
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            if request.transport is not None:
+                request.transport.abort()
+            return response
+
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def impairment_scope(request):
+        return request.match_info.get('company_id'), request.match_info.get('device_unique_id')
+
+    async def handle_impairment_get(self, request):
+        """
+        Show the impairment profile in effect for a scope
+        GET /admin/impairment[/{company_id}[/{device_unique_id}]]
+        """
+        company_id, device_unique_id = self.impairment_scope(request)
+        profile = IMPAIRMENTS.resolve(company_id, device_unique_id, fixture_store())
+        return web.json_response({
+            'company_id': company_id,
+            'device_unique_id': device_unique_id,
+            'override': (company_id, device_unique_id) in IMPAIRMENTS.overrides,
+            'profile': profile.to_dict(),
+        })
+
+    async def handle_impairment_put(self, request):
+        """
+        Set an impairment profile for every device, a company or one device
+        PUT /admin/impairment[/{company_id}[/{device_unique_id}]] with a profile object,
+        e.g. {"preset": "3g", "reset_probability": 0.05}, or a preset name as a JSON string
+        """
+        company_id, device_unique_id = self.impairment_scope(request)
+        try:
+            profile = ImpairmentProfile.from_json(await request.text())
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        IMPAIRMENTS.set(profile, company_id, device_unique_id)
+        logger.info(f"Impairment override set for company_id={company_id}, device_unique_id={device_unique_id}: {profile.to_dict()}")
+        return web.json_response({'profile': profile.to_dict()})
+
+    async def handle_impairment_delete(self, request):
+        """
+        Remove an impairment override
+        DELETE /admin/impairment[/{company_id}[/{device_unique_id}]]
+        """
+        company_id, device_unique_id = self.impairment_scope(request)
+        if not IMPAIRMENTS.clear(company_id, device_unique_id):
+            return web.json_response({'error': 'no override for this scope'}, status=404)
+        logger.info(f"Impairment override removed for company_id={company_id}, device_unique_id={device_unique_id}")
+        return web.json_response({'status': 'removed'})
+
+    @staticmethod
+    def throttle_conflict():
+        # Token buckets and the reply queue are per process: N workers would admit N times the rate
+        return web.json_response({'error': 'throttling needs a single HTTP worker'}, status=409)
+
+    async def handle_throttle_get(self, request):
+        """
+        Show the throttle policy and what it did since it was set (or reset)
+        GET /admin/throttle
+        """
+        return web.json_response(THROTTLE.report())
+
+    async def handle_throttle_put(self, request):
+        """
+        Set the throttle policy, restarting its statistics
+        PUT /admin/throttle with e.g. {"http_rate": 200, "retry_after": 2, "mqtt_rate": 500}
+        """
+        if self.worker_metrics is not None:
+            return self.throttle_conflict()
+        try:
+            policy = ThrottlePolicy.from_json(await request.text())
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        THROTTLE.configure(policy)
+        logger.info(f"Throttle policy set: {policy.to_dict()}")
+        return web.json_response(THROTTLE.report())
+
+    async def handle_throttle_delete(self, request):
+        """Turn throttling off: DELETE /admin/throttle"""
+        if self.worker_metrics is not None:
+            return self.throttle_conflict()
+        THROTTLE.configure(ThrottlePolicy())
+        logger.info("Throttle policy removed")
+        return web.json_response({'status': 'removed'})
+
+    async def handle_throttle_reset(self, request):
+        """Restart the throttle statistics, keeping the policy: POST /admin/throttle/reset"""
+        if self.worker_metrics is not None:
+            return self.throttle_conflict()
+        THROTTLE.reset_stats()
+        return web.json_response(THROTTLE.report())
+
+    async def handle_soak_get(self, request):
+        """Show the running (or last) config push soak: GET /admin/soak"""
+        if PUSH_SOAK is None:
+            return web.json_response({'error': 'no config push soak has run'}, status=404)
+        return web.json_response(PUSH_SOAK.report())
+
+    async def handle_soak_put(self, request):
+        """
+        Start a config push soak
+        PUT /admin/soak with e.g. {"company_id": "acme", "device_unique_id": "gw-1", "interval": 60,
+        "duration": 7200, "sizes": [{"devices": 10}, {"devices": 1000, "rules": 100}]}
+        """
+        global PUSH_SOAK
+        if self.responder is None or self.worker_metrics is not None:
+            # Pushes are published by this process and their downloads matched here
+            return web.json_response({'error': 'config push soaks need the MQTT responder and a single HTTP worker'},
+                                     status=409)
+        if PUSH_SOAK is not None and PUSH_SOAK.running:
+            return web.json_response({'error': 'a config push soak is already running'}, status=409)
+        try:
+            plan = PushPlan.from_json(await request.text())
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        PUSH_SOAK = PushSoak(plan, self.publish_push).start()
+        logger.info(f"Config push soak started: {plan.to_dict()}")
+        return web.json_response(PUSH_SOAK.report())
+
+    async def publish_push(self, plan, spec):
+        """Publish send_config_v3 for a soak push; returns (json_md5_hash, archive_size)"""
+        company_id, device_unique_id = plan.company_id, plan.device_unique_id
+        zip_data, json_md5_hash, _ = await synthetic_archive(spec, company_id, device_unique_id, *parse_archive_settings())
+        response = {
+            "command_type": "send_config_v3",
+            "payload": {
+                "url": config_download_url(company_id, device_unique_id),
+                "md5": json_md5_hash
+            }
+        }
+        self.responder.publish_reply(company_id, device_unique_id,
+                                     f"d/{company_id}/{device_unique_id}/gateway_commands/send_config_v3",
+                                     json.dumps(response))
+        CONFIG_PUSHES.inc(result='published')
+        return json_md5_hash, len(zip_data)
+
+    async def handle_soak_delete(self, request):
+        """Stop the config push soak and show its final report: DELETE /admin/soak"""
+        if PUSH_SOAK is None:
+            return web.json_response({'error': 'no config push soak has run'}, status=404)
+        PUSH_SOAK.stop()
+        logger.info("Config push soak stopped")
+        return web.json_response(PUSH_SOAK.report())
+
+    async def handle_timeline_get(self, request):
+        """
+        Show when config was requested, published and downloaded
+        GET /admin/timeline (every device) or /admin/timeline/{company_id}/{device_unique_id}, where
+        the latency between consecutive first occurrences is included
+        """
+        if 'company_id' not in request.match_info:
+            return web.json_response(TIMELINE.report())
+        company_id, device_unique_id = request.match_info['company_id'], request.match_info['device_unique_id']
+        events = TIMELINE.get(company_id, device_unique_id)
+        return web.json_response({'company_id': company_id, 'device_unique_id': device_unique_id,
+                                  'events': events, 'latency': breakdown(events)})
+
+    async def handle_timeline_delete(self, request):
+        """Forget timelines: DELETE /admin/timeline or /admin/timeline/{company_id}/{device_unique_id}"""
+        if 'company_id' not in request.match_info:
+            TIMELINE.clear()
+            logger.info("Timelines cleared")
+            return web.json_response({'status': 'cleared'})
+        company_id, device_unique_id = request.match_info['company_id'], request.match_info['device_unique_id']
+        # Clearing an unknown device is not an error: tests clear before the device first shows up
+        found = TIMELINE.clear(company_id, device_unique_id)
+        logger.info(f"Timeline cleared for company_id={company_id}, device_unique_id={device_unique_id}")
+        return web.json_response({'status': 'cleared' if found else 'empty'})
+
     async def start(self):
         """Start the HTTP server"""
         logger.info(f"Starting HTTP server on {self.host}:{self.port}")
         runner = web.AppRunner(self.app)
         await runner.setup()
-        site = web.TCPSite(runner, self.host, self.port)
+        site = web.TCPSite(runner, self.host, self.port, reuse_port=self.reuse_port or None)
         await site.start()
 
 
-async def main():
-    """Run both HTTP server and MQTT client"""
+async def main(worker_id=0, workers=1):
+    """
+    Run both HTTP server and MQTT client
+
+    Args:
+        worker_id: Index of this process when running several HTTP workers
+        workers: Total number of HTTP workers; only worker 0 runs the MQTT responder unless
+                 MQTT_SHARE_GROUP is set, in which case every worker joins the shared subscription
+    """
     logger.info("=" * 60)
-    logger.info("EdgeIQ Mock Server Starting")
+    logger.info("EdgeIQ Mock Server Starting" + (f" (worker {worker_id + 1}/{workers})" if workers > 1 else ""))
     logger.info("=" * 60)
 
     # Create responses directory if it doesn't exist
@@ -396,54 +1472,252 @@ async def main():
     logger.debug(f"Responses directory: {responses_dir}")
     responses_dir.mkdir(parents=True, exist_ok=True)
     logger.debug(f"Responses directory exists: {responses_dir.exists()}")
+    readiness = Readiness()
+    readiness.require('fixtures_loaded')
+    fixtures = fixture_store()
+    fixture_tracking = fixtures.watch()
+    readiness.set('fixtures_loaded', True)
 
     # Get configuration from environment
     mqtt_host = os.getenv('MQTT_HOST', 'localhost')
     mqtt_port = int(os.getenv('MQTT_PORT', '1883'))
+    mqtt_client_id = os.getenv('MQTT_CLIENT_ID')
+    if mqtt_client_id and workers > 1:
+        mqtt_client_id = f"{mqtt_client_id}-{worker_id}"
+    mqtt_share_group = os.getenv('MQTT_SHARE_GROUP') or None
+    embedded_broker = os.getenv('EMBEDDED_BROKER', '0') == '1'
+    mqtt_capture_path = os.getenv('MQTT_CAPTURE')
+    if mqtt_capture_path and mqtt_share_group and workers > 1:
+        mqtt_capture_path = capture_path_for_worker(mqtt_capture_path, worker_id)
     http_host = os.getenv('HTTP_HOST', '0.0.0.0')
     http_port = int(os.getenv('HTTP_PORT', '8080'))
+    http_gzip_level = int(os.getenv('HTTP_GZIP_LEVEL', '6')) if os.getenv('HTTP_GZIP', '0') == '1' else None
+    archive_compression, archive_compresslevel = parse_archive_settings()
+    impairment_seed = os.getenv('IMPAIRMENT_SEED')
+    IMPAIRMENTS.rng.seed(int(impairment_seed) + worker_id if impairment_seed else None)
+    if os.getenv('IMPAIRMENT_PROFILE'):
+        IMPAIRMENTS.default = ImpairmentProfile.from_json(os.getenv('IMPAIRMENT_PROFILE'))
+    if os.getenv('THROTTLE_PROFILE'):
+        THROTTLE.configure(ThrottlePolicy.from_json(os.getenv('THROTTLE_PROFILE')))
 
     logger.info("Configuration:")
-    logger.info(f"  MQTT: {mqtt_host}:{mqtt_port}")
+    logger.info(f"  MQTT: {mqtt_host}:{mqtt_port}" + (f" (share group {mqtt_share_group})" if mqtt_share_group else "")
+                + (" (embedded broker)" if embedded_broker else ""))
     logger.info(f"  HTTP: {http_host}:{http_port}")
-    logger.info(f"  Responses: {responses_dir}")
-
-    # Start MQTT client first (waits for Mosquitto to be available)
-    logger.info("Initializing MQTT client...")
-    mqtt_client = MockMQTTServer(host=mqtt_host, port=mqtt_port)
-    try:
-        logger.debug("Starting MQTT client connection process")
-        await mqtt_client.start()
-        logger.info("✓ MQTT client started successfully")
-    except ConnectionError as e:
-        logger.error(f"✗ Failed to start MQTT client: {e}")
-        logger.warning("Continuing without MQTT client...")
+    logger.info(f"  Responses: {responses_dir} ({len(fixtures)} fixture(s), tracked by {fixture_tracking})")
+    logger.info(f"  Archive: compression={archive_compression}, level={archive_compresslevel or 'default'}")
+    logger.info(f"  HTTP gzip: {'level ' + str(http_gzip_level) if http_gzip_level is not None else 'disabled'}")
+    logger.info(f"  Default impairment: {'none' if IMPAIRMENTS.default.is_clean else IMPAIRMENTS.default.to_dict()}")
+    logger.info(f"  Throttle: {'none' if THROTTLE.policy.is_clean else THROTTLE.policy.to_dict()}")
+
+    # Run the MQTT broker in worker 0 instead of connecting to Mosquitto; its metrics reach the
+    # other workers' /metrics through the worker snapshots
+    broker = None
+    if embedded_broker and worker_id == 0:
+        broker = Broker(os.getenv('EMBEDDED_BROKER_HOST', '0.0.0.0'), mqtt_port, registry=METRICS)
+        readiness.require('embedded_broker')
+        await broker.start()
+        readiness.set('embedded_broker', True)
+
+    # Create the MQTT client (connected below, once HTTP is up so /ready can report progress)
+    mqtt_client = None
+    sink = None
+    if worker_id == 0 or mqtt_share_group:
+        logger.info("Initializing MQTT client...")
+        if os.getenv('MQTT_SINK', '0') == '1':
+            sink = UplinkSink(
+                topic_pattern,
+                top_k=int(os.getenv('SINK_TOP_K', '100')),
+                reservoir_size=int(os.getenv('SINK_RESERVOIR_SIZE', '20')),
+                sample_bytes=int(os.getenv('SINK_SAMPLE_BYTES', '512')),
+            )
+            logger.info("Uplink sink enabled: counting all u/# traffic")
+        capture = None
+        if mqtt_capture_path:
+            capture = CaptureWriter(mqtt_capture_path, int(os.getenv('MQTT_CAPTURE_QUEUE', '10000'))).start()
+        mqtt_client = MockMQTTServer(host=mqtt_host, port=mqtt_port, client_id=mqtt_client_id,
+                                     share_group=mqtt_share_group, capture=capture, sink=sink,
+                                     readiness=readiness)
+
+    # Share metrics between forked workers
+    worker_metrics = None
+    if workers > 1:
+        worker_metrics = WorkerMetrics(mock_state_dir() / 'metrics', worker_id)
+        asyncio.create_task(worker_metrics.run())
+
+    # Without a share group the other workers report worker 0's MQTT state on /ready
+    if workers > 1 and not mqtt_share_group:
+        shared_readiness = SharedReadiness(mock_state_dir() / 'readiness', readiness)
+        if worker_id == 0:
+            readiness.listeners.append(shared_readiness.publish)
+            shared_readiness.publish()
+        else:
+            asyncio.create_task(shared_readiness.run())
 
     # Start HTTP server
     logger.info("Initializing HTTP server...")
-    http_server = MockHTTPServer(host=http_host, port=http_port)
+    http_server = MockHTTPServer(host=http_host, port=http_port, gzip_level=http_gzip_level,
+                                 reuse_port=workers > 1, worker_metrics=worker_metrics, sink=sink,
+                                 readiness=readiness, responder=mqtt_client)
     logger.debug("Starting HTTP server")
     await http_server.start()
     logger.info("✓ HTTP server started successfully")
 
+    # Connect the MQTT client (waits for Mosquitto to be available)
+    if mqtt_client is not None:
+        try:
+            logger.debug("Starting MQTT client connection process")
+            await mqtt_client.start()
+            logger.info("✓ MQTT client started successfully")
+        except ConnectionError as e:
+            logger.error(f"✗ Failed to start MQTT client: {e}")
+            logger.warning("Continuing without MQTT client (/ready will report not ready)...")
+
     logger.info("=" * 60)
     logger.info("Mock server ready to accept connections")
     logger.info(f"  Health check: http://{http_host}:{http_port}/health")
+    logger.info(f"  Readiness: http://{http_host}:{http_port}/ready?wait=30s")
+    logger.info(f"  Metrics: http://{http_host}:{http_port}/metrics")
+    if sink is not None:
+        logger.info(f"  Uplink sink: http://{http_host}:{http_port}/sink")
     logger.info(f"  Config API: http://{http_host}:{http_port}/api/v1/platform/configs_v3/{{company_id}}/{{device_id}}/app_config.zip")
-    logger.info(f"  MQTT broker: mqtt://{mqtt_host}:{mqtt_port}")
-    logger.info(f"  MQTT subscribed to: u/+/+/config")
+    if mqtt_client is not None:
+        logger.info(f"  MQTT broker: mqtt://{mqtt_host}:{mqtt_port}")
+        logger.info(f"  MQTT subscribed to: {mqtt_client.subscription}")
     logger.info("=" * 60)
 
-    # Keep running
-    try:
-        logger.debug("Entering main event loop")
-        await asyncio.Event().wait()
-    except KeyboardInterrupt:
-        logger.info("Shutting down mock server")
+    # Keep running until SIGTERM/SIGINT, then shut down cleanly (closes the MQTT capture)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_event.set)
+    logger.debug("Entering main event loop")
+    await stop_event.wait()
+
+    logger.info("Shutting down mock server")
+    if mqtt_client is not None:
         logger.debug("Stopping MQTT client")
         mqtt_client.stop()
-        logger.info("Mock server stopped")
+    if broker is not None:
+        await broker.stop()
+    fixtures.close()
+    logger.info("Mock server stopped")
 
 
-if __name__ == '__main__':
+def capture_path_for_worker(path, worker_id):
+    """Per-worker capture file: traffic.jsonl.gz -> traffic-1.jsonl.gz"""
+    path = Path(path)
+    name = path.name
+    for suffix in ('.jsonl.gz', '.jsonl'):
+        if name.endswith(suffix):
+            return path.with_name(f"{name[:-len(suffix)]}-{worker_id}{suffix}")
+    return path.with_name(f"{name}-{worker_id}")
+
+
+def mock_state_dir():
+    """Directory for state shared between worker processes (MOCK_STATE_DIR)"""
+    return Path(os.getenv('MOCK_STATE_DIR', '/tmp/edgeiq-mock-server'))
+
+
+def run_workers(workers):
+    """
+    Fork HTTP worker processes sharing the listen port via SO_REUSEPORT and supervise them
+
+    Workers share content-addressed archive and config history stores, device timelines and
+    impairment overrides on disk and publish metric snapshots that any of them merges on
+    /metrics. Without a share group, the other workers mirror worker 0's MQTT readiness. Throttling stays per process and is refused. If a worker exits, the others are
+    stopped.
+
+    Returns:
+        int: Exit code
+    """
+    if os.getenv('THROTTLE_PROFILE'):
+        logger.error("THROTTLE_PROFILE needs a single HTTP worker (each worker would admit the full rate)")
+        return 2
+    state_dir = mock_state_dir()
+    metrics_dir = state_dir / 'metrics'
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    for stale in metrics_dir.glob('worker-*'):
+        stale.unlink(missing_ok=True)
+    SharedReadiness(state_dir / 'readiness').clear()
+    os.environ.setdefault('ARCHIVE_CACHE_DIR', str(state_dir / 'archives'))
+    os.environ.setdefault('CONFIG_HISTORY_DIR', str(state_dir / 'configs'))
+    os.environ.setdefault('TIMELINE_DIR', str(state_dir / 'timeline'))
+    os.environ.setdefault('IMPAIRMENT_DIR', str(state_dir / 'impairment'))
+    DeviceTimeline(directory=os.environ['TIMELINE_DIR']).clear()
+    Impairments(directory=os.environ['IMPAIRMENT_DIR']).reset()
+
+    logger.info(f"Starting {workers} HTTP workers (archive cache: {os.environ['ARCHIVE_CACHE_DIR']})")
+    children = {}
+    for worker_id in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                for handler in logging.getLogger().handlers:
+                    handler.setFormatter(logging.Formatter(
+                        f'%(asctime)s - worker-{worker_id} - %(name)s - %(levelname)s - %(message)s'))
+                global ARCHIVE_CACHE, CONFIG_HISTORY, IMPAIRMENTS, TIMELINE
+                ARCHIVE_CACHE = ArchiveCache(int(os.getenv('ARCHIVE_CACHE_SIZE', '256')), os.environ['ARCHIVE_CACHE_DIR'])
+                CONFIG_HISTORY = ConfigHistory(int(os.getenv('CONFIG_HISTORY_VERSIONS', '8')),
+                                               directory=os.environ['CONFIG_HISTORY_DIR'])
+                TIMELINE = DeviceTimeline(int(os.getenv('TIMELINE_MAX_DEVICES', '10000')),
+                                          directory=os.environ['TIMELINE_DIR'])
+                IMPAIRMENTS = Impairments(directory=os.environ['IMPAIRMENT_DIR'])
+                asyncio.run(main(worker_id=worker_id, workers=workers))
+            except KeyboardInterrupt:
+                pass
+            except Exception:
+                logger.exception(f"Worker {worker_id} crashed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children[pid] = worker_id
+        logger.debug(f"Forked worker {worker_id} with pid {pid}")
+
+    stopping = False
+
+    def stop_children(signum, frame):
+        nonlocal stopping
+        stopping = True
+        logger.info(f"Received signal {signum}, stopping workers")
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop_children)
+    signal.signal(signal.SIGINT, stop_children)
+
+    exit_code = 0
+    while children:
+        pid, status = os.wait()
+        worker_id = children.pop(pid, None)
+        if worker_id is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if stopping:
+            logger.info(f"Worker {worker_id} (pid {pid}) stopped")
+            continue
+        logger.error(f"Worker {worker_id} (pid {pid}) exited unexpectedly with code {code}")
+        exit_code = 1
+        stop_children(signal.SIGTERM, None)
+    return exit_code
+
+
+def run(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='EdgeIQ mock API server')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('HTTP_WORKERS', '1')),
+                        help='number of HTTP worker processes sharing the port via SO_REUSEPORT')
+    args = parser.parse_args(argv)
+
+    if args.workers > 1:
+        return run_workers(args.workers)
     asyncio.run(main())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,251 @@
+"""
+Fixed-memory accounting of uplink MQTT traffic for the mock server's sink mode
+Counts messages and bytes per topic class exactly, per device approximately (Space-Saving top-K
+plus a Count-Min sketch), and keeps a reservoir sample of payloads per topic class. Memory does
+not grow with the number of devices or messages.
+"""
+
+import hashlib
+import heapq
+import math
+import random
+import time
+
+OVERFLOW_CLASS = 'other'
+
+
+class CountMinSketch:
+    """
+    Count-Min sketch: point estimates that never undercount, in width x depth counters
+
+    The overestimate is at most 2/width of the total with probability 1 - 0.5^depth.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+
+    def indexes(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8', errors='surrogateescape'), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * row:4 * row + 4], 'little') % self.width for row in range(self.depth)]
+
+    def add(self, key, amount=1, indexes=None):
+        """Add to a key's counters (indexes may be passed in when already computed)"""
+        for row, index in zip(self.rows, indexes or self.indexes(key)):
+            row[index] += amount
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self.rows, self.indexes(key)))
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters: the k most frequent keys with bounded overcount
+
+    Each monitored key carries (count, error); its true count lies in [count - error, count].
+    A min-heap holds one (count, key) entry per monitored key. Increments leave entries stale
+    (too low), so they are refreshed lazily while looking for the eviction victim.
+    """
+
+    def __init__(self, k=100):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+        self.heap = []
+
+    def add(self, key, amount=1):
+        counts = self.counts
+        if key in counts:
+            counts[key] += amount
+            return
+        if len(counts) < self.k:
+            counts[key] = amount
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (amount, key))
+            return
+        # Replace the least frequent key; the newcomer inherits its count as error
+        heap = self.heap
+        while True:
+            floor, victim = heap[0]
+            current = counts[victim]
+            if current == floor:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        heapq.heapreplace(heap, (floor + amount, key))
+        del counts[victim]
+        del self.errors[victim]
+        counts[key] = floor + amount
+        self.errors[key] = floor
+
+    def top(self, n=None):
+        """[(key, count, error)] most frequent first"""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return [(key, count, self.errors[key]) for key, count in ranked[:n]]
+
+
+class Reservoir:
+    """
+    Uniform random sample of at most `size` items from a stream (Algorithm L)
+
+    Instead of drawing a random number per item, the number of items to skip before the next
+    replacement is drawn, so most items cost one integer comparison.
+    """
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.rng = rng
+        self.seen = 0
+        self.items = []
+        self.weight = 1.0
+        self.next_replacement = size
+
+    def _draw_next(self):
+        self.weight *= math.exp(math.log(1.0 - self.rng.random()) / self.size)
+        skip = math.floor(math.log(1.0 - self.rng.random()) / math.log(1.0 - self.weight)) if self.weight < 1.0 else 0
+        self.next_replacement = self.seen + skip
+
+    def slot(self):
+        """
+        Count one stream item and decide whether it enters the sample
+
+        Returns:
+            Index to store the item at, or None to discard it
+        """
+        position = self.seen
+        self.seen += 1
+        if position < self.size:
+            if self.seen == self.size:
+                self._draw_next()
+            return position
+        if position < self.next_replacement or self.size == 0:
+            return None
+        self._draw_next()
+        return self.rng.randrange(self.size)
+
+    def put(self, index, item):
+        """Store an item at an index returned by slot()"""
+        if index < len(self.items):
+            self.items[index] = item
+        else:
+            self.items.append(item)
+
+    def add(self, item):
+        index = self.slot()
+        if index is not None:
+            self.put(index, item)
+
+
+class TopicClass:
+    """Exact totals and a payload sample for one topic class (e.g. u/+/+/report)"""
+
+    def __init__(self, reservoir_size, rng):
+        self.messages = 0
+        self.bytes = 0
+        self.samples = Reservoir(reservoir_size, rng)
+
+
+class UplinkSink:
+    """
+    Accounting for uplink traffic the responder does not answer
+
+    Args:
+        classify: Function mapping a topic to its topic class
+        max_classes: Topic classes tracked individually; later ones are folded into 'other'
+        top_k: Devices tracked by the heavy-hitter summary
+        reservoir_size: Payload samples kept per topic class
+        sample_bytes: Payload bytes kept per sample
+        sketch_width: Count-Min sketch width (depth is fixed at 4)
+        seed: Seed for reservoir sampling
+    """
+
+    def __init__(self, classify, max_classes=64, top_k=100, reservoir_size=20, sample_bytes=512,
+                 sketch_width=4096, seed=None):
+        self.classify = classify
+        self.max_classes = max_classes
+        self.top_k = top_k
+        self.reservoir_size = reservoir_size
+        self.sample_bytes = sample_bytes
+        self.sketch_width = sketch_width
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        self.started = time.time()
+        self.messages = 0
+        self.bytes = 0
+        self.classes = {}
+        self.device_messages = SpaceSaving(self.top_k)
+        self.device_message_sketch = CountMinSketch(self.sketch_width)
+        self.device_byte_sketch = CountMinSketch(self.sketch_width)
+
+    def record(self, topic, payload, timestamp=None):
+        """Account one message; cost is independent of how many devices/messages were seen"""
+        size = len(payload)
+        self.messages += 1
+        self.bytes += size
+
+        topic_class = self.classify(topic)
+        stats = self.classes.get(topic_class)
+        if stats is None:
+            if len(self.classes) >= self.max_classes:
+                topic_class = OVERFLOW_CLASS
+                stats = self.classes.get(topic_class)
+            if stats is None:
+                stats = self.classes[topic_class] = TopicClass(self.reservoir_size, self.rng)
+        stats.messages += 1
+        stats.bytes += size
+        # Only build the sample tuple for the few messages that enter the reservoir
+        index = stats.samples.slot()
+        if index is not None:
+            stats.samples.put(index, (timestamp or time.time(), topic, bytes(payload[:self.sample_bytes]), size))
+
+        parts = topic.split('/', 3)
+        if len(parts) >= 3:
+            device = f"{parts[1]}/{parts[2]}"
+            indexes = self.device_message_sketch.indexes(device)
+            self.device_messages.add(device)
+            self.device_message_sketch.add(device, 1, indexes)
+            self.device_byte_sketch.add(device, size, indexes)
+
+    def device_estimate(self, device):
+        """Estimated (messages, bytes) for 'company_id/device_unique_id' (never undercounts)"""
+        return self.device_message_sketch.estimate(device), self.device_byte_sketch.estimate(device)
+
+    def report(self, top=20, samples=True):
+        """
+        JSON friendly summary
+
+        Args:
+            top: Number of heaviest devices to list
+            samples: Include payload samples (decoded as UTF-8 with replacement)
+        """
+        elapsed = max(time.time() - self.started, 1e-9)
+        classes = {}
+        for topic_class, stats in sorted(self.classes.items(), key=lambda item: item[1].messages, reverse=True):
+            entry = {'messages': stats.messages, 'bytes': stats.bytes}
+            if samples:
+                entry['samples'] = [
+                    {'t': round(t, 3), 'topic': topic, 'bytes': size,
+                     'payload': payload.decode('utf-8', errors='replace')}
+                    for t, topic, payload, size in stats.samples.items
+                ]
+            classes[topic_class] = entry
+        devices = []
+        for device, count, error in self.device_messages.top(top):
+            devices.append({
+                'device': device,
+                'messages': count,
+                'messages_error': error,
+                'bytes_estimate': self.device_byte_sketch.estimate(device),
+            })
+        return {
+            'since': round(self.started, 3),
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'messages_per_s': round(self.messages / elapsed, 2),
+            'bytes_per_s': round(self.bytes / elapsed, 2),
+            'classes': classes,
+            'top_devices': devices,
+        }
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Thundering-herd reconnect storm for the EdgeIQ mock server
+Models a broker failover: every simulated device holds its own MQTT connection, all of them
+drop at once, then each one reconnects at a random point within --window seconds, requests
+its config and downloads app_config.zip the way an agent would, backing off on HTTP 429
+(honouring Retry-After) and re-requesting when no send_config_v3 arrives.
+
+Reports time-to-drain, peak number of devices waiting for their config and latency
+distributions per phase; with --admin-url it also sets the mock's throttle policy and reports
+the server-side reply queue (see throttle.py).
+"""
+
+import argparse
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import aiohttp
+import paho.mqtt.client as mqtt
+
+from loadgen import summarize_latencies
+
+# Configure logging
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(
+    level=getattr(logging, log_level, logging.INFO),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('storm')
+
+
+def parse_retry_after(value, now=None):
+    """
+    Seconds to wait according to a Retry-After header (delay-seconds or HTTP-date)
+
+    Returns:
+        float or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(date.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+def backoff_delay(attempt, base, maximum, jitter, rng):
+    """
+    Exponential backoff with jitter: base * 2^(attempt - 1), capped, then scaled by 1 +/- jitter
+
+    Args:
+        attempt: Number of the attempt that just failed, starting at 1
+        base: Delay after the first failure in seconds
+        maximum: Upper bound before jitter
+        jitter: Fraction of random spread, e.g. 0.2 for +/- 20%
+        rng: random.Random
+    """
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return delay * rng.uniform(1 - jitter, 1 + jitter)
+
+
+class MQTTDriver:
+    """Drives many paho clients from one asyncio event loop (no network thread per client)"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.clients = set()
+        self.task = None
+
+    def attach(self, client):
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+        self.clients.add(client)
+        if self.task is None:
+            self.task = self.loop.create_task(self.misc_loop())
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        """Keepalive and retry timers of every client"""
+        while True:
+            for client in list(self.clients):
+                client.loop_misc()
+            await asyncio.sleep(1)
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+
+class StormDevice:
+    """One simulated agent with its own MQTT connection"""
+
+    def __init__(self, device_id, company_id, host, port, driver):
+        self.device_id = device_id
+        self.host = host
+        self.port = port
+        self.loop = driver.loop
+        self.command_topic = f"d/{company_id}/{device_id}/gateway_commands/send_config_v3"
+        self.config_topic = f"u/{company_id}/{device_id}/config"
+        self.connected = None
+        self.subscribed = None
+        self.disconnected = None
+        self.subscribe_mid = None
+        self.command = None
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=device_id)
+        self.client.on_connect = self.on_connect
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+        self.client.max_inflight_messages_set(0)
+        self.client.max_queued_messages_set(0)
+        driver.attach(self.client)
+
+    @staticmethod
+    def _resolve(future, value):
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code != 0:
+            self._resolve(self.connected, False)
+            return
+        _, self.subscribe_mid = client.subscribe(self.command_topic, qos=1)
+        self._resolve(self.connected, True)
+
+    def on_subscribe(self, client, userdata, mid, reason_code_list, properties):
+        if mid == self.subscribe_mid:
+            self._resolve(self.subscribed, not any(code.is_failure for code in reason_code_list))
+
+    def on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self._resolve(self.connected, False)
+        self._resolve(self.subscribed, False)
+        self._resolve(self.disconnected, True)
+
+    def on_message(self, client, userdata, msg):
+        self._resolve(self.command, msg.payload)
+
+    async def connect(self, timeout):
+        """
+        Connect and subscribe to the command topic
+
+        Raises:
+            OSError: TCP connection failed
+            ConnectionError: Broker refused the connection or subscription
+            asyncio.TimeoutError: No CONNACK/SUBACK within timeout
+        """
+        self.connected = self.loop.create_future()
+        self.subscribed = self.loop.create_future()
+        self.disconnected = self.loop.create_future()
+        self.client.connect(self.host, self.port, 60)
+        try:
+            if not await asyncio.wait_for(self.connected, timeout):
+                raise ConnectionError(f"{self.device_id}: broker refused the connection")
+            if not await asyncio.wait_for(self.subscribed, timeout):
+                raise ConnectionError(f"{self.device_id}: broker refused the subscription")
+        except BaseException:
+            self.client.disconnect()
+            raise
+
+    async def disconnect(self, timeout):
+        """Drop the connection and wait until the socket is closed"""
+        self.client.disconnect()
+        if self.disconnected is not None:
+            try:
+                await asyncio.wait_for(self.disconnected, timeout)
+            except asyncio.TimeoutError:
+                logger.debug(f"{self.device_id}: no disconnect confirmation")
+
+    def request_config(self):
+        """Publish a config v3 request; the reply resolves self.command"""
+        self.command = self.loop.create_future()
+        self.client.publish(self.config_topic, json.dumps({'config_version': 3, 'requested': True}), qos=1)
+        return self.command
+
+
+class ReconnectStorm:
+    """Disconnects a fleet at once and measures how it drains back to having its config"""
+
+    def __init__(self, devices=1000, window=10.0, company_id='storm-company', device_prefix='storm-device',
+                 mqtt_host='localhost', mqtt_port=1883, timeout=30.0, command_timeout=10.0, max_attempts=8,
+                 backoff_base=1.0, backoff_max=30.0, jitter=0.2, http_concurrency=500,
+                 connect_concurrency=200, admin_url=None, throttle=None, seed=None):
+        self.num_devices = devices
+        self.window = window
+        self.company_id = company_id
+        self.device_ids = [f"{device_prefix}-{i:06d}" for i in range(devices)]
+        self.mqtt_host = mqtt_host
+        self.mqtt_port = mqtt_port
+        self.timeout = timeout
+        self.command_timeout = command_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.http_concurrency = http_concurrency
+        self.connect_concurrency = connect_concurrency
+        self.admin_url = admin_url.rstrip('/') if admin_url else None
+        self.throttle = throttle
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        self.devices = []
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.retries = {'connect': 0, 'command_timeout': 0, 'http_429': 0, 'download': 0}
+        self.errors = {}
+        self.reconnect_latencies = []
+        self.command_latencies = []
+        self.download_latencies = []
+        self.completion_times = []
+
+    def record_error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def backoff(self, attempt):
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, self.jitter, self.rng)
+
+    async def admin(self, session, method, path, body=None):
+        """Call the mock server's throttle admin API, returning its JSON (None on failure)"""
+        try:
+            async with session.request(method, f"{self.admin_url}{path}", data=body) as response:
+                if response.status == 200:
+                    return await response.json()
+                logger.warning(f"✗ {method} {path} returned HTTP {response.status}: {await response.text()}")
+        except aiohttp.ClientError as e:
+            logger.warning(f"✗ {method} {path} failed: {e}")
+        return None
+
+    async def establish(self):
+        """Connect the whole fleet (the steady state before the failover)"""
+        driver = MQTTDriver(asyncio.get_running_loop())
+        self.driver = driver
+        self.devices = [StormDevice(device_id, self.company_id, self.mqtt_host, self.mqtt_port, driver)
+                        for device_id in self.device_ids]
+        limit = asyncio.Semaphore(self.connect_concurrency)
+
+        async def connect(device):
+            async with limit:
+                await device.connect(self.timeout)
+
+        logger.info(f"Connecting {self.num_devices} devices to {self.mqtt_host}:{self.mqtt_port}")
+        await asyncio.gather(*(connect(device) for device in self.devices))
+        logger.info("✓ Fleet connected")
+
+    async def recover(self, session, device, offset, storm_started):
+        """One device's way back: reconnect, request the config, download it"""
+        await asyncio.sleep(offset)
+        started = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await device.connect(self.timeout)
+                break
+            except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+                logger.debug(f"{device.device_id}: reconnect attempt {attempt} failed: {e}")
+                if attempt == self.max_attempts:
+                    self.record_error('reconnect_failed')
+                    return
+                self.retries['connect'] += 1
+                await asyncio.sleep(self.backoff(attempt))
+        connected = time.monotonic()
+        self.reconnect_latencies.append(connected - started)
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self.fetch_config(session, device, connected, storm_started)
+        finally:
+            self.waiting -= 1
+
+    async def fetch_config(self, session, device, connected, storm_started):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                payload = await asyncio.wait_for(device.request_config(), self.command_timeout)
+                break
+            except asyncio.TimeoutError:
+                if attempt == self.max_attempts:
+                    self.record_error('command_timeout')
+                    return
+                self.retries['command_timeout'] += 1
+                await asyncio.sleep(self.backoff(attempt))
+        commanded = time.monotonic()
+        self.command_latencies.append(commanded - connected)
+
+        try:
+            url = json.loads(payload)['payload']['url']
+        except (ValueError, KeyError, TypeError):
+            self.record_error('invalid_command')
+            return
+
+        for attempt in range(1, self.max_attempts + 1):
+            retry_in = None
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status == 200:
+                        break
+                    if response.status not in (429, 503):
+                        self.record_error(f"http_{response.status}")
+                        return
+                    self.retries['http_429'] += 1
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after is not None:
+                        # Spread the retries instead of returning in lock step
+                        retry_in = retry_after * self.rng.uniform(1, 1 + self.jitter)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"{device.device_id}: download attempt {attempt} failed: {e}")
+                self.retries['download'] += 1
+            if attempt == self.max_attempts:
+                self.record_error('download_gave_up')
+                return
+            await asyncio.sleep(retry_in if retry_in is not None else self.backoff(attempt))
+        finished = time.monotonic()
+        self.download_latencies.append(finished - commanded)
+        self.completion_times.append(finished - storm_started)
+        self.completed += 1
+
+    async def run(self):
+        """Connect the fleet, run the storm and return the JSON report"""
+        await self.establish()
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.http_concurrency)
+        server = None
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            if self.admin_url:
+                if self.throttle is not None:
+                    await self.admin(session, 'PUT', '/admin/throttle', json.dumps(self.throttle))
+                else:
+                    await self.admin(session, 'POST', '/admin/throttle/reset')
+
+            logger.info(f"Dropping {self.num_devices} connections, reconnecting over {self.window}s")
+            storm_started = time.monotonic()
+            await asyncio.gather(*(device.disconnect(self.timeout) for device in self.devices))
+            offsets = [self.rng.uniform(0, self.window) for _ in self.devices]
+            await asyncio.gather(*(self.recover(session, device, offset, storm_started)
+                                   for device, offset in zip(self.devices, offsets)))
+            elapsed = time.monotonic() - storm_started
+            logger.info(f"✓ Storm drained: {self.completed}/{self.num_devices} devices have their config")
+
+            if self.admin_url:
+                server = await self.admin(session, 'GET', '/admin/throttle')
+
+        for device in self.devices:
+            device.client.disconnect()
+        self.driver.stop()
+        return self.report(elapsed, server)
+
+    def report(self, elapsed, server=None):
+        """Build the JSON report"""
+        time_to_drain = max(self.completion_times) if self.completion_times else None
+        per_second = [0] * (int(time_to_drain) + 1 if time_to_drain is not None else 0)
+        for completed_at in self.completion_times:
+            per_second[int(completed_at)] += 1
+        return {
+            'config': {
+                'devices': self.num_devices,
+                'window_s': self.window,
+                'command_timeout_s': self.command_timeout,
+                'max_attempts': self.max_attempts,
+                'backoff_base_s': self.backoff_base,
+                'jitter': self.jitter,
+                'throttle': self.throttle,
+                'mqtt': f"{self.mqtt_host}:{self.mqtt_port}",
+                'seed': self.seed,
+            },
+            'elapsed_s': round(elapsed, 3),
+            'devices': {
+                'completed': self.completed,
+                'failed': self.num_devices - self.completed,
+            },
+            'time_to_drain_s': round(time_to_drain, 3) if time_to_drain is not None else None,
+            'drain_after_window_s': round(max(time_to_drain - self.window, 0.0), 3) if time_to_drain is not None else None,
+            'peak_waiting_devices': self.peak_waiting,
+            'retries': dict(self.retries),
+            'errors': dict(sorted(self.errors.items())),
+            'latency_ms': {
+                'reconnect': summarize_latencies(self.reconnect_latencies),
+                'command': summarize_latencies(self.command_latencies),
+                'download': summarize_latencies(self.download_latencies),
+                'time_to_config': summarize_latencies(self.completion_times),
+            },
+            'completions_per_second': per_second,
+            'server': server,
+        }
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Reconnect storm against the EdgeIQ mock server')
+    parser.add_argument('--devices', type=int, default=1000, help='number of simulated devices (one MQTT connection each)')
+    parser.add_argument('--window', type=float, default=10.0, help='devices reconnect uniformly within this many seconds')
+    parser.add_argument('--company-id', default='storm-company')
+    parser.add_argument('--device-prefix', default='storm-device')
+    parser.add_argument('--mqtt-host', default=os.getenv('MQTT_HOST', 'localhost'))
+    parser.add_argument('--mqtt-port', type=int, default=int(os.getenv('MQTT_PORT', '1883')))
+    parser.add_argument('--timeout', type=float, default=30.0, help='connect and download timeout in seconds')
+    parser.add_argument('--command-timeout', type=float, default=10.0,
+                        help='re-request the config when no send_config_v3 arrives within this many seconds')
+    parser.add_argument('--max-attempts', type=int, default=8, help='attempts per phase before a device gives up')
+    parser.add_argument('--backoff', type=float, default=1.0, help='first retry delay in seconds (doubles per attempt)')
+    parser.add_argument('--backoff-max', type=float, default=30.0, help='retry delay cap in seconds')
+    parser.add_argument('--jitter', type=float, default=0.2, help='random spread of retry delays (0.2 = +/- 20%%)')
+    parser.add_argument('--http-concurrency', type=int, default=500, help='max concurrent zip downloads')
+    parser.add_argument('--connect-concurrency', type=int, default=200,
+                        help='max concurrent connection attempts while establishing the fleet')
+    parser.add_argument('--admin-url', default=None,
+                        help='mock server base URL (e.g. http://localhost:8080) for throttle setup and stats')
+    parser.add_argument('--throttle', default=None,
+                        help='throttle policy JSON to install via --admin-url, e.g. \'{"http_rate": 100}\'')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reconnect offsets and jitter')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    parser.add_argument('--max-failures', type=int, default=None,
+                        help='exit non-zero when more devices than this end without their config')
+    args = parser.parse_args(argv)
+    if args.throttle is not None:
+        if not args.admin_url:
+            parser.error('--throttle requires --admin-url')
+        try:
+            args.throttle = json.loads(args.throttle)
+        except json.JSONDecodeError as e:
+            parser.error(f"--throttle is not valid JSON: {e}")
+    return args
+
+
+def main(argv=None):
+    """Run the reconnect storm from the command line"""
+    args = parse_args(argv)
+    storm = ReconnectStorm(
+        devices=args.devices,
+        window=args.window,
+        company_id=args.company_id,
+        device_prefix=args.device_prefix,
+        mqtt_host=args.mqtt_host,
+        mqtt_port=args.mqtt_port,
+        timeout=args.timeout,
+        command_timeout=args.command_timeout,
+        max_attempts=args.max_attempts,
+        backoff_base=args.backoff,
+        backoff_max=args.backoff_max,
+        jitter=args.jitter,
+        http_concurrency=args.http_concurrency,
+        connect_concurrency=args.connect_concurrency,
+        admin_url=args.admin_url,
+        throttle=args.throttle,
+        seed=args.seed,
+    )
+    report = asyncio.run(storm.run())
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+        logger.info(f"Report written to {args.output}")
+    else:
+        print(report_json)
+
+    if args.max_failures is not None and report['devices']['failed'] > args.max_failures:
+        logger.error(f"{report['devices']['failed']} devices failed, more than --max-failures {args.max_failures}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+Deterministic synthetic app_config generator for agent parser scaling tests
+Fills the default app_config's arrays (devices, ingestors, rules, ...) with a chosen number of
+realistically sized entries. Every entry is derived from (seed, section, index) alone, so
+the same spec always gives the same bytes (and MD5), cross references between sections are
+consistent, and changing one count leaves the entries of the other sections unchanged.
+
+The document is streamed: entries are serialized one at a time into the zip member, so a
+config with a million devices never exists in memory as a whole. The output is identical to
+json.dumps(document, indent=2) of the full document.
+
+A spec is a JSON object (synthetic.json fixture) or the equivalent query parameters:
+    {"seed": 7, "devices": 5000, "ingestors": 50, "rules": 200}
+"""
+
+import hashlib
+import json
+import random
+import zipfile
+from io import BytesIO
+
+from app_config_template import build_default_app_config
+
+# Array sections of app_config that can be filled, in document order
+SECTIONS = ('device_types', 'devices', 'connections', 'ingestors', 'translators', 'commands', 'integrations',
+            'rules')
+MAX_ENTRIES = 2_000_000
+# Above this many entries the archive member may exceed 2 GiB and needs ZIP64 headers
+ZIP64_ENTRIES = 500_000
+CHUNK_SIZE = 64 * 1024
+
+LISTENER_TYPES = ('http_server', 'tcp_modbus', 'snmp_polling', 'opcua', 'dbus_signal', 'file_tail')
+HANDLER_TYPES = ('passthrough', 'fixed', 'delimited', 'router')
+LOG_LEVELS = ('error', 'warn', 'info', 'debug')
+PROPERTIES = ('temperature', 'humidity', 'pressure', 'voltage', 'current', 'rssi', 'battery', 'flow_rate')
+COMPARATORS = ('greater_than', 'less_than', 'equal', 'not_equal', 'greater_than_equal')
+ACTION_TYPES = ('mqtt', 'http_request', 'email', 'sms', 'relay', 'send_config')
+TIMESTAMP = '2023-04-04T00:52:28.001016Z'
+
+
+def object_id(seed, section, index):
+    """24 hex digit ID (like a Mongo ObjectId) for an entry, stable across specs"""
+    return hashlib.blake2b(f"{seed}:{section}:{index}".encode(), digest_size=12).hexdigest()
+
+
+class SyntheticSpec:
+    """
+    Entry counts per section plus the seed
+
+    Args:
+        seed: Seed for every generated value
+        **counts: Entries per section (see SECTIONS), default 0
+    """
+
+    def __init__(self, seed=1, **counts):
+        unknown = set(counts) - set(SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown synthetic config section(s): {', '.join(sorted(unknown))}")
+        if isinstance(seed, bool) or not isinstance(seed, int):
+            raise ValueError(f"seed must be an integer, got {seed!r}")
+        self.seed = seed
+        self.counts = {}
+        for section in SECTIONS:
+            count = counts.get(section, 0)
+            if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+                raise ValueError(f"{section} must be a non-negative integer, got {count!r}")
+            self.counts[section] = count
+        if self.total > MAX_ENTRIES:
+            raise ValueError(f"Synthetic config limited to {MAX_ENTRIES} entries, got {self.total}")
+
+    @classmethod
+    def from_value(cls, value):
+        if not isinstance(value, dict):
+            raise ValueError(f"Synthetic config spec must be an object, got {value!r}")
+        return cls(**value)
+
+    @classmethod
+    def from_json(cls, text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid synthetic config JSON: {e}") from e
+        return cls.from_value(value)
+
+    @classmethod
+    def from_query(cls, query):
+        """
+        Spec from download query parameters (?devices=5000&rules=200&seed=7)
+
+        Returns:
+            SyntheticSpec, or None when no section count is given
+        """
+        if not any(section in query for section in SECTIONS):
+            return None
+        values = {}
+        for name in SECTIONS + ('seed',):
+            if name in query:
+                try:
+                    values[name] = int(query[name])
+                except ValueError:
+                    raise ValueError(f"{name} must be an integer, got {query[name]!r}")
+        return cls(**values)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    @property
+    def key(self):
+        """Hashable identity of the spec (for caching)"""
+        return (self.seed,) + tuple(self.counts[section] for section in SECTIONS)
+
+    def to_dict(self):
+        return {'seed': self.seed, **{section: count for section, count in self.counts.items() if count}}
+
+    def ref(self, section, rng):
+        """ID of a random existing entry of another section, or None if it is empty"""
+        count = self.counts[section]
+        return object_id(self.seed, section, rng.randrange(count)) if count else None
+
+    def refs(self, section, rng, low, high):
+        count = self.counts[section]
+        if not count:
+            return []
+        picks = sorted(rng.sample(range(count), min(count, rng.randint(low, high))))
+        return [object_id(self.seed, section, index) for index in picks]
+
+    def entry(self, section, index, company_id):
+        """Build one entry (deterministic for seed, section and index)"""
+        rng = random.Random(f"{self.seed}:{section}:{index}")
+        return ENTRY_BUILDERS[section](self, rng, index, object_id(self.seed, section, index), company_id)
+
+
+def build_device_type(spec, rng, index, entry_id, company_id):
+    return {
+        'id': entry_id,
+        'name': f"Synthetic Device Type {index:05d}",
+        'type': 'device',
+        'role': 'sensor',
+        'manufacturer': rng.choice(('Acme', 'Globex', 'Initech', 'Umbrella')),
+        'model': f"M-{rng.randrange(1000, 9999)}",
+        'company_id': company_id,
+        'origin': 'cloud',
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+        'capabilities': {'actions': {'heartbeat': True, 'log': rng.random() < 0.5, 'setting': True,
+                                     'status': True}},
+        'command_ids': spec.refs('commands', rng, 0, 3),
+        'ingestor_ids': spec.refs('ingestors', rng, 1, 2),
+        'pollable_attributes': [{'name': name, 'interval': rng.choice((10, 30, 60, 300))}
+                                for name in rng.sample(PROPERTIES, rng.randint(0, 3))],
+    }
+
+
+def build_device(spec, rng, index, entry_id, company_id):
+    return {
+        'id': entry_id,
+        'name': f"sensor-{index:06d}",
+        'unique_id': f"synthetic-sensor-{index:06d}",
+        'device_type_id': spec.ref('device_types', rng) or '642b74cc7ac462445dba7455',
+        'company_id': company_id,
+        'active': rng.random() < 0.95,
+        'heartbeat_period': rng.choice((60, 300, 900)),
+        'log_config': {'local_level': rng.choice(LOG_LEVELS), 'forward_level': 'error',
+                       'forward_frequency_limit': 60},
+        'location': {'lat': round(rng.uniform(-90, 90), 6), 'lon': round(rng.uniform(-180, 180), 6)},
+        'metadata': {
+            'serial': f"SN{rng.randrange(10**9):09d}",
+            'firmware': f"{rng.randrange(1, 4)}.{rng.randrange(20)}.{rng.randrange(50)}",
+            'site': f"site-{rng.randrange(500):03d}",
+        },
+        'tags': rng.sample(('indoor', 'outdoor', 'critical', 'battery', 'mains', 'pilot'), rng.randint(0, 3)),
+        'ingestor_ids': spec.refs('ingestors', rng, 1, 3),
+        'connection_id': spec.ref('connections', rng),
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+def build_connection(spec, rng, index, entry_id, company_id):
+    kind = rng.choice(('modbus_tcp', 'snmp', 'serial', 'opcua'))
+    return {
+        'id': entry_id,
+        'name': f"connection-{index:05d}",
+        'type': kind,
+        'company_id': company_id,
+        'config': {
+            'host': f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            'port': {'modbus_tcp': 502, 'snmp': 161, 'serial': 0, 'opcua': 4840}[kind],
+            'timeout_ms': rng.choice((500, 1000, 5000)),
+            'retries': rng.randrange(4),
+            'serial_port': '/dev/ttyUSB0' if kind == 'serial' else '',
+            'baud_rate': 9600 if kind == 'serial' else 0,
+        },
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+def build_ingestor(spec, rng, index, entry_id, company_id):
+    listener_type = rng.choice(LISTENER_TYPES)
+    return {
+        'id': entry_id,
+        'name': f"ingestor-{index:05d}",
+        'type': 'edge',
+        'is_on_edge': True,
+        'company_id': company_id,
+        'listener_type': listener_type,
+        'listener': {
+            'port': rng.randrange(1024, 65535),
+            'poll_interval': rng.choice((1, 5, 10, 60)),
+            'timeout': rng.choice((1000, 5000)),
+            'registers': [{'address': rng.randrange(40001, 49999), 'count': rng.randint(1, 4),
+                           'name': rng.choice(PROPERTIES)} for _ in range(rng.randint(0, 6))]
+            if listener_type == 'tcp_modbus' else [],
+        },
+        'handler_type': rng.choice(HANDLER_TYPES),
+        'handler': {'delimiter': ',', 'attributes': rng.sample(PROPERTIES, rng.randint(1, 4))},
+        'translator_id': spec.ref('translators', rng),
+        'connection_id': spec.ref('connections', rng),
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+TRANSLATOR_SCRIPT = (
+    "function translate(payload) {{\n"
+    "  var data = JSON.parse(payload);\n"
+    "  var report = {{device_id: data.id, payload: {{}}}};\n"
+    "{lines}"
+    "  return JSON.stringify(report);\n"
+    "}}\n"
+)
+
+
+def build_translator(spec, rng, index, entry_id, company_id):
+    fields = rng.sample(PROPERTIES, rng.randint(2, len(PROPERTIES)))
+    lines = ''.join(f"  report.payload.{field} = Number(data.{field}) * {rng.choice((1, 0.1, 0.01))};\n"
+                    for field in fields)
+    return {
+        'id': entry_id,
+        'name': f"translator-{index:05d}",
+        'type': 'javascript',
+        'company_id': company_id,
+        'script': TRANSLATOR_SCRIPT.format(lines=lines),
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+def build_command(spec, rng, index, entry_id, company_id):
+    return {
+        'id': entry_id,
+        'name': f"command-{index:05d}",
+        'sender_type': rng.choice(('gateway_command', 'http_sender', 'mqtt_sender')),
+        'company_id': company_id,
+        'long_description': 'Synthetic command ' + ' '.join(rng.choice(PROPERTIES) for _ in range(12)),
+        'options': {'topic': f"commands/{index:05d}", 'qos': rng.randint(0, 1), 'timeout': 30},
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+def build_integration(spec, rng, index, entry_id, company_id):
+    return {
+        'id': entry_id,
+        'name': f"integration-{index:05d}",
+        'type': rng.choice(('aws_device_integration', 'azure_device_integration', 'gcp_cloud_native')),
+        'company_id': company_id,
+        'region': rng.choice(('us-east-1', 'eu-west-1', 'ap-southeast-2')),
+        'role_arn': f"arn:aws:iam::{rng.randrange(10**12):012d}:role/synthetic-{index:05d}",
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+def build_rule(spec, rng, index, entry_id, company_id):
+    return {
+        'id': entry_id,
+        'description': f"Synthetic rule {index:05d}",
+        'active': rng.random() < 0.9,
+        'cloud_rule': False,
+        'company_id': company_id,
+        'if': {
+            'type': rng.choice(COMPARATORS),
+            'property': rng.choice(PROPERTIES),
+            'value': round(rng.uniform(0, 100), 2),
+        },
+        'then': [{'type': rng.choice(ACTION_TYPES), 'send_to_cloud': rng.random() < 0.5,
+                  'body_template': f"{{{{.Payload.{rng.choice(PROPERTIES)}}}}} exceeded on {{{{.DeviceName}}}}"}
+                 for _ in range(rng.randint(1, 3))],
+        'device_ids': spec.refs('devices', rng, 0, 5),
+        'created_at': TIMESTAMP,
+        'updated_at': TIMESTAMP,
+    }
+
+
+ENTRY_BUILDERS = {
+    'device_types': build_device_type,
+    'devices': build_device,
+    'connections': build_connection,
+    'ingestors': build_ingestor,
+    'translators': build_translator,
+    'commands': build_command,
+    'integrations': build_integration,
+    'rules': build_rule,
+}
+
+
+def iter_document(spec, company_id, device_unique_id):
+    """
+    Serialized document in pieces, identical to json.dumps(document, indent=2)
+
+    The default app_config is serialized with a placeholder per filled section; each
+    placeholder is replaced by that section's entries, serialized one by one at the
+    indentation json.dumps would use for top-level array items.
+
+    Yields:
+        str pieces
+    """
+    document = build_default_app_config(company_id, device_unique_id)
+    filled = [section for section in SECTIONS if spec.counts[section]]
+    placeholders = {}
+    for section in filled:
+        document[section] = f"\x00{section}\x00"
+        placeholders[json.dumps(document[section])] = section
+    text = json.dumps(document, indent=2)
+    position = 0
+    # Placeholders appear in key order; locate each and stream its entries in its place
+    for token, section in sorted(placeholders.items(), key=lambda item: text.index(item[0])):
+        start = text.index(token, position)
+        yield text[position:start]
+        yield '['
+        for index in range(spec.counts[section]):
+            entry = json.dumps(spec.entry(section, index, company_id), indent=2)
+            yield ('\n    ' if index == 0 else ',\n    ') + entry.replace('\n', '\n    ')
+        yield '\n  ]'
+        position = start + len(token)
+    yield text[position:]
+
+
+def iter_chunks(spec, company_id, device_unique_id, chunk_size=CHUNK_SIZE):
+    """UTF-8 encoded document in chunks of about chunk_size bytes"""
+    pending = []
+    size = 0
+    for piece in iter_document(spec, company_id, device_unique_id):
+        pending.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+            size = 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def build_archive(spec, company_id, device_unique_id, compress_type, compresslevel=None):
+    """
+    Stream a synthetic app_config.json into a zip archive
+
+    Args:
+        spec: SyntheticSpec
+        company_id: Company ID for the config
+        device_unique_id: Device unique ID for the config
+        compress_type: zipfile compression constant
+        compresslevel: Deflate level, None for zlib's default
+
+    Returns:
+        Tuple of (zip_data: bytes, json_md5_hash: str, json_size: int)
+    """
+    json_md5 = hashlib.md5()
+    json_size = 0
+    zip_buffer = BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', compress_type, compresslevel=compresslevel) as zip_file:
+        with zip_file.open('app_config.json', 'w', force_zip64=spec.total > ZIP64_ENTRIES) as member:
+            for chunk in iter_chunks(spec, company_id, device_unique_id):
+                json_md5.update(chunk)
+                json_size += len(chunk)
+                member.write(chunk)
+    return zip_buffer.getvalue(), json_md5.hexdigest(), json_size
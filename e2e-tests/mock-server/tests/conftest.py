@@ -0,0 +1,9 @@
+"""
+Pytest configuration for mock server unit tests
+"""
+
+import os
+import sys
+
+# The mock server modules are plain scripts living next to server.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
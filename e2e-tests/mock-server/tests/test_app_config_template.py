@@ -0,0 +1,51 @@
+"""
+Byte-identity tests for the precompiled default app_config template
+"""
+
+import json
+
+import pytest
+
+from app_config_template import (
+    AppConfigTemplate,
+    build_default_app_config,
+    render_app_config_reference,
+    render_default_app_config,
+)
+
+IDS = [
+    ('test-company-001', 'test-device-001'),
+    ('', ''),
+    ('company "quoted"', 'back\\slash/slash'),
+    ('tab\there', 'new\nline\r\n'),
+    ('control\x00\x01\x1f', 'del\x7f'),
+    ('ünïcödé', '设备-001'),
+    ('emoji-\U0001F4A1', 'surrogate-\ud800'),
+    ('\x00company_id\x00', '\x00device_unique_id\x00'),
+]
+
+
+@pytest.mark.parametrize('company_id,device_unique_id', IDS)
+def test_template_is_byte_identical_to_json_dumps(company_id, device_unique_id):
+    expected = render_app_config_reference(company_id, device_unique_id)
+    assert render_default_app_config(company_id, device_unique_id) == expected
+
+
+def test_rendered_document_round_trips():
+    rendered = render_default_app_config('c-1', 'd-1')
+    assert json.loads(rendered) == build_default_app_config('c-1', 'd-1')
+
+
+def test_template_honours_dumps_options():
+    def builder(name):
+        return {'name': name, 'nested': {'alias': name}, 'count': 3}
+
+    template = AppConfigTemplate(builder, ('name',), ensure_ascii=False, separators=(',', ':'))
+    for name in ('plain', 'ünïcödé', 'quote"d'):
+        expected = json.dumps(builder(name), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        assert template.render(name=name) == expected
+
+
+def test_template_rejects_fields_missing_from_document():
+    with pytest.raises(ValueError):
+        AppConfigTemplate(lambda name, other: {'name': name}, ('name', 'other'))
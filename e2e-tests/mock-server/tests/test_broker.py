@@ -0,0 +1,292 @@
+"""
+Tests for the embedded asyncio MQTT broker
+"""
+
+import asyncio
+import json
+import queue
+import socket
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+import pytest
+
+import server
+from broker import (
+    CONNACK,
+    CONNECT,
+    PUBACK,
+    PUBLISH,
+    SUBACK,
+    SUBSCRIBE,
+    Broker,
+    SubscriptionTrie,
+    encode_packet,
+    encode_string,
+    parse_subscription,
+    topic_matches,
+    valid_filter,
+)
+
+
+@pytest.fixture
+def broker():
+    """Broker on a free port, running on its own event loop thread"""
+    loop = asyncio.new_event_loop()
+    instance = Broker(port=0)
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(instance.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield instance
+    asyncio.run_coroutine_threadsafe(instance.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+class Client:
+    """Blocking wrapper around a paho client collecting received messages"""
+
+    def __init__(self, port, client_id, protocol=mqtt.MQTTv311):
+        self.messages = queue.Queue()
+        self.connected = threading.Event()
+        self.disconnected = threading.Event()
+        self.subacks = {}
+        self.subscribed = threading.Condition()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, protocol=protocol)
+        self.client.on_connect = lambda *args: self.connected.set()
+        self.client.on_disconnect = lambda *args: self.disconnected.set()
+        self.client.on_subscribe = self.on_subscribe
+        self.client.on_message = lambda client, userdata, msg: self.messages.put(
+            (msg.topic, msg.payload, msg.qos, bool(msg.retain)))
+        self.client.connect('127.0.0.1', port)
+        self.client.loop_start()
+        assert self.connected.wait(5)
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties):
+        with self.subscribed:
+            self.subacks[mid] = [code.value for code in reason_codes]
+            self.subscribed.notify_all()
+
+    def subscribe(self, *subscriptions):
+        _, mid = self.client.subscribe(list(subscriptions))
+        with self.subscribed:
+            assert self.subscribed.wait_for(lambda: mid in self.subacks, 5)
+        return self.subacks[mid]
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.client.publish(topic, payload, qos=qos, retain=retain).wait_for_publish(5)
+
+    def receive(self, timeout=5):
+        return self.messages.get(timeout=timeout)
+
+    def assert_nothing(self, timeout=0.2):
+        with pytest.raises(queue.Empty):
+            self.messages.get(timeout=timeout)
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+@pytest.fixture
+def connect(broker):
+    """Factory for connected clients, disconnected at the end of the test"""
+    clients = []
+
+    def factory(client_id, protocol=mqtt.MQTTv311):
+        client = Client(broker.port, client_id, protocol)
+        clients.append(client)
+        return client
+
+    yield factory
+    for client in clients:
+        client.close()
+
+
+class TestTopics:
+    """Filter validation and matching"""
+
+    @pytest.mark.parametrize('topic_filter,valid', [
+        ('a/b', True), ('a/+/c', True), ('#', True), ('a/#', True), ('+', True),
+        ('a/#/c', False), ('a/b#', False), ('a+/b', False), ('', False),
+    ])
+    def test_valid_filter(self, topic_filter, valid):
+        assert valid_filter(topic_filter) is valid
+
+    @pytest.mark.parametrize('topic_filter,topic,matches', [
+        ('a/+/c', 'a/b/c', True), ('a/+/c', 'a/b/d', False), ('a/#', 'a', True), ('a/#', 'a/b/c', True),
+        ('+', 'a/b', False), ('#', '$SYS/x', False), ('$SYS/#', '$SYS/x', True), ('a/+', 'a/', True),
+    ])
+    def test_matching(self, topic_filter, topic, matches):
+        assert topic_matches(topic_filter, topic) is matches
+        trie = SubscriptionTrie()
+        trie.add(topic_filter, 'client', 1)
+        assert bool(trie.match(topic)) is matches
+
+    def test_shared_subscription_syntax(self):
+        assert parse_subscription('$share/group/u/+/+/config') == ('group', 'u/+/+/config')
+        assert parse_subscription('u/#') == (None, 'u/#')
+
+    def test_trie_prunes_removed_filters(self):
+        trie = SubscriptionTrie()
+        trie.add('a/b/c', 'one', 0)
+        trie.add('a/+', 'two', 0, group='g')
+        assert trie.count == 2
+        assert trie.remove('a/b/c', 'one') and trie.remove('a/+', 'two', group='g')
+        assert not trie.remove('a/b/c', 'one')
+        assert trie.count == 0 and not trie.root.children
+
+
+class TestBroker:
+    """Behaviour observed through real MQTT clients"""
+
+    def test_wildcard_delivery_and_qos_downgrade(self, broker, connect):
+        subscriber = connect('sub')
+        publisher = connect('pub')
+        assert subscriber.subscribe(('u/+/+/config', 1), ('d/#', 0)) == [1, 0]
+        publisher.publish('u/acme/gw-1/config', b'one', qos=1)
+        publisher.publish('d/acme/gw-1/cmd', b'two', qos=1)
+        publisher.publish('x/acme', b'ignored')
+        assert subscriber.receive() == ('u/acme/gw-1/config', b'one', 1, False)
+        assert subscriber.receive() == ('d/acme/gw-1/cmd', b'two', 0, False)
+        subscriber.assert_nothing()
+        assert broker.ack_latency.get()[0] == 1
+
+    def test_overlapping_subscriptions_deliver_once(self, broker, connect):
+        subscriber = connect('sub')
+        subscriber.subscribe(('a/#', 0), ('a/+', 1))
+        connect('pub').publish('a/b', b'x', qos=1)
+        assert subscriber.receive() == ('a/b', b'x', 1, False)
+        subscriber.assert_nothing()
+
+    def test_retained_messages(self, broker, connect):
+        publisher = connect('pub')
+        publisher.publish('status/gw-1', b'online', qos=1, retain=True)
+        subscriber = connect('sub')
+        subscriber.subscribe(('status/+', 1))
+        assert subscriber.receive() == ('status/gw-1', b'online', 1, True)
+        publisher.publish('status/gw-1', b'', retain=True)
+        assert subscriber.receive() == ('status/gw-1', b'', 0, False)
+        late = connect('late')
+        late.subscribe(('status/+', 1))
+        late.assert_nothing()
+
+    def test_shared_subscription_delivers_each_message_once(self, broker, connect):
+        members = [connect(f"responder-{i}", mqtt.MQTTv5) for i in range(2)]
+        for member in members:
+            assert member.subscribe(('$share/responders/u/+/+/config', 1)) == [1]
+        publisher = connect('pub')
+        for index in range(10):
+            publisher.publish(f"u/acme/device-{index}/config", b'{}', qos=1)
+        received = [[], []]
+        deadline = time.monotonic() + 5
+        while len(received[0]) + len(received[1]) < 10 and time.monotonic() < deadline:
+            for member, messages in zip(members, received):
+                try:
+                    messages.append(member.messages.get(timeout=0.01)[0])
+                except queue.Empty:
+                    pass
+        assert sorted(received[0] + received[1]) == sorted(f"u/acme/device-{i}/config" for i in range(10))
+        assert len(received[0]) == len(received[1]) == 5
+
+    def test_client_id_takeover(self, broker, connect):
+        first = connect('same-id')
+        first.client.reconnect_delay_set(60, 60)
+        connect('same-id')
+        assert first.disconnected.wait(5)
+
+    def test_will_published_on_unclean_disconnect(self, broker, connect):
+        subscriber = connect('sub')
+        subscriber.subscribe(('wills/#', 0))
+        # CONNECT (3.1.1) with clean session and a will on wills/gw-1, then drop the socket
+        body = (encode_string('MQTT') + bytes([4, 0x06]) + (60).to_bytes(2, 'big')
+                + encode_string('gw-1') + encode_string('wills/gw-1') + encode_string(b'offline'))
+        with socket.create_connection(('127.0.0.1', broker.port), timeout=5) as sock:
+            sock.sendall(encode_packet(CONNECT, 0, body))
+            assert sock.recv(4) == bytes([CONNACK << 4, 2, 0, 0])
+            # An invalid filter is refused without closing the connection
+            sock.sendall(encode_packet(SUBSCRIBE, 2, (1).to_bytes(2, 'big') + encode_string('a/#/b') + b'\x00'))
+            assert sock.recv(5) == bytes([SUBACK << 4, 3, 0, 1, 0x80])
+        assert subscriber.receive() == ('wills/gw-1', b'offline', 0, False)
+
+
+def read_packet(sock):
+    """(packet type, body) of the next packet on a blocking socket"""
+    first = sock.recv(1)[0]
+    length, shift = 0, 0
+    while True:
+        byte = sock.recv(1)[0]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    body = b''
+    while len(body) < length:
+        body += sock.recv(length - len(body))
+    return first >> 4, body
+
+
+def test_qos1_past_the_inflight_window_is_queued_not_dropped(broker, connect):
+    broker.max_inflight = 2
+    with socket.create_connection(('127.0.0.1', broker.port), timeout=5) as sock:
+        sock.sendall(encode_packet(CONNECT, 0, encode_string('MQTT') + bytes([4, 0x02]) + (60).to_bytes(2, 'big')
+                                   + encode_string('slow')))
+        assert read_packet(sock) == (CONNACK, b'\x00\x00')
+        sock.sendall(encode_packet(SUBSCRIBE, 2, (1).to_bytes(2, 'big') + encode_string('jobs/#') + b'\x01'))
+        assert read_packet(sock) == (SUBACK, b'\x00\x01\x01')
+        publisher = connect('pub')
+        for index in range(5):
+            publisher.publish(f"jobs/{index}", b'x', qos=1)
+
+        def deliveries(count):
+            packets = [read_packet(sock) for _ in range(count)]
+            assert all(packet_type == PUBLISH for packet_type, _ in packets)
+            # topic (2-byte length + "jobs/N"), then the packet identifier
+            return [(body[2:8].decode(), body[8:10]) for _, body in packets]
+
+        window = deliveries(2)
+        assert [topic for topic, _ in window] == ['jobs/0', 'jobs/1']
+        sock.settimeout(0.2)
+        with pytest.raises(socket.timeout):
+            sock.recv(1)
+        assert broker.queued.get() == 3
+        sock.settimeout(5)
+        received = []
+        while window:
+            topic, packet_id = window.pop(0)
+            received.append(topic)
+            sock.sendall(encode_packet(PUBACK, 0, packet_id))
+            if len(received) + len(window) < 5:
+                window += deliveries(1)
+    assert received == [f"jobs/{index}" for index in range(5)]
+    assert broker.queued.get() == 0 and not broker.dropped.values
+
+
+def test_mock_server_round_trip(broker, connect, tmp_path, monkeypatch):
+    """The config responder works unchanged against the embedded broker"""
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    device = connect('device')
+    device.subscribe(('d/acme/gw-1/gateway_commands/send_config_v3', 1))
+
+    async def run():
+        responder = server.MockMQTTServer('127.0.0.1', broker.port, max_retries=1)
+        await responder.start()
+        try:
+            device.publish('u/acme/gw-1/config', json.dumps({'config_version': 3, 'requested': True}), qos=1)
+            return await asyncio.to_thread(device.receive)
+        finally:
+            responder.stop()
+
+    topic, payload, qos, _ = asyncio.run(run())
+    assert topic == 'd/acme/gw-1/gateway_commands/send_config_v3' and qos == 1
+    assert json.loads(payload)['command_type'] == 'send_config_v3'
@@ -0,0 +1,91 @@
+"""
+Tests for uplink MQTT capture and replay
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from capture import CaptureWriter, read_capture
+from replay import Replayer, parse_speed
+
+
+def test_capture_round_trips_text_and_binary_payloads(tmp_path):
+    path = tmp_path / 'traffic.jsonl.gz'
+    writer = CaptureWriter(path).start()
+    writer.record(100.0, 'u/acme/gw-1/config', b'{"config_version": 3}', qos=1)
+    writer.record(100.5, 'u/acme/gw-1/telemetry', b'\xff\x00\x01', retain=True)
+    writer.close()
+
+    records = list(read_capture(path))
+    assert [r['topic'] for r in records] == ['u/acme/gw-1/config', 'u/acme/gw-1/telemetry']
+    assert records[0] == {'t': 100.0, 'topic': 'u/acme/gw-1/config', 'qos': 1, 'retain': False,
+                          'payload': '{"config_version": 3}'}
+    assert records[1]['encoding'] == 'base64' and records[1]['retain'] is True
+    assert path.read_bytes()[:2] == b'\x1f\x8b'
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    writer = CaptureWriter(tmp_path / 'traffic.jsonl', max_queue=2)
+    assert writer.record(1.0, 't', b'a') and writer.record(2.0, 't', b'b')
+    assert not writer.record(3.0, 't', b'c')
+    assert (writer.recorded, writer.dropped) == (2, 1)
+    writer.start().close()
+    assert [r['payload'] for r in read_capture(tmp_path / 'traffic.jsonl')] == ['a', 'b']
+
+
+def test_capture_path_for_worker():
+    assert str(server.capture_path_for_worker('/tmp/traffic.jsonl.gz', 2)) == '/tmp/traffic-2.jsonl.gz'
+    assert str(server.capture_path_for_worker('/tmp/traffic', 1)) == '/tmp/traffic-1'
+
+
+def test_responder_records_every_uplink(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    writer = CaptureWriter(tmp_path / 'traffic.jsonl.gz').start()
+    responder = server.MockMQTTServer(capture=writer)
+    assert responder.subscription == 'u/#'
+    responder.publish = lambda topic, payload, qos=1: None
+
+    async def run():
+        responder.loop = asyncio.get_running_loop()
+        for topic, payload in (('u/acme/gw-1/config', b'{"config_version": 3, "requested": true}'),
+                               ('u/acme/gw-1/status/extra', b'\x00binary')):
+            responder.on_message(None, None, SimpleNamespace(topic=topic, payload=payload, qos=1, retain=False))
+        await asyncio.gather(*responder.reply_tasks)
+
+    asyncio.run(run())
+    writer.close()
+    assert [r['topic'] for r in read_capture(tmp_path / 'traffic.jsonl.gz')] == [
+        'u/acme/gw-1/config', 'u/acme/gw-1/status/extra']
+
+
+@pytest.mark.parametrize('value,expected', [('1', 1.0), ('10x', 10.0), ('max', None), ('0', None)])
+def test_parse_speed(value, expected):
+    assert parse_speed(value) == expected
+
+
+def capture_records(count, spacing):
+    return [{'t': 1000.0 + i * spacing, 'topic': f"u/acme/gw-{i}/config",
+             'qos': 1, 'retain': False, 'payload': json.dumps({'i': i})} for i in range(count)]
+
+
+def test_replay_keeps_scaled_spacing():
+    sent = []
+    report = Replayer(capture_records(11, 0.05), lambda *args: sent.append((time.monotonic(), args)),
+                      speed=5).run()
+    assert report['messages'] == 11 and report['capture_duration_s'] == 0.5
+    assert 0.09 <= sent[-1][0] - sent[0][0] < 0.2
+    assert sent[0][1] == ('u/acme/gw-0/config', b'{"i": 0}', 1, False)
+    assert report['lateness_ms']['count'] == 11
+
+
+def test_replay_at_max_speed_ignores_timing():
+    sent = []
+    report = Replayer(capture_records(50, 10.0), lambda *args: sent.append(args), speed=None, limit=20).run()
+    assert len(sent) == report['messages'] == 20
+    assert report['replay_duration_s'] < 1
+    assert report['lateness_ms']['count'] == 0
@@ -0,0 +1,199 @@
+"""
+Tests for JSON Patch diffing, config version history and delta downloads
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server as mock_server
+from config_history import ConfigHistory, DeltaUnavailable, serialize
+from json_patch import apply_patch, make_patch
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+BASE = {
+    'heartbeat_period': 5,
+    'devices': [{'name': f"sensor-{i}", 'log_config': {'local_level': 'info'}} for i in range(20)],
+    'rules': [],
+    'a/b': {'~key': True},
+}
+
+
+def edited(edit):
+    document = copy.deepcopy(BASE)
+    edit(document)
+    return document
+
+
+EDITS = {
+    'scalar': lambda d: d.update(heartbeat_period=30),
+    'nested': lambda d: d['devices'][3]['log_config'].update(local_level='debug'),
+    'append': lambda d: d['devices'].append({'name': 'new'}),
+    'insert': lambda d: d['devices'].insert(10, {'name': 'new'}),
+    'remove': lambda d: d['devices'].pop(7),
+    'remove_member': lambda d: d.pop('rules'),
+    'add_member': lambda d: d.update(extra=[1, 2]),
+    'escaped_key': lambda d: d['a/b'].update({'~key': False}),
+    'type_change': lambda d: d.update(rules={'enabled': 1}),
+    'move_member': lambda d: d.update(devices=d.pop('devices')),
+    'reverse': lambda d: d['devices'].reverse(),
+    'int_to_bool': lambda d: d.update(heartbeat_period=True),
+    'nested_reorder': lambda d: d['devices'][2].update(name=d['devices'][2].pop('name')),
+}
+
+
+class TestJSONPatch:
+    """make_patch/apply_patch round trips"""
+
+    @pytest.mark.parametrize('edit', EDITS)
+    def test_patch_reproduces_target_bytes(self, edit):
+        target = edited(EDITS[edit])
+        patch = make_patch(BASE, target)
+        patched = apply_patch(BASE, patch)
+        assert patched == target
+        assert serialize(patched) == serialize(target)
+
+    def test_identical_documents_give_empty_patch(self):
+        assert make_patch(BASE, copy.deepcopy(BASE)) == []
+
+    @pytest.mark.parametrize('old,new', [({'c': 1}, {'c': True}), ({'c': [1]}, {'c': [1.0]}),
+                                         ([{'a': 1, 'b': 2}], [{'b': 2, 'a': 1}])])
+    def test_equal_but_differently_serialized_values_are_patched(self, old, new):
+        patch = make_patch(old, new)
+        assert patch and serialize(apply_patch(old, patch)) == serialize(new)
+
+    def test_insert_does_not_rewrite_rest_of_list(self):
+        patch = make_patch(BASE, edited(EDITS['insert']))
+        assert patch == [{'op': 'add', 'path': '/devices/10', 'value': {'name': 'new'}}]
+
+    def test_apply_does_not_modify_input(self):
+        document = copy.deepcopy(BASE)
+        apply_patch(document, make_patch(BASE, edited(EDITS['scalar'])))
+        assert document == BASE
+
+    @pytest.mark.parametrize('op', [
+        {'op': 'remove', 'path': '/missing'},
+        {'op': 'replace', 'path': '/devices/99', 'value': 1},
+        {'op': 'test', 'path': '/heartbeat_period', 'value': 6},
+        {'op': 'move', 'from': '/rules', 'path': '/x'},
+        {'op': 'add', 'path': 'no-slash', 'value': 1},
+    ])
+    def test_invalid_operations_raise(self, op):
+        with pytest.raises(ValueError):
+            apply_patch(BASE, [op])
+
+
+def md5(content):
+    return hashlib.md5(content).hexdigest()
+
+
+class TestConfigHistory:
+    """Per-device versions and cached deltas"""
+
+    def test_records_versions_per_device(self):
+        history = ConfigHistory(max_versions=2)
+        for content in (b'1', b'1', b'2', b'3'):
+            history.record('acme', 'gw-1', md5(content), content)
+        assert [v for v, _ in history.versions('acme', 'gw-1')] == [md5(b'2'), md5(b'3')]
+        assert history.versions('acme', 'gw-2') == []
+
+    def test_delta_between_served_versions(self):
+        history = ConfigHistory()
+        base, target = serialize(BASE), serialize(edited(EDITS['nested']))
+        history.record('acme', 'gw-1', md5(base), base)
+        history.record('acme', 'gw-1', md5(target), target)
+        patch = json.loads(history.delta(md5(base), md5(target)))
+        assert serialize(apply_patch(json.loads(base), patch)) == target
+
+    def test_unknown_base(self):
+        history = ConfigHistory()
+        history.record('acme', 'gw-1', md5(b'{}'), b'{}')
+        with pytest.raises(DeltaUnavailable, match='unknown_base'):
+            history.delta('0' * 32, md5(b'{}'))
+
+    def test_non_canonical_formatting_is_not_reproducible(self):
+        history = ConfigHistory()
+        base, target = b'{"a": 1}', b'{"a": 2}'
+        history.record('acme', 'gw-1', md5(base), base)
+        history.record('acme', 'gw-1', md5(target), target)
+        for _ in range(2):
+            with pytest.raises(DeltaUnavailable, match='not_reproducible'):
+                history.delta(md5(base), md5(target))
+
+    def test_directory_shares_contents_between_workers(self, tmp_path):
+        content = serialize(BASE)
+        ConfigHistory(directory=tmp_path).record('acme', 'gw-1', md5(content), content)
+        other_worker = ConfigHistory(directory=tmp_path)
+        assert other_worker.content(md5(content)) == content
+        (tmp_path / f"{md5(b'x')}.json").write_bytes(b'tampered')
+        assert other_worker.content(md5(b'x')) is None
+
+
+def fetch(server, path):
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            response = await client.get(path)
+            return response.status, dict(response.headers), await response.read()
+    return asyncio.run(run())
+
+
+class TestDeltaDownload:
+    """?md5= on the app_config.zip download"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_history(self, monkeypatch):
+        monkeypatch.setattr(mock_server, 'CONFIG_HISTORY', ConfigHistory())
+
+    @staticmethod
+    def serve(monkeypatch, directory, document):
+        """Point RESPONSES_DIR at a directory holding one global app_config.json"""
+        directory.mkdir()
+        (directory / 'app_config.json').write_bytes(serialize(document))
+        monkeypatch.setenv('RESPONSES_DIR', str(directory))
+
+    def test_delta_from_previously_served_version(self, tmp_path, monkeypatch):
+        self.serve(monkeypatch, tmp_path / 'v1', BASE)
+        status, headers, _ = fetch(mock_server.MockHTTPServer(), CONFIG_PATH)
+        base_md5 = headers['X-Config-MD5']
+        assert status == 200 and headers['Content-Type'] == 'application/zip'
+
+        target = edited(EDITS['nested'])
+        self.serve(monkeypatch, tmp_path / 'v2', target)
+        deltas = mock_server.CONFIG_DELTAS.get(result='delta')
+        status, headers, body = fetch(mock_server.MockHTTPServer(), f"{CONFIG_PATH}?md5={base_md5}")
+        assert status == 200
+        assert headers['Content-Type'] == 'application/json-patch+json'
+        assert headers['X-Config-Base-MD5'] == base_md5
+        assert headers['X-Config-Serialization'] == 'json; indent=2'
+        patched = serialize(apply_patch(BASE, json.loads(body)))
+        assert md5(patched) == headers['X-Config-MD5'] == md5(serialize(target))
+        assert mock_server.CONFIG_DELTAS.get(result='delta') == deltas + 1
+
+    def test_current_md5_is_not_modified(self, tmp_path, monkeypatch):
+        self.serve(monkeypatch, tmp_path / 'v1', BASE)
+        status, headers, _ = fetch(mock_server.MockHTTPServer(), f"{CONFIG_PATH}?md5={md5(serialize(BASE))}")
+        assert status == 304
+        assert headers['X-Config-MD5'] == md5(serialize(BASE))
+
+    def test_unknown_base_falls_back_to_archive(self, tmp_path, monkeypatch):
+        self.serve(monkeypatch, tmp_path / 'v1', BASE)
+        status, headers, body = fetch(mock_server.MockHTTPServer(), f"{CONFIG_PATH}?md5={'0' * 32}")
+        assert status == 200 and headers['Content-Type'] == 'application/zip'
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            assert archive.read('app_config.json') == serialize(BASE)
+
+    def test_large_delta_falls_back_to_archive(self, tmp_path, monkeypatch):
+        self.serve(monkeypatch, tmp_path / 'v1', BASE)
+        fetch(mock_server.MockHTTPServer(), CONFIG_PATH)
+        self.serve(monkeypatch, tmp_path / 'v2', edited(EDITS['reverse']))
+        not_smaller = mock_server.CONFIG_DELTAS.get(result='not_smaller')
+        status, headers, _ = fetch(mock_server.MockHTTPServer(), f"{CONFIG_PATH}?md5={md5(serialize(BASE))}")
+        assert status == 200 and headers['Content-Type'] == 'application/zip'
+        assert mock_server.CONFIG_DELTAS.get(result='not_smaller') == not_smaller + 1
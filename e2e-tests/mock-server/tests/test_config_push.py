@@ -0,0 +1,160 @@
+"""
+Tests for the config push soak
+"""
+
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from config_push import PushPlan, PushSoak
+from impairment import Impairments
+from timeline import DeviceTimeline
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+
+class TestPlan:
+
+    def test_sizes_cycle_and_seed_changes_every_push(self):
+        plan = PushPlan('acme', 'gw-1', sizes=[{'devices': 5}, {'rules': 3}], interval=10)
+        assert plan.timeout == 10
+        specs = [plan.spec(index).to_dict() for index in range(3)]
+        assert specs == [{'seed': 1, 'devices': 5}, {'seed': 2, 'rules': 3}, {'seed': 3, 'devices': 5}]
+
+    @pytest.mark.parametrize('text,message', [
+        ('{"company_id": "acme"}', 'needs company_id and device_unique_id'),
+        ('{"company_id": "acme", "device_unique_id": "gw-1", "interval": 0}', 'interval must be positive'),
+        ('{"company_id": "acme", "device_unique_id": "gw-1", "rate": 1}', 'Unknown soak setting'),
+        ('{"company_id": "acme", "device_unique_id": "gw-1", "sizes": [{"devices": -1}]}', 'non-negative'),
+        ('{"company_id": "acme", "device_unique_id": "gw-1", "sizes": [{"seed": 4}]}', 'without seed'),
+        ('{"company_id": "a/b", "device_unique_id": "gw-1"}', "without '/'"),
+        ('[]', 'must be an object'),
+    ])
+    def test_rejects_invalid_plans(self, text, message):
+        with pytest.raises(ValueError, match=message):
+            PushPlan.from_json(text)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_downloads_are_matched_to_pushes_by_md5():
+    clock = FakeClock()
+    published = []
+
+    async def publish(plan, spec):
+        published.append(spec.seed)
+        return f"md5-{spec.seed}", 1000 * spec.seed
+
+    soak = PushSoak(PushPlan('acme', 'gw-1', sizes=[{'devices': 1}, {'devices': 2}], interval=60, timeout=30),
+                    publish, clock=clock)
+    soak.running, soak.started_at = True, clock.now
+    for index, latency in enumerate((1.0, 2.0, None, 4.0, 5.0)):
+        asyncio.run(soak.push(index))
+        assert soak.spec_for('acme', 'gw-1').seed == index + 1 and soak.spec_for('acme', 'gw-2') is None
+        if latency is not None:
+            clock.now += latency
+            assert soak.downloaded('acme', 'gw-1', f"md5-{index + 1}")
+        clock.now += 60
+    assert not soak.downloaded('acme', 'gw-1', 'md5-1') and not soak.downloaded('acme', 'gw-2', 'md5-3')
+
+    report = soak.report()
+    assert (report['pushes'], report['downloaded'], report['missed'], report['pending']) == (5, 4, 1, 0)
+    assert report['latency_ms']['p50'] == 3000.0 and report['latency_ms']['max'] == 5000.0
+    # Every push takes a second longer than the one before it
+    assert report['latency_slope_ms_per_h'] > 0
+    assert report['first_quarter_latency_ms']['max'] == 1000.0 and report['last_quarter_latency_ms']['max'] == 5000.0
+    assert [size['pushes'] for size in report['by_size']] == [3, 2]
+    assert report['recent'][2] == {'index': 2, 'bytes': 3000, 'md5': 'md5-3', 'latency_ms': None}
+
+
+def test_long_soak_keeps_bounded_state():
+    async def publish(plan, spec):
+        return f"md5-{spec.seed}", 1000
+
+    clock = FakeClock()
+    soak = PushSoak(PushPlan('acme', 'gw-1', interval=60, timeout=30), publish, clock=clock, max_samples=40)
+    soak.running, soak.started_at = True, clock.now
+    for index in range(1000):
+        asyncio.run(soak.push(index))
+        clock.now += 1.0 + index / 1000
+        if index % 10:
+            soak.downloaded('acme', 'gw-1', f"md5-{index + 1}")
+        clock.now += 60
+
+    report = soak.report()
+    assert (report['pushes'], report['downloaded'], report['missed'], report['pending']) == (1000, 900, 100, 0)
+    assert len(soak.pending) == 0 and len(soak.recent) == 20 and len(soak.latency.samples) == 40
+    assert len(soak.early) == 10
+    # Count, min and max cover the whole soak, percentiles the last samples
+    assert report['latency_ms']['count'] == 900
+    assert report['latency_ms']['min'] == 1001.0 and report['latency_ms']['max'] == 1999.0
+    assert report['latency_ms']['p50'] > 1900.0
+    assert report['latency_slope_ms_per_h'] > 0
+    assert report['first_quarter_latency_ms']['max'] < report['last_quarter_latency_ms']['min']
+
+
+@pytest.fixture
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.setattr(server, 'IMPAIRMENTS', Impairments(seed=1))
+    monkeypatch.setattr(server, 'TIMELINE', DeviceTimeline())
+    monkeypatch.setattr(server, 'PUSH_SOAK', None)
+
+
+class FakeResponder:
+
+    def __init__(self):
+        self.published = []
+
+    def publish_reply(self, company_id, device_unique_id, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+
+def test_soak_endpoint_pushes_and_serves_changing_configs(isolated):
+    async def run():
+        responder = FakeResponder()
+        plan = {'company_id': 'acme', 'device_unique_id': 'gw-1', 'interval': 0.05, 'count': 3,
+                'timeout': 5, 'sizes': [{'devices': 2}, {'devices': 20, 'rules': 4}]}
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            response = await client.put('/admin/soak', data=json.dumps(plan))
+            assert response.status == 409
+            assert (await client.get('/admin/soak')).status == 404
+
+        async with TestClient(TestServer(server.MockHTTPServer(responder=responder).app)) as client:
+            assert (await client.put('/admin/soak', data='{"company_id": "acme"}')).status == 400
+            assert (await client.put('/admin/soak', data=json.dumps(plan))).status == 200
+            assert (await client.put('/admin/soak', data=json.dumps(plan))).status == 409
+            served = []
+            while len(responder.published) < 3:
+                await asyncio.sleep(0.01)
+                if len(served) < len(responder.published):
+                    response = await client.get(CONFIG_PATH)
+                    served.append((response.headers['X-Config-MD5'], len(await response.read())))
+            topic, command = responder.published[-1]
+            assert topic == 'd/acme/gw-1/gateway_commands/send_config_v3'
+            assert command['payload']['url'].endswith(CONFIG_PATH)
+            response = await client.get(CONFIG_PATH)
+            assert response.headers['X-Config-MD5'] == command['payload']['md5']
+
+            md5s = [command['payload']['md5'] for _, command in responder.published]
+            assert len(set(md5s)) == 3 and [md5 for md5, _ in served] == md5s[:len(served)]
+            report = await (await client.get('/admin/soak')).json()
+            assert report['pushes'] == 3 and report['downloaded'] == 3 and report['running']
+            assert report['by_size'][0]['bytes'] < report['by_size'][1]['bytes']
+
+            report = await (await client.delete('/admin/soak')).json()
+            assert not report['running'] and report['missed'] == 0
+            # Once the soak is over the device gets its regular config again
+            assert (await client.get(CONFIG_PATH)).headers['X-Config-MD5'] not in md5s
+
+    asyncio.run(run())
@@ -0,0 +1,103 @@
+"""
+Tests for the indexed per-device fixture store
+"""
+
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+import server
+from fixture_store import FixtureStore
+
+
+def write_fixture(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+@pytest.fixture
+def responses(tmp_path):
+    write_fixture(tmp_path / 'app_config.json', b'{"scope": "global"}')
+    write_fixture(tmp_path / 'acme' / 'app_config.json', b'{"scope": "company"}')
+    write_fixture(tmp_path / 'acme' / 'gw-1' / 'app_config.json', b'{"scope": "device"}')
+    return tmp_path
+
+
+def test_lookup_prefers_most_specific_fixture(responses):
+    store = FixtureStore(responses).load()
+    assert len(store) == 3
+    assert store.lookup('acme', 'gw-1').content == b'{"scope": "device"}'
+    assert store.lookup('acme', 'gw-2').scope == 'company'
+    assert store.lookup('other', 'gw-1').scope == 'global'
+    assert store.lookup('acme', 'gw-1').md5 == hashlib.md5(b'{"scope": "device"}').hexdigest()
+
+
+def test_lookup_without_fixtures_returns_none(tmp_path):
+    assert FixtureStore(tmp_path / 'missing').load().lookup('acme', 'gw-1') is None
+
+
+def test_files_outside_the_layout_are_ignored(responses):
+    write_fixture(responses / 'acme' / 'gw-1' / 'nested' / 'app_config.json', b'{}')
+    write_fixture(responses / 'acme' / 'config.json', b'{}')
+    assert len(FixtureStore(responses).load()) == 3
+
+
+def wait_for(store, predicate, timeout=2.0):
+    async def poll():
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not predicate(store):
+            if asyncio.get_running_loop().time() > deadline:
+                raise AssertionError('fixture index did not update')
+            await asyncio.sleep(0.01)
+    return poll()
+
+
+def test_inotify_keeps_index_current(responses):
+    async def run():
+        store = FixtureStore(responses).load()
+        if store.watch() != 'inotify':
+            pytest.skip('inotify not available')
+        try:
+            write_fixture(responses / 'acme' / 'gw-1' / 'app_config.json', b'{"scope": "device", "v": 2}')
+            await wait_for(store, lambda s: s.lookup('acme', 'gw-1').content.endswith(b'"v": 2}'))
+
+            # New company and device directories are watched as they appear
+            write_fixture(responses / 'beta' / 'gw-9' / 'app_config.json', b'{"scope": "new device"}')
+            await wait_for(store, lambda s: s.lookup('beta', 'gw-9').scope == 'device')
+            write_fixture(responses / 'beta' / 'gw-9' / 'app_config.json', b'{"scope": "new device", "v": 2}')
+            await wait_for(store, lambda s: s.lookup('beta', 'gw-9').content.endswith(b'"v": 2}'))
+
+            # Atomic replace and removal
+            tmp = responses / 'acme' / '.app_config.json.tmp'
+            tmp.write_bytes(b'{"scope": "company", "v": 2}')
+            os.replace(tmp, responses / 'acme' / 'app_config.json')
+            await wait_for(store, lambda s: s.lookup('acme', 'gw-2').content.endswith(b'"v": 2}'))
+            (responses / 'acme' / 'gw-1' / 'app_config.json').unlink()
+            await wait_for(store, lambda s: s.lookup('acme', 'gw-1').scope == 'company')
+        finally:
+            store.close()
+
+    asyncio.run(run())
+
+
+def test_poll_fallback_rescans(responses):
+    async def run():
+        store = FixtureStore(responses, poll_interval=0.02).load()
+        store.poll_task = asyncio.get_running_loop().create_task(store.poll())
+        try:
+            (responses / 'app_config.json').unlink()
+            await wait_for(store, lambda s: s.lookup('other', 'gw-1') is None)
+        finally:
+            store.close()
+
+    asyncio.run(run())
+
+
+def test_config_download_uses_device_fixture(responses, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(responses))
+    _, json_md5, _ = asyncio.run(server.generate_app_config_zip('acme', 'gw-1', compression='stored'))
+    assert json_md5 == hashlib.md5(b'{"scope": "device"}').hexdigest()
+    _, default_md5, _ = asyncio.run(server.generate_app_config_zip('other-company', 'gw-1', compression='stored'))
+    assert default_md5 == hashlib.md5(b'{"scope": "global"}').hexdigest()
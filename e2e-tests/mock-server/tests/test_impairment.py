@@ -0,0 +1,160 @@
+"""
+Tests for per-device network impairment profiles
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import ClientPayloadError
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from fixture_store import FixtureStore
+from impairment import PRESETS, ImpairmentProfile, Impairments
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+
+@pytest.fixture(autouse=True)
+def isolated_impairments(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.setattr(server, 'IMPAIRMENTS', Impairments(seed=1))
+    return server.IMPAIRMENTS
+
+
+class TestProfiles:
+    """Profile parsing and validation"""
+
+    def test_preset_with_overrides(self):
+        profile = ImpairmentProfile.from_json('{"preset": "3g", "reset_probability": 0.5}')
+        assert profile.latency_ms == PRESETS['3g']['latency_ms']
+        assert profile.reset_probability == 0.5
+        assert not profile.is_clean
+
+    def test_bare_preset_name(self):
+        assert ImpairmentProfile.from_json('lan').is_clean
+        assert ImpairmentProfile.from_json('"satellite"').latency_ms == 600
+
+    @pytest.mark.parametrize('text', [
+        '{"latency": 5}', '{"latency_ms": -1}', '{"reset_probability": 2}',
+        '{"latency_ms": "5"}', '{"preset": "dialup"}', '[1]', '{not json', '{"chunk_size": 0}',
+    ])
+    def test_rejects_invalid_profiles(self, text):
+        with pytest.raises(ValueError):
+            ImpairmentProfile.from_json(text)
+
+    def test_jitter_stays_within_bounds(self):
+        profile = ImpairmentProfile(latency_ms=100, jitter_ms=20)
+        rng = Impairments(seed=3).rng
+        delays = [profile.http_delay(rng) for _ in range(200)]
+        assert 0.08 <= min(delays) < max(delays) <= 0.12
+
+
+def test_resolution_prefers_specific_scope_and_admin_override(tmp_path):
+    (tmp_path / 'impairment.json').write_text('"dsl"')
+    (tmp_path / 'acme' / 'gw-1').mkdir(parents=True)
+    (tmp_path / 'acme' / 'gw-1' / 'impairment.json').write_text('{"preset": "lossy"}')
+    (tmp_path / 'acme' / 'gw-2').mkdir()
+    (tmp_path / 'acme' / 'gw-2' / 'impairment.json').write_text('{broken')
+    store = FixtureStore(tmp_path).load()
+    impairments = Impairments()
+
+    assert impairments.resolve('acme', 'gw-1', store).reset_probability == PRESETS['lossy']['reset_probability']
+    assert impairments.resolve('acme', 'gw-3', store).latency_ms == PRESETS['dsl']['latency_ms']
+    assert impairments.resolve('acme', 'gw-2', store).is_clean
+
+    impairments.set(ImpairmentProfile(latency_ms=1), 'acme')
+    assert impairments.resolve('acme', 'gw-1', store).reset_probability > 0
+    assert impairments.resolve('acme', 'gw-3', store).latency_ms == 1
+    assert impairments.clear('acme')
+    assert not impairments.clear('acme')
+
+
+def test_overrides_are_shared_by_workers(tmp_path):
+    first, second = Impairments(directory=tmp_path), Impairments(directory=tmp_path)
+    first.set(ImpairmentProfile.from_value('3g'), 'acme', 'gw-1')
+    assert second.resolve('acme', 'gw-1').latency_ms == PRESETS['3g']['latency_ms']
+    second.set(ImpairmentProfile(latency_ms=5))
+    assert first.resolve('other', 'gw-9').latency_ms == 5 and ('acme', 'gw-1') in first.overrides
+    assert second.clear('acme', 'gw-1') and not first.clear('acme', 'gw-1')
+    assert second.resolve('acme', 'gw-1').latency_ms == 5
+    Impairments(directory=tmp_path).reset()
+    assert first.resolve('acme', 'gw-1').is_clean and second.resolve('other', 'gw-9').is_clean
+
+
+def download(app, path=CONFIG_PATH):
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            started = time.monotonic()
+            response = await client.get(path)
+            body = await response.read()
+            return response.status, body, time.monotonic() - started
+    return asyncio.run(run())
+
+
+def test_latency_and_bandwidth_cap(tmp_path, isolated_impairments):
+    (tmp_path / 'app_config.json').write_bytes(json.dumps({'blob': list(range(6000))}).encode())
+    _, clean_body, _ = download(server.MockHTTPServer().app)
+
+    # 80 KB/s plus 100ms latency
+    isolated_impairments.set(ImpairmentProfile(latency_ms=100, bandwidth_kbps=640, chunk_size=1024))
+    status, body, elapsed = download(server.MockHTTPServer().app)
+    assert status == 200
+    assert body == clean_body
+    assert elapsed >= 0.1 + len(body) / 80000 * 0.9
+
+
+def test_connection_reset_mid_body(isolated_impairments):
+    isolated_impairments.set(ImpairmentProfile(reset_probability=1), 'acme', 'gw-1')
+    resets = server.IMPAIRMENT_ACTIONS.get(action='http_reset')
+    with pytest.raises(ClientPayloadError):
+        download(server.MockHTTPServer().app)
+    assert server.IMPAIRMENT_ACTIONS.get(action='http_reset') == resets + 1
+    # Other devices are unaffected
+    assert download(server.MockHTTPServer().app, CONFIG_PATH.replace('gw-1', 'gw-2'))[0] == 200
+
+
+def test_admin_endpoint_round_trip():
+    async def run():
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            response = await client.put('/admin/impairment/acme/gw-1', data='{"preset": "3g"}')
+            assert response.status == 200
+            shown = await (await client.get('/admin/impairment/acme/gw-1')).json()
+            assert shown['override'] and shown['profile']['latency_ms'] == PRESETS['3g']['latency_ms']
+            assert (await client.put('/admin/impairment', data='{"latency": 1}')).status == 400
+            assert (await client.delete('/admin/impairment/acme/gw-1')).status == 200
+            assert (await client.delete('/admin/impairment/acme/gw-1')).status == 404
+            shown = await (await client.get('/admin/impairment/acme/gw-1')).json()
+            assert not shown['override'] and shown['profile']['latency_ms'] == 0
+    asyncio.run(run())
+
+
+def config_request(mqtt_server):
+    payload = json.dumps({'config_version': 3, 'requested': True}).encode()
+    mqtt_server.on_message(None, None, SimpleNamespace(topic='u/acme/gw-1/config', payload=payload))
+
+
+def test_mqtt_reply_dropped_or_delayed(isolated_impairments):
+    async def run():
+        mqtt_server = server.MockMQTTServer()
+        mqtt_server.loop = asyncio.get_running_loop()
+        published = []
+        mqtt_server.publish = lambda topic, payload, qos=1: published.append((time.monotonic(), topic))
+
+        isolated_impairments.set(ImpairmentProfile(mqtt_drop_probability=1))
+        config_request(mqtt_server)
+        await asyncio.sleep(0.05)
+        assert published == []
+
+        isolated_impairments.set(ImpairmentProfile(mqtt_delay_ms=50))
+        started = time.monotonic()
+        config_request(mqtt_server)
+        assert published == []
+        await asyncio.sleep(0.1)
+        assert [topic for _, topic in published] == ['d/acme/gw-1/gateway_commands/send_config_v3']
+        assert published[0][0] - started >= 0.05
+
+    asyncio.run(run())
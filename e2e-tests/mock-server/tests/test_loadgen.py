@@ -0,0 +1,90 @@
+"""
+Unit tests for the load generator statistics and request scheduling
+"""
+
+import asyncio
+import json
+import math
+from types import SimpleNamespace
+
+import aiohttp
+import paho.mqtt.client as mqtt
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from loadgen import LoadGenerator, percentile, requests_allowed, summarize_latencies
+
+
+class TestPercentile:
+    """Percentile interpolation"""
+
+    def test_empty(self):
+        assert percentile([], 50) is None
+
+    def test_single_value(self):
+        assert percentile([0.25], 99) == 0.25
+
+    def test_interpolates_between_ranks(self):
+        values = [1, 2, 3, 4]
+        assert percentile(values, 0) == 1
+        assert percentile(values, 50) == pytest.approx(2.5)
+        assert percentile(values, 100) == 4
+
+    def test_summary_is_in_milliseconds(self):
+        summary = summarize_latencies([0.003, 0.001, 0.002])
+        assert summary['count'] == 3
+        assert summary['min'] == 1.0
+        assert summary['p50'] == 2.0
+        assert summary['max'] == 3.0
+
+    def test_summary_of_no_samples(self):
+        assert summarize_latencies([])['p99'] is None
+
+
+class TestRequestSchedule:
+    """Rate and ramp allowance"""
+
+    def test_unlimited_rate(self):
+        assert requests_allowed(1.0, 0, 0) == math.inf
+
+    def test_flat_rate(self):
+        assert requests_allowed(2.0, 50, 0) == pytest.approx(100)
+
+    def test_ramp_is_linear_then_flat(self):
+        # Half way through a 10s ramp to 100 rps: area of the triangle = 0.5 * 5s * 50rps
+        assert requests_allowed(5.0, 100, 10) == pytest.approx(125)
+        # End of ramp plus 1s at full rate
+        assert requests_allowed(11.0, 100, 10) == pytest.approx(600)
+
+
+class FakeConnection:
+    """Answers every config request with a send_config_v3 pointing at url"""
+
+    def __init__(self, generator, url):
+        self.generator = generator
+        self.url = url
+
+    def request_config(self, device):
+        command = json.dumps({'command_type': 'send_config_v3', 'payload': {'url': self.url, 'md5': 'x'}})
+        asyncio.get_running_loop().call_soon(self.generator.on_command, device, command, 0.0)
+        return SimpleNamespace(rc=mqtt.MQTT_ERR_SUCCESS)
+
+
+def test_corrupt_archive_is_a_failed_request():
+    async def truncated(request):
+        return web.Response(body=b'PK\x03\x04truncated')
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/app_config.zip', truncated)
+        async with TestServer(app) as http_server, aiohttp.ClientSession() as session:
+            generator = LoadGenerator(devices=2, verify=True)
+            url = str(http_server.make_url('/app_config.zip'))
+            for device in generator.device_ids:
+                generator.device_connection[device] = FakeConnection(generator, url)
+            await asyncio.gather(*(generator.round_trip(session, device) for device in generator.device_ids))
+            return generator
+
+    generator = asyncio.run(run())
+    assert generator.errors == {'invalid_archive': 2} and generator.completed == 0
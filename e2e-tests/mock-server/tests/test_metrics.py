@@ -0,0 +1,141 @@
+"""
+Unit tests for the Prometheus metrics registry and the /metrics endpoint
+"""
+
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import metrics
+import server
+
+
+class TestRegistry:
+    """Text exposition format rendering"""
+
+    def test_counter_with_labels(self):
+        registry = metrics.Registry()
+        counter = registry.counter('requests_total', 'Requests', ('route',))
+        counter.inc(route='/a')
+        counter.inc(2, route='/b "quoted"')
+        text = registry.render()
+        assert '# TYPE requests_total counter' in text
+        assert 'requests_total{route="/a"} 1' in text
+        assert 'requests_total{route="/b \\"quoted\\""} 2' in text
+        assert counter.total() == 3
+
+    def test_counter_rejects_wrong_labels(self):
+        counter = metrics.Registry().counter('x_total', 'X', ('a',))
+        with pytest.raises(ValueError):
+            counter.inc(b='1')
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5.0):
+            histogram.observe(value)
+        lines = registry.render().splitlines()
+        assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+        assert 'latency_seconds_bucket{le="1"} 3' in lines
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+        assert 'latency_seconds_count 4' in lines
+        assert 'latency_seconds_sum 6.25' in lines
+
+    def test_gauge_function(self):
+        registry = metrics.Registry()
+        gauge = registry.gauge('ratio', 'Ratio')
+        gauge.set_function(lambda registry: 0.5)
+        assert 'ratio 0.5' in registry.render()
+
+    def test_duplicate_names_rejected(self):
+        registry = metrics.Registry()
+        registry.counter('a_total', 'A')
+        with pytest.raises(ValueError):
+            registry.gauge('a_total', 'A')
+
+
+def test_topic_pattern():
+    assert server.topic_pattern('u/company/device/config') == 'u/+/+/config'
+    assert server.topic_pattern('d/c/d/gateway_commands/send_config_v3') == 'd/+/+/gateway_commands/send_config_v3'
+    assert server.topic_pattern('other/topic') == 'other/topic'
+
+
+def test_metrics_endpoint_reports_http_and_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    server.ARCHIVE_CACHE.clear()
+    route = '/api/v1/platform/configs_v3/{company_id}/{device_unique_id}/app_config.zip'
+    requests_before = server.HTTP_REQUESTS.get(route=route, method='GET', status=200)
+    hits_before = server.ARCHIVE_CACHE_LOOKUPS.get(result='hit')
+
+    async def run():
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            for _ in range(3):
+                response = await client.get('/api/v1/platform/configs_v3/c/d/app_config.zip')
+                assert response.status == 200
+            assert (await client.get('/missing')).status == 404
+            response = await client.get('/metrics')
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            return await response.text()
+
+    text = asyncio.run(run())
+    assert server.HTTP_REQUESTS.get(route=route, method='GET', status=200) == requests_before + 3
+    assert server.ARCHIVE_CACHE_LOOKUPS.get(result='hit') == hits_before + 2
+    assert 'mock_http_requests_total{route="unmatched",method="GET",status="404"}' in text
+    assert 'mock_http_request_duration_seconds_bucket{route="' + route + '",le="+Inf"}' in text
+    assert 'mock_config_generation_seconds_count{source="default"}' in text
+    assert 'mock_archive_cache_hit_ratio ' in text
+    assert 'mock_http_requests_in_flight 1' in text
+
+
+def test_snapshots_merge_into_one_report():
+    registry = metrics.Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(1.0,))
+    in_flight = registry.gauge('in_flight', 'In flight')
+    share = registry.gauge('share', 'Share of /a requests')
+    share.set_function(lambda r: r.metrics['requests_total'].get(route='/a') / r.metrics['requests_total'].total())
+
+    requests.inc(route='/a')
+    latency.observe(0.5)
+    in_flight.set(1)
+    worker_snapshot = registry.snapshot()
+    assert 'share' not in worker_snapshot
+
+    requests.inc(route='/b')
+    latency.observe(2.0)
+    merged = registry.merged([registry.snapshot(), worker_snapshot])
+
+    assert merged.metrics['requests_total'].get(route='/a') == 2
+    assert merged.metrics['requests_total'].get(route='/b') == 1
+    assert merged.metrics['latency_seconds'].get() == (3, 3.0)
+    assert merged.metrics['in_flight'].get() == 2
+    assert merged.metrics['share'].get() == pytest.approx(2 / 3)
+    assert 'latency_seconds_bucket{le="1"} 2' in merged.render()
+
+
+def test_merge_adds_families_only_other_processes_register():
+    registry = metrics.Registry()
+    registry.counter('requests_total', 'Requests')
+    other = metrics.Registry()
+    other.counter('requests_total', 'Requests').inc()
+    other.histogram('broker_seconds', 'Broker latency', ('qos',), buckets=(0.1,)).observe(0.05, qos=1)
+    other.gauge('broker_connections', 'Connections').set(3)
+
+    merged = registry.merged([registry.snapshot(), json.loads(json.dumps(other.snapshot()))])
+
+    assert merged.metrics['requests_total'].get() == 1
+    assert merged.metrics['broker_seconds'].get(qos=1) == (1, 0.05)
+    assert merged.metrics['broker_connections'].get() == 3
+    assert 'broker_seconds_bucket{qos="1",le="0.1"} 1' in merged.render()
+
+
+def test_worker_metrics_collect_sums_other_workers(tmp_path):
+    server.MQTT_RECEIVED.inc(topic='u/+/+/config')
+    server.WorkerMetrics(tmp_path, 1).publish()
+    own = server.MQTT_RECEIVED.get(topic='u/+/+/config')
+
+    merged = server.WorkerMetrics(tmp_path, 0).collect()
+
+    assert merged.metrics['mock_mqtt_messages_received_total'].get(topic='u/+/+/config') == 2 * own
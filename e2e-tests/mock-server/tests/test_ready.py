@@ -0,0 +1,109 @@
+"""
+Tests for the composite /ready endpoint
+"""
+
+import asyncio
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+
+
+@pytest.mark.parametrize('value,seconds', [('30', 30.0), ('30s', 30.0), ('500ms', 0.5), ('1.5s', 1.5), ('900', 300.0)])
+def test_parse_wait(value, seconds):
+    assert server.parse_wait(value) == seconds
+
+
+@pytest.mark.parametrize('value', ['', 'soon', '-1s', '5m'])
+def test_parse_wait_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        server.parse_wait(value)
+
+
+def test_ready_reports_each_check(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+
+    async def run():
+        readiness = server.Readiness()
+        responder = server.MockMQTTServer(readiness=readiness)
+        readiness.require('fixtures_loaded')
+        readiness.set('fixtures_loaded', True)
+        async with TestClient(TestServer(server.MockHTTPServer(readiness=readiness).app)) as client:
+            response = await client.get('/ready')
+            assert response.status == 503
+            assert (await response.json())['checks'] == {
+                'mqtt_connected': False, 'mqtt_subscribed': False, 'fixtures_loaded': True}
+
+            responder.on_connect(responder.client, None, None, 0, None)
+            assert (await client.get('/ready')).status == 503
+            responder.subscribed = True
+            responder._update_readiness()
+            assert (await client.get('/ready')).status == 200
+
+            responder.on_disconnect(responder.client, None, None, 7, None)
+            assert (await client.get('/ready')).status == 503
+            assert (await client.get('/ready?wait=later')).status == 400
+
+    asyncio.run(run())
+
+
+def test_long_poll_returns_as_soon_as_ready():
+    async def run():
+        readiness = server.Readiness()
+        readiness.require('mqtt_subscribed')
+        loop = asyncio.get_running_loop()
+        async with TestClient(TestServer(server.MockHTTPServer(readiness=readiness).app)) as client:
+            started = time.monotonic()
+            loop.call_later(0.1, readiness.set, 'mqtt_subscribed', True)
+            response = await client.get('/ready?wait=10s')
+            assert response.status == 200
+            assert 0.1 <= time.monotonic() - started < 2
+
+            readiness.set('mqtt_subscribed', False)
+            started = time.monotonic()
+            assert (await client.get('/ready?wait=200ms')).status == 503
+            assert time.monotonic() - started >= 0.2
+
+    asyncio.run(run())
+
+
+def test_ready_without_checks_once_http_is_up():
+    async def run():
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            assert (await client.get('/ready')).status == 200
+    asyncio.run(run())
+
+
+def test_other_workers_mirror_worker_0(tmp_path):
+    async def run():
+        owner = server.Readiness()
+        responder = server.MockMQTTServer(readiness=owner)
+        published = server.SharedReadiness(tmp_path, owner)
+        owner.listeners.append(published.publish)
+        published.publish()
+
+        mirror = server.Readiness()
+        mirror.require('fixtures_loaded')
+        mirror.set('fixtures_loaded', True)
+        task = asyncio.get_running_loop().create_task(server.SharedReadiness(tmp_path, mirror, interval=0.01).run())
+        try:
+            async with TestClient(TestServer(server.MockHTTPServer(readiness=mirror).app)) as client:
+                response = await client.get('/ready')
+                assert response.status == 503
+                assert (await response.json())['checks'] == {
+                    'fixtures_loaded': True, 'mqtt_connected': False, 'mqtt_subscribed': False}
+
+                responder.on_connect(responder.client, None, None, 0, None)
+                responder.subscribed = True
+                responder._update_readiness()
+                assert (await client.get('/ready?wait=2s')).status == 200
+
+                responder.on_disconnect(responder.client, None, None, 7, None)
+                await asyncio.sleep(0.05)
+                assert (await client.get('/ready')).status == 503
+        finally:
+            task.cancel()
+
+    asyncio.run(run())
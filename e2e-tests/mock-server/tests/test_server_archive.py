@@ -0,0 +1,151 @@
+"""
+Unit tests for archive compression settings and gzip content-encoding negotiation
+"""
+
+import asyncio
+import gzip
+import hashlib
+import zipfile
+from io import BytesIO
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server as mock_server
+from server import (
+    MockHTTPServer,
+    accepts_gzip,
+    build_zip_archive,
+    generate_app_config_zip,
+    parse_archive_settings,
+)
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/test-company/test-device/app_config.zip'
+
+
+@pytest.fixture(autouse=True)
+def empty_responses_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.delenv('ARCHIVE_COMPRESSION', raising=False)
+    monkeypatch.delenv('ARCHIVE_COMPRESSLEVEL', raising=False)
+
+
+def read_member(zip_data):
+    with zipfile.ZipFile(BytesIO(zip_data)) as archive:
+        info = archive.getinfo('app_config.json')
+        return info.compress_type, archive.read('app_config.json')
+
+
+class TestArchiveSettings:
+    """Archive method and level selection"""
+
+    def test_defaults_to_deflate(self):
+        assert parse_archive_settings() == ('deflate', None)
+
+    def test_environment_defaults(self, monkeypatch):
+        monkeypatch.setenv('ARCHIVE_COMPRESSION', 'deflate')
+        monkeypatch.setenv('ARCHIVE_COMPRESSLEVEL', '9')
+        assert parse_archive_settings() == ('deflate', 9)
+
+    def test_stored_ignores_level(self):
+        assert parse_archive_settings('STORED', '9') == ('stored', None)
+
+    @pytest.mark.parametrize('compression,level', [('bzip2', None), ('deflate', '0'), ('deflate', '10'), ('deflate', 'x')])
+    def test_rejects_invalid_settings(self, compression, level):
+        with pytest.raises(ValueError):
+            parse_archive_settings(compression, level)
+
+    @pytest.mark.parametrize('compression,level,method', [
+        ('stored', None, zipfile.ZIP_STORED),
+        ('deflate', 1, zipfile.ZIP_DEFLATED),
+        ('deflate', 9, zipfile.ZIP_DEFLATED),
+    ])
+    def test_archive_round_trips(self, compression, level, method):
+        content = b'{"key": "value"}' * 100
+        assert read_member(build_zip_archive(content, compression, level)) == (method, content)
+
+    def test_json_md5_does_not_depend_on_compression(self):
+        stored, stored_md5, _ = asyncio.run(generate_app_config_zip('c', 'd', compression='stored'))
+        deflated, deflated_md5, _ = asyncio.run(
+            generate_app_config_zip('c', 'd', compression='deflate', compresslevel=1))
+        assert stored_md5 == deflated_md5 == hashlib.md5(read_member(stored)[1]).hexdigest()
+        assert len(stored) > len(deflated)
+
+
+class TestAcceptEncoding:
+    """Accept-Encoding parsing"""
+
+    @pytest.mark.parametrize('header,expected', [
+        (None, False),
+        ('', False),
+        ('identity', False),
+        ('gzip', True),
+        ('deflate, gzip;q=0.5', True),
+        ('gzip;q=0', False),
+        ('*', True),
+        ('br, x-gzip', True),
+    ])
+    def test_accepts_gzip(self, header, expected):
+        assert accepts_gzip(header) is expected
+
+
+def fetch(server, path, headers=None):
+    async def run():
+        async with TestClient(TestServer(server.app)) as client:
+            response = await client.get(path, headers=headers or {}, auto_decompress=False)
+            return response.status, dict(response.headers), await response.read()
+    return asyncio.run(run())
+
+
+class TestConfigDownloadEncoding:
+    """HTTP response encoding for app_config.zip"""
+
+    def test_query_selects_stored_archive(self):
+        status, _, body = fetch(MockHTTPServer(), f"{CONFIG_PATH}?compression=stored")
+        assert status == 200
+        assert read_member(body)[0] == zipfile.ZIP_STORED
+
+    def test_invalid_level_is_bad_request(self):
+        status, _, _ = fetch(MockHTTPServer(), f"{CONFIG_PATH}?level=11")
+        assert status == 400
+
+    def test_gzip_disabled_by_default(self):
+        _, headers, body = fetch(MockHTTPServer(), CONFIG_PATH, {'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in headers
+        assert read_member(body)[0] == zipfile.ZIP_DEFLATED
+
+    def test_gzip_negotiated(self):
+        server = MockHTTPServer(gzip_level=6)
+        _, headers, body = fetch(server, f"{CONFIG_PATH}?compression=stored", {'Accept-Encoding': 'gzip'})
+        assert headers['Content-Encoding'] == 'gzip'
+        assert headers['Vary'] == 'Accept-Encoding'
+        assert int(headers['Content-Length']) == len(body)
+        assert read_member(gzip.decompress(body))[0] == zipfile.ZIP_STORED
+
+    def test_gzip_not_used_without_accept_encoding(self):
+        server = MockHTTPServer(gzip_level=6)
+        _, headers, body = fetch(server, CONFIG_PATH, {'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in headers
+        read_member(body)
+
+
+class TestDiskArchiveCache:
+    """Content-addressed archive cache shared between workers"""
+
+    def test_second_cache_reuses_archive_from_disk(self, tmp_path):
+        content = b'{"devices": []}'
+        json_md5 = hashlib.md5(content).hexdigest()
+        zip_data, zip_md5 = mock_server.ArchiveCache(directory=tmp_path).get_or_build(json_md5, content, 'deflate', 9)
+        assert (tmp_path / f"{json_md5}-deflate-9.zip").read_bytes() == zip_data
+        assert not list(tmp_path.glob('.*.tmp'))
+
+        disk_hits = mock_server.ARCHIVE_CACHE_LOOKUPS.get(result='disk_hit')
+        other_worker = mock_server.ArchiveCache(directory=tmp_path)
+        assert other_worker.get_or_build(json_md5, b'unused on a hit', 'deflate', 9) == (zip_data, zip_md5)
+        assert mock_server.ARCHIVE_CACHE_LOOKUPS.get(result='disk_hit') == disk_hits + 1
+
+    def test_archive_settings_are_part_of_the_address(self, tmp_path):
+        cache = mock_server.ArchiveCache(directory=tmp_path)
+        cache.get_or_build('abc', b'{}', 'stored', None)
+        cache.get_or_build('abc', b'{}', 'deflate', None)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['abc-deflate-default.zip', 'abc-stored-default.zip']
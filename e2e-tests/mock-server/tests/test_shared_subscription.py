@@ -0,0 +1,176 @@
+"""
+Tests for running several MQTT responders behind one broker
+
+The tests use the broker at MQTT_TEST_HOST:MQTT_TEST_PORT (e.g. a local mosquitto 2.x):
+    MQTT_TEST_HOST=localhost MQTT_TEST_PORT=1883 python3 -m pytest tests/test_shared_subscription.py
+and start the embedded broker (broker.py) when none is reachable. Every request being answered
+exactly once is checked everywhere. The throughput gain needs at least 3 CPUs (one per responder
+plus the broker): with fewer it is skipped, except under CI (CI=true), where it fails instead.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import paho.mqtt.client as mqtt
+import pytest
+
+import server
+
+SERVER = Path(__file__).resolve().parent.parent / 'server.py'
+BROKER = SERVER.with_name('broker.py')
+MQTT_TEST_HOST = os.getenv('MQTT_TEST_HOST', 'localhost')
+MQTT_TEST_PORT = int(os.getenv('MQTT_TEST_PORT', '1883'))
+SCALING_REQUESTS = int(os.getenv('SCALING_REQUESTS', '3000'))
+
+
+def test_plain_subscription_by_default():
+    responder = server.MockMQTTServer()
+    assert responder.subscription == 'u/+/+/config'
+    assert responder.client.protocol == mqtt.MQTTv311
+
+
+def test_share_group_uses_mqtt5_shared_subscription():
+    responder = server.MockMQTTServer(share_group='responders')
+    assert responder.subscription == '$share/responders/u/+/+/config'
+    assert responder.client.protocol == mqtt.MQTTv5
+
+
+def test_client_ids_are_unique_per_process():
+    assert server.default_client_id().endswith(f"-{os.getpid()}")
+    assert server.MockMQTTServer(client_id='custom').client_id == 'custom'
+
+
+def broker_available(host, port):
+    try:
+        with socket.create_connection((host, port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def mqtt_broker():
+    """(host, port) of the external test broker, or of an embedded broker started for the test"""
+    if broker_available(MQTT_TEST_HOST, MQTT_TEST_PORT):
+        yield MQTT_TEST_HOST, MQTT_TEST_PORT
+        return
+    port = free_port()
+    process = subprocess.Popen([sys.executable, str(BROKER), '--port', str(port)])
+    try:
+        deadline = time.monotonic() + 10
+        while not broker_available('127.0.0.1', port):
+            if process.poll() is not None or time.monotonic() > deadline:
+                pytest.fail('embedded broker did not start')
+            time.sleep(0.05)
+        yield '127.0.0.1', port
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def start_responders(count, share_group, tmp_path, mqtt_broker):
+    """Run server.py --workers count joined to one share group; returns (process, log path)"""
+    log_path = tmp_path / f"responders-{count}.log"
+    env = dict(
+        os.environ,
+        MQTT_HOST=mqtt_broker[0],
+        MQTT_PORT=str(mqtt_broker[1]),
+        MQTT_SHARE_GROUP=share_group,
+        HTTP_HOST='127.0.0.1',
+        HTTP_PORT=str(free_port()),
+        RESPONSES_DIR=str(tmp_path / 'responses'),
+        MOCK_STATE_DIR=str(tmp_path / f"state-{count}"),
+        LOG_LEVEL='INFO',
+    )
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen([sys.executable, str(SERVER), '--workers', str(count)],
+                                   env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while log_path.read_text().count('Mock server ready to accept connections') < count:
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.terminate()
+            pytest.fail(f"responders did not start:\n{log_path.read_text()[-2000:]}")
+        time.sleep(0.1)
+    return process, log_path
+
+
+def measure_throughput(requests, run_id, mqtt_broker):
+    """Publish config requests for distinct devices and time until every send_config_v3 reply arrived"""
+    replies = set()
+    done = threading.Event()
+
+    def on_message(client, userdata, msg):
+        replies.add(msg.topic.split('/')[2])
+        if len(replies) >= requests:
+            done.set()
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"scaling-test-{run_id}")
+    client.on_message = on_message
+    client.connect(*mqtt_broker)
+    client.subscribe(f"d/{run_id}/+/gateway_commands/send_config_v3", qos=1)
+    client.loop_start()
+    try:
+        time.sleep(0.5)
+        payload = json.dumps({'config_version': 3, 'requested': True})
+        started = time.monotonic()
+        for index in range(requests):
+            client.publish(f"u/{run_id}/device-{index:06d}/config", payload, qos=0)
+        assert done.wait(120), f"only {len(replies)}/{requests} replies received"
+        return requests / (time.monotonic() - started)
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+def run_share_group(count, requests, tmp_path, mqtt_broker):
+    """
+    Answer config requests with count responders joined to one share group
+
+    Returns:
+        tuple: (requests per second, replies published by each worker)
+    """
+    share_group = f"scaling-{uuid.uuid4().hex[:8]}"
+    process, log_path = start_responders(count, share_group, tmp_path, mqtt_broker)
+    try:
+        throughput = measure_throughput(requests, share_group, mqtt_broker)
+    finally:
+        process.terminate()
+        process.wait(10)
+    log = log_path.read_text().splitlines()
+    replies_per_worker = [
+        sum(1 for line in log if f"worker-{worker} " in line and 'Publishing config response' in line)
+        for worker in range(count)
+    ] if count > 1 else [sum(1 for line in log if 'Publishing config response' in line)]
+    print(f"\n{count} responder(s): {throughput:.0f} requests/s, replies per worker {replies_per_worker}")
+    return throughput, replies_per_worker
+
+
+def test_share_group_answers_every_request_once(tmp_path, mqtt_broker):
+    # Every config request is answered by exactly one responder, and all of them take a share
+    _, replies_per_worker = run_share_group(2, 1000, tmp_path, mqtt_broker)
+    assert sum(replies_per_worker) == 1000
+    assert all(replies_per_worker), replies_per_worker
+
+
+def test_throughput_scales_with_responder_count(tmp_path, request):
+    if (os.cpu_count() or 1) < 3:
+        message = f"needs at least 3 CPUs to show scaling, this host has {os.cpu_count()}"
+        if os.getenv('CI'):
+            pytest.fail(message)
+        pytest.skip(message)
+    mqtt_broker = request.getfixturevalue('mqtt_broker')
+    throughput = {count: run_share_group(count, SCALING_REQUESTS, tmp_path, mqtt_broker)[0] for count in (1, 2)}
+    assert throughput[2] > throughput[1] * 1.3
@@ -0,0 +1,103 @@
+"""
+Tests for the fixed-memory uplink sink
+"""
+
+import asyncio
+import logging
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from sink import CountMinSketch, Reservoir, SpaceSaving, UplinkSink
+
+
+def zipf_stream(count, seed=1):
+    rng = random.Random(seed)
+    return [f"device-{int(rng.paretovariate(1.1))}" for _ in range(count)]
+
+
+def test_count_min_never_undercounts():
+    sketch = CountMinSketch(width=64)
+    stream = zipf_stream(5000)
+    for key in stream:
+        sketch.add(key)
+    for key, count in Counter(stream).items():
+        assert count <= sketch.estimate(key) <= count + 2 * len(stream) / 64
+
+
+def test_space_saving_finds_heavy_hitters_with_bounded_error():
+    summary = SpaceSaving(k=20)
+    stream = zipf_stream(20000)
+    for key in stream:
+        summary.add(key)
+    true = Counter(stream)
+    assert len(summary.counts) == 20
+    assert [key for key, _, _ in summary.top(3)] == [key for key, _ in true.most_common(3)]
+    for key, count, error in summary.top():
+        assert count - error <= true[key] <= count
+
+
+def test_reservoir_is_bounded_and_uniform():
+    hits = Counter()
+    for seed in range(2000):
+        reservoir = Reservoir(4, random.Random(seed))
+        for item in range(40):
+            reservoir.add(item)
+        assert len(reservoir.items) == 4 and len(set(reservoir.items)) == 4
+        hits.update(reservoir.items)
+    # Every item is kept with probability 4/40 -> 200 times in expectation
+    assert 140 < min(hits.values()) and max(hits.values()) < 260
+
+
+def test_sink_counts_classes_and_devices():
+    sink = UplinkSink(server.topic_pattern, max_classes=2, reservoir_size=3, sample_bytes=4, seed=1)
+    for i in range(30):
+        sink.record(f"u/acme/gw-{i % 3}/report", b'report-payload')
+        sink.record(f"u/acme/gw-{i % 3}/heartbeat", b'hb')
+    sink.record('u/acme/gw-0/something_else', b'x')
+
+    report = sink.report(top=2)
+    assert (report['messages'], report['bytes']) == (61, 30 * 14 + 30 * 2 + 1)
+    assert report['classes']['u/+/+/report']['messages'] == 30
+    assert (report['classes']['other']['messages'], report['classes']['other']['bytes']) == (1, 1)
+    samples = report['classes']['u/+/+/report']['samples']
+    assert len(samples) == 3 and all(s['payload'] == 'repo' and s['bytes'] == 14 for s in samples)
+    assert len(report['top_devices']) == 2
+    assert sink.device_estimate('acme/gw-0')[0] >= 21
+
+    sink.reset()
+    assert sink.report()['messages'] == 0
+
+
+def test_sink_mode_counts_without_per_message_logging(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    sink = UplinkSink(server.topic_pattern)
+    responder = server.MockMQTTServer(sink=sink)
+    assert responder.subscription == 'u/#'
+    with caplog.at_level(logging.INFO):
+        for i in range(100):
+            msg = SimpleNamespace(topic=f"u/acme/gw-{i}/heartbeat", payload=b'{"ok": true}', qos=0, retain=False)
+            responder.on_message(None, None, msg)
+    assert sink.messages == 100
+    assert not [r for r in caplog.records if r.levelno >= logging.INFO]
+
+
+def test_sink_endpoint():
+    sink = UplinkSink(server.topic_pattern)
+    sink.record('u/acme/gw-1/report', b'{"value": 1}')
+
+    async def run():
+        async with TestClient(TestServer(server.MockHTTPServer(sink=sink).app)) as client:
+            report = await (await client.get('/sink?samples=0')).json()
+            assert report['classes'] == {'u/+/+/report': {'messages': 1, 'bytes': 12}}
+            estimate = await (await client.get('/sink?device=acme/gw-1')).json()
+            assert estimate['messages_estimate'] == 1
+            assert (await client.delete('/sink')).status == 200
+            assert (await (await client.get('/sink')).json())['messages'] == 0
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            assert (await client.get('/sink')).status == 404
+
+    asyncio.run(run())
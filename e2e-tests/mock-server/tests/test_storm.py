@@ -0,0 +1,163 @@
+"""
+Tests for server-side throttling and the reconnect storm benchmark
+"""
+
+import asyncio
+import json
+import random
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import server as mock_server
+from broker import Broker
+from storm import ReconnectStorm, backoff_delay, parse_retry_after
+from throttle import Throttle, ThrottlePolicy
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestThrottle:
+    """Token bucket admission and reply pacing"""
+
+    def test_downloads_beyond_burst_get_retry_after(self):
+        clock = FakeClock()
+        throttle = Throttle(ThrottlePolicy(http_rate=2, http_burst=2, retry_after=0.5), clock=clock)
+        assert throttle.admit_download() is None and throttle.admit_download() is None
+        assert throttle.admit_download() == 1
+        clock.now += 0.5
+        assert throttle.admit_download() is None
+        assert throttle.stats['http_admitted'] == 3 and throttle.stats['http_rejected'] == 1
+
+    def test_retry_after_covers_the_wait_for_a_token(self):
+        throttle = Throttle(ThrottlePolicy(http_rate=0.2, http_burst=1), clock=FakeClock())
+        throttle.admit_download()
+        assert throttle.admit_download() == 5
+
+    def test_replies_are_paced_and_dropped_past_max_delay(self):
+        clock = FakeClock()
+        throttle = Throttle(ThrottlePolicy(mqtt_rate=10, mqtt_max_delay=0.25), clock=clock)
+        delays = [throttle.reserve_reply() for _ in range(5)]
+        assert delays[:3] == pytest.approx([0, 0.1, 0.2])
+        assert delays[3] is None and delays[4] is None
+        assert throttle.queue_depth == 2 and throttle.stats['mqtt_queue_peak'] == 2
+        throttle.reply_sent()
+        clock.now += 1
+        assert throttle.reserve_reply() == 0
+        assert throttle.stats['mqtt_dropped'] == 2
+
+    def test_new_policy_keeps_queued_replies(self):
+        clock = FakeClock()
+        throttle = Throttle(ThrottlePolicy(mqtt_rate=10), clock=clock)
+        assert [throttle.reserve_reply() for _ in range(3)] == pytest.approx([0, 0.1, 0.2])
+        throttle.configure(ThrottlePolicy(mqtt_rate=10, mqtt_max_delay=0.25))
+        assert throttle.queue_depth == 2 and throttle.stats['mqtt_queue_peak'] == 2
+        # Paced behind the replies still held back
+        assert throttle.reserve_reply() is None
+        throttle.reply_sent()
+        throttle.reply_sent()
+        assert throttle.queue_depth == 0
+
+    def test_no_policy_does_nothing(self):
+        throttle = Throttle()
+        assert throttle.admit_download() is None and throttle.reserve_reply() == 0
+        assert throttle.policy.is_clean
+
+    @pytest.mark.parametrize('text', ['[]', '{"http_rate": -1}', '{"qps": 5}', '{"mqtt_rate": "fast"}', 'nope'])
+    def test_invalid_policies(self, text):
+        with pytest.raises(ValueError):
+            ThrottlePolicy.from_json(text)
+
+
+class TestBackoff:
+    """Client-side retry timing"""
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('3') == 3.0
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:05 GMT', now=1445412480) == 5.0
+        assert parse_retry_after('soon') is None and parse_retry_after(None) is None
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        rng = random.Random(1)
+        assert [backoff_delay(attempt, 1, 5, 0, rng) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
+        assert 1.6 <= backoff_delay(2, 1, 5, 0.2, rng) <= 2.4
+
+
+def test_throttled_download_returns_429(monkeypatch, tmp_path):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.setattr(mock_server, 'THROTTLE', Throttle(ThrottlePolicy(http_rate=1, retry_after=3)))
+
+    async def run():
+        async with TestClient(TestServer(mock_server.MockHTTPServer().app)) as client:
+            statuses = [(await client.get(CONFIG_PATH)) for _ in range(2)]
+            report = await (await client.get('/admin/throttle')).json()
+            reset = await (await client.post('/admin/throttle/reset')).json()
+            removed = await client.delete('/admin/throttle')
+            return statuses, report, reset, removed.status, await client.get(CONFIG_PATH)
+
+    (first, second), report, reset, removed, after = asyncio.run(run())
+    assert first.status == 200
+    assert second.status == 429 and second.headers['Retry-After'] == '3'
+    assert report['http_rejected'] == 1 and report['policy']['http_rate'] == 1
+    assert reset['http_rejected'] == 0
+    assert removed == 200 and after.status == 200
+
+
+def test_storm_drains_through_throttling(monkeypatch, tmp_path):
+    """A small fleet reconnects through 429s and paced replies and every device gets its config"""
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.setattr(mock_server, 'THROTTLE', Throttle())
+
+    async def run():
+        broker = await Broker(port=0).start()
+        runner = web.AppRunner(mock_server.MockHTTPServer().app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        http_port = runner.addresses[0][1]
+        monkeypatch.setenv('MOCK_SERVER_HOST', '127.0.0.1')
+        monkeypatch.setenv('MOCK_SERVER_PORT', str(http_port))
+        responder = mock_server.MockMQTTServer('127.0.0.1', broker.port, max_retries=1)
+        await responder.start()
+        try:
+            storm = ReconnectStorm(devices=30, window=0.3, mqtt_host='127.0.0.1', mqtt_port=broker.port,
+                                   admin_url=f"http://127.0.0.1:{http_port}", backoff_base=0.05,
+                                   throttle={'http_rate': 50, 'http_burst': 5, 'mqtt_rate': 100}, seed=3)
+            return await storm.run()
+        finally:
+            responder.stop()
+            await runner.cleanup()
+            await broker.stop()
+
+    report = asyncio.run(run())
+    assert report['devices'] == {'completed': 30, 'failed': 0}
+    assert report['retries']['http_429'] > 0
+    assert report['server']['http_rejected'] == report['retries']['http_429']
+    assert report['server']['mqtt_queued'] > 0
+    assert report['latency_ms']['time_to_config']['count'] == 30
+    assert sum(report['completions_per_second']) == 30
+    assert 0 < report['peak_waiting_devices'] <= 30
+    assert json.dumps(report)
+
+
+def test_throttle_is_refused_with_several_workers(monkeypatch, tmp_path):
+    monkeypatch.setattr(mock_server, 'THROTTLE', Throttle())
+
+    async def run():
+        app = mock_server.MockHTTPServer(worker_metrics=mock_server.WorkerMetrics(tmp_path, 0)).app
+        async with TestClient(TestServer(app)) as client:
+            return [(await request).status for request in (
+                client.put('/admin/throttle', data='{"http_rate": 1}'), client.delete('/admin/throttle'),
+                client.post('/admin/throttle/reset'), client.get('/admin/throttle'))]
+
+    assert asyncio.run(run()) == [409, 409, 409, 200]
+    assert mock_server.THROTTLE.policy.is_clean
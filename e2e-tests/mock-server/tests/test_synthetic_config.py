@@ -0,0 +1,180 @@
+"""
+Tests for the synthetic large-fleet app_config generator
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import zipfile
+from io import BytesIO
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server as mock_server
+from app_config_template import build_default_app_config
+from synthetic_config import SECTIONS, SyntheticSpec, build_archive, iter_chunks, iter_document
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+SPEC = SyntheticSpec(seed=3, device_types=3, devices=40, connections=2, ingestors=5, translators=2,
+                     commands=4, integrations=1, rules=10)
+
+
+def render(spec):
+    return ''.join(iter_document(spec, 'acme', 'gw-1'))
+
+
+class TestGenerator:
+    """Document shape and determinism"""
+
+    def test_stream_matches_json_dumps_of_whole_document(self):
+        text = render(SPEC)
+        document = json.loads(text)
+        assert text == json.dumps(document, indent=2)
+        for section in SECTIONS:
+            assert len(document[section]) == SPEC.counts[section]
+
+    def test_empty_spec_is_the_default_config(self):
+        default = build_default_app_config('acme', 'gw-1')
+        assert render(SyntheticSpec()) == json.dumps(default, indent=2)
+
+    def test_deterministic_and_seeded(self):
+        assert render(SPEC) == render(SyntheticSpec(**SPEC.to_dict()))
+        assert render(SPEC) != render(SyntheticSpec(**{**SPEC.to_dict(), 'seed': 4}))
+
+    def test_sections_are_independent(self):
+        more_rules = json.loads(render(SyntheticSpec(**{**SPEC.to_dict(), 'rules': 20})))
+        document = json.loads(render(SPEC))
+        assert more_rules['devices'] == document['devices']
+        assert more_rules['rules'][:10] == document['rules']
+
+    def test_references_point_at_generated_entries(self):
+        document = json.loads(render(SPEC))
+        device_types = {entry['id'] for entry in document['device_types']}
+        ingestors = {entry['id'] for entry in document['ingestors']}
+        for device in document['devices']:
+            assert device['device_type_id'] in device_types
+            assert set(device['ingestor_ids']) <= ingestors
+
+    def test_chunks_are_bounded(self):
+        spec = SyntheticSpec(devices=500)
+        chunks = list(iter_chunks(spec, 'acme', 'gw-1', chunk_size=16 * 1024))
+        assert len(chunks) > 10
+        assert max(len(chunk) for chunk in chunks[:-1]) < 32 * 1024
+        assert b''.join(chunks) == render(spec).encode()
+
+    def test_archive_md5_matches_member(self):
+        zip_data, json_md5, json_size = build_archive(SPEC, 'acme', 'gw-1', zipfile.ZIP_DEFLATED)
+        with zipfile.ZipFile(BytesIO(zip_data)) as archive:
+            content = archive.read('app_config.json')
+        assert hashlib.md5(content).hexdigest() == json_md5 and len(content) == json_size
+
+
+class TestSpec:
+    """Spec parsing and validation"""
+
+    def test_from_query(self):
+        assert SyntheticSpec.from_query({'compression': 'stored'}) is None
+        spec = SyntheticSpec.from_query({'devices': '100', 'seed': '9'})
+        assert spec.to_dict() == {'seed': 9, 'devices': 100}
+
+    @pytest.mark.parametrize('values', [
+        {'devices': -1}, {'devices': 1.5}, {'gadgets': 1}, {'seed': 'x'}, {'devices': 10**7},
+    ])
+    def test_invalid_specs(self, values):
+        with pytest.raises(ValueError):
+            SyntheticSpec(**values)
+
+    def test_invalid_query_value(self):
+        with pytest.raises(ValueError, match='devices'):
+            SyntheticSpec.from_query({'devices': 'many'})
+
+
+def fetch(path):
+    async def run():
+        async with TestClient(TestServer(mock_server.MockHTTPServer().app)) as client:
+            response = await client.get(path)
+            return response.status, dict(response.headers), await response.read()
+    return asyncio.run(run())
+
+
+class TestDownload:
+    """Selecting synthetic configs on app_config.zip downloads"""
+
+    @pytest.fixture(autouse=True)
+    def responses(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+        monkeypatch.setattr(mock_server, 'SYNTHETIC_ARCHIVES', type(mock_server.SYNTHETIC_ARCHIVES)())
+        return tmp_path
+
+    @staticmethod
+    def member(body):
+        with zipfile.ZipFile(BytesIO(body)) as archive:
+            return json.loads(archive.read('app_config.json'))
+
+    def test_query_parameters(self):
+        status, headers, body = fetch(f"{CONFIG_PATH}?devices=25&rules=3&seed=2")
+        assert status == 200
+        document = self.member(body)
+        assert len(document['devices']) == 25 and len(document['rules']) == 3
+        _, again, _ = fetch(f"{CONFIG_PATH}?devices=25&rules=3&seed=2")
+        assert again['X-Config-MD5'] == headers['X-Config-MD5']
+
+    def test_invalid_query_is_rejected(self):
+        status, _, body = fetch(f"{CONFIG_PATH}?devices=-5")
+        assert status == 400 and 'devices' in json.loads(body)['error']
+
+    def test_device_fixture(self, responses):
+        (responses / 'app_config.json').write_text('{"global": true}')
+        device_dir = responses / 'acme' / 'gw-1'
+        device_dir.mkdir(parents=True)
+        (device_dir / 'synthetic.json').write_text(json.dumps({'devices': 12}))
+        _, json_md5, _ = asyncio.run(mock_server.generate_app_config_zip('acme', 'gw-1'))
+        zip_data, other_md5, _ = asyncio.run(mock_server.generate_app_config_zip('acme', 'gw-2'))
+        assert self.member(zip_data) == {'global': True}
+        _, headers, body = fetch(CONFIG_PATH)
+        assert len(self.member(body)['devices']) == 12
+        assert headers['X-Config-MD5'] == json_md5 != other_md5
+
+    def test_app_config_in_same_scope_wins(self, responses):
+        (responses / 'app_config.json').write_text('{"global": true}')
+        (responses / 'synthetic.json').write_text(json.dumps({'devices': 12}))
+        zip_data, _, _ = asyncio.run(mock_server.generate_app_config_zip('acme', 'gw-1'))
+        assert self.member(zip_data) == {'global': True}
+
+    def test_invalid_fixture_falls_back(self, responses):
+        (responses / 'synthetic.json').write_text('{"devices": "lots"}')
+        zip_data, _, _ = asyncio.run(mock_server.generate_app_config_zip('acme', 'gw-1'))
+        assert self.member(zip_data)['devices'] == []
+
+    def test_build_runs_off_the_event_loop_once(self, monkeypatch):
+        builds = []
+
+        def slow_build(*args):
+            builds.append(args[0])
+            time.sleep(0.2)
+            return build_archive(*args)
+
+        monkeypatch.setattr(mock_server, 'build_synthetic_archive', slow_build)
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.get_running_loop().create_task(tick())
+            first, second = await asyncio.gather(*(mock_server.generate_app_config_zip(
+                'acme', 'gw-1', synthetic=SyntheticSpec(devices=5)) for _ in range(2)))
+            ticker.cancel()
+            return ticks, first, second
+
+        ticks, first, second = asyncio.run(run())
+        assert first == second and len(builds) == 1
+        # The loop kept running while the archive was built
+        assert ticks >= 5
@@ -0,0 +1,141 @@
+"""
+Tests for the per-device config round trip timeline
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from impairment import Impairments
+from throttle import Throttle
+from timeline import DeviceTimeline, breakdown
+
+CONFIG_PATH = '/api/v1/platform/configs_v3/acme/gw-1/app_config.zip'
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDeviceTimeline:
+
+    def test_first_last_and_count_per_event(self):
+        clock = FakeClock()
+        timeline = DeviceTimeline(clock=clock)
+        timeline.mark('acme', 'gw-1', 'config_requested')
+        clock.now = 1000.5
+        timeline.mark('acme', 'gw-1', 'config_published')
+        clock.now = 1002.0
+        timeline.mark('acme', 'gw-1', 'config_requested')
+        timeline.mark('acme', 'gw-1', 'config_downloaded', when=1001.25)
+
+        events = timeline.get('acme', 'gw-1')
+        assert list(events) == ['config_requested', 'config_published', 'config_downloaded']
+        assert events['config_requested'] == {'first': 1000.0, 'last': 1002.0, 'count': 2}
+        assert breakdown(events, started_at=990.0) == {
+            'start -> config_requested': 10.0,
+            'config_requested -> config_published': 0.5,
+            'config_published -> config_downloaded': 0.75,
+        }
+        assert timeline.get('acme', 'gw-2') == {}
+        with pytest.raises(ValueError, match="Unknown timeline event 'connected'"):
+            timeline.mark('acme', 'gw-1', 'connected')
+
+    def test_least_recently_active_devices_are_forgotten(self):
+        timeline = DeviceTimeline(max_devices=2)
+        for device in ('gw-1', 'gw-2', 'gw-1', 'gw-3'):
+            timeline.mark('acme', device, 'config_requested')
+        assert sorted(timeline.report()) == ['acme/gw-1', 'acme/gw-3']
+        assert timeline.clear('acme', 'gw-1') and not timeline.clear('acme', 'gw-1')
+        assert list(timeline.report()) == ['acme/gw-3']
+
+    def test_workers_share_a_directory(self, tmp_path, monkeypatch):
+        http_worker = DeviceTimeline(directory=tmp_path)
+        mqtt_worker = DeviceTimeline(directory=tmp_path)
+        monkeypatch.setattr('os.getpid', lambda: 101)
+        mqtt_worker.mark('acme', 'gw-1', 'config_requested', when=5.0)
+        mqtt_worker.mark('acme', 'gw-2', 'config_requested', when=5.5)
+        monkeypatch.setattr('os.getpid', lambda: 102)
+        http_worker.mark('acme', 'gw-1', 'config_downloaded', when=6.0)
+        (tmp_path / 'events-103.jsonl').write_text('{"company_id": "acme", "devi')
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['events-101.jsonl', 'events-102.jsonl',
+                                                              'events-103.jsonl']
+        assert http_worker.get('acme', 'gw-1') == {'config_requested': {'first': 5.0, 'last': 5.0, 'count': 1},
+                                                   'config_downloaded': {'first': 6.0, 'last': 6.0, 'count': 1}}
+        assert http_worker.clear('acme', 'gw-1')
+        assert list(mqtt_worker.report()) == ['acme/gw-2']
+        assert mqtt_worker.clear() and mqtt_worker.report() == {} and http_worker.report() == {}
+
+    def test_worker_files_are_compacted_and_read_incrementally(self, tmp_path, monkeypatch):
+        monkeypatch.setattr('os.getpid', lambda: 101)
+        worker = DeviceTimeline(directory=tmp_path, compact_every=10)
+        reader = DeviceTimeline(directory=tmp_path)
+        for index in range(25):
+            worker.mark('acme', f"gw-{index % 2}", 'config_requested', when=float(index))
+            if index == 12:
+                assert reader.get('acme', 'gw-0')['config_requested']['count'] == 7
+        lines = (tmp_path / 'events-101.jsonl').read_text().splitlines()
+        # Two compacted records plus the five events since the last compaction
+        assert len(lines) == 7
+        assert reader.get('acme', 'gw-0') == {'config_requested': {'first': 0.0, 'last': 24.0, 'count': 13}}
+        assert reader.get('acme', 'gw-1') == {'config_requested': {'first': 1.0, 'last': 23.0, 'count': 12}}
+
+
+@pytest.fixture
+def timeline(tmp_path, monkeypatch):
+    monkeypatch.setenv('RESPONSES_DIR', str(tmp_path))
+    monkeypatch.setattr(server, 'IMPAIRMENTS', Impairments(seed=1))
+    monkeypatch.setattr(server, 'THROTTLE', Throttle())
+    monkeypatch.setattr(server, 'TIMELINE', DeviceTimeline())
+    return server.TIMELINE
+
+
+def test_round_trip_is_recorded_and_reported(timeline):
+    async def run():
+        mqtt_server = server.MockMQTTServer()
+        mqtt_server.loop = asyncio.get_running_loop()
+        published = []
+        mqtt_server.publish = lambda topic, payload, qos=1: published.append(topic)
+        payload = json.dumps({'config_version': 3, 'requested': True}).encode()
+        mqtt_server.on_message(None, None, SimpleNamespace(topic='u/acme/gw-1/config', payload=payload))
+        await asyncio.gather(*mqtt_server.reply_tasks)
+        assert published == ['d/acme/gw-1/gateway_commands/send_config_v3']
+
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            assert (await client.get(CONFIG_PATH)).status == 200
+            shown = await (await client.get('/admin/timeline/acme/gw-1')).json()
+            assert list(shown['events']) == ['config_requested', 'config_published', 'config_downloaded']
+            assert list(shown['latency']) == ['config_requested -> config_published',
+                                              'config_published -> config_downloaded']
+            assert all(latency >= 0 for latency in shown['latency'].values())
+            assert list(await (await client.get('/admin/timeline')).json()) == ['acme/gw-1']
+
+            assert (await (await client.delete('/admin/timeline/acme/gw-1')).json())['status'] == 'cleared'
+            assert (await (await client.delete('/admin/timeline/acme/gw-1')).json())['status'] == 'empty'
+            assert (await (await client.get('/admin/timeline/acme/gw-1')).json())['events'] == {}
+            assert (await client.delete('/admin/timeline')).status == 200
+
+    asyncio.run(run())
+
+
+def test_not_modified_and_rejected_downloads_are_not_recorded(timeline):
+    async def run():
+        async with TestClient(TestServer(server.MockHTTPServer().app)) as client:
+            response = await client.get(CONFIG_PATH)
+            current = response.headers['X-Config-MD5']
+            timeline.clear()
+            assert (await client.get(f"{CONFIG_PATH}?md5={current}")).status == 304
+            assert (await client.get(f"{CONFIG_PATH}?compression=bogus")).status == 400
+            assert timeline.get('acme', 'gw-1') == {}
+
+    asyncio.run(run())
@@ -0,0 +1,173 @@
+"""
+Server-side throttling for reconnect storm tests
+Models an overloaded backend: config downloads beyond a token bucket rate are answered with
+429 Too Many Requests and Retry-After, and send_config_v3 replies are paced through a queue
+at a fixed rate instead of being published immediately (optionally dropped once the queue
+wait would exceed a limit, so agents have to re-request).
+
+A policy is a JSON object (THROTTLE_PROFILE or PUT /admin/throttle):
+    {"http_rate": 200, "http_burst": 50, "retry_after": 2, "mqtt_rate": 500, "mqtt_max_delay": 10}
+"""
+
+import json
+import math
+import time
+
+FIELDS = {
+    'http_rate': 0.0,
+    'http_burst': 0.0,
+    'retry_after': 1.0,
+    'mqtt_rate': 0.0,
+    'mqtt_max_delay': 0.0,
+}
+
+
+class ThrottlePolicy:
+    """
+    One set of throttle settings
+
+    Args:
+        http_rate: Config downloads admitted per second (0 = unlimited)
+        http_burst: Downloads admitted back to back before the rate applies (default: one second's worth)
+        retry_after: Minimum Retry-After in seconds sent with a 429 (rounded up to whole seconds)
+        mqtt_rate: send_config_v3 replies published per second (0 = immediately)
+        mqtt_max_delay: Drop a reply instead of queueing it for longer than this many seconds (0 = never)
+    """
+
+    def __init__(self, **settings):
+        unknown = set(settings) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown throttle setting(s): {', '.join(sorted(unknown))}")
+        for name, default in FIELDS.items():
+            value = settings.get(name, default)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"{name} must be a number, got {value!r}")
+            if value < 0:
+                raise ValueError(f"{name} must not be negative, got {value}")
+            setattr(self, name, value)
+        if not self.http_burst:
+            self.http_burst = max(self.http_rate, 1.0)
+
+    @classmethod
+    def from_json(cls, text):
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid throttle policy JSON: {e}") from e
+        if not isinstance(value, dict):
+            raise ValueError(f"Throttle policy must be an object, got {value!r}")
+        return cls(**value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+    @property
+    def is_clean(self):
+        return not self.http_rate and not self.mqtt_rate
+
+
+class TokenBucket:
+    """Admits `rate` events per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        """
+        Take one token
+
+        Returns:
+            float: 0 if admitted, otherwise seconds until a token becomes available
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Throttle:
+    """
+    Applies a ThrottlePolicy and keeps the statistics a storm run reports
+
+    Args:
+        policy: ThrottlePolicy (default: no throttling)
+        clock: Monotonic clock, replaceable in tests
+    """
+
+    def __init__(self, policy=None, clock=time.monotonic):
+        self.clock = clock
+        self.queue_depth = 0
+        self.next_reply = clock()
+        self.configure(policy or ThrottlePolicy())
+
+    def configure(self, policy):
+        """
+        Install a policy, restarting the download bucket and statistics
+
+        Replies already held back keep their publish slots and still count towards the queue depth
+        until they are sent; new replies are paced behind them.
+        """
+        self.policy = policy
+        now = self.clock()
+        self.http_bucket = TokenBucket(policy.http_rate, policy.http_burst, now) if policy.http_rate else None
+        self.next_reply = max(now, self.next_reply)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'http_admitted': 0, 'http_rejected': 0, 'mqtt_immediate': 0, 'mqtt_queued': 0,
+                      'mqtt_dropped': 0, 'mqtt_queue_peak': self.queue_depth, 'mqtt_max_wait_s': 0.0}
+
+    def admit_download(self):
+        """
+        Admission check for one config download
+
+        Returns:
+            int or None: Retry-After seconds when the download must be rejected, else None
+        """
+        if self.http_bucket is None:
+            return None
+        wait = self.http_bucket.take(self.clock())
+        if not wait:
+            self.stats['http_admitted'] += 1
+            return None
+        self.stats['http_rejected'] += 1
+        return max(1, math.ceil(max(self.policy.retry_after, wait)))
+
+    def reserve_reply(self):
+        """
+        Reserve a publish slot for one send_config_v3 reply
+
+        Returns:
+            float or None: Seconds to hold the reply (0 = publish now), None to drop it.
+            A positive delay counts towards the queue depth until reply_sent() is called.
+        """
+        if not self.policy.mqtt_rate:
+            self.stats['mqtt_immediate'] += 1
+            return 0.0
+        now = self.clock()
+        slot = max(now, self.next_reply)
+        wait = slot - now
+        if self.policy.mqtt_max_delay and wait > self.policy.mqtt_max_delay:
+            self.stats['mqtt_dropped'] += 1
+            return None
+        self.next_reply = slot + 1.0 / self.policy.mqtt_rate
+        if not wait:
+            self.stats['mqtt_immediate'] += 1
+            return 0.0
+        self.queue_depth += 1
+        self.stats['mqtt_queued'] += 1
+        self.stats['mqtt_queue_peak'] = max(self.stats['mqtt_queue_peak'], self.queue_depth)
+        self.stats['mqtt_max_wait_s'] = max(self.stats['mqtt_max_wait_s'], round(wait, 3))
+        return wait
+
+    def reply_sent(self):
+        """A queued reply left the queue"""
+        self.queue_depth = max(self.queue_depth - 1, 0)
+
+    def report(self):
+        return {'policy': self.policy.to_dict(), 'mqtt_queue_depth': self.queue_depth, **self.stats}
@@ -0,0 +1,224 @@
+"""
+Per-device timeline of the config round trip
+Records when the mock server saw each step of a device's config round trip, as wall clock
+(epoch) timestamps that tests on the same host can line up with their own:
+
+    config_requested   config v3 request received on u/<company>/<device>/config
+    config_published   send_config_v3 reply published (after any impairment or throttle delay)
+    config_downloaded  app_config.zip (or a delta) served
+
+For every event the first and last timestamp and a count are kept, so the first config request
+after an install stays visible while the agent keeps re-requesting. Forked HTTP workers each
+append their events to a JSON lines file in a shared directory; reports merge all files. A worker
+compacts its file into one first/last/count record per device and event every `compact_every`
+events, and readers only parse what was appended since their last read, so long storms and soaks
+keep the files and the cost of a report bounded.
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ('config_requested', 'config_published', 'config_downloaded')
+
+
+class DeviceTimeline:
+    """
+    Config round trip timestamps per device
+
+    Args:
+        max_devices: Devices remembered in memory (least recently active are forgotten first)
+        directory: Optional directory shared by forked HTTP workers (events-<pid>.jsonl files)
+        clock: Wall clock (injectable for tests)
+        compact_every: Events appended to this process's file between compactions
+    """
+
+    def __init__(self, max_devices=10000, directory=None, clock=time.time, compact_every=10000):
+        self.max_devices = max_devices
+        self.directory = Path(directory) if directory else None
+        self.clock = clock
+        self.compact_every = compact_every
+        self.devices = OrderedDict()
+        self.appended = 0
+        # Parsed worker files: path -> (inode, first line, offset parsed up to, devices)
+        self.parsed = {}
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def mark(self, company_id, device_unique_id, event, when=None):
+        """
+        Record an event of a device
+
+        Returns:
+            float: The event's timestamp
+        """
+        if event not in EVENTS:
+            raise ValueError(f"Unknown timeline event '{event}'")
+        when = self.clock() if when is None else when
+        self._add(self.devices, (company_id, device_unique_id), event, when, 1)
+        while len(self.devices) > self.max_devices:
+            self.devices.popitem(last=False)
+        if self.directory is not None:
+            record = {'company_id': company_id, 'device_unique_id': device_unique_id, 'event': event, 't': when}
+            path = self.directory / f"events-{os.getpid()}.jsonl"
+            try:
+                with open(path, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+            except OSError as e:
+                logger.warning(f"Failed to record timeline event: {e}")
+            self.appended += 1
+            if self.appended >= self.compact_every:
+                self._compact(path)
+        return when
+
+    def _compact(self, path):
+        """Rewrite this process's file as one record per device and event (most recently active devices)"""
+        self.appended = 0
+        devices = self._read(path)
+        keys = list(devices)[-self.max_devices:]
+        records = [{'company_id': company_id, 'device_unique_id': device_unique_id, 'event': event, **entry}
+                   for company_id, device_unique_id in keys
+                   for event, entry in devices[(company_id, device_unique_id)].items()]
+        try:
+            tmp_path = path.with_name(f"{path.name}.tmp")
+            tmp_path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to compact timeline events in {path}: {e}")
+
+    @staticmethod
+    def _add(devices, key, event, first, count, last=None):
+        events = devices.setdefault(key, {})
+        devices.move_to_end(key)
+        entry = events.get(event)
+        last = first if last is None else last
+        if entry is None:
+            events[event] = {'first': first, 'last': last, 'count': count}
+        else:
+            entry['first'] = min(entry['first'], first)
+            entry['last'] = max(entry['last'], last)
+            entry['count'] += count
+
+    def _read(self, path):
+        """
+        Devices recorded in one worker file
+
+        Only the lines appended since the last read are parsed. A file that was replaced
+        (compacted, cleared) is recognised by its inode and first line, and parsed again.
+        """
+        try:
+            with open(path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                head = f.readline()
+                cached = self.parsed.get(path)
+                if cached is None or cached[:2] != (inode, head):
+                    cached = (inode, head, 0, OrderedDict())
+                _, _, offset, devices = cached
+                f.seek(offset)
+                data = f.read()
+        except OSError as e:
+            logger.debug(f"Skipping unreadable timeline file {path}: {e}")
+            return OrderedDict()
+        # A line another worker is still writing is parsed on the next read
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+                key = (record['company_id'], record['device_unique_id'])
+                if 't' in record:
+                    self._add(devices, key, record['event'], record['t'], 1)
+                else:
+                    self._add(devices, key, record['event'], record['first'], record['count'], record['last'])
+            except (ValueError, KeyError, TypeError):
+                continue
+        self.parsed[path] = (inode, head, offset + end, devices)
+        return devices
+
+    def _merged(self):
+        """Devices of all workers (this process's memory alone without a shared directory)"""
+        if self.directory is None:
+            return self.devices
+        devices = OrderedDict()
+        paths = sorted(self.directory.glob('events-*.jsonl'))
+        for path in set(self.parsed) - set(paths):
+            del self.parsed[path]
+        for path in paths:
+            for key, events in self._read(path).items():
+                for event, entry in events.items():
+                    self._add(devices, key, event, entry['first'], entry['count'], entry['last'])
+        return devices
+
+    def get(self, company_id, device_unique_id):
+        """
+        Timeline of one device
+
+        Returns:
+            dict: {event: {'first', 'last', 'count'}} for the events seen so far ({} if none)
+        """
+        events = self._merged().get((company_id, device_unique_id), {})
+        return {event: dict(events[event]) for event in EVENTS if event in events}
+
+    def report(self):
+        """All devices: {'<company_id>/<device_unique_id>': timeline}"""
+        return {f"{company_id}/{device_unique_id}": {event: dict(events[event]) for event in EVENTS if event in events}
+                for (company_id, device_unique_id), events in self._merged().items()}
+
+    def clear(self, company_id=None, device_unique_id=None):
+        """
+        Forget the timeline of one device, or of every device when no device is given
+
+        Returns:
+            bool: Whether there was anything to forget
+        """
+        if company_id is None:
+            found = bool(self._merged())
+            self.devices.clear()
+            if self.directory is not None:
+                for path in self.directory.glob('events-*.jsonl'):
+                    path.unlink(missing_ok=True)
+            return found
+        key = (company_id, device_unique_id)
+        found = key in self._merged()
+        self.devices.pop(key, None)
+        if self.directory is not None and found:
+            for path in self.directory.glob('events-*.jsonl'):
+                self._drop_device(path, company_id, device_unique_id)
+        return found
+
+    @staticmethod
+    def _drop_device(path, company_id, device_unique_id):
+        kept = []
+        try:
+            for line in path.read_text().splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if (record.get('company_id'), record.get('device_unique_id')) != (company_id, device_unique_id):
+                    kept.append(line + '\n')
+            tmp_path = path.with_name(f"{path.name}.tmp")
+            tmp_path.write_text(''.join(kept))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to clear timeline events in {path}: {e}")
+
+
+def breakdown(timeline, started_at=None):
+    """
+    Latencies between the first occurrence of consecutive events
+
+    Args:
+        timeline: One device's timeline (DeviceTimeline.get)
+        started_at: Optional epoch timestamp to measure the first event from
+
+    Returns:
+        dict: {'<from> -> <to>': seconds} for the events present, in round trip order
+    """
+    points = ([('start', started_at)] if started_at is not None else []) + \
+        [(event, timeline[event]['first']) for event in EVENTS if event in timeline]
+    return {f"{a} -> {b}": round(tb - ta, 6) for (a, ta), (b, tb) in zip(points, points[1:])}
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Per-command overhead benchmark for the e2e command transports
+Runs trivial commands through each transport (see transport.py) and reports the setup cost
+(first command, including session start) and the steady-state latency per command.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from transport import TRANSPORTS, make_transport
+
+COMMANDS = {
+    'true': 'true',
+    'snap': 'snap version >/dev/null 2>&1 || true',
+    'output_64k': 'head -c 65536 /dev/zero | tr "\\0" x',
+}
+
+
+def summarize(durations):
+    """Latency summary in milliseconds (nearest-rank percentiles)"""
+    ordered = sorted(durations)
+
+    def rank(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))] * 1000.0
+
+    return {
+        'p50': round(rank(50), 3),
+        'p95': round(rank(95), 3),
+        'mean': round(sum(ordered) / len(ordered) * 1000.0, 3),
+        'max': round(ordered[-1] * 1000.0, 3),
+    }
+
+
+def measure(transport, command, iterations):
+    """
+    Time one command repeatedly through a transport
+
+    Returns:
+        tuple: (first_s, list of steady-state durations in seconds)
+    """
+    started = time.perf_counter()
+    transport.run(command, timeout=60)
+    first = time.perf_counter() - started
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        transport.run(command, timeout=60)
+        durations.append(time.perf_counter() - started)
+    return first, durations
+
+
+def run_matrix(transports, commands, iterations, vm_name):
+    """
+    Benchmark every transport/command combination
+
+    Returns:
+        list of result dicts
+    """
+    results = []
+    for kind in transports:
+        for name in commands:
+            with make_transport(kind, vm_name) as transport:
+                first, durations = measure(transport, COMMANDS[name], iterations)
+            results.append({
+                'transport': kind,
+                'command': name,
+                'iterations': iterations,
+                'first_ms': round(first * 1000.0, 3),
+                **{f"{key}_ms": value for key, value in summarize(durations).items()},
+            })
+    return results
+
+
+def print_table(results, out):
+    """Print a human readable latency table"""
+    header = f"{'transport':<16} {'command':<11} {'first ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'max ms':>9}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for r in results:
+        print(f"{r['transport']:<16} {r['command']:<11} {r['first_ms']:>9.2f} {r['p50_ms']:>9.2f} "
+              f"{r['p95_ms']:>9.2f} {r['mean_ms']:>9.2f} {r['max_ms']:>9.2f}", file=out)
+
+
+def main(argv=None):
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description='e2e command transport overhead benchmark')
+    parser.add_argument('--transports', default=','.join(TRANSPORTS),
+                        help=f"transports to compare (default: {','.join(TRANSPORTS)})")
+    parser.add_argument('--commands', default=','.join(COMMANDS),
+                        help=f"commands to time (default: {','.join(COMMANDS)})")
+    parser.add_argument('--iterations', type=int, default=50, help='timed runs per transport and command')
+    parser.add_argument('--vm-name', default=os.getenv('MULTIPASS_VM_NAME', 'coda-test-vm'))
+    parser.add_argument('--json', dest='json_output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = run_matrix(list(filter(None, args.transports.split(','))),
+                         list(filter(None, args.commands.split(','))), args.iterations, args.vm_name)
+    print_table(results, sys.stdout)
+
+    if args.json_output:
+        with open(args.json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Checkpoints of the snap's state on the test target
+A checkpoint captures everything a test can change about the installed snap (its `snap get`
+configuration, the $SNAP_COMMON tree and the start state of its services), so a test starts from a
+known baseline by restoring it instead of reinstalling and reconfiguring the snap:
+
+    store = CheckpointStore(transport)
+    baseline = store.capture('baseline')
+    ...                                   # the test changes config, files, services, mounts
+    store.restore(baseline)               # a few seconds, services back as they were
+
+The tree is kept on the target as a tar archive (numeric owners, permissions, xattrs and ACLs).
+Capturing and restoring each take one or two transport round trips.
+"""
+
+import json
+import shlex
+import time
+
+
+class Checkpoint:
+    """
+    Captured state of the snap
+
+    Args:
+        name: Checkpoint name (also names its archive on the target)
+        archive: Path of the $SNAP_COMMON tar archive on the target
+        config: `snap get -d` document
+        services: {service: (startup, current)}, e.g. {'coda.agent': ('enabled', 'active')}
+        capture_s: Seconds the capture took
+    """
+
+    def __init__(self, name, archive, config, services, capture_s=0.0):
+        self.name = name
+        self.archive = archive
+        self.config = config
+        self.services = services
+        self.capture_s = capture_s
+
+    def __repr__(self):
+        return f"Checkpoint({self.name!r}, services={self.services!r})"
+
+
+class CheckpointStore:
+    """
+    Captures and restores checkpoints of one snap through a transport (see transport.py)
+
+    Args:
+        transport: Transport to the test target
+        snap: Snap name
+        common_dir: The snap's $SNAP_COMMON (default: /var/snap/<snap>/common)
+        store_dir: Directory on the target holding the archives
+        sudo: Privilege prefix for commands on the target ('' when already root)
+    """
+
+    def __init__(self, transport, snap='coda', common_dir=None, store_dir='/var/tmp/e2e-checkpoints',
+                 sudo='sudo'):
+        self.transport = transport
+        self.snap = snap
+        self.common_dir = common_dir or f"/var/snap/{snap}/common"
+        self.store_dir = store_dir
+        self.sudo = f"{sudo} " if sudo else ''
+
+    def archive_path(self, name):
+        return f"{self.store_dir}/{name}.tar"
+
+    def run(self, script, timeout):
+        """Run a script on the target, raising RuntimeError when it fails"""
+        exit_code, output = self.transport.run(script, timeout=timeout)
+        if exit_code != 0:
+            raise RuntimeError(f"Checkpoint command failed with exit code {exit_code}: {output}")
+        return output
+
+    def save_tree_script(self, archive):
+        """Shell commands archiving the $SNAP_COMMON tree (tar exit status 1 only means a file changed while read)"""
+        return (f"{self.sudo}mkdir -p {shlex.quote(self.store_dir)}\n"
+                f"{self.sudo}tar -C {shlex.quote(self.common_dir)} --numeric-owner --xattrs --acls "
+                f"-cpf {shlex.quote(archive)} . 2>/dev/null || [ $? -eq 1 ]\n")
+
+    def load_tree_script(self, archive):
+        """Shell commands replacing the $SNAP_COMMON tree by an archive, lifting anything mounted over it first"""
+        common = shlex.quote(self.common_dir)
+        return (f"while mountpoint -q {common}; do {self.sudo}umount {common} || {self.sudo}umount -l {common}; done\n"
+                f"{self.sudo}mkdir -p {common}\n"
+                f"{self.sudo}find {common} -mindepth 1 -delete\n"
+                f"{self.sudo}tar -C {common} --numeric-owner --xattrs --acls -xpf {shlex.quote(archive)}\n")
+
+    def capture(self, name):
+        """
+        Capture the snap's current state
+
+        Args:
+            name: Checkpoint name; capturing again under a name replaces it
+
+        Returns:
+            Checkpoint
+
+        Raises:
+            RuntimeError: The capture failed on the target
+        """
+        started = time.monotonic()
+        archive = self.archive_path(name)
+        marker = '__E2E_CHECKPOINT_PART__'
+        output = self.run(
+            "set -e\n"
+            + self.save_tree_script(archive)
+            + f"echo {marker}\n"
+            f"{self.sudo}snap get -d {self.snap} 2>/dev/null || echo '{{}}'\n"
+            f"echo {marker}\n"
+            f"snap services {self.snap}\n",
+            timeout=120
+        )
+        _, config_text, services_text = output.split(f"{marker}\n")
+        checkpoint = Checkpoint(name, archive, json.loads(config_text), parse_services(services_text))
+        checkpoint.capture_s = time.monotonic() - started
+        return checkpoint
+
+    def restore(self, checkpoint):
+        """
+        Put the snap back in a checkpoint's state
+
+        The services are stopped, the configuration is set back (removed top-level keys are unset),
+        the $SNAP_COMMON tree is replaced by the archive and the services are started, enabled or
+        disabled as they were.
+
+        Returns:
+            float: Seconds the restore took
+
+        Raises:
+            RuntimeError: The restore failed on the target
+        """
+        started = time.monotonic()
+        current = json.loads(self.run(f"{self.sudo}snap get -d {self.snap} 2>/dev/null || echo '{{}}'", timeout=60))
+        settings = config_settings(current, checkpoint.config)
+        script = f"set -e\n{self.sudo}snap stop {self.snap} >/dev/null\n"
+        if settings:
+            script += f"{self.sudo}snap set {self.snap} {' '.join(shlex.quote(s) for s in settings)}\n"
+        script += self.load_tree_script(checkpoint.archive)
+        script += "".join(f"{command}\n" for command in self.service_commands(checkpoint.services))
+        self.run(script, timeout=180)
+        return time.monotonic() - started
+
+    def service_commands(self, services):
+        """Commands giving every service its captured startup (enabled/disabled) and current state"""
+        commands = []
+        for service, (startup, current) in sorted(services.items()):
+            if startup == 'disabled':
+                commands.append(f"{self.sudo}snap stop --disable {service} >/dev/null")
+                if current == 'active':
+                    commands.append(f"{self.sudo}snap start {service} >/dev/null")
+            else:
+                commands.append(f"{self.sudo}snap start --enable {service} >/dev/null")
+                if current != 'active':
+                    commands.append(f"{self.sudo}snap stop {service} >/dev/null")
+        return commands
+
+    def discard(self, checkpoint):
+        """Delete a checkpoint's archive from the target"""
+        self.transport.run(f"{self.sudo}rm -f {shlex.quote(checkpoint.archive)}", timeout=60)
+
+
+def parse_services(text):
+    """
+    Parse `snap services` output
+
+    Returns:
+        dict: {service: (startup, current)}
+    """
+    services = {}
+    for line in text.strip().splitlines()[1:]:
+        fields = line.split()
+        if len(fields) >= 3:
+            services[fields[0]] = (fields[1], fields[2])
+    return services
+
+
+def config_settings(current, target):
+    """
+    `snap set` arguments turning the current configuration into the target one
+
+    Top-level keys are set as whole JSON documents, which replaces their subtree; keys missing
+    from the target are unset with the `key!` syntax.
+
+    Returns:
+        list of str
+    """
+    settings = [f"{key}!" for key in sorted(current) if key not in target]
+    settings += [f"{key}={json.dumps(value, separators=(',', ':'))}" for key, value in sorted(target.items())
+                 if current.get(key) != value]
+    return settings
@@ -0,0 +1,194 @@
+"""
+Streaming log matcher for the monitoring phases of the e2e tests
+Instead of re-reading the last N journal lines every few seconds for a fixed window, a LogWatch
+follows a line stream (`journalctl -f` through a transport, a file, any iterable of lines) and
+returns as soon as an accept or reject pattern matches or the deadline passes:
+
+    watch = LogWatch(accept={'connected': r'MQTT client connected'},
+                     reject={'no space': r'(?i)no space left on device'})
+    result = watch.watch_command(transport, "sudo journalctl -u snap.coda.agent.service -f", timeout=60)
+    assert result.outcome != 'reject', result.report()
+
+The last lines seen are kept in a bounded ring buffer so failure reports show the context of the
+match without holding the whole stream.
+"""
+
+import collections
+import os
+import re
+import selectors
+import signal
+import subprocess
+import time
+
+ACCEPT = 'accept'
+REJECT = 'reject'
+TIMEOUT = 'timeout'
+EOF = 'eof'
+
+
+class WatchResult:
+    """
+    Outcome of a watch
+
+    Args:
+        outcome: 'accept' or 'reject' (a pattern matched), 'timeout' (deadline passed first) or
+            'eof' (the stream ended first)
+        pattern: Name of the matching pattern (None without a match)
+        line: Matching line (None without a match)
+        elapsed_s: Seconds from the start of the watch to the outcome
+        lines_seen: Number of lines read
+        context: Last lines read, the matching line last
+    """
+
+    def __init__(self, outcome, pattern=None, line=None, elapsed_s=0.0, lines_seen=0, context=()):
+        self.outcome = outcome
+        self.pattern = pattern
+        self.line = line
+        self.elapsed_s = elapsed_s
+        self.lines_seen = lines_seen
+        self.context = list(context)
+
+    @property
+    def matched(self):
+        return self.outcome in (ACCEPT, REJECT)
+
+    def report(self):
+        """Human readable summary with the context lines, for assertion messages"""
+        if self.matched:
+            head = f"{self.outcome} pattern '{self.pattern}' matched after {self.elapsed_s:.1f}s: {self.line}"
+        else:
+            head = f"no pattern matched ({self.outcome} after {self.elapsed_s:.1f}s)"
+        lines = '\n'.join(f"  | {line}" for line in self.context)
+        return f"{head}\nLast {len(self.context)} of {self.lines_seen} lines:\n{lines}"
+
+    def __repr__(self):
+        return f"WatchResult({self.outcome!r}, pattern={self.pattern!r}, elapsed_s={self.elapsed_s:.3f})"
+
+
+class LogWatch:
+    """
+    Match a line stream against accept and reject patterns
+
+    Args:
+        accept: {name: regex} of lines that end the watch successfully
+        reject: {name: regex} of lines that end the watch with a failure (checked before accept)
+        context_lines: Size of the ring buffer of recent lines kept for reports
+        clock: Monotonic clock (injectable for tests)
+    """
+
+    def __init__(self, accept=None, reject=None, context_lines=50, clock=time.monotonic):
+        self.patterns = [(REJECT, name, re.compile(regex)) for name, regex in (reject or {}).items()]
+        self.patterns += [(ACCEPT, name, re.compile(regex)) for name, regex in (accept or {}).items()]
+        self.context = collections.deque(maxlen=context_lines)
+        self.clock = clock
+        self.started = None
+        self.lines_seen = 0
+
+    def start(self):
+        self.context.clear()
+        self.lines_seen = 0
+        self.started = self.clock()
+
+    def result(self, outcome, pattern=None, line=None):
+        return WatchResult(outcome, pattern, line, self.clock() - self.started, self.lines_seen, self.context)
+
+    def feed(self, line):
+        """
+        Match one line
+
+        Returns:
+            WatchResult if a pattern matched, else None
+        """
+        if self.started is None:
+            self.start()
+        line = line.rstrip('\r\n')
+        self.context.append(line)
+        self.lines_seen += 1
+        for outcome, name, regex in self.patterns:
+            if regex.search(line):
+                return self.result(outcome, name, line)
+        return None
+
+    def watch_lines(self, lines, timeout):
+        """
+        Watch an iterable of lines
+
+        The deadline is checked between lines, so a blocking iterator can overrun it; use
+        watch_stream for pipes.
+
+        Returns:
+            WatchResult
+        """
+        self.start()
+        deadline = self.started + timeout
+        for line in lines:
+            result = self.feed(line)
+            if result:
+                return result
+            if self.clock() >= deadline:
+                return self.result(TIMEOUT)
+        return self.result(EOF)
+
+    def watch_stream(self, stream, timeout):
+        """
+        Watch a pipe or socket, honouring the deadline even while no line arrives
+
+        Args:
+            stream: Object with fileno() (read as bytes, decoded as UTF-8)
+            timeout: Seconds before giving up
+
+        Returns:
+            WatchResult
+        """
+        self.start()
+        deadline = self.started + timeout
+        pending = b''
+        with selectors.DefaultSelector() as selector:
+            selector.register(stream, selectors.EVENT_READ)
+            while True:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return self.result(TIMEOUT)
+                if not selector.select(remaining):
+                    continue
+                chunk = os.read(stream.fileno(), 65536)
+                if not chunk:
+                    if pending:
+                        result = self.feed(pending.decode(errors='replace'))
+                        if result:
+                            return result
+                    return self.result(EOF)
+                *lines, pending = (pending + chunk).split(b'\n')
+                for line in lines:
+                    result = self.feed(line.decode(errors='replace'))
+                    if result:
+                        return result
+
+    def watch_command(self, transport, command, timeout):
+        """
+        Run a following command (e.g. `journalctl -f`) on the test target and watch its output
+
+        The command is stopped as soon as the watch ends.
+
+        Args:
+            transport: Transport to the target (see transport.py)
+            command: bash command line printing the lines to watch
+            timeout: Seconds before giving up
+
+        Returns:
+            WatchResult
+        """
+        process = transport.popen(command)
+        try:
+            return self.watch_stream(process.stdout, timeout)
+        finally:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            process.stdout.close()
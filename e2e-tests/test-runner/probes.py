@@ -0,0 +1,117 @@
+"""
+Batched remote probes: many checks in one round trip
+An assertion phase typically reads a few config files, stats a path and captures a command's
+output. Each `exec_command` is a full round trip to the target; a ProbeBatch sends all of them as
+one shell script and returns structured results:
+
+    batch = ProbeBatch(transport)
+    batch.json('bootstrap', '/var/snap/coda/common/conf/bootstrap.json')
+    batch.stat('identifier', '/var/snap/coda/common/conf/identifier.json')
+    batch.run('snap_get', 'sudo snap get -d coda bootstrap')
+    results = batch.execute()
+    assert results['identifier']['exists']
+    assert results['bootstrap']['data']['identifier_filepath'] == ...
+
+Every probe runs independently (a failing probe does not stop the others). Outputs come back
+base64 encoded, one framed line per probe, so any content survives the transport unchanged.
+"""
+
+import base64
+import json
+import shlex
+import uuid
+
+STAT_FORMAT = '%F|%a|%s|%u|%g'
+
+
+class ProbeBatch:
+    """
+    Probes collected for one round trip
+
+    Args:
+        transport: Transport to the test target (see transport.py)
+        sudo: Privilege prefix for file probes ('' when already root)
+    """
+
+    def __init__(self, transport, sudo='sudo'):
+        self.transport = transport
+        self.sudo = f"{sudo} " if sudo else ''
+        self.probes = []
+
+    def add(self, name, kind, command, path=None):
+        if any(probe['name'] == name for probe in self.probes):
+            raise ValueError(f"Duplicate probe name '{name}'")
+        self.probes.append({'name': name, 'kind': kind, 'command': command, 'path': path})
+        return self
+
+    def run(self, name, command):
+        """Probe a command: exit_code and output (stdout and stderr)"""
+        return self.add(name, 'run', command)
+
+    def read(self, name, path):
+        """Probe a file: exists and content"""
+        return self.add(name, 'read', f"{self.sudo}cat {shlex.quote(path)}", path)
+
+    def json(self, name, path):
+        """Probe a JSON file: exists, data (None if missing or invalid) and error"""
+        return self.add(name, 'json', f"{self.sudo}cat {shlex.quote(path)}", path)
+
+    def stat(self, name, path):
+        """Probe a path: exists, type ('regular file', 'directory', ...), mode (octal string), size, uid, gid"""
+        return self.add(name, 'stat', f"{self.sudo}stat -c '{STAT_FORMAT}' {shlex.quote(path)}", path)
+
+    def script(self, marker):
+        """The remote script: every probe's output is captured to a temporary file and framed as one line"""
+        lines = ['tmp=$(mktemp)', 'trap \'rm -f "$tmp"\' EXIT']
+        for index, probe in enumerate(self.probes):
+            lines.append(f"( {probe['command']}\n) </dev/null >\"$tmp\" 2>&1; code=$?")
+            lines.append(f"printf '{marker} {index} %d ' \"$code\"; base64 -w0 <\"$tmp\"; echo")
+        return '\n'.join(lines) + '\n'
+
+    def execute(self, timeout=120):
+        """
+        Run every probe in one round trip
+
+        Returns:
+            dict: {probe name: result dict}; every result has kind, exit_code and output
+
+        Raises:
+            RuntimeError: The batch did not report a result for every probe
+        """
+        if not self.probes:
+            return {}
+        marker = f"__E2E_PROBE_{uuid.uuid4().hex}__"
+        _, output = self.transport.run(self.script(marker), timeout=timeout)
+        raw = {}
+        for line in output.splitlines():
+            fields = line.split(' ')
+            if len(fields) == 4 and fields[0] == marker:
+                raw[int(fields[1])] = (int(fields[2]), base64.b64decode(fields[3]).decode(errors='replace'))
+        if len(raw) != len(self.probes):
+            raise RuntimeError(f"Probe batch returned {len(raw)} of {len(self.probes)} results: {output}")
+        return {probe['name']: interpret(probe, *raw[index]) for index, probe in enumerate(self.probes)}
+
+
+def interpret(probe, exit_code, output):
+    """Structured result of one probe"""
+    result = {'kind': probe['kind'], 'exit_code': exit_code, 'output': output}
+    if probe['path'] is not None:
+        result['path'] = probe['path']
+    if probe['kind'] == 'read':
+        result['exists'] = exit_code == 0
+        result['content'] = output if exit_code == 0 else None
+    elif probe['kind'] == 'json':
+        result['exists'] = exit_code == 0
+        result['data'] = None
+        result['error'] = None if exit_code == 0 else output.strip()
+        if exit_code == 0:
+            try:
+                result['data'] = json.loads(output)
+            except ValueError as e:
+                result['error'] = f"invalid JSON: {e}"
+    elif probe['kind'] == 'stat':
+        result['exists'] = exit_code == 0
+        if exit_code == 0:
+            file_type, mode, size, uid, gid = output.strip().split('|')
+            result.update(type=file_type, mode=mode, size=int(size), uid=int(uid), gid=int(gid))
+    return result
@@ -0,0 +1,261 @@
+"""
+Resource sampler for the coda agent during e2e and soak runs
+Follows the agent process (the MainPID of snap.coda.agent.service) from a single shell loop on
+the target. Every interval it reads /proc/<pid>/stat and counts /proc/<pid>/fd with bash builtins,
+so a sample costs no process start on the target and no round trip. The loop streams one line
+per sample and resolves the pid again when the agent restarts:
+
+    with ResourceSampler(transport, interval=1.0) as sampler:
+        ...                                        # exercise the agent
+    print(sampler.summary())
+    assert not sampler.violations({'max_rss_mb': 150, 'rss_slope_mb_per_h': 5, 'cpu_percent': 25})
+    sampler.write('agent-resources.json')          # compact time series
+
+Limits (see LIMITS): max_rss_mb, rss_slope_mb_per_h (least squares over the current process,
+after warmup_s), cpu_percent (mean share of one core), max_fds and max_threads. The conftest
+`agent_resources` fixture applies E2E_RESOURCE_LIMITS="max_rss_mb=150,cpu_percent=25" to any
+test that requests it.
+"""
+
+import json
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+
+AGENT_SERVICE = 'snap.coda.agent.service'
+COLUMNS = ('t', 'pid', 'cpu_s', 'rss_kb', 'fds', 'threads')
+# Ceilings, named after the summary figure they apply to
+LIMITS = ('max_rss_mb', 'rss_slope_mb_per_h', 'cpu_percent', 'max_fds', 'max_threads')
+
+
+def parse_limits(text, names=LIMITS):
+    """
+    'max_rss_mb=150, cpu_percent=25' -> {'max_rss_mb': 150.0, 'cpu_percent': 25.0}
+
+    Args:
+        text: Comma separated name=value ceilings (empty or None for none)
+        names: Accepted limit names
+
+    Raises:
+        ValueError: Unknown limit or invalid value
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, sep, value = item.partition('=')
+        name = name.strip()
+        if not sep or name not in names:
+            raise ValueError(f"Unknown resource limit '{item}' (expected one of: {', '.join(names)})")
+        try:
+            limits[name] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for resource limit {name}: '{value.strip()}'") from None
+    return limits
+
+
+def sampler_script(pid_command, interval):
+    """The remote sampling loop; prints 'H <clk_tck> <page_kb>', then 'S ...' or 'G <t>' per interval"""
+    return f"""export LC_ALL=C
+shopt -s nullglob
+exec {{tick}}<> <(:)
+page_kb=$(( $(getconf PAGESIZE) / 1024 ))
+echo "H $(getconf CLK_TCK) $page_kb"
+pid=
+while :; do
+  if [ -z "$pid" ] || [ ! -r "/proc/$pid/stat" ]; then
+    pid=$({pid_command})
+    [ "$pid" = 0 ] && pid=
+  fi
+  stat=
+  [ -n "$pid" ] && read -r stat 2>/dev/null < "/proc/$pid/stat"
+  if [ -n "$stat" ]; then
+    fields=(${{stat##*) }})
+    fds=("/proc/$pid/fd/"*)
+    echo "S $EPOCHREALTIME $pid $(( fields[11] + fields[12] )) $(( fields[21] * page_kb )) ${{#fds[@]}} ${{fields[17]}}"
+  else
+    pid=
+    echo "G $EPOCHREALTIME"
+  fi
+  read -r -t {interval} -u "$tick" || true
+done
+"""
+
+
+class ResourceSampler:
+    """
+    Samples CPU time, RSS, open fds and threads of the agent process
+
+    Args:
+        transport: Transport to the test target (see transport.py)
+        interval: Seconds between samples
+        service: systemd unit whose MainPID is sampled
+        pid_command: Shell command printing the pid to sample (default: the MainPID of service)
+        sudo: Privilege prefix for reading another user's /proc entries ('' when already root)
+        warmup_s: Seconds after a process first shows up excluded from the RSS slope
+    """
+
+    def __init__(self, transport, interval=1.0, service=AGENT_SERVICE, pid_command=None, sudo='sudo',
+                 warmup_s=0.0):
+        self.transport = transport
+        self.interval = interval
+        self.pid_command = pid_command or f"systemctl show -p MainPID --value {shlex.quote(service)}"
+        self.sudo = sudo
+        self.warmup_s = warmup_s
+        self.samples = []
+        self.gaps = 0
+        self.clk_tck = 100
+        self.process = None
+        self.reader = None
+
+    def start(self):
+        """Start the sampling loop on the target"""
+        script = sampler_script(self.pid_command, self.interval)
+        command = f"{self.sudo} bash -c {shlex.quote(script)}" if self.sudo else script
+        self.process = self.transport.popen(command)
+        self.reader = threading.Thread(target=self._read, name='resource-sampler', daemon=True)
+        self.reader.start()
+        return self
+
+    def _read(self):
+        for raw in self.process.stdout:
+            fields = raw.decode(errors='replace').split()
+            try:
+                if fields[0] == 'S' and len(fields) == 7:
+                    t, pid, ticks, rss_kb, fds, threads = fields[1:]
+                    self.samples.append((float(t), int(pid), int(ticks) / self.clk_tck, int(rss_kb), int(fds),
+                                         int(threads)))
+                elif fields[0] == 'G':
+                    self.gaps += 1
+                elif fields[0] == 'H':
+                    self.clk_tck = int(fields[1])
+            except (IndexError, ValueError):
+                continue
+
+    def stop(self):
+        """Stop the sampling loop and wait for the last samples"""
+        if self.process is None:
+            return self
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        self.reader.join(timeout=5)
+        self.process.stdout.close()
+        self.process = None
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def wait_for_samples(self, count, timeout=30):
+        """Block until count samples were taken (False on timeout)"""
+        deadline = time.monotonic() + timeout
+        while len(self.samples) < count:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(min(self.interval, 0.1))
+        return True
+
+    def summary(self):
+        """
+        Figures over the samples taken so far
+
+        Returns:
+            dict: samples, duration_s, pids (one per agent (re)start seen), restarts, gaps (samples
+            without an agent process), max_rss_mb, last_rss_mb, rss_slope_mb_per_h (None with fewer
+            than 3 samples after warmup), cpu_percent (mean share of one core), cpu_percent_peak,
+            max_fds and max_threads
+        """
+        samples = list(self.samples)
+        summary = {'samples': len(samples), 'gaps': self.gaps}
+        if not samples:
+            return summary
+        pids = list(dict.fromkeys(sample[1] for sample in samples))
+        cpu_s = busy_s = 0.0
+        peak = 0.0
+        for previous, sample in zip(samples, samples[1:]):
+            elapsed = sample[0] - previous[0]
+            if sample[1] != previous[1] or elapsed <= 0:
+                continue
+            used = sample[2] - previous[2]
+            cpu_s += used
+            busy_s += elapsed
+            peak = max(peak, 100.0 * used / elapsed)
+        current = [sample for sample in samples if sample[1] == pids[-1]]
+        settled = [sample for sample in current if sample[0] - current[0][0] >= self.warmup_s]
+        summary.update(
+            duration_s=round(samples[-1][0] - samples[0][0], 3),
+            pids=pids,
+            restarts=len(pids) - 1,
+            max_rss_mb=round(max(sample[3] for sample in samples) / 1024, 2),
+            last_rss_mb=round(samples[-1][3] / 1024, 2),
+            rss_slope_mb_per_h=slope([(s[0], s[3] / 1024) for s in settled], per=3600),
+            cpu_percent=round(100.0 * cpu_s / busy_s, 2) if busy_s else None,
+            cpu_percent_peak=round(peak, 2),
+            max_fds=max(sample[4] for sample in samples),
+            max_threads=max(sample[5] for sample in samples),
+        )
+        return summary
+
+    def violations(self, limits, summary=None):
+        """
+        Ceilings the samples exceed
+
+        Args:
+            limits: {limit name: ceiling} (see LIMITS and parse_limits)
+            summary: Summary to check (default: a fresh one)
+
+        Returns:
+            list of str: One message per exceeded ceiling (empty when within all of them)
+        """
+        summary = summary or self.summary()
+        messages = []
+        for name, ceiling in limits.items():
+            if name not in LIMITS:
+                raise ValueError(f"Unknown resource limit '{name}'")
+            value = summary.get(name)
+            if value is not None and value > ceiling:
+                messages.append(f"{name} {value} exceeds {ceiling:g}")
+        return messages
+
+    def series(self):
+        """Compact time series: column names and rows with t relative to started_at"""
+        samples = list(self.samples)
+        started_at = samples[0][0] if samples else None
+        return {
+            'interval_s': self.interval,
+            'started_at': started_at,
+            'columns': list(COLUMNS),
+            'rows': [[round(t - started_at, 3), pid, round(cpu_s, 2), rss_kb, fds, threads]
+                     for t, pid, cpu_s, rss_kb, fds, threads in samples],
+        }
+
+    def write(self, path, summary=None):
+        """Write the time series and its summary as one compact JSON document"""
+        document = {**self.series(), 'summary': summary or self.summary()}
+        with open(path, 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+            f.write('\n')
+
+
+def slope(points, per=1.0):
+    """Least squares slope of (x, y) points, in y per `per` units of x (None below 3 points)"""
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return round(covariance / variance * per, 3)
@@ -0,0 +1,84 @@
+"""
+Summary and release gate of a config push soak
+The mock server pushes changing configs to the agent (PUT /admin/soak, see the mock server's
+config_push.py) while the `agent_resources` fixture samples the agent process. The two reports
+are folded into one flat summary exported for release gating:
+
+    summary = soak_summary(mock_report, sampler.summary(), coda_version='1.2.3 (rev 42)')
+    violations = gate(summary, parse_limits("max_missed=0,max_latency_p95_ms=5000,rss_slope_mb_per_h=2",
+                                            names=GATE_LIMITS))
+
+Soak ceilings: max_missed (pushes never downloaded), max_latency_p95_ms (push -> download) and
+max_latency_slope_ms_per_h (latency creep). Resource ceilings are those of resources.py.
+"""
+
+import datetime
+
+from resources import LIMITS as RESOURCE_LIMITS
+
+SOAK_LIMITS = ('max_missed', 'max_latency_p95_ms', 'max_latency_slope_ms_per_h')
+GATE_LIMITS = SOAK_LIMITS + RESOURCE_LIMITS
+
+
+def soak_summary(report, resources, coda_version=None):
+    """
+    Flat summary of a soak
+
+    Args:
+        report: Final soak report of the mock server (GET/DELETE /admin/soak)
+        resources: ResourceSampler.summary() over the soak
+        coda_version: Version of the snap under test
+
+    Returns:
+        dict: created, coda_version, plan, soak figures and resources
+    """
+    latency = report.get('latency_ms') or {}
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'coda_version': coda_version,
+        'plan': report.get('plan'),
+        'soak': {
+            'elapsed_s': report.get('elapsed_s'),
+            'pushes': report.get('pushes', 0),
+            'downloaded': report.get('downloaded', 0),
+            'missed': report.get('missed', 0),
+            'latency_p50_ms': latency.get('p50'),
+            'latency_p95_ms': latency.get('p95'),
+            'latency_p99_ms': latency.get('p99'),
+            'latency_max_ms': latency.get('max'),
+            'latency_slope_ms_per_h': report.get('latency_slope_ms_per_h'),
+            'first_quarter_p50_ms': (report.get('first_quarter_latency_ms') or {}).get('p50'),
+            'last_quarter_p50_ms': (report.get('last_quarter_latency_ms') or {}).get('p50'),
+        },
+        'resources': resources,
+    }
+
+
+def gate(summary, limits):
+    """
+    Ceilings a soak summary exceeds
+
+    Args:
+        summary: soak_summary() result
+        limits: {limit name: ceiling} (see GATE_LIMITS)
+
+    Returns:
+        list of str: One message per exceeded ceiling (empty when the soak passes)
+    """
+    soak = summary['soak']
+    figures = {
+        'max_missed': soak['missed'],
+        'max_latency_p95_ms': soak['latency_p95_ms'],
+        'max_latency_slope_ms_per_h': soak['latency_slope_ms_per_h'],
+        **{name: summary['resources'].get(name) for name in RESOURCE_LIMITS},
+    }
+    messages = []
+    for name, ceiling in limits.items():
+        if name not in figures:
+            raise ValueError(f"Unknown soak limit '{name}'")
+        value = figures[name]
+        if value is not None and value > ceiling:
+            messages.append(f"{name} {value} exceeds {ceiling:g}")
+    if soak['pushes'] and not soak['downloaded']:
+        messages.append("no pushed config was downloaded")
+    return messages
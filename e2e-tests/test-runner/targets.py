@@ -0,0 +1,103 @@
+"""
+Target pool for running the e2e suite in parallel
+The tests change system state on their target (they install and purge the snap, fill its disk,
+refresh it), so two tests can only run at the same time on different targets. E2E_TARGETS lists
+the targets, one Multipass VM per entry (e.g. `coda-test-vm-1,coda-test-vm-2`, created by
+`make vm-pool-create`); without it the pool is the single MULTIPASS_VM_NAME VM.
+
+Under pytest-xdist every worker (gw0, gw1, ...) owns one target for its whole session and runs its
+share of the tests there. Each test provisions the state it needs itself (see the `coda_snap`
+fixture), so the order and the distribution of the tests do not matter.
+
+Only VMs are pooled: snapd needs its own systemd, mount namespace and AppArmor profiles, which a
+chroot or an unprivileged namespace sandbox on the host does not provide. The `local` transports run
+on the host itself, which is a single target.
+"""
+
+import os
+import re
+
+
+class TargetPool:
+    """
+    Isolated test targets handed out to pytest-xdist workers
+
+    Args:
+        targets: Target (VM) names, in worker order
+    """
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+        if not self.targets:
+            raise ValueError("The target pool is empty")
+        duplicates = sorted({name for name in self.targets if self.targets.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Targets listed more than once: {', '.join(duplicates)}")
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build the pool from E2E_TARGETS (comma separated), else MULTIPASS_VM_NAME
+
+        Raises:
+            ValueError: The pool is empty, lists a target twice, or lists several local targets
+        """
+        environ = os.environ if environ is None else environ
+        default = environ.get('MULTIPASS_VM_NAME', 'coda-test-vm')
+        targets = [name.strip() for name in environ.get('E2E_TARGETS', '').split(',') if name.strip()]
+        pool = cls(targets or [default])
+        if environ.get('E2E_TRANSPORT', '').startswith('local') and len(pool) > 1:
+            raise ValueError("The local transports run on this machine, which is a single target "
+                             f"(E2E_TARGETS lists {len(pool)})")
+        return pool
+
+    def __len__(self):
+        return len(self.targets)
+
+    def assign(self, worker_id=None, workers=None):
+        """
+        Target owned by an xdist worker
+
+        Args:
+            worker_id: xdist worker id ('gw0', 'gw1', ...); None or 'master' without xdist
+            workers: Number of xdist workers in the run (default: 1)
+
+        Returns:
+            str: Target name
+
+        Raises:
+            ValueError: More workers than targets (two workers would share a target)
+        """
+        workers = workers or 1
+        if workers > len(self.targets):
+            raise ValueError(f"{workers} workers need {workers} isolated targets but the pool has "
+                             f"{len(self.targets)} ({', '.join(self.targets)}); add VMs to E2E_TARGETS "
+                             "or lower the number of workers")
+        return self.targets[worker_index(worker_id)]
+
+
+def worker_index(worker_id):
+    """
+    Index of an xdist worker: 'gw3' -> 3, no worker (None or 'master') -> 0
+
+    Raises:
+        ValueError: Unrecognized worker id
+    """
+    if worker_id in (None, '', 'master'):
+        return 0
+    match = re.fullmatch(r'gw(\d+)', worker_id)
+    if not match:
+        raise ValueError(f"Unrecognized pytest-xdist worker id '{worker_id}'")
+    return int(match.group(1))
+
+
+def current_target(environ=None):
+    """
+    Target owned by this pytest process (PYTEST_XDIST_WORKER/PYTEST_XDIST_WORKER_COUNT under xdist)
+
+    Returns:
+        str: Target name
+    """
+    environ = os.environ if environ is None else environ
+    workers = int(environ.get('PYTEST_XDIST_WORKER_COUNT', '1') or 1)
+    return TargetPool.from_env(environ).assign(environ.get('PYTEST_XDIST_WORKER'), workers)
@@ -3,16 +3,77 @@ Pytest configuration and fixtures for e2e tests
 """
 
 import os
+import re
+import sys
 import time
 import subprocess
 import pytest
 import requests
 
+# Shared helpers (transport.py, targets.py, checkpoint.py) live next to this tests directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoint import CheckpointStore
+from resources import ResourceSampler, parse_limits
+from targets import current_target
+from timing import TIMER_KEY, StepTimer, TimingPlugin, add_options
+from transport import make_transport
+
+# Interfaces connected and configuration applied when provisioning the coda snap
+CODA_INTERFACES = [
+    "home", "shutdown", "snapd-control", "hardware-observe", "system-observe",
+    "network", "network-bind", "network-control",
+    "network-manager", "network-manager-observe", "network-observe",
+    "network-setup-control", "network-setup-observe", "network-status",
+    "modem-manager", "ppp", "firewall-control", "tpm",
+    "log-observe", "physical-memory-observe", "mount-observe",
+    "ssh-public-keys", "raw-usb"
+]
+CODA_BASE_CONFIG = {
+    "bootstrap.company-id": "test-company-001",
+    "bootstrap.unique-id": "test-device-001",
+    "conf.mqtt.broker.protocol": "tcp",
+    "conf.mqtt.broker.host": "localhost",
+    "conf.mqtt.broker.port": "1883",
+    "conf.platform.url": "http://localhost:8080/api/v1/platform",
+}
+
+
+def pytest_addoption(parser):
+    add_options(parser)
+
+
+def pytest_configure(config):
+    config.pluginmanager.register(TimingPlugin(config), 'e2e-timing')
+
+
+@pytest.fixture
+def step(request):
+    """
+    Step timer of the test (see timing.py): step("[3/9] Installing...") prints the banner and
+    times the step until the next one, or `with step(...)` bounds it
+    """
+    timer = StepTimer()
+    request.node.stash[TIMER_KEY] = timer
+    return timer
+
 
 @pytest.fixture(scope="session")
 def multipass_vm():
-    """Get reference to the Multipass VM for test execution"""
-    vm_name = os.getenv('MULTIPASS_VM_NAME', 'coda-test-vm')
+    """
+    Get reference to the Multipass VM for test execution
+
+    Under pytest-xdist every worker gets its own VM from the E2E_TARGETS pool (see targets.py).
+    """
+    worker_id = os.getenv('PYTEST_XDIST_WORKER', 'master')
+    try:
+        vm_name = current_target()
+    except ValueError as e:
+        pytest.fail(f"Cannot assign a test target to worker '{worker_id}': {e}")
+    print(f"\n✓ Worker '{worker_id}' runs its tests on target '{vm_name}'")
+    if os.getenv('E2E_TRANSPORT', '').startswith('local'):
+        # Running on the target itself; no VM involved
+        return vm_name
 
     # Verify VM exists and is running
     result = subprocess.run(
@@ -27,6 +88,17 @@ def multipass_vm():
     return vm_name
 
 
+@pytest.fixture(scope="session")
+def transport(multipass_vm):
+    """
+    Command transport to the test target, shared by the whole session (see transport.py)
+    """
+    session_transport = make_transport(vm_name=multipass_vm)
+    print(f"\n✓ Running commands through the '{session_transport.name}' transport")
+    yield session_transport
+    session_transport.close()
+
+
 @pytest.fixture(scope="session")
 def local_snap_file():
     """
@@ -79,6 +151,14 @@ def snap_in_vm(multipass_vm, local_snap_file):
             'channel': 'stable'
         }
 
+    if os.getenv('E2E_TRANSPORT', '').startswith('local'):
+        # The target is this machine, nothing to transfer
+        return {
+            'source': 'local',
+            'file_path': os.path.abspath(local_snap_file),
+            'channel': None
+        }
+
     # Transfer snap file to VM
     snap_basename = os.path.basename(local_snap_file)
     vm_snap_path = f'/home/ubuntu/{snap_basename}'
@@ -108,6 +188,166 @@ def snap_in_vm(multipass_vm, local_snap_file):
     }
 
 
+def install_command(snap_in_vm):
+    """Command installing the coda snap from the local file or the store channel"""
+    if snap_in_vm['source'] == 'local':
+        return f"sudo snap install --dangerous {snap_in_vm['file_path']}"
+    return f"sudo snap install coda --channel={snap_in_vm['channel']}"
+
+
+def connect_command():
+    """Command connecting the coda interfaces (some do not exist on every target; connect what is there)"""
+    return "; ".join(f"sudo snap connect coda:{name} :{name}" for name in CODA_INTERFACES)
+
+
+def configure_command(config=CODA_BASE_CONFIG):
+    """One `snap set`, so the configure hook runs once for the whole configuration"""
+    return "sudo snap set coda " + " ".join(f"{key}={value}" for key, value in config.items())
+
+
+def install_coda(transport, snap_in_vm):
+    """
+    Install the coda snap if it is missing and connect its interfaces
+
+    Returns:
+        bool: True if the snap was installed by this call
+    """
+    exit_code, output = transport.run(
+        "for i in $(seq 30); do snap version >/dev/null 2>&1 && exit 0; sleep 2; done; exit 1", timeout=90)
+    if exit_code != 0:
+        pytest.fail(f"snapd did not become ready: {output}")
+
+    installed, _ = transport.run("snap list coda", timeout=60)
+    if installed == 0:
+        return False
+    if snap_in_vm['source'] == 'local':
+        print(f"\nProvisioning: installing coda from {snap_in_vm['file_path']}")
+    else:
+        print(f"\nProvisioning: installing coda from the {snap_in_vm['channel']} channel")
+    exit_code, output = transport.run(install_command(snap_in_vm), timeout=120)
+    if exit_code != 0:
+        pytest.fail(f"Failed to install coda snap: {output}")
+    transport.run(connect_command(), timeout=300)
+    print("✓ Provisioning: coda installed and interfaces connected")
+    return True
+
+
+@pytest.fixture(scope="session")
+def coda_provisioning(snap_in_vm):
+    """
+    The commands provisioning the coda snap the way the baseline does, for tests that run (and
+    time) them one by one
+
+    Returns:
+        dict: 'install', 'connect' and 'configure' commands and the applied 'config'
+    """
+    return {
+        'install': install_command(snap_in_vm),
+        'connect': connect_command(),
+        'configure': configure_command(),
+        'config': dict(CODA_BASE_CONFIG),
+    }
+
+
+@pytest.fixture(scope="session")
+def checkpoints(transport):
+    """Checkpoint store for the coda snap on the test target (see checkpoint.py)"""
+    return CheckpointStore(transport, snap='coda')
+
+
+@pytest.fixture(scope="session")
+def coda_baseline(transport, snap_in_vm, checkpoints):
+    """
+    Provision the coda snap once per session (installed, interfaces connected, configured against
+    the mock services, running) and capture that state as the 'baseline' checkpoint.
+    """
+    install_coda(transport, snap_in_vm)
+    for command in (configure_command(), "sudo snap start coda"):
+        exit_code, output = transport.run(command, timeout=120)
+        if exit_code != 0:
+            pytest.fail(f"Provisioning command failed ({exit_code}): {command}\n{output}")
+
+    baseline = checkpoints.capture('baseline')
+    print(f"✓ Provisioning: baseline checkpoint captured in {baseline.capture_s:.2f}s "
+          f"(services: {baseline.services})")
+    yield baseline
+    checkpoints.discard(baseline)
+
+
+@pytest.fixture
+def coda_snap(transport, snap_in_vm, checkpoints, coda_baseline, step):
+    """
+    Start the test from the baseline: the coda snap installed, configured against the mock
+    services and running, whatever earlier tests did to it.
+
+    The baseline checkpoint is restored (configuration, $SNAP_COMMON, service state), so tests that
+    need an installed snap request this fixture instead of relying on an earlier test. The snap is
+    only reinstalled if a test removed it.
+
+    Returns:
+        Checkpoint: The baseline checkpoint (its archive can seed a test's own copy of $SNAP_COMMON)
+    """
+    install_coda(transport, snap_in_vm)
+    try:
+        elapsed = checkpoints.restore(coda_baseline)
+    except RuntimeError as e:
+        pytest.fail(f"Failed to restore the baseline checkpoint: {e}")
+    step.record("Restore baseline checkpoint", elapsed)
+    print(f"\n✓ Restored baseline checkpoint in {elapsed:.2f}s")
+    return coda_baseline
+
+
+@pytest.fixture
+def coda_removed(transport, step):
+    """
+    Start the test from a target without the coda snap, for tests of the installation itself.
+
+    The snap is purged along with its data, so a later `snap install` really installs it and runs
+    the install hook. Tests that follow get the snap back through `coda_snap`.
+    """
+    started = time.monotonic()
+    exit_code, output = transport.run(
+        "if snap list coda >/dev/null 2>&1; then sudo snap remove --purge coda; fi; ! snap list coda >/dev/null 2>&1",
+        timeout=300)
+    if exit_code != 0:
+        pytest.fail(f"Failed to remove the coda snap: {output}")
+    step.record("Remove coda snap", time.monotonic() - started)
+    print("\n✓ Starting from a target without coda")
+
+
+@pytest.fixture
+def agent_resources(transport, request):
+    """
+    Sample the coda agent's CPU time, RSS, open fds and threads for the whole test (see resources.py)
+
+    The test fails when the agent exceeds a ceiling from E2E_RESOURCE_LIMITS
+    (e.g. "max_rss_mb=150,rss_slope_mb_per_h=5,cpu_percent=25"); tests can also check their own
+    with agent_resources.violations({...}). With E2E_RESOURCE_DIR set, the time series is written
+    to <dir>/<test name>.json.
+    """
+    try:
+        limits = parse_limits(os.getenv('E2E_RESOURCE_LIMITS'))
+    except ValueError as e:
+        pytest.fail(f"Invalid E2E_RESOURCE_LIMITS: {e}")
+    sampler = ResourceSampler(transport, interval=float(os.getenv('E2E_RESOURCE_INTERVAL', '1.0')),
+                              warmup_s=float(os.getenv('E2E_RESOURCE_WARMUP', '30')))
+    sampler.start()
+    yield sampler
+    sampler.stop()
+
+    summary = sampler.summary()
+    print(f"\nℹ Agent resources: {summary}")
+    directory = os.getenv('E2E_RESOURCE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, re.sub(r'[^\w.-]+', '_', request.node.name) + '.json')
+        sampler.write(path, summary)
+        print(f"✓ Agent resource series written to {path}")
+    violations = sampler.violations(limits, summary)
+    if violations:
+        pytest.fail(f"Agent resource ceilings exceeded: {'; '.join(violations)}")
+
+
 @pytest.fixture(scope="session")
 def mock_server_url():
     """
@@ -131,55 +371,46 @@ def mock_mqtt_broker():
 
 
 @pytest.fixture(scope="session", autouse=True)
-def wait_for_services(multipass_vm, mock_server_url, mock_mqtt_broker):
+def wait_for_services(transport, mock_server_url, mock_mqtt_broker):
     """
     Wait for all services to be ready before running tests.
     This fixture runs automatically for all tests (autouse=True).
 
     Services run inside the VM, so we check them by executing commands in the VM.
+    The mock server's /ready endpoint covers the MQTT broker connection, the config topic
+    subscription and the fixture index; it is long-polled so we return as soon as it is ready.
     """
-    max_retries = 60
-    retry_delay = 2
+    timeout = 120
+    poll_wait = 30
 
     print("\n" + "="*60)
     print("Waiting for all services to be ready...")
     print("="*60)
 
-    # Wait for HTTP server (check from within VM)
-    print(f"\nChecking mock HTTP server at {mock_server_url}...")
-    for i in range(max_retries):
-        result = subprocess.run(
-            ['multipass', 'exec', multipass_vm, '--',
-             'curl', '-s', '-o', '/dev/null', '-w', '%{http_code}', f'{mock_server_url}/health'],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0 and result.stdout.strip() == '200':
-            print(f"✓ Mock HTTP server is ready at {mock_server_url}")
-            break
-        if i < max_retries - 1:
-            print(f"  Waiting for mock HTTP server... ({i + 1}/{max_retries})")
-            time.sleep(retry_delay)
-        else:
-            pytest.fail(f"Mock HTTP server did not become ready in time")
-
-    # Wait for MQTT broker (simple TCP connection check from within VM)
-    print(f"\nChecking MQTT broker at {mock_mqtt_broker['host']}:{mock_mqtt_broker['port']}...")
-    for i in range(max_retries):
-        result = subprocess.run(
-            ['multipass', 'exec', multipass_vm, '--',
-             'nc', '-z', '-v', mock_mqtt_broker['host'], str(mock_mqtt_broker['port'])],
-            capture_output=True,
-            text=True
+    print(f"\nChecking mock server readiness at {mock_server_url}/ready "
+          f"(MQTT broker {mock_mqtt_broker['host']}:{mock_mqtt_broker['port']})...")
+    deadline = time.monotonic() + timeout
+    body = ''
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            pytest.fail(f"Mock server did not become ready in time: {body or 'not reachable'}")
+        wait = max(1, min(poll_wait, int(remaining)))
+        _, output = transport.run(
+            f"curl -s --max-time {wait + 5} -w '\\n%{{http_code}}' '{mock_server_url}/ready?wait={wait}s'",
+            timeout=wait + 10
         )
-        if result.returncode == 0:
-            print(f"✓ MQTT broker is ready at {mock_mqtt_broker['host']}:{mock_mqtt_broker['port']}")
+        body, _, status = output.strip().rpartition('\n')
+        if status == '200':
+            print(f"✓ Mock server is ready: {body}")
             break
-        if i < max_retries - 1:
-            print(f"  Waiting for MQTT broker... ({i + 1}/{max_retries})")
-            time.sleep(retry_delay)
+        if status == '503':
+            # Long-poll timed out without becoming ready; poll again right away
+            print(f"  Mock server not ready yet: {body}")
         else:
-            pytest.fail(f"MQTT broker did not become ready in time")
+            # HTTP server not listening yet (service still starting)
+            print("  Waiting for mock HTTP server to start...")
+            time.sleep(1)
 
     print("\n" + "="*60)
     print("All services are ready! Starting tests...")
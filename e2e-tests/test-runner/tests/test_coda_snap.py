@@ -3,9 +3,12 @@ E2E tests for Coda snap installation and configuration
 """
 
 import time
+import threading
 import subprocess
 import pytest
 
+from logwatch import LogWatch, REJECT, TIMEOUT
+
 MQTT_BROKER_PROTOCOL = "tcp"
 MQTT_BROKER_HOST = "localhost"
 MQTT_BROKER_PORT = 1883
@@ -14,12 +17,18 @@ PLATFORM_URL = "http://localhost:8080/api/v1/platform"
 class TestCodaSnapInstallation:
     """Test suite for Coda snap installation and basic functionality"""
 
+    @pytest.fixture(autouse=True)
+    def bind_transport(self, transport, step):
+        """Run every command of the test through the session transport, timing its steps"""
+        self.transport = transport
+        self.step = step
+
     def exec_command(self, vm_name, command, check=True, timeout=300):
         """
         Execute command in Multipass VM and return result
 
         Args:
-            vm_name: Name of the Multipass VM
+            vm_name: Name of the Multipass VM (the session transport is bound to it)
             command: Command to execute
             check: If True, raise exception on non-zero exit code
             timeout: Command timeout in seconds (default: 300)
@@ -29,14 +38,7 @@ class TestCodaSnapInstallation:
         """
         print(f"Executing: {command}")
         try:
-            result = subprocess.run(
-                ['multipass', 'exec', vm_name, '--', 'bash', '-c', command],
-                capture_output=True,
-                text=True,
-                timeout=timeout
-            )
-            exit_code = result.returncode
-            output = result.stdout + result.stderr
+            exit_code, output = self.transport.run(command, timeout=timeout)
 
             print(f"Exit code: {exit_code}")
             print(f"Output: {output}")
@@ -52,14 +54,14 @@ class TestCodaSnapInstallation:
             print(f"Command execution failed: {e}")
             raise
 
-    def test_install_coda_snap(self, multipass_vm, wait_for_services, snap_in_vm):
-        """Install the coda snap from the snap store or local file"""
+    def test_install_coda_snap(self, multipass_vm, wait_for_services, snap_in_vm, coda_removed):
+        """Install the coda snap from the snap store or local file, starting from a target without it"""
 
         COMPANY_ID = "test-company-001"
         UNIQUE_ID = "test-device-001"
 
         # Verify snapd is responsive
-        print("Verifying snapd is ready...")
+        self.step("Verifying snapd is ready...")
         for attempt in range(10):
             exit_code, _ = self.exec_command(
                 multipass_vm,
@@ -84,7 +86,7 @@ class TestCodaSnapInstallation:
         # Install coda snap - either from local file or store
         if snap_in_vm['source'] == 'local':
             print(f"\n{'='*60}")
-            print(f"Installing coda snap from LOCAL FILE")
+            self.step("Installing coda snap from LOCAL FILE")
             print(f"File: {snap_in_vm['file_path']}")
             print(f"{'='*60}\n")
 
@@ -95,7 +97,7 @@ class TestCodaSnapInstallation:
             )
         else:
             print(f"\n{'='*60}")
-            print(f"Installing coda snap from SNAP STORE")
+            self.step("Installing coda snap from SNAP STORE")
             print(f"Channel: {snap_in_vm['channel']}")
             print(f"{'='*60}\n")
 
@@ -145,7 +147,7 @@ class TestCodaSnapInstallation:
         print("✓ Coda snap installed successfully")
 
         # Connect required interfaces
-        print("Connecting required snap interfaces...")
+        self.step("Connecting required snap interfaces...")
         interfaces = [
             "home",
             "shutdown",
@@ -187,7 +189,7 @@ class TestCodaSnapInstallation:
         print("✓ Interface connections completed")
 
         # Configure coda with unique-id and company-id
-        print("Configuring coda snap...")
+        self.step("Configuring coda snap...")
         
         # Set unique-id
         exit_code, output = self.exec_command(
@@ -236,7 +238,7 @@ class TestCodaSnapInstallation:
         print(f"✓ Set conf.platform.url={PLATFORM_URL}")
 
         # Restart coda snap to apply configuration
-        print("Restarting coda snap...")
+        self.step("Restarting coda snap...")
         exit_code, output = self.exec_command(
             multipass_vm,
             "sudo snap restart coda"
@@ -245,7 +247,7 @@ class TestCodaSnapInstallation:
         print("✓ Coda snap restarted")
 
         # Verify configuration
-        print("Verifying configuration...")
+        self.step("Verifying configuration...")
         exit_code, output = self.exec_command(
             multipass_vm,
             "sudo snap get coda bootstrap"
@@ -272,7 +274,7 @@ class TestCodaSnapInstallation:
         time.sleep(10)
 
         # Print coda snap logs
-        print("Printing coda snap logs...")
+        self.step("Printing coda snap logs...")
         exit_code, output = self.exec_command(
             multipass_vm,
             "sudo snap logs coda"
@@ -280,7 +282,7 @@ class TestCodaSnapInstallation:
         print(f"Coda snap logs: {output}")
         assert exit_code == 0, f"Failed to get logs: {output}"
 
-    def test_disk_space_exhaustion_crash(self, multipass_vm):
+    def test_disk_space_exhaustion_crash(self, multipass_vm, coda_snap, checkpoints, agent_resources):
         """
         Test that coda snap handles disk space exhaustion gracefully without crashing.
 
@@ -301,7 +303,6 @@ class TestCodaSnapInstallation:
         """
 
         COMMON_DIR = "/var/snap/coda/common"
-        COMMON_BACKUP = "/tmp/common_backup"
         LOOP_DEVICE_FILE = "/tmp/loop_disk_test.img"
         LOOP_DEVICE_SIZE_MB = 10  # 10MB - will be filled by restored files + prefill
         MONITOR_DURATION = 60  # Monitor for 60 seconds to verify stable operation
@@ -312,7 +313,7 @@ class TestCodaSnapInstallation:
 
         try:
             # Step 1: Stop coda snap service
-            print("\n[1/9] Stopping coda snap service...")
+            self.step("[1/9] Stopping coda snap service...")
             exit_code, output = self.exec_command(
                 multipass_vm,
                 "sudo snap stop coda"
@@ -320,18 +321,12 @@ class TestCodaSnapInstallation:
             assert exit_code == 0, f"Failed to stop coda snap: {output}"
             print("✓ Coda snap stopped")
 
-            # Step 2: Backup entire common directory
-            print("\n[2/9] Backing up entire common directory...")
-            exit_code, output = self.exec_command(
-                multipass_vm,
-                f"sudo mkdir -p {COMMON_BACKUP} && sudo cp -r {COMMON_DIR}/* {COMMON_BACKUP}/",
-                timeout=30
-            )
-            assert exit_code == 0, f"Failed to backup common directory: {output}"
-            print(f"✓ Common directory backed up to {COMMON_BACKUP}")
+            # Step 2: The baseline checkpoint holds the common directory (restored by coda_snap)
+            self.step("[2/9] Using the baseline checkpoint as the common directory backup...")
+            print(f"✓ Common directory archived in {coda_snap.archive}")
 
             # Step 3: Create loop device file
-            print(f"\n[3/9] Creating {LOOP_DEVICE_SIZE_MB}MB loop device file...")
+            self.step(f"[3/9] Creating {LOOP_DEVICE_SIZE_MB}MB loop device file...")
             exit_code, output = self.exec_command(
                 multipass_vm,
                 f"dd if=/dev/zero of={LOOP_DEVICE_FILE} bs=1M count={LOOP_DEVICE_SIZE_MB}",
@@ -341,7 +336,7 @@ class TestCodaSnapInstallation:
             print(f"✓ Loop device file created: {LOOP_DEVICE_FILE}")
 
             # Step 4: Format as ext4
-            print("\n[4/9] Formatting loop device as ext4...")
+            self.step("[4/9] Formatting loop device as ext4...")
             exit_code, output = self.exec_command(
                 multipass_vm,
                 f"sudo mkfs.ext4 -F {LOOP_DEVICE_FILE}",
@@ -351,7 +346,7 @@ class TestCodaSnapInstallation:
             print("✓ Loop device formatted")
 
             # Step 5: Mount loop device over entire common directory
-            print(f"\n[5/9] Mounting loop device over {COMMON_DIR}...")
+            self.step(f"[5/9] Mounting loop device over {COMMON_DIR}...")
             exit_code, output = self.exec_command(
                 multipass_vm,
                 f"sudo mount -o loop {LOOP_DEVICE_FILE} {COMMON_DIR}",
@@ -364,7 +359,7 @@ class TestCodaSnapInstallation:
             print("Restoring backed up files...")
             exit_code, output = self.exec_command(
                 multipass_vm,
-                f"sudo cp -r {COMMON_BACKUP}/* {COMMON_DIR}/",
+                f"sudo tar -C {COMMON_DIR} --numeric-owner -xpf {coda_snap.archive}",
                 timeout=30
             )
             assert exit_code == 0, f"Failed to restore files: {output}"
@@ -379,7 +374,7 @@ class TestCodaSnapInstallation:
             print(f"Disk status after restore:\n{output}")
 
             # Step 6: Pre-fill remaining space to ensure disk is close to 100%
-            print(f"\n[6/9] Pre-filling remaining disk space...")
+            self.step(f"[6/9] Pre-filling remaining disk space...")
             # Fill to capacity - the dd command will fail when disk is full, which is expected
             exit_code, output = self.exec_command(
                 multipass_vm,
@@ -397,7 +392,9 @@ class TestCodaSnapInstallation:
             print(f"Final disk usage:\n{output}")
 
             # Step 7: Start coda snap service (should start successfully despite disk constraints)
-            print("\n[7/9] Starting coda snap service (should handle disk constraints gracefully)...")
+            self.step("[7/9] Starting coda snap service (should handle disk constraints gracefully)...")
+            # Journal lines from here on are watched, so nothing logged during startup is missed
+            _, started_at = self.exec_command(multipass_vm, "date +%s")
             exit_code, output = self.exec_command(
                 multipass_vm,
                 "sudo snap start coda",
@@ -405,118 +402,69 @@ class TestCodaSnapInstallation:
             )
             print(f"Start command result: {output}")
 
-            # Wait a moment for snap to stabilize
-            print("Waiting 5 seconds for snap to stabilize...")
-            time.sleep(5)
-
-            # Step 8: Monitor for graceful handling (no crash/error patterns should occur)
-            print(f"\n[8/9] Monitoring snap behavior under disk pressure (max {MONITOR_DURATION}s)...")
-
-            # Monitor logs to ensure graceful handling (no errors)
-            start_time = time.time()
-            found_no_space = False
-            found_failed_hook = False
-            found_fatal_error = False
-            found_exit_failure = False
-            restart_count = 0
-            loop_iteration = 0
-            service_active_count = 0
-
-            while time.time() - start_time < MONITOR_DURATION:
-                loop_iteration += 1
-                elapsed = int(time.time() - start_time)
-                print(f"\n[Monitoring iteration {loop_iteration}, elapsed: {elapsed}s]")
-
-                # Get journalctl logs
-                exit_code, output = self.exec_command(
-                    multipass_vm,
-                    "sudo journalctl -u snap.coda.agent.service -n 100 --no-pager",
-                    check=False,
-                    timeout=10
+            # Step 8: Follow the journal for failure patterns; the first one ends the test right away
+            self.step(f"[8/9] Monitoring snap behavior under disk pressure (max {MONITOR_DURATION}s)...")
+            watch = LogWatch(reject={
+                "no space left on device": r"(?i)no space left on device",
+                "failed to fire hook": r"(?i)failed to fire hook",
+                "level=fatal error": r'level=fatal msg="resource temporarily unavailable"',
+                "exit failure": r"Main process exited, code=exited, status=1/FAILURE",
+                "restart": r"Scheduled restart job, restart counter is at",
+            })
+
+            # The service state is still sampled every 5 seconds while the journal is followed (the
+            # journal has its own process, so the poller is the only user of the transport meanwhile)
+            statuses = []
+            stop_polling = threading.Event()
+
+            def poll_status():
+                while not stop_polling.is_set():
+                    try:
+                        _, status = self.transport.run(
+                            "sudo systemctl status snap.coda.agent.service --no-pager -l", timeout=10)
+                        statuses.append(status)
+                    except (subprocess.TimeoutExpired, ConnectionError) as e:
+                        print(f"⚠ systemctl status failed: {e}")
+                    stop_polling.wait(5)
+
+            poller = threading.Thread(target=poll_status, daemon=True)
+            poller.start()
+            try:
+                result = watch.watch_command(
+                    self.transport,
+                    f"sudo journalctl -u snap.coda.agent.service -f --no-pager --since @{started_at.strip()}",
+                    timeout=MONITOR_DURATION
                 )
+            finally:
+                stop_polling.set()
+                poller.join(15)
+            print(f"Watch result: {result.outcome} after {result.elapsed_s:.1f}s ({result.lines_seen} journal lines)")
 
-                # Check systemctl status
-                exit_code_status, status_output = self.exec_command(
-                    multipass_vm,
-                    "sudo systemctl status snap.coda.agent.service --no-pager -l",
-                    check=False,
-                    timeout=10
-                )
+            exit_code, output = self.exec_command(
+                multipass_vm,
+                f"df -h {COMMON_DIR} | tail -1",
+                check=False,
+                timeout=10
+            )
+            print(f"Disk usage: {output.strip()}")
 
-                # Check disk usage on first and every 3rd iteration
-                if loop_iteration == 1 or loop_iteration % 3 == 0:
-                    exit_code_df, df_output = self.exec_command(
-                        multipass_vm,
-                        f"df -h {COMMON_DIR} | tail -1",
-                        check=False,
-                        timeout=10
-                    )
-                    print(f"Disk usage: {df_output.strip()}")
-
-                # Check for error patterns that should NOT occur
-                if "no space left on device" in output.lower():
-                    if not found_no_space:
-                        found_no_space = True
-                        print("✗ ERROR: Found 'no space left on device' error (should not occur)")
-
-                if "Failed to fire hook: write" in output or "failed to fire hook" in output.lower():
-                    if not found_failed_hook:
-                        found_failed_hook = True
-                        print("✗ ERROR: Found 'Failed to fire hook: write' error (should not occur)")
-
-                if 'level=fatal msg="resource temporarily unavailable"' in output:
-                    if not found_fatal_error:
-                        found_fatal_error = True
-                        print("✗ ERROR: Found level=fatal error (should not occur)")
-
-                # Check for exit failure in both journalctl and systemctl status
-                if "Main process exited, code=exited, status=1/FAILURE" in output or \
-                   "Main process exited, code=exited, status=1/FAILURE" in status_output:
-                    if not found_exit_failure:
-                        found_exit_failure = True
-                        print("✗ ERROR: Found 'Main process exited' message (should not occur)")
-
-                # Check for failed/crashed state in systemctl status
-                if "Active: failed" in status_output:
-                    if not found_exit_failure:
-                        found_exit_failure = True
-                        print("✗ ERROR: Service is in failed state (should not occur)")
-
-                # Check for active state (this is what we want)
-                if "Active: active" in status_output:
-                    service_active_count += 1
-                    if service_active_count == 1:
-                        print("✓ Service is active/running")
-
-                # Count restart attempts (should not occur)
-                restart_matches = output.count("Scheduled restart job, restart counter is at")
-                if restart_matches > restart_count:
-                    restart_count = restart_matches
-                    print(f"✗ ERROR: Restart counter detected: {restart_count} restarts (should not occur)")
-
-                # If we detect any error pattern early, we can exit early to fail faster
-                if found_no_space or found_exit_failure or restart_count > 0:
-                    print(f"\n✗ ERROR: Detected failure patterns early at {int(time.time() - start_time)}s")
-                    break
-
-                time.sleep(5)
-
-            # Print final logs and status for debugging
-            print("\n[Final systemctl status]")
             exit_code_status, status_output = self.exec_command(
                 multipass_vm,
                 "sudo systemctl status snap.coda.agent.service --no-pager -l",
                 check=False
             )
-            print(status_output)
-
-            print("\n[Final logs from journalctl]")
-            exit_code, output = self.exec_command(
-                multipass_vm,
-                "sudo journalctl -u snap.coda.agent.service -n 50 --no-pager",
-                check=False
+            print(f"\n[Final systemctl status]\n{status_output}")
+
+            found_no_space = result.pattern == "no space left on device"
+            found_failed_hook = result.pattern == "failed to fire hook"
+            found_fatal_error = result.pattern == "level=fatal error"
+            # An exit failure also shows in systemctl status, as does a failed/crashed state
+            found_exit_failure = result.pattern == "exit failure" or any(
+                "Main process exited, code=exited, status=1/FAILURE" in status or "Active: failed" in status
+                for status in statuses
             )
-            print(output)
+            restart_count = 1 if result.pattern == "restart" else 0
+            service_active_count = sum(1 for status in statuses if "Active: active" in status)
 
             # Verify we observed graceful handling (no error patterns)
             print("\n[Verification Results]")
@@ -526,6 +474,8 @@ class TestCodaSnapInstallation:
             print(f"  - Found exit failure: {found_exit_failure} (should be False)")
             print(f"  - Restart count: {restart_count} (should be 0)")
             print(f"  - Service was active: {service_active_count > 0} (should be True)")
+            if result.outcome == REJECT:
+                print(result.report())
 
             # Assert on graceful handling - no error patterns should occur
             # Test fails if ANY error pattern is detected
@@ -544,6 +494,9 @@ class TestCodaSnapInstallation:
             assert restart_count == 0, \
                 f"FAILED: Found {restart_count} restart(s) - snap should not crash and restart"
 
+            assert result.outcome == TIMEOUT, \
+                f"FAILED: journal stream ended before the monitoring window - {result.report()}"
+
             # Service should have been active during monitoring
             assert service_active_count > 0, \
                 "FAILED: Service was never active - snap should remain running under disk pressure"
@@ -552,37 +505,13 @@ class TestCodaSnapInstallation:
 
         finally:
             # Step 9: CLEANUP (critical - must happen even if test fails)
-            print("\n[9/9] CLEANUP: Restoring normal operation...")
+            self.step("[9/9] CLEANUP: Restoring normal operation...")
 
-            # Stop snap
-            print("  - Stopping coda snap...")
-            self.exec_command(
-                multipass_vm,
-                "sudo snap stop coda",
-                check=False,
-                timeout=30
-            )
-
-            # Unmount loop device from common directory
-            print(f"  - Unmounting loop device from {COMMON_DIR}...")
-            exit_code, output = self.exec_command(
-                multipass_vm,
-                f"sudo umount {COMMON_DIR}",
-                check=False,
-                timeout=30
-            )
-            if exit_code == 0:
-                print("  ✓ Loop device unmounted")
-            else:
-                print(f"  ⚠ Failed to unmount: {output}")
-                # Force unmount if normal unmount fails
-                print("  - Attempting force unmount...")
-                self.exec_command(
-                    multipass_vm,
-                    f"sudo umount -f {COMMON_DIR}",
-                    check=False,
-                    timeout=30
-                )
+            # Restoring the baseline stops the snap, unmounts the loop device, puts the common
+            # directory back and starts the snap as it was
+            print("  - Restoring the baseline checkpoint...")
+            elapsed = checkpoints.restore(coda_snap)
+            print(f"  ✓ Baseline restored in {elapsed:.2f}s")
 
             # Remove loop device file
             print(f"  - Removing loop device file {LOOP_DEVICE_FILE}...")
@@ -594,33 +523,6 @@ class TestCodaSnapInstallation:
             )
             print("  ✓ Loop device file removed")
 
-            # Restore backed up common directory
-            print(f"  - Restoring original common directory from {COMMON_BACKUP}...")
-            self.exec_command(
-                multipass_vm,
-                f"sudo mkdir -p {COMMON_DIR} && sudo cp -r {COMMON_BACKUP}/* {COMMON_DIR}/ 2>/dev/null || true",
-                check=False,
-                timeout=30
-            )
-            print("  ✓ Common directory restored")
-
-            # Remove backup
-            self.exec_command(
-                multipass_vm,
-                f"sudo rm -rf {COMMON_BACKUP}",
-                check=False
-            )
-
-            # Start snap normally
-            print("  - Starting coda snap normally...")
-            exit_code, output = self.exec_command(
-                multipass_vm,
-                "sudo snap start coda",
-                check=False,
-                timeout=30
-            )
-            print(f"  Start result: {output}")
-
             # Wait for snap to stabilize
             time.sleep(5)
 
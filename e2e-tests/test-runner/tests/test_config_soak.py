@@ -0,0 +1,115 @@
+"""
+Config push soak for the coda snap
+
+Production gateways receive config pushes all day. This soak has the mock server push a changing
+app_config (size and MD5 differ every push) to the agent at a fixed rate, for as long as
+E2E_SOAK_DURATION seconds (hours for release runs). Meanwhile `agent_resources` samples the agent
+process. The soak checks for leaks (RSS growth, fds, threads) and for latency creep in config
+application (push -> download latency over time).
+
+The summary (soak.py) is written to E2E_SOAK_SUMMARY for release gating and checked against
+E2E_SOAK_LIMITS, e.g. "max_missed=0,max_latency_p95_ms=5000,max_latency_slope_ms_per_h=500,
+rss_slope_mb_per_h=2". The soak only runs when E2E_SOAK_DURATION is set (`make e2e-soak`).
+"""
+
+import json
+import os
+import shlex
+import time
+import pytest
+
+from resources import parse_limits
+from soak import GATE_LIMITS, gate, soak_summary
+
+SOAK_DURATION = float(os.getenv('E2E_SOAK_DURATION', '0'))
+SOAK_INTERVAL = float(os.getenv('E2E_SOAK_INTERVAL', '60'))
+# Synthetic app_config sizes the pushes cycle through (section counts, see synthetic_config.py)
+SOAK_SIZES = json.loads(os.getenv(
+    'E2E_SOAK_SIZES', '[{"devices": 10}, {"devices": 200, "rules": 20}, {"devices": 2000, "rules": 200}]'))
+PROGRESS_INTERVAL = 60
+
+
+@pytest.mark.skipif(not SOAK_DURATION, reason="set E2E_SOAK_DURATION (seconds) to run the config push soak")
+class TestConfigPushSoak:
+    """Repeated send_config_v3 pushes with process sampling"""
+
+    @pytest.fixture(autouse=True)
+    def bind_transport(self, transport, step):
+        """Run every command of the test through the session transport, timing its steps"""
+        self.transport = transport
+        self.step = step
+
+    def admin(self, method, url, body=None):
+        """
+        Call a mock server admin endpoint from the test target
+
+        Returns:
+            dict: The JSON response
+        """
+        data = f" -H 'Content-Type: application/json' --data {shlex.quote(json.dumps(body))}" if body else ''
+        exit_code, output = self.transport.run(f"curl -s -X {method}{data} '{url}'", timeout=60)
+        try:
+            return json.loads(output)
+        except ValueError:
+            pytest.fail(f"{method} {url} failed ({exit_code}): {output}")
+
+    def test_config_push_soak(self, coda_snap, coda_provisioning, agent_resources, mock_server_url,
+                              record_property):
+        """Push changing configs for E2E_SOAK_DURATION seconds and gate on latency and resources"""
+        try:
+            limits = parse_limits(os.getenv('E2E_SOAK_LIMITS'), names=GATE_LIMITS)
+        except ValueError as e:
+            pytest.fail(f"Invalid E2E_SOAK_LIMITS: {e}")
+        soak_url = f"{mock_server_url}/admin/soak"
+        plan = {
+            'company_id': coda_provisioning['config']['bootstrap.company-id'],
+            'device_unique_id': coda_provisioning['config']['bootstrap.unique-id'],
+            'interval': SOAK_INTERVAL,
+            'duration': SOAK_DURATION,
+            'sizes': SOAK_SIZES,
+        }
+        _, version = self.transport.run("snap list coda | awk 'NR == 2 {print $2 \" (rev \" $3 \")\"}'")
+        version = version.strip()
+        record_property('coda_version', version)
+
+        self.step("[1/4] Starting config push soak...")
+        report = self.admin('PUT', soak_url, plan)
+        assert 'error' not in report, f"Could not start the soak: {report['error']}"
+        print(f"✓ Pushing every {SOAK_INTERVAL:g}s for {SOAK_DURATION:g}s to coda {version}: {SOAK_SIZES}")
+
+        self.step(f"[2/4] Pushing configs for {SOAK_DURATION:g}s...")
+        try:
+            deadline = time.monotonic() + SOAK_DURATION
+            while time.monotonic() < deadline:
+                time.sleep(min(PROGRESS_INTERVAL, max(deadline - time.monotonic(), 0)))
+                report = self.admin('GET', soak_url)
+                resources = agent_resources.summary()
+                print(f"  {report['elapsed_s']:8.0f}s: {report['pushes']} pushed, {report['downloaded']} downloaded, "
+                      f"{report['missed']} missed, p95 {report['latency_ms']['p95']}ms | "
+                      f"RSS {resources.get('last_rss_mb')}MB, fds {resources.get('max_fds')}, "
+                      f"restarts {resources.get('restarts')}")
+                if 'max_missed' in limits and report['missed'] > limits['max_missed']:
+                    print(f"✗ {report['missed']} pushes missed, stopping the soak early")
+                    break
+                if not report['running']:
+                    break
+        finally:
+            self.step("[3/4] Stopping the soak...")
+            report = self.admin('DELETE', soak_url)
+
+        self.step("[4/4] Exporting the soak summary...")
+        summary = soak_summary(report, agent_resources.summary(), coda_version=version)
+        print(f"\nConfig push soak summary:\n{json.dumps(summary, indent=2)}")
+        path = os.getenv('E2E_SOAK_SUMMARY')
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+                f.write('\n')
+            print(f"✓ Soak summary written to {path}")
+        # Tracked by the timing report and its baseline like any step
+        for label, name in (('p50', 'latency_p50_ms'), ('p95', 'latency_p95_ms')):
+            if summary['soak'][name] is not None:
+                self.step.record(f"soak: push to download {label}", summary['soak'][name] / 1000)
+
+        violations = gate(summary, limits)
+        assert not violations, f"Config push soak failed its release gate: {'; '.join(violations)}"
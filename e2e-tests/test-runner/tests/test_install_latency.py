@@ -0,0 +1,209 @@
+"""
+Install-to-connected latency benchmark for the coda snap
+
+Measures how long a new gateway takes from `snap install` until the agent has requested and
+downloaded its config, broken down into:
+
+    install started -> snap installed      `snap install`, including the install hook
+    snap installed -> hooks done           interfaces connected and the configure hook run by `snap set`
+    hooks done -> agent started            the agent service (re)started (from the journal)
+    agent started -> config requested      first config request seen by the mock server
+    config requested -> config published   send_config_v3 reply published by the mock server
+    config published -> config downloaded  app_config.zip served by the mock server
+
+Test-side points are `date` stamps taken on the target around each command, agent start comes
+from the journal and the config points from the mock server's device timeline (/admin/timeline).
+The mock services run on the target, so all timestamps come from the same clock.
+
+Every segment is recorded as a step ("latency: <from> -> <to>"), so the timing report, the JUnit
+XML and a timing baseline track the breakdown over releases (see timing.py). With
+E2E_LATENCY_HISTORY set, every run also appends the breakdown and the snap version to that JSON
+lines file.
+"""
+
+import datetime
+import json
+import os
+import subprocess
+import pytest
+
+STAMP_MARKER = "__E2E_STAMP__"
+AGENT_SERVICE = "snap.coda.agent.service"
+CONFIG_TIMEOUT = 180
+POLL_INTERVAL = 0.5
+
+
+class TestInstallLatency:
+    """Benchmark of a fresh install up to the first config download"""
+
+    @pytest.fixture(autouse=True)
+    def bind_transport(self, transport, step):
+        """Run every command of the test through the session transport, timing its steps"""
+        self.transport = transport
+        self.step = step
+
+    def exec_command(self, command, check=True, timeout=300):
+        """
+        Execute command on the test target and return result
+
+        Args:
+            command: Command to execute
+            check: If True, raise exception on non-zero exit code
+            timeout: Command timeout in seconds (default: 300)
+
+        Returns:
+            tuple: (exit_code, output)
+        """
+        print(f"Executing: {command}")
+        try:
+            exit_code, output = self.transport.run(command, timeout=timeout)
+
+            print(f"Exit code: {exit_code}")
+            print(f"Output: {output}")
+
+            if check and exit_code != 0:
+                raise RuntimeError(f"Command failed with exit code {exit_code}: {output}")
+
+            return exit_code, output
+        except subprocess.TimeoutExpired:
+            print(f"Command timed out after {timeout} seconds")
+            raise
+
+    def stamped_command(self, command, timeout=300):
+        """
+        Execute command on the test target between two target clock stamps (one round trip)
+
+        Returns:
+            tuple: (exit_code, output, started_at, finished_at) with epoch timestamps
+        """
+        stamp = f'echo "{STAMP_MARKER} $(date +%s.%N)"'
+        exit_code, output = self.exec_command(f"{stamp}\n{command}\ncode=$?\n{stamp}\nexit $code",
+                                              check=False, timeout=timeout)
+        stamps = [float(line.split()[1]) for line in output.splitlines() if line.startswith(STAMP_MARKER)]
+        assert len(stamps) == 2, f"Missing clock stamps in output: {output}"
+        output = "\n".join(line for line in output.splitlines() if not line.startswith(STAMP_MARKER))
+        return exit_code, output, stamps[0], stamps[1]
+
+    def agent_started_at(self, since, before):
+        """
+        When the agent service last started before its first config request (the start that
+        connected), from systemd's "Started" journal entries
+
+        Returns:
+            float or None: Epoch timestamp
+        """
+        _, output = self.exec_command(
+            f"sudo journalctl -u {AGENT_SERVICE} -o short-unix --no-pager --since @{int(since)} | grep ' Started '",
+            check=False
+        )
+        starts = []
+        for line in output.splitlines():
+            try:
+                starts.append(float(line.split()[0]))
+            except (IndexError, ValueError):
+                continue
+        earlier = [t for t in starts if t <= before]
+        return max(earlier) if earlier else None
+
+    def wait_for_config_download(self, timeline_url, timeout=CONFIG_TIMEOUT):
+        """
+        Poll the device's mock server timeline on the target until the config was downloaded
+        (one round trip; the timestamps come from the mock server, not from the polling)
+
+        Returns:
+            dict: {event: {'first', 'last', 'count'}} as reported by /admin/timeline
+        """
+        polls = int(timeout / POLL_INTERVAL)
+        _, output = self.exec_command(
+            f"url='{timeline_url}'\n"
+            f"for i in $(seq {polls}); do\n"
+            f"  case \"$(curl -s \"$url\")\" in *config_downloaded*) break;; esac\n"
+            f"  sleep {POLL_INTERVAL}\n"
+            f"done\n"
+            f"curl -s \"$url\"",
+            check=False, timeout=timeout + 30
+        )
+        try:
+            return json.loads(output.strip().splitlines()[-1])['events']
+        except (IndexError, KeyError, ValueError):
+            pytest.fail(f"Could not read the device timeline from {timeline_url}: {output}")
+
+    def test_install_to_config_download(self, snap_in_vm, coda_provisioning, mock_server_url, record_property):
+        """Fresh install of the coda snap up to its first config download, as a latency breakdown"""
+        company_id = coda_provisioning['config']['bootstrap.company-id']
+        device_unique_id = coda_provisioning['config']['bootstrap.unique-id']
+        timeline_url = f"{mock_server_url}/admin/timeline/{company_id}/{device_unique_id}"
+
+        self.step("[1/6] Removing coda snap and clearing the device timeline...")
+        self.exec_command("if snap list coda >/dev/null 2>&1; then sudo snap remove --purge coda; fi", timeout=300)
+        self.exec_command(f"curl -sf -X DELETE '{timeline_url}'")
+        print("✓ Starting from a target without coda")
+
+        self.step(f"[2/6] Installing coda snap from {snap_in_vm['source'].upper()}...")
+        exit_code, output, started_at, installed_at = self.stamped_command(coda_provisioning['install'])
+        assert exit_code == 0, f"Failed to install coda snap: {output}"
+        _, version = self.exec_command("snap list coda | awk 'NR == 2 {print $2 \" (rev \" $3 \")\"}'")
+        version = version.strip()
+        record_property('coda_version', version)
+        print(f"✓ Installed coda {version} in {installed_at - started_at:.2f}s")
+
+        self.step("[3/6] Connecting interfaces and configuring coda snap...")
+        # Some interfaces do not exist on every target, so the connect chain's exit code is not checked
+        _, _, _, connected_at = self.stamped_command(coda_provisioning['connect'])
+        exit_code, output, _, configured_at = self.stamped_command(coda_provisioning['configure'])
+        assert exit_code == 0, f"Failed to configure coda snap: {output}"
+        print(f"✓ Hooks done {configured_at - installed_at:.2f}s after the install "
+              f"(interfaces: {connected_at - installed_at:.2f}s)")
+
+        self.step("[4/6] Restarting coda snap...")
+        exit_code, output, _, _ = self.stamped_command("sudo snap restart coda")
+        assert exit_code == 0, f"Failed to restart coda snap: {output}"
+
+        self.step("[5/6] Waiting for the agent to request and download its config...")
+        events = self.wait_for_config_download(timeline_url)
+        if 'config_downloaded' not in events:
+            _, logs = self.exec_command("sudo snap logs coda -n 50", check=False)
+            pytest.fail(f"No config download within {CONFIG_TIMEOUT}s (timeline: {events})\n{logs}")
+        requested_at = events['config_requested']['first']
+        agent_at = self.agent_started_at(since=installed_at, before=requested_at)
+        if agent_at is None:
+            print("⚠ No agent start found in the journal; the breakdown skips it")
+
+        self.step("[6/6] Reporting the latency breakdown...")
+        points = [
+            ('install started', started_at),
+            ('snap installed', installed_at),
+            ('hooks done', configured_at),
+            ('agent started', agent_at),
+            ('config requested', requested_at),
+            ('config published', events.get('config_published', {}).get('first')),
+            ('config downloaded', events['config_downloaded']['first']),
+        ]
+        points = [(name, at) for name, at in points if at is not None]
+        latency = {}
+        print(f"\nInstall-to-connected latency of coda {version}:")
+        for (previous, previous_at), (name, at) in zip(points, points[1:]):
+            latency[f"{previous} -> {name}"] = round(at - previous_at, 3)
+            self.step.record(f"latency: {previous} -> {name}", at - previous_at)
+            print(f"  {previous:>18} -> {name:<18} {at - previous_at:8.2f}s")
+        total = points[-1][1] - started_at
+        latency['install started -> config downloaded'] = round(total, 3)
+        self.step.record("latency: install started -> config downloaded", total)
+        print(f"  {'total':>40} {total:8.2f}s")
+        for event, entry in events.items():
+            if entry['count'] > 1:
+                print(f"ℹ {event} seen {entry['count']} times")
+
+        history = os.getenv('E2E_LATENCY_HISTORY')
+        if history:
+            record = {
+                'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'coda_version': version,
+                'source': snap_in_vm['source'],
+                'latency_s': latency,
+            }
+            with open(history, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+            print(f"✓ Appended the breakdown to {history}")
+
+        assert all(value >= 0 for value in latency.values()), f"Out of order timestamps: {latency}"
@@ -0,0 +1,244 @@
+"""
+Per-test and per-step timing for the e2e suite
+Tests mark their phases with the `step` fixture in place of the "[3/9] ..." progress banners:
+
+    step("[3/9] Installing coda snap from LOCAL FILE")   # prints the banner, starts the step
+    ...                                                  # runs until the next step or the test end
+    with step("Restarting coda snap"):                   # or bounded by a with block
+        ...
+    step.record("time to first config request", seconds) # a duration measured by the test itself
+
+Steps are keyed by their banner without the "[n/m]" counter, attached to the test report (so they
+also reach the controller under pytest-xdist) and written as a JSON report and as a JUnit XML file
+with one testcase per step. A stored JSON report can serve as baseline: steps slower than
+threshold x baseline (and by more than min_delta seconds, to ignore noise) are flagged in the
+terminal summary and optionally fail the run.
+
+Options (environment defaults in parentheses):
+    --timing-report PATH        JSON report (E2E_TIMING_REPORT)
+    --timing-junit PATH         JUnit XML report (E2E_TIMING_JUNIT)
+    --timing-baseline PATH      JSON report to compare against (E2E_TIMING_BASELINE)
+    --timing-threshold RATIO    slowdown ratio flagged as regression (E2E_TIMING_THRESHOLD, 1.5)
+    --timing-min-delta SECONDS  minimum slowdown flagged (E2E_TIMING_MIN_DELTA, 2.0)
+    --timing-fail-on-regression exit non-zero when a regression is flagged
+"""
+
+import datetime
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+USER_PROPERTY = 'e2e_steps'
+TIMER_KEY = pytest.StashKey()
+
+
+def step_key(banner):
+    """'[3/9] Installing coda snap...' -> 'Installing coda snap'"""
+    return re.sub(r'^\s*\[\d+/\d+\]\s*', '', banner).strip().rstrip('.').strip()
+
+
+class StepTimer:
+    """
+    Times the steps of one test
+
+    Calling the timer starts a step (ending the running one); the returned object also works as a
+    context manager ending the step on exit.
+
+    Args:
+        clock: Monotonic clock (injectable for tests)
+        echo: Print the banner of every step
+    """
+
+    def __init__(self, clock=time.monotonic, echo=True):
+        self.clock = clock
+        self.echo = echo
+        self.steps = []
+        self.current = None
+
+    def __call__(self, banner):
+        self.end()
+        if self.echo:
+            print(f"\n{banner}")
+        self.current = {'name': step_key(banner), 'started': self.clock()}
+        return _StepScope(self, self.current)
+
+    def record(self, name, duration_s, outcome='passed'):
+        """Record a duration measured by the test itself"""
+        self.steps.append({'name': name, 'duration_s': round(duration_s, 3), 'outcome': outcome})
+
+    def end(self, outcome='passed', entry=None):
+        """End the running step (only if it is entry, when given)"""
+        if self.current is None or (entry is not None and entry is not self.current):
+            return
+        self.record(self.current['name'], self.clock() - self.current['started'], outcome)
+        self.current = None
+
+
+class _StepScope:
+
+    def __init__(self, timer, entry):
+        self.timer = timer
+        self.entry = entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.timer.end('failed' if exc_type else 'passed', self.entry)
+
+
+def compare(current, baseline, threshold=1.5, min_delta=2.0):
+    """
+    Steps and tests that got slower than their baseline
+
+    Args:
+        current: Report dict (see TimingPlugin.report)
+        baseline: Report dict of an earlier run
+        threshold: Ratio over the baseline duration that counts as a regression
+        min_delta: Seconds the slowdown must exceed as well
+
+    Returns:
+        list of dicts: test, step (None for the whole test), baseline_s, current_s, ratio
+    """
+    regressions = []
+
+    def check(test, step, base_s, cur_s):
+        if base_s is None or cur_s is None:
+            return
+        if cur_s > base_s * threshold and cur_s - base_s > min_delta:
+            regressions.append({'test': test, 'step': step, 'baseline_s': base_s, 'current_s': cur_s,
+                                'ratio': round(cur_s / base_s, 2) if base_s else None})
+
+    for test, entry in current.get('tests', {}).items():
+        base = baseline.get('tests', {}).get(test)
+        if not base:
+            continue
+        check(test, None, base.get('duration_s'), entry.get('duration_s'))
+        base_steps = {}
+        for s in base.get('steps', []):
+            base_steps.setdefault(s['name'], s['duration_s'])
+        seen = set()
+        for s in entry.get('steps', []):
+            if s['name'] in seen:
+                continue
+            seen.add(s['name'])
+            check(test, s['name'], base_steps.get(s['name']), s['duration_s'])
+    return regressions
+
+
+def write_junit(report, path):
+    """JUnit XML with one testcase per step (classname: the test) so CI can chart step durations"""
+    suite = ET.Element('testsuite', name='e2e-timing')
+    count = failures = 0
+    total = 0.0
+    for test, entry in report['tests'].items():
+        for s in entry['steps'] or [{'name': '(test)', 'duration_s': entry['duration_s'], 'outcome': entry['outcome']}]:
+            case = ET.SubElement(suite, 'testcase', classname=test, name=s['name'], time=f"{s['duration_s']:.3f}")
+            if s['outcome'] == 'failed':
+                ET.SubElement(case, 'failure', message='step failed')
+                failures += 1
+            count += 1
+            total += s['duration_s']
+    suite.set('tests', str(count))
+    suite.set('failures', str(failures))
+    suite.set('time', f"{total:.3f}")
+    ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+
+def add_options(parser):
+    """Register the timing command line options (call from pytest_addoption)"""
+    group = parser.getgroup('e2e-timing', 'e2e step timing')
+    group.addoption('--timing-report', default=os.getenv('E2E_TIMING_REPORT'), help='write a JSON timing report')
+    group.addoption('--timing-junit', default=os.getenv('E2E_TIMING_JUNIT'), help='write step timings as JUnit XML')
+    group.addoption('--timing-baseline', default=os.getenv('E2E_TIMING_BASELINE'),
+                    help='JSON timing report to compare against')
+    group.addoption('--timing-threshold', type=float, default=float(os.getenv('E2E_TIMING_THRESHOLD', '1.5')),
+                    help='slowdown ratio flagged as a regression (default: 1.5)')
+    group.addoption('--timing-min-delta', type=float, default=float(os.getenv('E2E_TIMING_MIN_DELTA', '2.0')),
+                    help='minimum slowdown in seconds flagged as a regression (default: 2.0)')
+    group.addoption('--timing-fail-on-regression', action='store_true', help='fail the run on regressions')
+
+
+class TimingPlugin:
+    """
+    Collects test and step durations from the test reports and writes the timing reports
+
+    Registered by conftest.py; under pytest-xdist the steps travel with the reports, so the
+    controller writes the complete report.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.tests = {}
+        self.regressions = []
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        outcome = yield
+        timer = item.stash.get(TIMER_KEY, None)
+        if timer is None:
+            return
+        # The call report is built right after this hook, before fixture teardown
+        timer.end('failed' if outcome.excinfo else 'passed')
+        item.user_properties.append((USER_PROPERTY, timer.steps))
+
+    def pytest_runtest_logreport(self, report):
+        if report.when == 'setup' and report.outcome != 'passed':
+            self.tests[report.nodeid] = {'outcome': report.outcome, 'duration_s': round(report.duration, 3),
+                                         'steps': []}
+        if report.when != 'call':
+            return
+        steps = next((value for key, value in report.user_properties if key == USER_PROPERTY), [])
+        self.tests[report.nodeid] = {
+            'outcome': report.outcome,
+            'duration_s': round(report.duration, 3),
+            'steps': steps,
+        }
+
+    def report(self):
+        return {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'tests': self.tests,
+        }
+
+    def pytest_sessionfinish(self, session):
+        if hasattr(self.config, 'workerinput'):
+            # xdist worker: the controller writes the reports
+            return
+        options = self.config.option
+        report = self.report()
+        if options.timing_report:
+            with open(options.timing_report, 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+        if options.timing_junit:
+            write_junit(report, options.timing_junit)
+        if options.timing_baseline:
+            try:
+                with open(options.timing_baseline) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"\n⚠ Could not read timing baseline {options.timing_baseline}: {e}")
+                return
+            self.regressions = compare(report, baseline, options.timing_threshold, options.timing_min_delta)
+            if self.regressions and options.timing_fail_on_regression and session.exitstatus == 0:
+                session.exitstatus = 1
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if hasattr(self.config, 'workerinput') or not self.tests:
+            return
+        steps = [(s['duration_s'], test.split('::')[-1], s['name'])
+                 for test, entry in self.tests.items() for s in entry['steps']]
+        terminalreporter.section('e2e timing')
+        for duration, test, name in sorted(steps, reverse=True)[:10]:
+            terminalreporter.write_line(f"{duration:9.2f}s  {test}: {name}")
+        for r in self.regressions:
+            where = f"{r['test'].split('::')[-1]}: {r['step']}" if r['step'] else r['test']
+            terminalreporter.write_line(f"✗ Slower than baseline: {where} {r['baseline_s']:.2f}s -> "
+                                        f"{r['current_s']:.2f}s (x{r['ratio']})", red=True)
+        if self.config.option.timing_baseline and not self.regressions:
+            terminalreporter.write_line("✓ No step slower than the timing baseline")
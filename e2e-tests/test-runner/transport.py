@@ -0,0 +1,248 @@
+"""
+Command execution transports for the e2e tests
+Every check runs shell commands on the test target. Spawning `multipass exec ... bash -c` per
+command costs a few hundred milliseconds, which dominates the suite runtime, so commands go
+through a transport chosen with E2E_TRANSPORT:
+
+    persistent  one long-lived `multipass exec` bash session; commands are written to its stdin
+                and their output is framed by a random sentinel line carrying the exit code (default)
+    exec        a new `multipass exec` process per command (the original behaviour)
+    local       bash on this machine, for running the suite on the target itself without a VM
+    local-persistent  one bash session on this machine (mainly to measure the framing overhead)
+
+Every transport runs a command as `bash -c <command>` with stdin from /dev/null and returns
+(exit_code, output), output being stdout followed by stderr (interleaved for the persistent shell).
+"""
+
+import abc
+import os
+import selectors
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+
+
+class Transport(abc.ABC):
+    """Runs shell commands on the test target"""
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def run(self, command, timeout=300):
+        """
+        Run a command
+
+        Args:
+            command: bash command line
+            timeout: Seconds before the command is abandoned
+
+        Returns:
+            tuple: (exit_code, output)
+
+        Raises:
+            subprocess.TimeoutExpired: If the command did not finish within timeout
+        """
+
+    def popen(self, command):
+        """
+        Start a long-running command (e.g. `journalctl -f`) without waiting for it
+
+        Returns:
+            subprocess.Popen: stdout is a byte pipe carrying stdout and stderr; the process leads
+            its own process group, so killpg stops the whole command
+        """
+        return subprocess.Popen(
+            self.stream_argv() + ['bash', '-c', command],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+    @abc.abstractmethod
+    def stream_argv(self):
+        """Command prefix running a program on the target"""
+
+    def close(self):
+        """Release the transport's resources"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SubprocessTransport(Transport):
+    """One process per command: `<prefix> bash -c <command>`"""
+
+    def __init__(self, prefix=()):
+        self.prefix = list(prefix)
+
+    def run(self, command, timeout=300):
+        result = subprocess.run(
+            self.prefix + ['bash', '-c', command],
+            stdin=subprocess.DEVNULL,
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+        return result.returncode, result.stdout + result.stderr
+
+    def stream_argv(self):
+        return list(self.prefix)
+
+
+class MultipassExecTransport(SubprocessTransport):
+    """A new `multipass exec` per command"""
+
+    name = 'exec'
+
+    def __init__(self, vm_name):
+        super().__init__(['multipass', 'exec', vm_name, '--'])
+
+
+class LocalTransport(SubprocessTransport):
+    """bash on the machine running the tests"""
+
+    name = 'local'
+
+
+class PersistentShellTransport(Transport):
+    """
+    One long-lived bash session multiplexing every command
+
+    Each command is sent as a single line, `bash -c <quoted command> </dev/null 2>&1`, followed by
+    a printf of a per-command random sentinel and $?. Output is read up to the sentinel, so the
+    session stays in sync even if a command prints text resembling a previous sentinel. The command
+    still runs in its own bash process (cd, exit and set -e do not leak into the session); only the
+    cost of starting the remote session is paid once.
+
+    The session is started on first use and restarted after it died or a command timed out (a
+    timed-out command may still be running on the target, so its output cannot be trusted).
+    Commands from several threads are serialized.
+
+    Args:
+        argv: Command starting the session's bash
+        name: Transport name reported to the tests
+        stream_prefix: Command prefix for popen (long-running commands get their own process)
+    """
+
+    def __init__(self, argv, name='persistent', stream_prefix=()):
+        self.argv = list(argv)
+        self.name = name
+        self.stream_prefix = list(stream_prefix)
+        self.process = None
+        self.selector = None
+        self.sessions_started = 0
+        self.lock = threading.Lock()
+
+    def stream_argv(self):
+        return list(self.stream_prefix)
+
+    def start(self):
+        self.process = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0
+        )
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.process.stdout, selectors.EVENT_READ)
+        self.sessions_started += 1
+
+    def run(self, command, timeout=300):
+        # One command at a time: concurrent callers would interleave their commands and output
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self.close()
+                self.start()
+            sentinel = f"__E2E_DONE_{uuid.uuid4().hex}__"
+            line = f"bash -c {shlex.quote(command)} </dev/null 2>&1; printf '\\n{sentinel} %d\\n' \"$?\"\n"
+            try:
+                self.process.stdin.write(line.encode())
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                self.close()
+                raise ConnectionError(f"Shell session {self.argv} exited before the command was sent")
+
+            marker = f"\n{sentinel} ".encode()
+            buffer = bytearray()
+            deadline = time.monotonic() + timeout
+            while True:
+                end = buffer.find(marker)
+                if end != -1 and buffer.find(b'\n', end + len(marker)) != -1:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close(kill=True)
+                    raise subprocess.TimeoutExpired(command, timeout, output=bytes(buffer).decode(errors='replace'))
+                if not self.selector.select(remaining):
+                    continue
+                chunk = os.read(self.process.stdout.fileno(), 65536)
+                if not chunk:
+                    output = bytes(buffer).decode(errors='replace')
+                    self.close()
+                    raise ConnectionError(f"Shell session {self.argv} exited while running a command: {output}")
+                buffer += chunk
+
+            status_end = buffer.find(b'\n', end + len(marker))
+            exit_code = int(buffer[end + len(marker):status_end])
+            if status_end + 1 != len(buffer):
+                # Nothing may follow the sentinel: the session only runs one command at a time
+                self.close()
+                raise ConnectionError(f"Unexpected output after command completion: {bytes(buffer[status_end + 1:])!r}")
+            return exit_code, bytes(buffer[:end]).decode(errors='replace')
+
+    def close(self, kill=False):
+        """End the session: EOF lets bash exit on its own, kill=True does not wait for a running command"""
+        if self.process is None:
+            return
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+        if self.process.poll() is None and not kill:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.process = None
+
+
+TRANSPORTS = ('persistent', 'exec', 'local', 'local-persistent')
+
+
+def make_transport(kind=None, vm_name=None):
+    """
+    Build the transport selected by kind (default: E2E_TRANSPORT, 'persistent')
+
+    Args:
+        kind: 'persistent', 'exec', 'local' or 'local-persistent'
+        vm_name: Multipass VM for the persistent and exec transports
+
+    Raises:
+        ValueError: Unknown transport
+    """
+    kind = kind or os.getenv('E2E_TRANSPORT', 'persistent')
+    if kind == 'local':
+        return LocalTransport()
+    if kind == 'exec':
+        return MultipassExecTransport(vm_name)
+    if kind == 'persistent':
+        return PersistentShellTransport(['multipass', 'exec', vm_name, '--', 'bash', '--noprofile', '--norc'],
+                                        stream_prefix=['multipass', 'exec', vm_name, '--'])
+    if kind == 'local-persistent':
+        return PersistentShellTransport(['bash', '--noprofile', '--norc'], name='local-persistent')
+    raise ValueError(f"Unknown E2E_TRANSPORT '{kind}' (expected one of: {', '.join(TRANSPORTS)})")
@@ -0,0 +1,9 @@
+"""
+Pytest configuration for e2e runner unit tests (no VM required)
+"""
+
+import os
+import sys
+
+# The runner helpers are plain modules living next to the tests directories
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
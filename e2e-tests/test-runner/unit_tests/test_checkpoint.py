@@ -0,0 +1,63 @@
+"""
+Unit tests for snap state checkpoints (the tree round trip runs against local bash)
+"""
+
+import os
+
+from checkpoint import CheckpointStore, config_settings, parse_services
+from transport import LocalTransport
+
+SERVICES = """Service     Startup   Current   Notes
+coda.agent  enabled   active    -
+coda.relay  disabled  inactive  -
+"""
+
+
+class TestParsing:
+
+    def test_parse_services(self):
+        assert parse_services(SERVICES) == {
+            'coda.agent': ('enabled', 'active'),
+            'coda.relay': ('disabled', 'inactive'),
+        }
+        assert parse_services('') == {}
+
+    def test_config_settings_replace_changed_keys_and_unset_new_ones(self):
+        current = {'bootstrap': {'unique-id': 'changed'}, 'conf': {'a': 1}, 'extra': 'x'}
+        target = {'bootstrap': {'unique-id': 'dev-1'}, 'conf': {'a': 1}}
+        assert config_settings(current, target) == ['extra!', 'bootstrap={"unique-id":"dev-1"}']
+        assert config_settings(target, target) == []
+
+
+class TestStore:
+
+    def test_service_commands_restore_startup_and_current_state(self):
+        store = CheckpointStore(LocalTransport(), sudo='')
+        commands = store.service_commands(parse_services(SERVICES))
+        assert commands == [
+            'snap start --enable coda.agent >/dev/null',
+            'snap stop --disable coda.relay >/dev/null',
+        ]
+        commands = store.service_commands({'coda.agent': ('enabled', 'inactive')})
+        assert commands == ['snap start --enable coda.agent >/dev/null', 'snap stop coda.agent >/dev/null']
+
+    def test_tree_round_trip(self, tmp_path):
+        common = tmp_path / 'common'
+        (common / 'conf').mkdir(parents=True)
+        (common / 'conf' / 'conf.json').write_text('{"a": 1}')
+        os.chmod(common / 'conf' / 'conf.json', 0o600)
+        (common / 'log').mkdir()
+        transport = LocalTransport()
+        store = CheckpointStore(transport, common_dir=str(common), store_dir=str(tmp_path / 'store'), sudo='')
+        archive = store.archive_path('baseline')
+
+        assert transport.run('set -e\n' + store.save_tree_script(archive))[0] == 0
+        (common / 'conf' / 'conf.json').write_text('changed')
+        (common / 'log' / 'new.log').write_text('x')
+        (common / 'prefill.dat').write_text('x' * 100)
+        assert transport.run('set -e\n' + store.load_tree_script(archive))[0] == 0
+
+        assert (common / 'conf' / 'conf.json').read_text() == '{"a": 1}'
+        assert os.stat(common / 'conf' / 'conf.json').st_mode & 0o777 == 0o600
+        assert sorted(p.name for p in common.iterdir()) == ['conf', 'log']
+        assert list((common / 'log').iterdir()) == []
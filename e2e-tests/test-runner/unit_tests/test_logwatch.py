@@ -0,0 +1,91 @@
+"""
+Unit tests for the streaming log matcher
+"""
+
+import os
+import time
+
+from logwatch import ACCEPT, EOF, REJECT, TIMEOUT, LogWatch
+from transport import LocalTransport
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMatching:
+
+    def test_reject_is_checked_before_accept(self):
+        watch = LogWatch(accept={'ready': r'ready'}, reject={'error': r'(?i)error'})
+        result = watch.watch_lines(['starting\n', 'ready with ERROR\n', 'ready\n'], timeout=10)
+        assert (result.outcome, result.pattern, result.line) == (REJECT, 'error', 'ready with ERROR')
+        assert result.lines_seen == 2
+
+    def test_accept_stops_reading_the_source(self):
+        consumed = []
+
+        def lines():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"line {i}"
+
+        result = LogWatch(accept={'five': r'line 5$'}).watch_lines(lines(), timeout=10)
+        assert result.outcome == ACCEPT and result.matched
+        assert consumed == list(range(6))
+
+    def test_eof_and_timeout(self):
+        assert LogWatch(accept={'x': 'x'}).watch_lines(['a', 'b'], timeout=10).outcome == EOF
+
+        clock = FakeClock()
+
+        def slow_lines():
+            while True:
+                clock.now += 1
+                yield 'tick'
+
+        result = LogWatch(reject={'x': 'x'}, clock=clock).watch_lines(slow_lines(), timeout=5)
+        assert result.outcome == TIMEOUT and not result.matched
+        assert result.lines_seen == 5 and result.elapsed_s == 5
+
+    def test_context_is_a_bounded_ring_buffer(self):
+        watch = LogWatch(reject={'boom': 'boom'}, context_lines=3)
+        result = watch.watch_lines([f"line {i}" for i in range(100)] + ['boom'], timeout=10)
+        assert result.context == ['line 98', 'line 99', 'boom']
+        assert result.lines_seen == 101
+        report = result.report()
+        assert "reject pattern 'boom' matched" in report
+        assert 'Last 3 of 101 lines' in report and '  | line 99' in report
+
+
+class TestStreams:
+
+    def test_stream_deadline_holds_without_output(self):
+        read_fd, write_fd = os.pipe()
+        try:
+            with os.fdopen(read_fd, 'rb', buffering=0) as stream:
+                os.write(write_fd, b'partial line without newline')
+                started = time.monotonic()
+                result = LogWatch(reject={'x': 'never'}).watch_stream(stream, timeout=0.3)
+                assert result.outcome == TIMEOUT
+                assert 0.25 <= time.monotonic() - started < 2
+                assert result.lines_seen == 0
+        finally:
+            os.close(write_fd)
+
+    def test_command_is_stopped_on_the_first_match(self):
+        started = time.monotonic()
+        result = LogWatch(accept={'up': r'^service up$'}).watch_command(
+            LocalTransport(), 'echo booting; sleep 0.2; echo service up; sleep 30; echo late', timeout=10)
+        assert result.outcome == ACCEPT and result.context == ['booting', 'service up']
+        assert time.monotonic() - started < 5
+
+    def test_command_output_split_across_reads(self):
+        command = "printf 'first li'; sleep 0.1; printf 'ne\\nsecond'; sleep 0.1; printf ' line\\n'"
+        result = LogWatch(accept={'x': 'never'}).watch_command(LocalTransport(), command, timeout=10)
+        assert result.outcome == EOF
+        assert result.context == ['first line', 'second line']
@@ -0,0 +1,78 @@
+"""
+Unit tests for batched remote probes, run against local bash
+"""
+
+import os
+
+import pytest
+
+from probes import ProbeBatch
+from transport import LocalTransport
+
+
+class CountingTransport(LocalTransport):
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def run(self, command, timeout=300):
+        self.calls += 1
+        return super().run(command, timeout=timeout)
+
+
+@pytest.fixture
+def transport():
+    return CountingTransport()
+
+
+def test_one_round_trip_for_every_probe(transport, tmp_path):
+    (tmp_path / 'conf.json').write_text('{"mqtt": {"broker": {"port": 1883}}}')
+    (tmp_path / 'broken.json').write_text('{not json')
+    notes = b'line 1\n\x00binary\xffline 3 __E2E_PROBE_x__ 0 0\n'
+    (tmp_path / 'notes.txt').write_bytes(notes)
+    os.chmod(tmp_path / 'notes.txt', 0o640)
+
+    results = (ProbeBatch(transport, sudo='')
+               .json('conf', str(tmp_path / 'conf.json'))
+               .json('broken', str(tmp_path / 'broken.json'))
+               .json('missing', str(tmp_path / 'missing.json'))
+               .read('notes', str(tmp_path / 'notes.txt'))
+               .stat('notes_stat', str(tmp_path / 'notes.txt'))
+               .stat('dir', str(tmp_path))
+               .stat('nothing', str(tmp_path / 'nothing'))
+               .run('command', 'echo out; echo err >&2; exit 3')
+               .execute())
+
+    assert transport.calls == 1
+    assert results['conf']['data'] == {'mqtt': {'broker': {'port': 1883}}}
+    assert results['broken']['exists'] and results['broken']['data'] is None
+    assert results['broken']['error'].startswith('invalid JSON')
+    assert not results['missing']['exists'] and 'No such file' in results['missing']['error']
+    assert results['notes']['content'] == notes.decode(errors='replace')
+    assert results['notes_stat']['type'] == 'regular file'
+    assert results['notes_stat']['mode'] == '640' and results['notes_stat']['size'] == len(notes)
+    assert results['dir']['type'] == 'directory'
+    assert results['nothing'] == {'kind': 'stat', 'exit_code': 1, 'output': results['nothing']['output'],
+                                  'path': str(tmp_path / 'nothing'), 'exists': False}
+    assert results['command']['exit_code'] == 3
+    assert results['command']['output'] == 'out\nerr\n'
+
+
+def test_probes_are_independent_and_isolated(transport):
+    results = (ProbeBatch(transport, sudo='')
+               .run('exits', 'exit 7')
+               .run('cd', 'cd /; false')
+               .run('after', 'pwd; read line || echo no stdin')
+               .execute())
+    assert results['exits']['exit_code'] == 7 and results['cd']['exit_code'] == 1
+    # A probe's exit, cd or failure does not leak into the next one; stdin is closed
+    assert results['after']['exit_code'] == 0
+    assert results['after']['output'] == f"{os.getcwd()}\nno stdin\n"
+
+
+def test_empty_batch_and_duplicate_names(transport):
+    assert ProbeBatch(transport).execute() == {}
+    assert transport.calls == 0
+    with pytest.raises(ValueError, match="Duplicate probe name 'a'"):
+        ProbeBatch(transport).run('a', 'true').run('a', 'false')
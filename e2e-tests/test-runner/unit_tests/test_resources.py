@@ -0,0 +1,130 @@
+"""
+Unit tests for the agent resource sampler, run against local processes
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from resources import ResourceSampler, parse_limits, slope
+from transport import LocalTransport
+
+# Holds some memory, open files and threads until stdin closes
+WORKLOAD = """
+import sys, threading, time
+ballast = bytearray(32 * 1024 * 1024)
+files = [open(sys.executable, 'rb') for _ in range(20)]
+for _ in range(3):
+    threading.Thread(target=time.sleep, args=(60,), daemon=True).start()
+print('ready', flush=True)
+sys.stdin.read()
+"""
+
+
+@pytest.fixture
+def workload():
+    processes = []
+
+    def start():
+        process = subprocess.Popen([sys.executable, '-c', WORKLOAD], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        assert process.stdout.readline() == b'ready\n'
+        processes.append(process)
+        return process
+
+    yield start
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def test_samples_a_local_process(workload, tmp_path):
+    process = workload()
+    with ResourceSampler(LocalTransport(), interval=0.05, pid_command=f"echo {process.pid}", sudo='') as sampler:
+        assert sampler.wait_for_samples(5)
+    t, pid, cpu_s, rss_kb, fds, threads = sampler.samples[-1]
+    assert pid == process.pid and cpu_s >= 0
+    assert rss_kb > 32 * 1024 and fds >= 20 and threads >= 4
+
+    summary = sampler.summary()
+    assert summary['restarts'] == 0 and summary['gaps'] == 0 and summary['max_fds'] == fds
+    assert summary['max_rss_mb'] > 32 and summary['cpu_percent'] is not None
+
+    sampler.write(tmp_path / 'resources.json')
+    document = json.loads((tmp_path / 'resources.json').read_text())
+    assert document['columns'] == ['t', 'pid', 'cpu_s', 'rss_kb', 'fds', 'threads']
+    assert document['rows'][0][0] == 0 and len(document['rows']) == summary['samples']
+    assert document['summary'] == summary
+
+
+def test_follows_restarts_and_counts_gaps(workload, tmp_path):
+    pid_file = tmp_path / 'pid'
+
+    def write_pid(pid):
+        # Replaced atomically so the loop never reads a partial pid
+        (tmp_path / 'pid.tmp').write_text(str(pid))
+        os.replace(tmp_path / 'pid.tmp', pid_file)
+
+    first = workload()
+    write_pid(first.pid)
+    with ResourceSampler(LocalTransport(), interval=0.05, pid_command=f"cat {pid_file}", sudo='') as sampler:
+        assert sampler.wait_for_samples(2)
+        write_pid(0)
+        first.kill()
+        first.wait()
+        deadline = time.monotonic() + 10
+        while not sampler.gaps and time.monotonic() < deadline:
+            time.sleep(0.05)
+        count = len(sampler.samples)
+        second = workload()
+        write_pid(second.pid)
+        assert sampler.wait_for_samples(count + 2)
+    summary = sampler.summary()
+    assert summary['pids'] == [first.pid, second.pid] and summary['restarts'] == 1
+    assert summary['gaps'] >= 1
+
+
+class TestSummary:
+
+    def sampler(self, samples, warmup_s=0.0):
+        sampler = ResourceSampler(LocalTransport(), warmup_s=warmup_s)
+        sampler.samples = samples
+        return sampler
+
+    def test_cpu_share_and_rss_slope(self):
+        # 50% of a core; RSS grows 1 MB per minute after a startup jump
+        samples = [(0.0, 10, 0.0, 100 * 1024, 8, 4), (60.0, 10, 30.0, 200 * 1024, 9, 4)]
+        samples += [(60.0 * i, 10, 30.0 * i, (200 + i - 1) * 1024, 9, 5) for i in range(2, 6)]
+        summary = self.sampler(samples, warmup_s=60).summary()
+        assert summary['cpu_percent'] == 50.0 and summary['cpu_percent_peak'] == 50.0
+        assert summary['rss_slope_mb_per_h'] == 60.0
+        assert summary['max_rss_mb'] == 204.0 and summary['max_threads'] == 5
+        assert self.sampler(samples).summary()['rss_slope_mb_per_h'] > 60.0
+
+    def test_restart_intervals_do_not_count_as_cpu(self):
+        samples = [(0.0, 10, 5.0, 1024, 1, 1), (1.0, 10, 5.5, 1024, 1, 1),
+                   (2.0, 11, 0.0, 1024, 1, 1), (3.0, 11, 0.5, 1024, 1, 1)]
+        summary = self.sampler(samples).summary()
+        assert summary['cpu_percent'] == 50.0 and summary['restarts'] == 1
+        assert summary['rss_slope_mb_per_h'] is None
+
+    def test_violations(self):
+        samples = [(0.0, 10, 0.0, 300 * 1024, 50, 4), (10.0, 10, 9.0, 300 * 1024, 50, 4)]
+        sampler = self.sampler(samples)
+        assert sampler.violations({'max_rss_mb': 250, 'cpu_percent': 95, 'max_fds': 50}) == [
+            'max_rss_mb 300.0 exceeds 250']
+        assert self.sampler([]).violations({'max_rss_mb': 1}) == []
+
+
+def test_parse_limits_and_slope():
+    assert parse_limits(' max_rss_mb=150, cpu_percent=25 ') == {'max_rss_mb': 150.0, 'cpu_percent': 25.0}
+    assert parse_limits('') == {}
+    with pytest.raises(ValueError, match="Unknown resource limit 'max_cpu=1'"):
+        parse_limits('max_cpu=1')
+    with pytest.raises(ValueError, match='Invalid value for resource limit max_fds'):
+        parse_limits('max_fds=many')
+    assert slope([(0, 0), (1, 2), (2, 4)], per=60) == 120.0
+    assert slope([(0, 1), (0, 2), (0, 3)]) is None
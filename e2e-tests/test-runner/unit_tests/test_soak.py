@@ -0,0 +1,49 @@
+"""
+Unit tests for the config push soak summary and release gate
+"""
+
+import pytest
+
+from resources import parse_limits
+from soak import GATE_LIMITS, gate, soak_summary
+
+REPORT = {
+    'plan': {'company_id': 'acme', 'device_unique_id': 'gw-1', 'interval': 60},
+    'elapsed_s': 7200.0,
+    'pushes': 120,
+    'downloaded': 119,
+    'missed': 1,
+    'latency_ms': {'count': 119, 'p50': 800.0, 'p95': 2400.0, 'p99': 3100.0, 'max': 3500.0},
+    'latency_slope_ms_per_h': 150.0,
+    'first_quarter_latency_ms': {'p50': 700.0},
+    'last_quarter_latency_ms': {'p50': 950.0},
+}
+RESOURCES = {'samples': 7200, 'max_rss_mb': 80.5, 'rss_slope_mb_per_h': 1.5, 'cpu_percent': 3.2,
+             'max_fds': 40, 'max_threads': 12}
+
+
+def test_summary_is_flat_and_complete():
+    summary = soak_summary(REPORT, RESOURCES, coda_version='1.2.3 (rev 42)')
+    assert summary['coda_version'] == '1.2.3 (rev 42)' and summary['plan'] == REPORT['plan']
+    assert summary['soak'] == {
+        'elapsed_s': 7200.0, 'pushes': 120, 'downloaded': 119, 'missed': 1,
+        'latency_p50_ms': 800.0, 'latency_p95_ms': 2400.0, 'latency_p99_ms': 3100.0, 'latency_max_ms': 3500.0,
+        'latency_slope_ms_per_h': 150.0, 'first_quarter_p50_ms': 700.0, 'last_quarter_p50_ms': 950.0,
+    }
+    assert summary['resources'] is RESOURCES
+
+
+def test_gate_checks_soak_and_resource_ceilings():
+    summary = soak_summary(REPORT, RESOURCES)
+    limits = parse_limits('max_missed=0, max_latency_p95_ms=5000, max_latency_slope_ms_per_h=100, '
+                          'rss_slope_mb_per_h=2, max_fds=100', names=GATE_LIMITS)
+    assert gate(summary, limits) == ['max_missed 1 exceeds 0', 'max_latency_slope_ms_per_h 150.0 exceeds 100']
+    assert gate(summary, {'max_rss_mb': 50}) == ['max_rss_mb 80.5 exceeds 50']
+    assert gate(summary, {}) == []
+    with pytest.raises(ValueError, match="Unknown resource limit 'max_pushes=1'"):
+        parse_limits('max_pushes=1', names=GATE_LIMITS)
+
+
+def test_gate_fails_a_soak_without_downloads():
+    summary = soak_summary({'pushes': 3, 'downloaded': 0, 'missed': 3, 'latency_ms': {}}, {'samples': 0})
+    assert gate(summary, {'max_latency_p95_ms': 1000}) == ['no pushed config was downloaded']
@@ -0,0 +1,54 @@
+"""
+Unit tests for the parallel run target pool
+"""
+
+import pytest
+
+from targets import TargetPool, current_target, worker_index
+
+
+class TestTargetPool:
+
+    def test_defaults_to_the_single_vm(self):
+        assert TargetPool.from_env({}).targets == ['coda-test-vm']
+        assert TargetPool.from_env({'MULTIPASS_VM_NAME': 'vm-x'}).targets == ['vm-x']
+
+    def test_e2e_targets_takes_precedence(self):
+        pool = TargetPool.from_env({'MULTIPASS_VM_NAME': 'vm-x', 'E2E_TARGETS': ' vm-1, vm-2,,vm-3 '})
+        assert pool.targets == ['vm-1', 'vm-2', 'vm-3']
+
+    def test_rejects_duplicates_and_empty_pools(self):
+        with pytest.raises(ValueError, match='vm-1'):
+            TargetPool(['vm-1', 'vm-2', 'vm-1'])
+        with pytest.raises(ValueError):
+            TargetPool([])
+
+    def test_local_transport_is_a_single_target(self):
+        assert TargetPool.from_env({'E2E_TRANSPORT': 'local'}).targets == ['coda-test-vm']
+        with pytest.raises(ValueError, match='single target'):
+            TargetPool.from_env({'E2E_TRANSPORT': 'local-persistent', 'E2E_TARGETS': 'a,b'})
+
+    def test_each_worker_gets_its_own_target(self):
+        pool = TargetPool(['vm-1', 'vm-2', 'vm-3'])
+        assigned = [pool.assign(f"gw{i}", 3) for i in range(3)]
+        assert assigned == ['vm-1', 'vm-2', 'vm-3']
+        assert pool.assign(None) == pool.assign('master') == 'vm-1'
+
+    def test_more_workers_than_targets_is_an_error(self):
+        with pytest.raises(ValueError, match='3 workers need 3 isolated targets'):
+            TargetPool(['vm-1', 'vm-2']).assign('gw0', 3)
+
+
+class TestWorkers:
+
+    def test_worker_index(self):
+        assert worker_index('gw0') == 0
+        assert worker_index('gw12') == 12
+        assert worker_index(None) == worker_index('master') == 0
+        with pytest.raises(ValueError):
+            worker_index('worker-1')
+
+    def test_current_target_reads_the_xdist_environment(self):
+        environ = {'E2E_TARGETS': 'vm-1,vm-2', 'PYTEST_XDIST_WORKER': 'gw1', 'PYTEST_XDIST_WORKER_COUNT': '2'}
+        assert current_target(environ) == 'vm-2'
+        assert current_target({'E2E_TARGETS': 'vm-1,vm-2'}) == 'vm-1'
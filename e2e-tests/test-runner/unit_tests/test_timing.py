@@ -0,0 +1,159 @@
+"""
+Unit tests for the step timing plugin
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from timing import StepTimer, compare, step_key, write_junit
+
+RUNNER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStepTimer:
+
+    def test_step_key_drops_counter_and_ellipsis(self):
+        assert step_key("[3/9] Installing coda snap...") == "Installing coda snap"
+        assert step_key("Restarting coda snap") == "Restarting coda snap"
+
+    def test_steps_run_until_the_next_one(self, capsys):
+        clock = FakeClock()
+        timer = StepTimer(clock=clock)
+        timer("[1/2] Install...")
+        clock.now = 4.0
+        timer("[2/2] Configure...")
+        clock.now = 5.5
+        timer.end()
+        assert timer.steps == [
+            {'name': 'Install', 'duration_s': 4.0, 'outcome': 'passed'},
+            {'name': 'Configure', 'duration_s': 1.5, 'outcome': 'passed'},
+        ]
+        assert capsys.readouterr().out == "\n[1/2] Install...\n\n[2/2] Configure...\n"
+
+    def test_with_block_bounds_the_step_and_records_failures(self):
+        clock = FakeClock()
+        timer = StepTimer(clock=clock, echo=False)
+        with pytest.raises(RuntimeError):
+            with timer("Restart"):
+                clock.now = 2.0
+                raise RuntimeError("boom")
+        clock.now = 10.0
+        timer.end()
+        timer.record("time to first config request", 0.25)
+        assert timer.steps == [
+            {'name': 'Restart', 'duration_s': 2.0, 'outcome': 'failed'},
+            {'name': 'time to first config request', 'duration_s': 0.25, 'outcome': 'passed'},
+        ]
+
+
+class TestReports:
+
+    BASELINE = {'tests': {'t::a': {'duration_s': 20.0, 'steps': [
+        {'name': 'Install', 'duration_s': 10.0, 'outcome': 'passed'},
+        {'name': 'Configure', 'duration_s': 1.0, 'outcome': 'passed'},
+    ]}}}
+
+    def test_compare_flags_ratio_and_absolute_slowdowns_only(self):
+        current = {'tests': {
+            't::a': {'duration_s': 21.0, 'steps': [
+                {'name': 'Install', 'duration_s': 16.0, 'outcome': 'passed'},
+                {'name': 'Configure', 'duration_s': 2.5, 'outcome': 'passed'},
+                {'name': 'New step', 'duration_s': 99.0, 'outcome': 'passed'},
+            ]},
+            't::new': {'duration_s': 50.0, 'steps': []},
+        }}
+        regressions = compare(current, self.BASELINE, threshold=1.5, min_delta=2.0)
+        # Configure is 2.5x slower but only by 1.5s; new tests and steps have nothing to compare to
+        assert regressions == [{'test': 't::a', 'step': 'Install', 'baseline_s': 10.0, 'current_s': 16.0,
+                                'ratio': 1.6}]
+        assert compare(self.BASELINE, self.BASELINE) == []
+
+    def test_junit_has_a_testcase_per_step(self, tmp_path):
+        report = {'tests': {
+            't::a': {'outcome': 'failed', 'duration_s': 3.0, 'steps': [
+                {'name': 'Install', 'duration_s': 2.0, 'outcome': 'passed'},
+                {'name': 'Verify', 'duration_s': 1.0, 'outcome': 'failed'},
+            ]},
+            't::b': {'outcome': 'passed', 'duration_s': 0.5, 'steps': []},
+        }}
+        write_junit(report, tmp_path / 'timing.xml')
+        suite = ET.parse(tmp_path / 'timing.xml').getroot()
+        cases = [(c.get('classname'), c.get('name'), c.get('time'), c.find('failure') is not None)
+                 for c in suite.iter('testcase')]
+        assert cases == [('t::a', 'Install', '2.000', False), ('t::a', 'Verify', '1.000', True),
+                         ('t::b', '(test)', '0.500', False)]
+        assert (suite.get('tests'), suite.get('failures')) == ('3', '1')
+
+
+class TestPlugin:
+
+    CONFTEST = textwrap.dedent(f"""
+        import sys
+        import pytest
+        sys.path.insert(0, {RUNNER_DIR!r})
+        from timing import TIMER_KEY, StepTimer, TimingPlugin, add_options
+
+        def pytest_addoption(parser):
+            add_options(parser)
+
+        def pytest_configure(config):
+            config.pluginmanager.register(TimingPlugin(config), 'e2e-timing')
+
+        @pytest.fixture
+        def step(request):
+            timer = StepTimer()
+            request.node.stash[TIMER_KEY] = timer
+            return timer
+    """)
+
+    TESTS = textwrap.dedent("""
+        import time
+
+        def test_steps(step):
+            step("[1/2] Fast...")
+            step("[2/2] Slow...")
+            time.sleep(SLOW)
+
+        def test_failing(step):
+            step("Broken")
+            assert False
+    """)
+
+    def run(self, tmp_path, slow, *args):
+        (tmp_path / 'conftest.py').write_text(self.CONFTEST)
+        (tmp_path / 'test_sample.py').write_text(self.TESTS.replace('SLOW', str(slow)))
+        return subprocess.run([sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', *args],
+                              cwd=tmp_path, capture_output=True, text=True)
+
+    def test_report_and_baseline_regression(self, tmp_path):
+        result = self.run(tmp_path, 0.0, '--timing-report', 'baseline.json')
+        assert result.returncode == 1, result.stdout
+        report = json.loads((tmp_path / 'baseline.json').read_text())
+        steps = report['tests']['test_sample.py::test_steps']['steps']
+        assert [s['name'] for s in steps] == ['Fast', 'Slow']
+        assert report['tests']['test_sample.py::test_failing']['steps'][0]['outcome'] == 'failed'
+
+        result = self.run(tmp_path, 0.5, '--timing-baseline', 'baseline.json', '--timing-min-delta', '0.2',
+                          '-k', 'test_steps', '--timing-fail-on-regression')
+        assert result.returncode == 1
+        assert '✗ Slower than baseline: test_steps: Slow' in result.stdout
+
+        result = self.run(tmp_path, 0.0, '--timing-baseline', 'baseline.json', '-k', 'test_steps',
+                          '--timing-fail-on-regression')
+        assert result.returncode == 0, result.stdout
+        assert '✓ No step slower than the timing baseline' in result.stdout
@@ -0,0 +1,98 @@
+"""
+Unit tests for the command execution transports, run against local bash
+"""
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from transport import LocalTransport, PersistentShellTransport, Transport, make_transport
+
+
+@pytest.fixture(params=['local', 'local-persistent'])
+def transport(request):
+    with make_transport(request.param) as instance:
+        yield instance
+
+
+class TestSemantics:
+    """Both transports behave like `bash -c <command>`"""
+
+    def test_exit_code_and_exact_output(self, transport):
+        assert transport.run('printf abc; exit 3') == (3, 'abc')
+        assert transport.run('echo one; echo two') == (0, 'one\ntwo\n')
+
+    def test_stderr_is_captured(self, transport):
+        exit_code, output = transport.run('echo oops >&2; false')
+        assert exit_code == 1 and output == 'oops\n'
+
+    def test_quoting_and_multiline_commands(self, transport):
+        command = "x='it'\"'\"'s'; cat <<'END'\n$x \"quoted\" $(nope)\nEND\necho \"$x\""
+        assert transport.run(command) == (0, '$x "quoted" $(nope)\nit\'s\n')
+
+    def test_commands_do_not_share_state(self, transport):
+        transport.run('cd /; export E2E_LEAK=1; set -e')
+        # set -e would stop before the echo, cd / would change the working directory
+        assert transport.run('false; echo "${E2E_LEAK:-unset}"') == (0, 'unset\n')
+        assert transport.run('pwd') != (0, '/\n')
+
+    def test_stdin_is_not_consumed(self, transport):
+        assert transport.run('cat; echo done') == (0, 'done\n')
+        assert transport.run('echo after') == (0, 'after\n')
+
+    def test_large_binary_safe_output(self, transport):
+        exit_code, output = transport.run('head -c 300000 /dev/zero | tr "\\0" x')
+        assert exit_code == 0 and output == 'x' * 300000
+
+    def test_timeout(self, transport):
+        with pytest.raises(subprocess.TimeoutExpired):
+            transport.run('sleep 5', timeout=0.3)
+        assert transport.run('echo recovered') == (0, 'recovered\n')
+
+
+class TestPersistentShell:
+    """Session handling specific to the persistent transport"""
+
+    def test_one_session_for_many_commands(self):
+        with PersistentShellTransport(['bash', '--noprofile', '--norc']) as transport:
+            for index in range(20):
+                assert transport.run(f"echo {index}") == (0, f"{index}\n")
+            assert transport.sessions_started == 1
+
+    def test_output_imitating_a_sentinel(self):
+        with PersistentShellTransport(['bash']) as transport:
+            exit_code, output = transport.run('printf "\\n__E2E_DONE_0000__ 0\\n"; exit 4')
+            assert (exit_code, output) == (4, '\n__E2E_DONE_0000__ 0\n')
+
+    def test_session_restarts_after_dying(self):
+        with PersistentShellTransport(['bash']) as transport:
+            transport.run('true')
+            with pytest.raises(ConnectionError):
+                transport.run('kill -9 $PPID; sleep 1')
+            assert transport.run('echo back') == (0, 'back\n')
+            assert transport.sessions_started == 2
+
+    def test_commands_from_several_threads(self):
+        with PersistentShellTransport(['bash']) as transport:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                results = list(pool.map(lambda index: transport.run(f"sleep 0.01; echo {index}"), range(40)))
+            assert results == [(0, f"{index}\n") for index in range(40)]
+            assert transport.sessions_started == 1
+
+    def test_local_transport_separates_streams(self):
+        assert LocalTransport().run('echo err >&2; echo out') == (0, 'out\nerr\n')
+
+
+def test_unknown_transport():
+    with pytest.raises(ValueError, match='E2E_TRANSPORT'):
+        make_transport('ssh')
+
+
+def test_transport_requires_run_and_stream_argv():
+    class RunOnly(Transport):
+        def run(self, command, timeout=300):
+            return 0, ''
+
+    with pytest.raises(TypeError, match='stream_argv'):
+        RunOnly()